@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from .auth import router as auth_router
 from .characters import router as characters_router
+from .export import router as export_router
 from .upload import router as upload_router
 from .videos import router as videos_router
 from .websocket import router as websocket_router
@@ -19,5 +20,8 @@ api_router.include_router(upload_router, prefix="/upload", tags=["upload"])
 # 包含视频生成路由
 api_router.include_router(videos_router, prefix="/videos", tags=["videos"])
 
+# 包含数据导出路由
+api_router.include_router(export_router, prefix="/export", tags=["export"])
+
 # 包含WebSocket路由
 api_router.include_router(websocket_router, tags=["websocket"]) 
\ No newline at end of file
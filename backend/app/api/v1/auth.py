@@ -2,16 +2,54 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from ...core.database import get_db
+from ...core.refresh_tokens import (
+    InvalidRefreshToken,
+    issue_refresh_token,
+    purge_refresh_tokens,
+    revoke_access,
+    revoke_session,
+    rotate_refresh_token,
+    session_of,
+)
 from ...core.security import create_access_token, get_password_hash, verify_password
 from ...models.user import User
-from ...schemas.auth import Token, UserCreate, UserLogin
+from ...schemas.auth import RefreshRequest, Token, UserCreate, UserLogin
 from datetime import timedelta
+from typing import Tuple
 from ...core.config import settings
+import asyncio
 
 router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+def _token_response(user_id: str, refresh_token: str, session_id: str) -> Token:
+    """签发访问令牌，sid 声明记录所属会话以便注销后拒绝"""
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
+    access_token = create_access_token(
+        data={"sub": user_id, "sid": session_id}, expires_delta=access_token_expires
+    )
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        refresh_token=refresh_token,
+        expires_in=int(access_token_expires.total_seconds())
+    )
+
+def _open_session(db: Session, user: User) -> Tuple[str, str, str]:
+    """写入用户（如为新用户）与新会话的刷新令牌并提交，返回 (用户ID, 刷新令牌, 会话ID)
+
+    在线程中调用：SQLite 等待写锁时不阻塞事件循环。
+    """
+    db.flush()
+    user_id = str(user.id)
+    # 请求还没有访问令牌，按新会话的用户记录写入，随后的读取在粘滞窗口内走主库
+    db.info["sticky_key"] = user_id
+    purge_refresh_tokens(db, user_id)
+    refresh_token, session_id = issue_refresh_token(db, user_id)
+    db.commit()
+    return user_id, refresh_token, session_id
+
 @router.post("/register", response_model=Token)
 async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """用户注册"""
@@ -35,19 +73,9 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    
-    # 生成访问令牌
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": str(db_user.id)}, expires_delta=access_token_expires
-    )
+    user_id, refresh_token, session_id = await asyncio.to_thread(_open_session, db, db_user)
     
-    return Token(
-        access_token=access_token, 
-        token_type="bearer"
-    )
+    return _token_response(user_id, refresh_token, session_id)
 
 @router.post("/login", response_model=Token)
 async def login(user_data: UserLogin, db: Session = Depends(get_db)):
@@ -66,16 +94,41 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
             detail="用户账户已被禁用"
         )
     
-    # 生成访问令牌
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
-    )
+    # 开始新会话，之后用刷新令牌续期，不再重复校验密码
+    user_id, refresh_token, session_id = await asyncio.to_thread(_open_session, db, user)
     
-    return Token(
-        access_token=access_token, 
-        token_type="bearer"
-    )
+    return _token_response(user_id, refresh_token, session_id)
+
+@router.post("/refresh", response_model=Token)
+async def refresh(request: RefreshRequest, db: Session = Depends(get_db)):
+    """用刷新令牌换取新的访问令牌与刷新令牌"""
+    try:
+        user, refresh_token, session_id = await asyncio.to_thread(rotate_refresh_token, db, request.refresh_token)
+    except InvalidRefreshToken as e:
+        if e.revoked_session:
+            # 旧令牌被重放时会话已被撤销，同时拒绝该会话尚未过期的访问令牌
+            await revoke_access(e.revoked_session)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e)
+        )
+    
+    return _token_response(str(user.id), refresh_token, session_id)
+
+@router.post("/logout")
+async def logout(request: RefreshRequest, db: Session = Depends(get_db)):
+    """注销刷新令牌所属的会话"""
+    def end_session():
+        session_id = session_of(db, request.refresh_token)
+        if session_id:
+            revoke_session(db, session_id)
+            db.commit()
+        return session_id
+
+    session_id = await asyncio.to_thread(end_session)
+    if session_id:
+        await revoke_access(session_id)
+    return {"message": "已退出登录"}
 
 @router.get("/me")
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
@@ -1,11 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
-from ...core.database import get_db
+from ...core.database import get_db, get_read_db
 from ...core.security import get_current_user
 from ...models.user import User
 from ...models.character import Character, CharacterImage
+from ...models.video import VideoTask
 from ...schemas.character import CharacterCreate, CharacterResponse, CharacterUpdate
+from ...services.character_reaper import character_reaper
+from ...services.task_dedup import IN_FLIGHT_STATUSES
+from ...services.task_scheduler import task_scheduler
+from ...services.video_pipeline import task_worker_pool
+from datetime import datetime
+import asyncio
 
 router = APIRouter()
 
@@ -14,11 +21,12 @@ async def get_characters(
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取角色列表"""
     characters = db.query(Character).filter(
-        Character.user_id == current_user.id
+        Character.user_id == current_user.id,
+        Character.deleted_at.is_(None)
     ).offset(skip).limit(limit).all()
     return characters
 
@@ -31,7 +39,7 @@ async def create_character(
     """创建新角色"""
     db_character = Character(**character.dict(), user_id=current_user.id)
     db.add(db_character)
-    db.commit()
+    await asyncio.to_thread(db.commit)
     db.refresh(db_character)
     return db_character
 
@@ -39,12 +47,13 @@ async def create_character(
 async def get_character(
     character_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取单个角色"""
     character = db.query(Character).filter(
         Character.id == character_id,
-        Character.user_id == current_user.id
+        Character.user_id == current_user.id,
+        Character.deleted_at.is_(None)
     ).first()
     if not character:
         raise HTTPException(status_code=404, detail="角色不存在")
@@ -60,7 +69,8 @@ async def update_character(
     """更新角色"""
     db_character = db.query(Character).filter(
         Character.id == character_id,
-        Character.user_id == current_user.id
+        Character.user_id == current_user.id,
+        Character.deleted_at.is_(None)
     ).first()
     if not db_character:
         raise HTTPException(status_code=404, detail="角色不存在")
@@ -68,7 +78,7 @@ async def update_character(
     for field, value in character.dict(exclude_unset=True).items():
         setattr(db_character, field, value)
     
-    db.commit()
+    await asyncio.to_thread(db.commit)
     db.refresh(db_character)
     return db_character
 
@@ -78,14 +88,37 @@ async def delete_character(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """删除角色"""
+    """删除角色
+
+    只标记删除并取消角色进行中的任务，立即返回；图片、任务、视频记录与文件由后台分批清理。
+    """
     character = db.query(Character).filter(
         Character.id == character_id,
-        Character.user_id == current_user.id
+        Character.user_id == current_user.id,
+        Character.deleted_at.is_(None)
     ).first()
     if not character:
         raise HTTPException(status_code=404, detail="角色不存在")
     
-    db.delete(character)
-    db.commit()
+    now = datetime.utcnow()
+    character.deleted_at = now
+    in_flight = [row[0] for row in db.query(VideoTask.id).filter(
+        VideoTask.character_id == character_id,
+        VideoTask.status.in_(IN_FLIGHT_STATUSES)
+    ).all()]
+    
+    def mark_deleted():
+        if in_flight:
+            db.query(VideoTask).filter(
+                VideoTask.id.in_(in_flight),
+                VideoTask.status.in_(IN_FLIGHT_STATUSES)
+            ).update({"status": "cancelled", "completed_at": now}, synchronize_session=False)
+        db.commit()
+    
+    await asyncio.to_thread(mark_deleted)
+    
+    for task_id in in_flight:
+        task_scheduler.cancel(task_id)
+        task_worker_pool.cancel(task_id)
+    character_reaper.wake()
     return {"message": "角色删除成功"} 
\ No newline at end of file
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from functools import partial
+from datetime import datetime
+from ...core.database import open_read_session
+from ...core.security import get_current_user
+from ...models.user import User
+from ...services.export_service import EXPORT_FORMATS
+
+router = APIRouter()
+
+@router.get("")
+async def export_data(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|zip)$"),
+    current_user: User = Depends(get_current_user)
+):
+    """流式导出当前用户的角色、图片、视频与任务
+
+    ndjson 只包含记录；zip 另外包含原始参考图片。数据边读边发送，内存占用与账户大小无关。
+    """
+    stream, media_type, extension = EXPORT_FORMATS[format]
+    filename = f"export-{datetime.utcnow():%Y%m%d%H%M%S}.{extension}"
+    return StreamingResponse(
+        stream(partial(open_read_session, request), current_user.id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,23 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, UploadFile, File
 from sqlalchemy.orm import Session
+from ...core.config import settings
 from ...core.database import get_db
+from ...core.security import get_current_user
 from ...models.character import Character, CharacterImage
-from ...schemas.upload import ImageUploadResponse, BatchUploadResponse
-from typing import List
+from ...models.user import User
+from ...schemas.upload import (
+    ImageUploadResponse, BatchUploadResponse, UploadFileStatus, UploadSessionCreate, UploadSessionResponse
+)
+from ...services.file_service import file_storage
+from ...services.image_hash import compute_hashes, find_character_duplicate, image_hash_index
+from ...services.ai_service import ai_service
+from ...services.reference_selection import reference_selector
+from ...services.upload_sessions import (
+    UploadSessionBusy, UploadSessionError, UploadSessionNotFound, upload_session_store
+)
+from typing import List, Optional, Tuple
+import asyncio
 import uuid
 import os
 
 router = APIRouter()
 
+def _storage_filename(filename: str) -> str:
+    """存储中的文件名：随机UUID加原扩展名"""
+    return f"{uuid.uuid4()}{os.path.splitext(filename)[1]}"
+
+async def _ingest_image(
+    db: Session,
+    character_id: str,
+    user_id: str,
+    filename: str,
+    content_type: str,
+    content: bytes,
+    reject_duplicates: bool,
+    threshold: int,
+    stored_path: Optional[str] = None
+) -> Optional[ImageUploadResponse]:
+    """检测近重复、提取特征、写入存储并创建图片记录，因近重复被拒绝时返回 None
+
+    similar_elsewhere 只统计同一用户其他角色中的近重复图片。
+
+    stored_path 为已写入存储的文件（分块上传拼接分块时已写入），因近重复被拒绝时删除；
+    缺省在检测通过后写入 content。
+    """
+    hashes = await asyncio.to_thread(compute_hashes, content)
+    duplicate = find_character_duplicate(db, character_id, hashes, threshold) if hashes else None
+    if duplicate and reject_duplicates:
+        if stored_path:
+            await asyncio.to_thread(file_storage.delete, stored_path)
+        return None
+    
+    features = await ai_service.extract_image_features(content)
+    
+    # 保存文件（本地存储，实际部署可替换为MinIO等存储服务）
+    file_path = stored_path
+    if file_path is None:
+        file_path, _ = await asyncio.to_thread(file_storage.save_stream, _storage_filename(filename), [content])
+    
+    # 创建图片记录
+    db_image = CharacterImage(
+        character_id=character_id,
+        image_url=file_path,
+        image_type="reference",
+        file_size=str(len(content)),
+        mime_type=content_type,
+        phash=hashes[0] if hashes else None,
+        dhash=hashes[1] if hashes else None,
+        feature_vector=features[0] if features else None,
+        quality_score=features[1] if features else None
+    )
+    
+    db.add(db_image)
+    await asyncio.to_thread(db.commit)
+    db.refresh(db_image)
+    
+    similar_elsewhere = 0
+    if hashes:
+        similar_elsewhere = len(image_hash_index.similar(
+            hashes[0], threshold, user_id, exclude_character=character_id
+        ))
+        image_hash_index.add(str(db_image.id), character_id, user_id, hashes[0])
+    
+    return ImageUploadResponse(
+        id=str(db_image.id),
+        filename=filename,
+        url=file_path,
+        file_size=len(content),
+        mime_type=content_type,
+        quality_score=features[1] if features else 0.0,
+        recommendations=["图片质量良好", "建议添加更多角度"],
+        duplicate_of=duplicate[0] if duplicate else None,
+        duplicate_distance=duplicate[1] if duplicate else None,
+        similar_elsewhere=similar_elsewhere
+    )
+
 @router.post("/character/{character_id}/images", response_model=BatchUploadResponse)
 async def upload_character_images(
     character_id: str,
     files: List[UploadFile] = File(...),
+    reject_duplicates: Optional[bool] = Query(None, description="拒绝与该角色已有图片近重复的图片，缺省使用服务配置"),
+    current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """上传角色图片"""
+    """上传角色图片
+
+    每张图片计算感知哈希：与该角色已有图片近重复时在响应中标记（可选直接拒绝），
+    并统计当前用户其他角色中的近重复图片数。
+    """
     # 检查角色是否存在
-    character = db.query(Character).filter(Character.id == character_id).first()
+    character = db.query(Character).filter(
+        Character.id == character_id,
+        Character.user_id == current_user.id,
+        Character.deleted_at.is_(None)
+    ).first()
     if not character:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -26,64 +122,227 @@ async def upload_character_images(
     
     uploaded_images = []
     failed_files = []
+    rejected_duplicates = []
+    threshold = settings.duplicate_hash_threshold
+    if reject_duplicates is None:
+        reject_duplicates = settings.reject_duplicate_images
+    await image_hash_index.ensure_loaded()
     
     for file in files:
         try:
-            # 生成文件名
-            file_extension = os.path.splitext(file.filename)[1]
-            new_filename = f"{uuid.uuid4()}{file_extension}"
-            
-            # 保存文件（这里简化处理，实际应该保存到MinIO等存储服务）
-            file_path = f"uploads/{new_filename}"
-            os.makedirs("uploads", exist_ok=True)
-            
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-            
-            # 创建图片记录
-            db_image = CharacterImage(
-                character_id=character_id,
-                image_url=file_path,
-                image_type="reference",
-                file_size=str(len(content)),
-                mime_type=file.content_type
+            content = await file.read()
+            image = await _ingest_image(
+                db, character_id, current_user.id, file.filename, file.content_type, content,
+                reject_duplicates, threshold
             )
-            
-            db.add(db_image)
-            db.commit()
-            db.refresh(db_image)
-            
-            uploaded_images.append(ImageUploadResponse(
-                id=str(db_image.id),
-                filename=file.filename,
-                url=file_path,
-                file_size=len(content),
-                mime_type=file.content_type,
-                quality_score=0.8,  # 模拟质量评分
-                recommendations=["图片质量良好", "建议添加更多角度"]
-            ))
+            if image is None:
+                rejected_duplicates.append(file.filename)
+                continue
+            uploaded_images.append(image)
             
         except Exception as e:
             failed_files.append(file.filename)
     
+    if uploaded_images:
+        reference_selector.invalidate(character_id)
+    
+    return BatchUploadResponse(
+        total_uploaded=len(uploaded_images),
+        total_failed=len(failed_files),
+        uploaded_images=uploaded_images,
+        failed_files=failed_files,
+        rejected_duplicates=rejected_duplicates
+    )
+
+async def _session_call(fn, *args):
+    """在线程中执行会话存储操作，并把会话错误转换为HTTP错误"""
+    try:
+        return await asyncio.to_thread(fn, *args)
+    except UploadSessionNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="上传会话不存在或已过期")
+    except UploadSessionBusy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="上传会话正在入库，请稍后查询结果")
+    except UploadSessionError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.post("/character/{character_id}/sessions", response_model=UploadSessionResponse)
+async def create_upload_session(
+    character_id: str,
+    session: UploadSessionCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """创建分块上传会话
+
+    声明要上传的文件名与大小后，按 offset = 分块序号 × chunk_size 逐块 PUT 到
+    /upload/sessions/{session_id}/files/{文件序号}，分块可以并行、乱序上传。中断后查询会话状态，
+    只补传 missing_chunks 中的分块，全部收齐后调用 finalize 入库。会话只对创建者可见。
+    """
+    character = db.query(Character).filter(
+        Character.id == character_id,
+        Character.user_id == current_user.id,
+        Character.deleted_at.is_(None)
+    ).first()
+    if not character:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="角色不存在")
+    if len(session.files) > settings.upload_session_max_files:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单个会话最多上传 {settings.upload_session_max_files} 个文件"
+        )
+    oversized = [spec.filename for spec in session.files if spec.size > settings.max_file_size]
+    if oversized:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"文件超过大小限制: {', '.join(oversized)}"
+        )
+    
+    manifest = await _session_call(
+        lambda: upload_session_store.create(
+            character_id,
+            current_user.id,
+            [spec.model_dump() for spec in session.files],
+            session.chunk_size,
+            reject_duplicates=session.reject_duplicates
+        )
+    )
+    return await _session_call(upload_session_store.status, manifest["session_id"], current_user.id)
+
+@router.get("/sessions/{session_id}", response_model=UploadSessionResponse)
+async def get_upload_session(session_id: str, current_user: User = Depends(get_current_user)):
+    """查询上传会话，返回每个文件尚未收到的分块"""
+    return await _session_call(upload_session_store.status, session_id, current_user.id)
+
+@router.put("/sessions/{session_id}/files/{file_index}", response_model=UploadFileStatus)
+async def upload_chunk(
+    session_id: str,
+    file_index: int,
+    request: Request,
+    offset: int = Query(..., ge=0, description="分块在文件中的字节偏移量，必须是 chunk_size 的整数倍"),
+    current_user: User = Depends(get_current_user)
+):
+    """上传一个分块，请求体为分块的原始字节；重复上传同一分块是幂等的"""
+    limit = upload_session_store.chunk_size
+    body = bytearray()
+    async for block in request.stream():
+        body += block
+        if len(body) > limit:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="分块超过允许的最大分块大小")
+    return await _session_call(
+        upload_session_store.write_chunk, session_id, file_index, offset, bytes(body), current_user.id
+    )
+
+def _store_session_file(session_id: str, spec: dict) -> Tuple[str, bytes]:
+    """按顺序读一遍分块，边写入存储边收集内容（哈希与特征提取需要完整内容），返回存储路径与内容"""
+    content = bytearray()
+
+    def blocks():
+        for block in upload_session_store.iter_file(session_id, spec["index"]):
+            content.extend(block)
+            yield block
+
+    file_path, _ = file_storage.save_stream(_storage_filename(spec["filename"]), blocks())
+    return file_path, bytes(content)
+
+@router.post("/sessions/{session_id}/finalize", response_model=BatchUploadResponse)
+async def finalize_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """所有分块收齐后拼接文件并入库，处理流程与批量上传相同；完成后删除会话
+
+    同一会话同时只有一个 finalize 执行，另一个请求返回 409。每个文件入库后记录结果，
+    请求中断或超时后重试时跳过已入库的文件，返回其原有结果。
+    """
+    session = await _session_call(upload_session_store.status, session_id, current_user.id)
+    if not session["complete"]:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="仍有分块未上传，请查询会话状态后补传")
+    lock = await _session_call(upload_session_store.lock_finalize, session_id, current_user.id)
+    try:
+        manifest = await _session_call(upload_session_store.load, session_id, current_user.id)
+        character_id = manifest["character_id"]
+        character = db.query(Character).filter(
+            Character.id == character_id,
+            Character.user_id == current_user.id,
+            Character.deleted_at.is_(None)
+        ).first()
+        if not character:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="角色不存在")
+        
+        reject_duplicates = manifest["options"].get("reject_duplicates")
+        if reject_duplicates is None:
+            reject_duplicates = settings.reject_duplicate_images
+        threshold = settings.duplicate_hash_threshold
+        await image_hash_index.ensure_loaded()
+        
+        uploaded_images = []
+        failed_files = []
+        rejected_duplicates = []
+        results = manifest.get("results", {})
+        for spec in manifest["files"]:
+            # 上次 finalize 已处理的文件
+            recorded = results.get(str(spec["index"]))
+            if recorded is not None:
+                if recorded.get("rejected"):
+                    rejected_duplicates.append(spec["filename"])
+                else:
+                    uploaded_images.append(ImageUploadResponse(**recorded["image"]))
+                continue
+            stored_path = None
+            try:
+                stored_path, content = await _session_call(_store_session_file, session_id, spec)
+                image = await _ingest_image(
+                    db, character_id, current_user.id, spec["filename"], spec["content_type"], content,
+                    reject_duplicates, threshold, stored_path=stored_path
+                )
+            except Exception:
+                db.rollback()
+                if stored_path:
+                    await asyncio.to_thread(file_storage.delete, stored_path)
+                failed_files.append(spec["filename"])
+                continue
+            if image is None:
+                rejected_duplicates.append(spec["filename"])
+                result = {"rejected": True}
+            else:
+                uploaded_images.append(image)
+                result = {"image": image.model_dump()}
+            await _session_call(upload_session_store.record_result, session_id, spec["index"], result)
+        
+        if uploaded_images:
+            reference_selector.invalidate(character_id)
+        await asyncio.to_thread(upload_session_store.delete, session_id)
+    finally:
+        lock.close()
+    
     return BatchUploadResponse(
         total_uploaded=len(uploaded_images),
         total_failed=len(failed_files),
         uploaded_images=uploaded_images,
-        failed_files=failed_files
+        failed_files=failed_files,
+        rejected_duplicates=rejected_duplicates
     )
 
+@router.delete("/sessions/{session_id}")
+async def abort_upload_session(session_id: str, current_user: User = Depends(get_current_user)):
+    """放弃上传会话并删除已收到的分块"""
+    await _session_call(upload_session_store.load, session_id, current_user.id)
+    await asyncio.to_thread(upload_session_store.delete, session_id)
+    return {"message": "上传会话已取消"}
+
 @router.delete("/character/{character_id}/images/{image_id}")
 async def delete_character_image(
     character_id: str,
     image_id: str,
+    current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """删除角色图片"""
-    image = db.query(CharacterImage).filter(
+    image = db.query(CharacterImage).join(Character, Character.id == CharacterImage.character_id).filter(
         CharacterImage.id == image_id,
-        CharacterImage.character_id == character_id
+        CharacterImage.character_id == character_id,
+        Character.user_id == current_user.id
     ).first()
     
     if not image:
@@ -92,12 +351,13 @@ async def delete_character_image(
             detail="图片不存在"
         )
     
-    # 删除文件
-    if os.path.exists(image.image_url):
-        os.remove(image.image_url)
+    # 删除文件（在线程中执行，不阻塞事件循环）
+    await asyncio.to_thread(file_storage.delete, image.image_url)
     
     # 删除数据库记录
     db.delete(image)
-    db.commit()
+    await asyncio.to_thread(db.commit)
+    image_hash_index.remove(image_id)
+    reference_selector.invalidate(character_id)
     
     return {"message": "图片删除成功"} 
\ No newline at end of file
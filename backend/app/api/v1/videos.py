@@ -1,53 +1,131 @@
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status, WebSocket, WebSocketDisconnect
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
-from ...core.database import get_db
+from typing import List, Optional
+from ...core.database import get_db, get_read_db
 from ...core.security import get_current_user
-from ...models.user import User
-from ...models.character import Character
+from ...core.tracing import inject_context
+from ...models.user import User, generate_uuid
+from ...models.character import Character, CharacterImage
 from ...models.video import Video, VideoTask
 from ...schemas.video import VideoTaskCreate, VideoTaskResponse, VideoResponse
 from ...services.ai_service import ai_service
+from ...services.eta_estimator import eta_estimator
+from ...services.task_scheduler import ScheduledTask, task_scheduler
+from ...services.task_dedup import (
+    IN_FLIGHT_STATUSES, character_fingerprint, dedup_stats, find_by_idempotency_key, find_reusable_task,
+    same_request
+)
+from ...services.video_pipeline import cancellation_stats, task_worker_pool
+from datetime import datetime
+import asyncio
 import json
 
 router = APIRouter()
 
+def _idempotent_replay(existing: VideoTask, task_data: VideoTaskCreate, response: Response) -> VideoTask:
+    """返回幂等键对应的原任务；同一幂等键用于参数不同的请求时返回409"""
+    if not same_request(existing, task_data):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="幂等键已用于不同的请求")
+    dedup_stats.idempotent_replays += 1
+    response.headers["X-Task-Deduplicated"] = "idempotency-key"
+    return existing
+
 @router.post("/generate", response_model=VideoTaskResponse)
 async def create_video_task(
     task_data: VideoTaskCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """创建视频生成任务"""
+    """创建视频生成任务
+
+    重复提交不会重复生成：相同幂等键返回原任务；参数与角色图片都相同时，
+    执行中的请求挂到已有任务上，已完成的请求直接复用已有视频结果。
+    """
     # 检查角色是否存在
     character = db.query(Character).filter(
         Character.id == task_data.character_id,
-        Character.user_id == current_user.id
+        Character.user_id == current_user.id,
+        Character.deleted_at.is_(None)
     ).first()
     
     if not character:
         raise HTTPException(status_code=404, detail="角色不存在")
     
+    fingerprint = character_fingerprint(db, task_data)
+    
+    # 幂等键重放
+    if idempotency_key:
+        existing = find_by_idempotency_key(db, current_user.id, idempotency_key)
+        if existing:
+            return _idempotent_replay(existing, task_data, response)
+    
+    # 相同参数的执行中任务或已完成结果
+    reusable = find_reusable_task(db, current_user.id, fingerprint)
+    if reusable:
+        if reusable.status == "completed":
+            dedup_stats.reused_results += 1
+            response.headers["X-Task-Deduplicated"] = "completed"
+        else:
+            dedup_stats.attached_in_flight += 1
+            response.headers["X-Task-Deduplicated"] = "in-flight"
+        return reusable
+    
     # 创建视频任务
     db_task = VideoTask(
+        id=generate_uuid(),
         user_id=current_user.id,
         character_id=task_data.character_id,
         script=task_data.script,
         duration=task_data.duration,
         style=task_data.style,
-        quality=task_data.quality
+        quality=task_data.quality,
+        preview=task_data.preview,
+        fingerprint=fingerprint,
+        idempotency_key=idempotency_key
+    )
+    # 按当前排队情况预计完成时间
+    references = db.query(func.count(CharacterImage.id)).filter(
+        CharacterImage.character_id == task_data.character_id
+    ).scalar()
+    db_task.estimated_time = eta_estimator.estimate_new_task(
+        db_task, task_scheduler, task_worker_pool.running, references
     )
     
     db.add(db_task)
-    db.commit()
+    try:
+        await asyncio.to_thread(db.commit)
+    except IntegrityError:
+        db.rollback()
+        eta_estimator.forget(db_task.id)
+        # 并发请求使用了同一幂等键，返回先创建的任务
+        if idempotency_key:
+            existing = find_by_idempotency_key(db, current_user.id, idempotency_key)
+            if existing:
+                return _idempotent_replay(existing, task_data, response)
+        # 并发的相同请求先创建了执行中的任务，挂到该任务上
+        reusable = find_reusable_task(db, current_user.id, fingerprint)
+        if not reusable or reusable.status not in IN_FLIGHT_STATUSES:
+            raise
+        dedup_stats.attached_in_flight += 1
+        response.headers["X-Task-Deduplicated"] = "in-flight"
+        return reusable
     db.refresh(db_task)
+    dedup_stats.created += 1
+    # 追踪上下文随任务载荷传给worker，任务执行的 span 与本次请求属于同一 trace
+    scheduled = ScheduledTask.from_model(db_task)
+    inject_context(scheduled.payload)
+    task_scheduler.submit(scheduled)
     
     return db_task
 
 @router.get("/tasks", response_model=List[VideoTaskResponse])
 async def get_video_tasks(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     skip: int = 0,
     limit: int = 100
 ):
@@ -61,7 +139,7 @@ async def get_video_tasks(
 async def get_video_task(
     task_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """获取单个视频任务"""
     task = db.query(VideoTask).filter(
@@ -74,10 +152,52 @@ async def get_video_task(
     
     return task
 
+@router.post("/tasks/{task_id}/cancel", response_model=VideoTaskResponse)
+async def cancel_video_task(
+    task_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """取消视频任务
+
+    排队中的任务直接移出调度队列；执行中的任务会停止渲染。任务在其他进程执行时，
+    该进程下一次更新进度时发现状态已变为 cancelled 并停止。
+    """
+    task = db.query(VideoTask).filter(
+        VideoTask.id == task_id,
+        VideoTask.user_id == current_user.id
+    ).first()
+    
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    previous_status = task.status
+    
+    def mark_cancelled() -> int:
+        updated = db.query(VideoTask).filter(
+            VideoTask.id == task_id,
+            VideoTask.status.in_(IN_FLIGHT_STATUSES)
+        ).update({"status": "cancelled", "completed_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        return updated
+    
+    updated = await asyncio.to_thread(mark_cancelled)
+    if not updated:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="任务已结束，无法取消")
+    db.refresh(task)
+    
+    task_scheduler.cancel(task_id)
+    eta_estimator.forget(task_id)
+    # 执行中的任务由worker记录已消耗与节省的计算量
+    if not task_worker_pool.cancel(task_id) and previous_status == "pending":
+        cancellation_stats.record_cancel("queued", task_scheduler.task_cost(ScheduledTask.from_model(task)))
+    
+    return task
+
 @router.get("/", response_model=List[VideoResponse])
 async def get_videos(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     skip: int = 0,
     limit: int = 100
 ):
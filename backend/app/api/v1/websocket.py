@@ -1,43 +1,54 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from ...core.security import get_current_user_websocket
 from ...core.database import get_db
+from ...core.log_pipeline import get_logger
+from ...services import ws_protocol
 from sqlalchemy.orm import Session
-import json
-import logging
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 router = APIRouter()
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: dict = {}
+        # 每个连接协商出的消息编码
+        self.codecs: dict = {}
     
     async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
+        self.codecs[websocket] = await ws_protocol.accept(websocket)
         if user_id not in self.active_connections:
             self.active_connections[user_id] = []
         self.active_connections[user_id].append(websocket)
-        logger.info(f"用户 {user_id} 连接成功")
+        logger.info("ws_connected", user_id=user_id, protocol=self.codecs[websocket].name)
     
     def disconnect(self, websocket: WebSocket, user_id: str):
         if user_id in self.active_connections:
-            self.active_connections[user_id].remove(websocket)
+            if websocket in self.active_connections[user_id]:
+                self.active_connections[user_id].remove(websocket)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
-        logger.info(f"用户 {user_id} 断开连接")
+        self.codecs.pop(websocket, None)
+        logger.info("ws_disconnected", user_id=user_id)
     
-    async def send_personal_message(self, message: str, user_id: str):
+    def codec(self, websocket: WebSocket):
+        return self.codecs.get(websocket, ws_protocol.json_codec)
+    
+    async def send_personal_message(self, message: dict, user_id: str, encoded: dict = None):
+        """发送给用户的所有连接，同一编码只编码一次"""
+        encoded = {} if encoded is None else encoded
         if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
+            for connection in list(self.active_connections[user_id]):
+                codec = self.codec(connection)
                 try:
-                    await connection.send_text(message)
+                    await ws_protocol.send(connection, codec, ws_protocol.encode_once(codec, message, encoded))
                 except Exception as e:
-                    logger.error(f"发送消息失败: {e}")
+                    logger.error("ws_send_failed", user_id=user_id, error=str(e))
                     self.disconnect(connection, user_id)
     
-    async def broadcast(self, message: str):
+    async def broadcast(self, message: dict):
+        encoded = {}
         for user_id in list(self.active_connections.keys()):
-            await self.send_personal_message(message, user_id)
+            await self.send_personal_message(message, user_id, encoded)
 
 manager = ConnectionManager()
 
@@ -47,7 +58,11 @@ async def websocket_endpoint(
     user_id: str,
     token: str = None
 ):
-    """WebSocket连接端点"""
+    """WebSocket连接端点
+
+    客户端可通过子协议 aivcl.msgpack.v1（或查询参数 protocol=msgpack）选择二进制编码，
+    未指定时使用JSON，见 services.ws_protocol。
+    """
     try:
         # 验证用户身份
         if token:
@@ -57,36 +72,40 @@ async def websocket_endpoint(
                 return
         else:
             # 如果没有token，允许连接但记录警告
-            logger.warning(f"用户 {user_id} 连接时没有提供token")
+            logger.warning("ws_missing_token", user_id=user_id)
         
         await manager.connect(websocket, user_id)
         
         try:
             while True:
-                # 接收消息
-                data = await websocket.receive_text()
-                message = json.loads(data)
+                # 接收消息，无法解码的帧回复错误后继续接收
+                try:
+                    message = await ws_protocol.receive(websocket, manager.codec(websocket))
+                except ws_protocol.ProtocolError as e:
+                    logger.info("ws_protocol_error", user_id=user_id, error=str(e))
+                    await ws_protocol.send(websocket, manager.codec(websocket), {"type": "error", "message": str(e)})
+                    continue
                 
                 # 处理不同类型的消息
                 if message.get("type") == "ping":
-                    await websocket.send_text(json.dumps({"type": "pong"}))
+                    await ws_protocol.send(websocket, manager.codec(websocket), {"type": "pong"})
                 elif message.get("type") == "task_progress":
                     # 处理任务进度更新
                     await manager.send_personal_message(
-                        json.dumps({
+                        {
                             "type": "task_progress_update",
                             "task_id": message.get("task_id"),
                             "progress": message.get("progress", 0)
-                        }),
+                        },
                         user_id
                     )
                 else:
                     # 回显消息
                     await manager.send_personal_message(
-                        json.dumps({
+                        {
                             "type": "echo",
                             "message": message.get("message", "收到消息")
-                        }),
+                        },
                         user_id
                     )
                     
@@ -94,8 +113,8 @@ async def websocket_endpoint(
             manager.disconnect(websocket, user_id)
             
     except Exception as e:
-        logger.error(f"WebSocket连接错误: {e}")
+        logger.error("ws_error", user_id=user_id, error=str(e))
         try:
             await websocket.close(code=4000, reason="服务器错误")
         except:
-            pass 
\ No newline at end of file
+            pass 
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -22,10 +22,138 @@ class Settings(BaseSettings):
     def db_url(self) -> str:
         return self.postgres_url or self.database_url
     
+    # 只读副本：列表与详情接口的读取在副本间轮询，连接失败的副本暂时摘除；
+    # 同一用户提交写入后的一段时间内仍读主库，保证读到自己的写入
+    read_replica_urls: List[str] = []
+    replica_sticky_seconds: float = 5.0
+    replica_retry_seconds: float = 30.0  # 副本被摘除后重新尝试的间隔
+    
+    # SQLite（单机部署）：queue 为 WAL + 连接池 + BEGIN IMMEDIATE 写事务，static 为所有请求共享一个连接
+    sqlite_pool: str = "queue"  # queue, static
+    sqlite_journal_mode: str = "wal"
+    sqlite_synchronous: str = "normal"  # WAL 下 normal 只在断电时可能丢失最近的提交，不会损坏数据库
+    sqlite_cache_size_mb: int = 64  # 每个连接的页缓存
+    sqlite_mmap_size_mb: int = 256
+    sqlite_busy_timeout_ms: int = 5000  # 等待其他连接（含其他进程）释放写锁的最长时间
+    
+    # 连接池：主库与每个副本在每个worker进程中各一个
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800  # 秒，避免使用被数据库或代理关闭的空闲连接（PostgreSQL）
+    db_pool_pre_ping: bool = True  # PostgreSQL
+    
+    # 启动时是否自动迁移数据库结构；生产环境应关闭并在部署时运行 python -m app.core.migrate
+    auto_migrate: bool = True
+    
+    # 消息代理（Redis），未配置时跳过代理健康检查
+    redis_url: Optional[str] = None
+    
+    # WebSocket编码：客户端可协商msgpack二进制编码，超过阈值的消息做zlib压缩
+    ws_msgpack_enabled: bool = True
+    ws_compress_threshold: int = 1024  # 字节
+    ws_compress_level: int = 1
+    
+    # 日志：经内存队列由后台线程写出；高频事件按事件名采样（保留比例）与限流（每秒条数）
+    log_level: str = "INFO"
+    log_format: str = "json"  # json, console
+    log_queue_size: int = 10000  # 队列满时丢弃日志而不是阻塞事件循环
+    log_sample_rates: Dict[str, float] = {"task_progress": 0.1}
+    log_rate_limits: Dict[str, float] = {
+        "task_progress": 100.0,
+        "ws_connected": 50.0,
+        "ws_disconnected": 50.0,
+        "ws_subscription": 50.0,
+        "ws_protocol_error": 10.0,
+        "request_shed": 1.0,
+    }
+    
+    # 分布式追踪：W3C traceparent 传播；同一请求或任务执行的span攒齐后尾部采样，保留的以OTLP/JSON导出
+    # 默认关闭；开启后使用 file 导出器时会持续向 trace_file 追加写入
+    tracing_enabled: bool = False
+    trace_exporter: str = "file"  # file（每行一个OTLP/JSON请求）, otlp（OTLP/HTTP收集器）, none
+    trace_file: str = "./traces/spans.jsonl"
+    trace_otlp_endpoint: str = "http://localhost:4318"
+    trace_sample_ratio: float = 0.01  # 未出错、未超时的片段按trace ID保留的比例
+    # 按根span类型的耗时阈值（毫秒），超过即保留：server 为HTTP请求，consumer 为任务执行
+    trace_slow_thresholds_ms: Dict[str, float] = {"server": 1000.0, "consumer": 600000.0}
+    trace_max_spans: int = 512  # 每个片段最多记录的span数
+    trace_export_queue_size: int = 1000  # 待导出片段数上限，满时丢弃
+    trace_export_batch_size: int = 64
+    trace_export_interval: float = 2.0  # 秒
+   
+    # 健康检查配置
+    health_check_interval: float = 5.0  # 后台刷新间隔（秒）
+    health_check_timeout: float = 2.0  # 单项检查超时（秒）
+    health_pool_saturation_threshold: float = 0.9  # 连接池使用率达到该值时就绪探针失败
+    health_min_free_disk_mb: int = 100
+    
+    # 限流配置：规则键为 "方法 路径模板"，值为 "次数/second|minute|hour|day"
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"  # memory, redis
+    rate_limit_default: Optional[str] = None  # 未匹配规则的请求的默认限额
+    rate_limit_rules: Dict[str, str] = {
+        "POST /api/v1/videos/generate": "10/minute",
+        "POST /api/v1/upload/character/{character_id}/images": "30/minute",
+        "GET /api/v1/export": "2/minute",
+    }
+    
+    # 准入控制：超过阈值时直接返回503
+    admission_enabled: bool = True
+    admission_max_loop_lag_ms: float = 200.0
+    admission_max_pool_wait_ms: float = 500.0
+    # 连接池等待时间平均值的衰减半衰期（秒），没有新请求时过载判断随之解除
+    admission_pool_wait_half_life: float = 2.0
+    
+    # 任务调度：档位间加权轮询，档位内按用户赤字轮询（成本 = 时长秒数 × 档位成本系数）
+    scheduler_tier_weights: Dict[str, float] = {"standard": 6.0, "high": 3.0, "ultra": 1.0}
+    scheduler_tier_costs: Dict[str, float] = {"standard": 1.0, "high": 3.0, "ultra": 10.0}
+    scheduler_user_quantum: float = 30.0
+    scheduler_aging_seconds: float = 600.0  # 等待超过该时长的任务优先执行
+    
+    # 任务执行：进程内任务worker数（0 表示不在本进程执行任务）与共享的场景渲染并发数
+    task_workers: int = 2
+    # 场景渲染器：none 表示未接入真实渲染器，任务保持 pending；fake 为按时长睡眠的本地假渲染器，
+    # 只用于开发与基准测试，产出的视频地址不对应真实文件（除非开启 render_placeholder_video）
+    scene_renderer: str = "none"  # none, fake
+    scene_workers: int = 8
+    scene_max_retries: int = 2  # 单个场景失败后的重试次数
+    progress_flush_interval: float = 1.0  # 任务进度批量写库的间隔（秒）
+    # 启动时把超过该时长未更新的 processing 任务（上次进程崩溃时正在执行）重置为 pending
+    task_stale_seconds: float = 120.0
+    
+    # 完成时间预估：排队等待与执行耗时两个在线回归模型，任务开始/完成时增量更新
+    eta_prior_seconds_per_cost: float = 2.0  # 未训练时每单位成本的执行秒数
+    eta_forgetting: float = 0.995  # 遗忘因子，越小越快适应变化
+    eta_quantile: float = 0.5  # estimated_time 取执行耗时的该分位
+    eta_quantile_step: float = 0.01
+    eta_warm_start_tasks: int = 500  # 启动时用于热身的最近完成任务数
+    
+    # 生成视频输出
+    generated_dir: str = "./generated"
+    video_fps: int = 24
+    video_width: int = 640
+    video_height: int = 360
+    render_placeholder_video: bool = False  # 本地假渲染器拼接时是否写出真实的占位视频文件
+    
+    # 预览：先渲染低分辨率、低帧率草稿
+    preview_fps: int = 8
+    preview_scale: float = 0.25  # 预览分辨率相对成片的缩放比例
+    preview_cost_ratio: float = 0.1  # 预览渲染成本相对成片的比例
+    
+    # 角色一致性评分：按帧率抽样成片帧与参考图片比对
+    consistency_sample_fps: float = 2.0
+    consistency_drift_threshold: float = 0.5  # 场景得分低于该值标记为漂移，需要重新渲染
+    consistency_chunk_size: int = 1024  # 每次矩阵乘法处理的帧数
+    
     # 安全配置
     secret_key: str = "your-secret-key-here-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    # 刷新令牌：每次使用后轮换，数据库只保存令牌的HMAC摘要；注销或检测到旧令牌被重放时撤销整个会话，
+    # 撤销记录保存在进程内存（memory）或Redis（多worker共享）中，直到该会话的访问令牌全部过期
+    refresh_token_expire_days: int = 30
+    token_revocation_backend: str = "memory"  # memory, redis
     
     # CORS配置
     cors_origins: List[str] = ["*"]
@@ -33,10 +161,30 @@ class Settings(BaseSettings):
     # 文件上传配置
     upload_dir: str = "./uploads"
     max_file_size: int = 10 * 1024 * 1024  # 10MB
+    duplicate_hash_threshold: int = 6  # pHash与dHash汉明距离都不超过该值视为近重复
+    reject_duplicate_images: bool = False  # 默认只标记同角色的近重复图片，开启后拒绝上传
+    # 分块上传：会话声明文件后按偏移量逐块上传，可断点续传；超过有效期没有活动的会话被清理
+    upload_chunk_size: int = 1024 * 1024
+    upload_session_dir: str = "./upload_sessions"
+    upload_session_ttl: int = 6 * 3600  # 秒
+    upload_session_max_files: int = 100
+    # 数据导出：服务端游标每批读取的记录数与流式响应的数据块大小
+    export_batch_size: int = 1000
+    export_chunk_size: int = 256 * 1024
+    # 删除角色：请求只做软删除，关联记录与文件由后台按批清理
+    character_reaper_batch_size: int = 200  # 每批删除的记录数
+    character_reaper_interval: float = 30.0  # 检查遗留删除任务的间隔（秒）
+    character_reaper_batch_pause: float = 0.0  # 批之间暂停的秒数
+    reference_select_k: int = 8  # 每次生成使用的参考图片数
+    reference_diversity_weight: float = 0.5  # 0 只看质量，1 只看差异
     
     # AI服务配置
     openai_api_key: Optional[str] = None
     runway_api_key: Optional[str] = None
+    # 推理微批处理：并发的单条请求攒够批大小或等待超过延迟预算后合并执行
+    inference_batch_size: int = 16
+    inference_batch_latency_ms: float = 5.0
+    inference_batch_workers: int = 2  # 同时执行的批数
     
     class Config:
         env_file = ".env"
@@ -1,45 +1,289 @@
-from sqlalchemy import create_engine
+from typing import Dict, List, Optional
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+from starlette.requests import HTTPConnection
 from .config import settings
+from .sqlite_profile import configure_engine, is_memory_database
+from .tracing import instrument_engine
+import itertools
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
-# 根据数据库URL选择引擎配置
-if "sqlite" in settings.db_url:
-    # SQLite配置
-    engine = create_engine(
-        settings.db_url,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-        echo=settings.debug
-    )
-else:
-    # PostgreSQL配置
-    engine = create_engine(
-        settings.db_url,
+def _create_engine(url: str):
+    """根据数据库URL选择引擎配置"""
+    if "sqlite" in url:
+        if settings.sqlite_pool == "static" or is_memory_database(url):
+            # SQLite配置：所有请求共享一个连接（内存数据库只能如此）
+            return create_engine(
+                url,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,
+                echo=settings.debug
+            )
+        # SQLite配置：WAL + 连接池，读取各用各的连接并行执行，写入由 SQLite 写锁串行
+        sqlite_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": settings.sqlite_busy_timeout_ms / 1000},
+            poolclass=QueuePool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            echo=settings.debug
+        )
+        configure_engine(sqlite_engine)
+        return sqlite_engine
+    # PostgreSQL配置：主库与每个副本在每个worker进程中各有一个连接池
+    return create_engine(
+        url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
         echo=settings.debug
     )
 
+engine = instrument_engine(_create_engine(settings.db_url))
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    """获取数据库会话"""
+class PoolWaitTracker:
+    """记录从连接池获取连接的等待时间（指数滑动平均），供准入控制判断过载
+
+    平均值随时间按半衰期衰减：准入控制拒绝请求时不再有新的签出样本，不衰减的话
+    一次慢签出会让平均值一直停在阈值之上，服务永远无法恢复接纳请求。
+    """
+
+    def __init__(self, alpha: float = 0.2, half_life: float = 2.0, clock=time.monotonic):
+        self.alpha = alpha
+        self.half_life = half_life
+        self.clock = clock
+        self._wait_ms = 0.0
+        self._updated = clock()
+
+    @property
+    def wait_ms(self) -> float:
+        if self.half_life <= 0:
+            return self._wait_ms
+        return self._wait_ms * 0.5 ** ((self.clock() - self._updated) / self.half_life)
+
+    def observe(self, seconds: float):
+        current = self.wait_ms
+        self._updated = self.clock()
+        self._wait_ms = self.alpha * seconds * 1000 + (1 - self.alpha) * current
+
+pool_wait_tracker = PoolWaitTracker(half_life=settings.admission_pool_wait_half_life)
+
+class PoolMetrics:
+    """单个连接池的会话工厂与指标：签出次数、连接失败次数与等待时间"""
+
+    def __init__(self, name: str, engine, wait_tracker: Optional[PoolWaitTracker] = None, session_factory=None):
+        self.name = name
+        self.engine = engine
+        self.session_factory = session_factory or sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.wait = wait_tracker or PoolWaitTracker(half_life=settings.admission_pool_wait_half_life)
+        self.checkouts = 0
+        self.failures = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "failures": self.failures,
+            "wait_ms": round(self.wait.wait_ms, 3),
+            **pool_usage(self.engine.pool),
+        }
+
+def pool_usage(pool) -> dict:
+    """连接池使用情况；StaticPool 等不支持统计的池只返回类型"""
+    status = {"type": type(pool).__name__}
+    if not hasattr(pool, "checkedout"):
+        return status
+    capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+    checked_out = pool.checkedout()
+    status.update({
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "overflow": pool.overflow(),
+        "capacity": capacity,
+        "saturation": round(checked_out / capacity, 3) if capacity > 0 else 0.0,
+    })
+    return status
+
+class ReplicaRouter:
+    """只读会话路由
+
+    读取在健康的副本间轮询；签出连接失败的副本摘除 retry_seconds 秒（健康检查成功后提前恢复），
+    所有副本都不可用时回退到主库。同一粘滞键提交写入后的 sticky_seconds 秒内读取主库，
+    避免副本复制延迟导致读不到自己刚写入的数据。
+    """
+
+    def __init__(self, primary: PoolMetrics, replicas: List[PoolMetrics], sticky_seconds: float, retry_seconds: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self._counter = itertools.count()
+        self._down_until: Dict[str, float] = {}
+        # 粘滞键（用户ID） -> 读主库截止时间
+        self._recent_writes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.sticky_reads = 0
+        self.fallback_reads = 0
+
+    def note_write(self, key: Optional[str]):
+        """记录写入，粘滞窗口内该键的读取走主库"""
+        if key is None or not self.replicas:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[key] = now + self.sticky_seconds
+            if len(self._recent_writes) > 10000:
+                self._recent_writes = {k: until for k, until in self._recent_writes.items() if until > now}
+
+    def is_sticky(self, key: Optional[str]) -> bool:
+        until = self._recent_writes.get(key) if key is not None else None
+        return until is not None and until > time.monotonic()
+
+    def mark_down(self, replica: PoolMetrics, error: Exception):
+        self._down_until[replica.name] = time.monotonic() + self.retry_seconds
+        logger.warning("只读副本 %s 不可用，暂时摘除: %s", replica.name, error)
+
+    def mark_up(self, replica: PoolMetrics):
+        if self._down_until.pop(replica.name, None) is not None:
+            logger.info("只读副本 %s 已恢复", replica.name)
+
+    def is_healthy(self, replica: PoolMetrics) -> bool:
+        return self._down_until.get(replica.name, 0.0) <= time.monotonic()
+
+    def candidates(self, sticky: bool = False) -> List[PoolMetrics]:
+        """本次读取依次尝试的连接池：从轮询位置开始的健康副本，最后是主库"""
+        if not self.replicas or sticky:
+            return [self.primary]
+        start = next(self._counter)
+        count = len(self.replicas)
+        ordered = [self.replicas[(start + i) % count] for i in range(count)]
+        return [replica for replica in ordered if self.is_healthy(replica)] + [self.primary]
+
+    def open_session(self, key: Optional[str] = None) -> Session:
+        """打开只读会话并立即签出连接，副本连接失败时换下一个"""
+        sticky = bool(self.replicas) and self.is_sticky(key)
+        if sticky:
+            self.sticky_reads += 1
+        for pool in self.candidates(sticky):
+            db = pool.session_factory()
+            start = time.perf_counter()
+            try:
+                db.connection()
+            except DBAPIError as e:
+                db.close()
+                pool.failures += 1
+                if pool is self.primary:
+                    raise
+                self.mark_down(pool, e)
+                continue
+            pool.wait.observe(time.perf_counter() - start)
+            pool.checkouts += 1
+            if pool is self.primary and self.replicas and not sticky:
+                self.fallback_reads += 1
+            return db
+        raise RuntimeError("没有可用的数据库连接池")
+
+    def check_replicas(self) -> Dict[str, bool]:
+        """探测每个副本，更新摘除状态"""
+        results = {}
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+            except Exception as e:
+                if self.is_healthy(replica):
+                    self.mark_down(replica, e)
+                results[replica.name] = False
+            else:
+                self.mark_up(replica)
+                results[replica.name] = True
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "sticky_reads": self.sticky_reads,
+            "fallback_reads": self.fallback_reads,
+            "pools": {
+                pool.name: {**pool.snapshot(), "healthy": pool is self.primary or self.is_healthy(pool)}
+                for pool in [self.primary, *self.replicas]
+            },
+        }
+
+primary_pool = PoolMetrics("primary", engine, pool_wait_tracker, SessionLocal)
+replica_router = ReplicaRouter(
+    primary_pool,
+    [PoolMetrics(f"replica-{i}", instrument_engine(_create_engine(url))) for i, url in enumerate(settings.read_replica_urls)],
+    sticky_seconds=settings.replica_sticky_seconds,
+    retry_seconds=settings.replica_retry_seconds,
+)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _remember_write(session: Session):
+    replica_router.note_write(session.info.get("sticky_key"))
+
+def _sticky_key(connection: HTTPConnection) -> Optional[str]:
+    """读己之写的粘滞键：访问令牌中的用户ID，刷新令牌后或同一用户的其他会话仍能读到自己的写入"""
+    from .security import token_payload
+
+    payload = token_payload(connection)
+    return payload["sub"] if payload else None
+
+def get_db(connection: HTTPConnection):
+    """获取数据库会话（主库）"""
     db = SessionLocal()
+    db.info["sticky_key"] = _sticky_key(connection)
     try:
+        # 立即签出连接以测量连接池等待时间
+        start = time.perf_counter()
+        db.connection()
+        pool_wait_tracker.observe(time.perf_counter() - start)
+        primary_pool.checkouts += 1
         yield db
     finally:
         db.close()
 
-async def init_db():
-    """初始化数据库"""
+def open_read_session(connection: HTTPConnection) -> Session:
+    """打开只读会话（调用方负责关闭），用于响应流式输出期间仍要读取数据库的接口"""
+    return replica_router.open_session(_sticky_key(connection))
+
+def get_read_db(connection: HTTPConnection):
+    """获取只读数据库会话，用于列表与详情等不写入的接口；未配置副本时即主库会话"""
+    db = open_read_session(connection)
     try:
-        # 创建所有表
-        Base.metadata.create_all(bind=engine)
+        yield db
+    finally:
+        db.close()
+
+async def init_db() -> bool:
+    """初始化数据库，返回数据库结构是否为最新
+
+    启动时只读取系统目录比对表、列、索引与唯一约束；补齐结构属于迁移步骤（python -m app.core.migrate），
+    仅在 auto_migrate 开启时才在启动流程中执行。
+    """
+    from .migrate import migrate, schema_is_current
+
+    try:
+        if schema_is_current():
+            logger.info("数据库结构已是最新")
+            return True
+        if not settings.auto_migrate:
+            logger.warning("数据库结构不是最新，请运行 python -m app.core.migrate")
+            return False
+        migrate()
         logger.info("数据库初始化成功")
+        return True
     except Exception as e:
         logger.error(f"数据库初始化失败: {e}")
         raise
@@ -48,7 +292,7 @@ async def init_db():
 def check_db_connection():
     try:
         with engine.connect() as connection:
-            connection.execute("SELECT 1")
+            connection.execute(text("SELECT 1"))
         return True
     except Exception as e:
         logger.error(f"数据库连接检查失败: {e}")
@@ -0,0 +1,149 @@
+"""依赖健康检查
+
+探针接口只读取缓存的检查结果（O(1)），实际检查由后台任务按固定间隔刷新，
+负载均衡器频繁探测时也不会压到数据库上。连接池饱和时就绪探针返回失败，
+让过载的worker自动从负载均衡中摘除。
+"""
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import os
+import shutil
+import time
+
+from .config import settings
+from .database import check_db_connection, engine, pool_usage, replica_router
+
+logger = logging.getLogger(__name__)
+
+CheckResult = Dict[str, object]
+Check = Callable[[], Awaitable[CheckResult]]
+
+
+def pool_status() -> CheckResult:
+    """主库连接池使用情况"""
+    return pool_usage(engine.pool)
+
+
+async def check_database() -> CheckResult:
+    return {"ok": await asyncio.to_thread(check_db_connection)}
+
+
+async def check_replicas() -> CheckResult:
+    """探测只读副本并恢复或摘除；副本不可用时读取回退到主库，不影响就绪状态"""
+    if not replica_router.replicas:
+        return {"ok": True, "configured": False}
+    return {"ok": True, "configured": True, "replicas": await asyncio.to_thread(replica_router.check_replicas)}
+
+
+async def check_storage() -> CheckResult:
+    path = settings.upload_dir
+    os.makedirs(path, exist_ok=True)
+    writable = os.access(path, os.W_OK)
+    free_mb = shutil.disk_usage(path).free // (1024 * 1024)
+    return {"ok": writable and free_mb >= settings.health_min_free_disk_mb, "writable": writable, "free_mb": free_mb}
+
+
+async def check_broker() -> CheckResult:
+    if not settings.redis_url:
+        return {"ok": True, "configured": False}
+    import redis.asyncio as redis
+
+    client = redis.from_url(settings.redis_url, socket_timeout=settings.health_check_timeout)
+    try:
+        return {"ok": bool(await client.ping()), "configured": True}
+    finally:
+        await client.close()
+
+
+async def check_ai_service() -> CheckResult:
+    from ..services.ai_service import ai_service
+
+    return {"ok": await ai_service.check_service_health()}
+
+
+class HealthMonitor:
+    """缓存依赖检查结果，并在后台定期刷新"""
+
+    def __init__(self, checks: Dict[str, Check], interval: float, timeout: float):
+        self.checks = checks
+        self.interval = interval
+        self.timeout = timeout
+        self.results: Dict[str, CheckResult] = {}
+        self.checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_check(self, name: str, check: Check) -> CheckResult:
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(check(), self.timeout)
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": "timeout"}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        if not result["ok"]:
+            logger.warning("健康检查失败 %s: %s", name, result)
+        return result
+
+    async def refresh(self):
+        """并发执行所有检查并更新缓存"""
+        names = list(self.checks)
+        results = await asyncio.gather(*(self._run_check(name, self.checks[name]) for name in names))
+        self.results = dict(zip(names, results))
+        self.checked_at = time.time()
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("健康检查刷新失败: %s", e)
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def readiness(self) -> CheckResult:
+        """返回缓存的就绪状态
+
+        结果过期（后台刷新停止）视为未就绪；连接池使用率读取内存计数，实时计算。
+        """
+        age = time.time() - self.checked_at if self.checked_at else None
+        stale = age is None or age > self.interval * 3
+        pool = pool_status()
+        saturated = pool.get("saturation", 0.0) >= settings.health_pool_saturation_threshold
+        ready = not stale and not saturated and all(result["ok"] for result in self.results.values())
+        return {
+            "status": "ready" if ready else "not_ready",
+            "checked_at": self.checked_at,
+            "age_s": round(age, 3) if age is not None else None,
+            "stale": stale,
+            "saturated": saturated,
+            "pool": pool,
+            "pools": replica_router.stats(),
+            "checks": self.results,
+        }
+
+
+health_monitor = HealthMonitor(
+    checks={
+        "database": check_database,
+        "replicas": check_replicas,
+        "storage": check_storage,
+        "broker": check_broker,
+        "ai_service": check_ai_service,
+    },
+    interval=settings.health_check_interval,
+    timeout=settings.health_check_timeout,
+)
@@ -0,0 +1,42 @@
+from types import ModuleType
+import importlib.machinery
+import importlib.util
+import sys
+
+
+def _find_spec(name: str):
+    """查找模块规格；子模块在父包的搜索路径中查找，不执行父包的 __init__"""
+    parent_name, _, _ = name.rpartition(".")
+    if not parent_name:
+        return importlib.util.find_spec(name)
+    parent = lazy_import(parent_name)
+    # 直接读取实例属性，访问延迟模块的其他属性会触发导入
+    locations = object.__getattribute__(parent, "__spec__").submodule_search_locations
+    if locations is None:
+        raise ImportError(f"No module named '{name}'; '{parent_name}' is not a package")
+    return importlib.machinery.PathFinder.find_spec(name, locations)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """延迟导入模块
+
+    返回的模块对象在第一次访问属性时才真正执行导入，用于推迟OpenCV、NumPy、
+    AI客户端、加密后端等重量级依赖的加载，缩短进程冷启动时间。子模块（如 "jose.jwt"）
+    的父包同样延迟加载，子模块执行时才导入父包。
+    模块不存在时立即抛出 ImportError。
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = _find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    parent_name, _, child = name.rpartition(".")
+    if parent_name:
+        # 与普通导入一样把子模块绑定为父包的属性；写入实例字典不会触发父包加载，父包加载后保留
+        object.__getattribute__(sys.modules[parent_name], "__dict__")[child] = module
+    return module
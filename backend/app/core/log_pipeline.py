@@ -0,0 +1,202 @@
+"""非阻塞结构化日志
+
+事件循环上只做最少的工作：structlog 记录事件名与键值对（不拼接字符串），按事件类型
+采样与限流后把未格式化的记录放入内存队列；后台线程中的 QueueListener 负责渲染为
+JSON（或开发用的控制台格式）并写出。队列满时直接丢弃记录并计数，永远不阻塞事件循环。
+
+标准库 logging 的日志（第三方库、尚未改为结构化事件的模块）同样经过队列，并被渲染为
+相同格式。structlog 在首次记录结构化事件或调用 configure_logging 时才加载。高频事件使用
+结构化记录器：
+
+    logger = get_logger(__name__)
+    logger.info("task_progress", task_id=task_id, progress=progress)
+"""
+from typing import Dict, Optional
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+from .config import settings
+from .lazy import lazy_import
+
+structlog = lazy_import("structlog")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_atexit_registered = False
+
+
+class EventThrottle:
+    """structlog 处理器：按事件名采样与限流
+
+    采样按计数确定性地保留（采样率 0.1 即每10条保留1条），限流为每个事件名一个令牌桶，
+    桶容量等于每秒条数。被丢弃的条数按事件名累计，可通过 stats 查看。
+    """
+
+    def __init__(self, sample_rates: Dict[str, float], rate_limits: Dict[str, float]):
+        self.sample_rates = dict(sample_rates)
+        self.rate_limits = dict(rate_limits)
+        self._credits: Dict[str, float] = {}
+        # 事件名 -> (剩余令牌, 更新时间)
+        self._buckets: Dict[str, tuple] = {}
+        self.dropped: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _drop(self, event: str):
+        self.dropped[event] = self.dropped.get(event, 0) + 1
+        raise structlog.DropEvent
+
+    def __call__(self, logger, method_name: str, event_dict: dict) -> dict:
+        event = event_dict.get("event")
+        rate = self.sample_rates.get(event)
+        limit = self.rate_limits.get(event)
+        if rate is None and limit is None:
+            return event_dict
+        with self._lock:
+            if rate is not None and rate < 1.0:
+                credit = self._credits.get(event, 1.0) + rate
+                if credit < 1.0:
+                    self._credits[event] = credit
+                    self._drop(event)
+                self._credits[event] = credit - 1.0
+            if limit is not None:
+                now = time.monotonic()
+                tokens, updated = self._buckets.get(event, (limit, now))
+                tokens = min(limit, tokens + (now - updated) * limit)
+                if tokens < 1.0:
+                    self._buckets[event] = (tokens, now)
+                    self._drop(event)
+                self._buckets[event] = (tokens - 1.0, now)
+        return event_dict
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.dropped)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """不格式化、队列满时丢弃的 QueueHandler
+
+    默认的 prepare 会在调用线程中格式化消息，这里原样入队，由监听线程格式化；
+    日志参数在入队后被修改会影响输出内容，调用方应传入不可变值。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+event_throttle = EventThrottle(settings.log_sample_rates, settings.log_rate_limits)
+queue_handler = DroppingQueueHandler(queue.Queue(maxsize=settings.log_queue_size))
+
+
+def _renderer():
+    if settings.log_format == "json":
+        return structlog.processors.JSONRenderer(ensure_ascii=False)
+    return structlog.dev.ConsoleRenderer(colors=False)
+
+
+def _shared_processors() -> list:
+    return [
+        structlog.stdlib.add_log_level,
+        structlog.stdlib.add_logger_name,
+        structlog.processors.TimeStamper(fmt="iso", utc=True),
+    ]
+
+
+_structlog_configured = False
+
+
+def _configure_structlog():
+    """配置 structlog 走标准库 logging，未调用 configure_logging 时（脚本、基准）
+    结构化事件同样遵守标准库的日志级别与处理器"""
+    global _structlog_configured
+    if _structlog_configured:
+        return
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            event_throttle,
+            structlog.processors.StackInfoRenderer(),
+            structlog.processors.format_exc_info,
+            *_shared_processors(),
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+    _structlog_configured = True
+
+
+class _LazyLogger:
+    """模块导入时创建的记录器，首次记录时才加载并配置 structlog"""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, method: str):
+        _configure_structlog()
+        value = getattr(structlog.get_logger(self._name), method)
+        # 缓存解析出的方法，之后的调用不再经过 __getattr__
+        setattr(self, method, value)
+        return value
+
+
+def get_logger(name: str):
+    """获取结构化日志记录器，用于高频事件"""
+    return _LazyLogger(name)
+
+
+def configure_logging(stream=None, level: Optional[str] = None):
+    """把根日志替换为队列处理器并启动后台写出线程，重复调用时先停止旧的线程"""
+    global _listener, _atexit_registered
+    shutdown_logging()
+    _configure_structlog()
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(structlog.stdlib.ProcessorFormatter(
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.format_exc_info,
+            _renderer(),
+        ],
+        foreign_pre_chain=_shared_processors(),
+    ))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel((level or settings.log_level).upper())
+    _listener = logging.handlers.QueueListener(queue_handler.queue, output)
+    _listener.start()
+    if not _atexit_registered:
+        atexit.register(shutdown_logging)
+        _atexit_registered = True
+
+
+def shutdown_logging():
+    """停止监听线程，写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> dict:
+    return {
+        "queued": queue_handler.queue.qsize(),
+        "dropped_queue_full": queue_handler.dropped,
+        "dropped_by_event": event_throttle.stats(),
+    }
@@ -0,0 +1,194 @@
+"""数据库结构迁移
+
+结构创建不再放在请求服务进程的启动流程中：部署时运行
+
+    python -m app.core.migrate
+
+对照模型检查数据库中实际存在的表、列、索引与唯一约束，补齐缺失的部分，并在 schema_version
+表中记录当前模型结构的指纹。create_all 只创建缺失的表，不会修改已有表，已有表上新增的列、
+索引与唯一约束由这里逐项补上。服务启动时同样按数据库中的实际结构判断是否最新（只读取
+系统目录，不扫描数据）。列类型与可空性的变化不会自动迁移。
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional
+import hashlib
+import logging
+
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, UniqueConstraint, inspect, select, text
+from sqlalchemy.sql import func
+
+from .database import Base, engine
+from .. import models  # noqa: F401  确保所有模型已注册到 Base.metadata
+
+logger = logging.getLogger(__name__)
+
+# 版本表不属于业务模型，使用独立的 MetaData 避免影响指纹
+_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _version_metadata,
+    Column("fingerprint", String(64), primary_key=True),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def schema_fingerprint() -> str:
+    """根据模型定义计算结构指纹"""
+    digest = hashlib.sha256()
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        digest.update(table.name.encode())
+        for column in table.columns:
+            digest.update(f"|{column.name}:{column.type}:{column.nullable}".encode())
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            digest.update(f"|ix:{index.name}".encode())
+        for constraint in sorted(_unique_constraints(table), key=lambda c: _unique_name(table, c)):
+            digest.update(f"|uq:{_unique_name(table, constraint)}".encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def applied_fingerprint() -> Optional[str]:
+    """读取数据库中记录的结构指纹，版本表不存在时返回 None"""
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(
+                select(schema_version.c.fingerprint).order_by(schema_version.c.applied_at.desc()).limit(1)
+            ).first()
+            return row[0] if row else None
+    except Exception:
+        return None
+
+
+def _unique_constraints(table: Table) -> List[UniqueConstraint]:
+    return [constraint for constraint in table.constraints if isinstance(constraint, UniqueConstraint)]
+
+
+def _unique_name(table: Table, constraint: UniqueConstraint) -> str:
+    """列上 unique=True 生成的约束没有名称，按表名与列名命名"""
+    if isinstance(constraint.name, str) and constraint.name:
+        return constraint.name
+    return f"uq_{table.name}_{'_'.join(column.name for column in constraint.columns)}"
+
+
+@dataclass
+class SchemaDiff:
+    """数据库相对模型缺失的结构"""
+
+    tables: List[Table] = field(default_factory=list)
+    columns: List[Column] = field(default_factory=list)
+    indexes: List[Index] = field(default_factory=list)
+    unique_constraints: List[UniqueConstraint] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.tables or self.columns or self.indexes or self.unique_constraints)
+
+    def describe(self) -> List[str]:
+        return (
+            [f"表 {table.name}" for table in self.tables]
+            + [f"列 {column.table.name}.{column.name}" for column in self.columns]
+            + [f"索引 {index.name}" for index in self.indexes]
+            + [f"唯一约束 {_unique_name(c.table, c)}" for c in self.unique_constraints]
+        )
+
+
+def schema_diff(connection) -> SchemaDiff:
+    """对照模型检查数据库中实际存在的结构"""
+    inspector = inspect(connection)
+    diff = SchemaDiff()
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            diff.tables.append(table)
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        diff.columns += [column for column in table.columns if column.name not in existing_columns]
+
+        indexes = inspector.get_indexes(table.name)
+        index_names = {index["name"] for index in indexes}
+        diff.indexes += [index for index in table.indexes if index.name not in index_names]
+
+        # 唯一性可能由唯一约束或唯一索引提供（补建时使用唯一索引），按列集合比对
+        unique_columns = {tuple(sorted(c["column_names"])) for c in inspector.get_unique_constraints(table.name)}
+        unique_columns |= {tuple(sorted(index["column_names"])) for index in indexes if index.get("unique")}
+        diff.unique_constraints += [
+            constraint for constraint in _unique_constraints(table)
+            if tuple(sorted(column.name for column in constraint.columns)) not in unique_columns
+        ]
+    return diff
+
+
+def schema_is_current() -> bool:
+    """按数据库中的实际结构检查是否与模型一致"""
+    with engine.connect() as connection:
+        return not schema_diff(connection)
+
+
+def _add_column(connection, column: Column) -> bool:
+    """为已存在的表补充新增的列"""
+    table = column.table
+    if not column.nullable and column.server_default is None:
+        logger.error("无法自动添加非空列 %s.%s，请手动迁移", table.name, column.name)
+        return False
+    column_type = column.type.compile(dialect=connection.dialect)
+    ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+    default = column.server_default.arg if column.server_default is not None else None
+    if isinstance(default, str):
+        ddl += f" DEFAULT '{default}'"
+    elif hasattr(default, "text"):
+        ddl += f" DEFAULT {default.text}"
+    connection.execute(text(ddl))
+    return True
+
+
+def _add_unique_constraint(connection, constraint: UniqueConstraint):
+    """补建唯一约束；SQLite 不支持给已有表加约束，统一用同名唯一索引实现"""
+    name = _unique_name(constraint.table, constraint)
+    # 用 DDL 文本创建：以表的列构造 Index 对象会把它注册到模型的 MetaData 上
+    columns = ", ".join(column.name for column in constraint.columns)
+    try:
+        connection.execute(text(f"CREATE UNIQUE INDEX {name} ON {constraint.table.name} ({columns})"))
+    except Exception:
+        logger.error("创建唯一约束 %s 失败，表中可能已有重复数据，请清理后重新迁移", name)
+        raise
+
+
+def migrate() -> bool:
+    """将数据库结构迁移到当前模型，返回是否执行了变更"""
+    fingerprint = schema_fingerprint()
+    recorded = applied_fingerprint()
+    with engine.begin() as connection:
+        diff = schema_diff(connection)
+        if not diff and recorded == fingerprint:
+            logger.info("数据库结构已是最新")
+            return False
+
+        Base.metadata.create_all(bind=connection, tables=diff.tables)
+        applied = [f"表 {table.name}" for table in diff.tables]
+        for column in diff.columns:
+            if _add_column(connection, column):
+                applied.append(f"列 {column.table.name}.{column.name}")
+        # 新增的列可能带索引，索引在加列之后创建
+        for index in diff.indexes:
+            try:
+                index.create(connection)
+            except Exception:
+                if index.unique:
+                    logger.error("创建唯一索引 %s 失败，表中可能已有重复数据，请清理后重新迁移", index.name)
+                raise
+            applied.append(f"索引 {index.name}")
+        for constraint in diff.unique_constraints:
+            _add_unique_constraint(connection, constraint)
+            applied.append(f"唯一约束 {_unique_name(constraint.table, constraint)}")
+        _version_metadata.create_all(bind=connection)
+        connection.execute(schema_version.delete())
+        connection.execute(schema_version.insert().values(fingerprint=fingerprint))
+
+    if applied:
+        logger.info("已补齐: %s", ', '.join(applied))
+    logger.info("数据库结构已迁移到 %s", fingerprint[:12])
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrate()
@@ -0,0 +1,271 @@
+"""限流与准入控制
+
+- 令牌桶限流：按 (路由规则, 用户ID) 计数，用户ID取自JWT，未登录请求按客户端IP计数。
+  默认使用进程内存储，配置 rate_limit_backend=redis 后多个worker共享同一组令牌桶。
+- 准入控制：事件循环延迟或数据库连接池等待超过阈值时直接返回503，过载时尽早丢弃请求，
+  避免所有请求一起变慢。
+"""
+from typing import Dict, List, Optional, Pattern, Tuple
+import asyncio
+import json
+import math
+import re
+import time
+
+from .config import settings
+from .database import PoolWaitTracker, pool_wait_tracker
+from .log_pipeline import get_logger
+from .security import verify_token
+
+logger = get_logger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(rate: str) -> Tuple[float, float]:
+    """解析 "10/minute" 形式的限额，返回 (桶容量, 每秒补充令牌数)"""
+    count, _, period = rate.partition("/")
+    seconds = PERIODS.get(period.strip().rstrip("s"))
+    if seconds is None:
+        raise ValueError(f"无法解析限流规则: {rate}")
+    capacity = float(count)
+    return capacity, capacity / seconds
+
+
+class MemoryRateLimitBackend:
+    """进程内令牌桶存储"""
+
+    def __init__(self, max_keys: int = 100_000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        # key -> (剩余令牌, 更新时间, 回满时间)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+    def _prune(self, now: float):
+        """清理已回满的桶，回满的桶与不存在的桶等价"""
+        for key in [key for key, bucket in self._buckets.items() if bucket[2] <= now]:
+            del self._buckets[key]
+
+    async def acquire(self, key: str, capacity: float, refill_rate: float, cost: float = 1) -> Tuple[bool, float]:
+        now = self.clock()
+        bucket = self._buckets.get(key)
+        tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+        if tokens >= cost:
+            tokens -= cost
+            allowed, retry_after = True, 0.0
+        else:
+            allowed, retry_after = False, (cost - tokens) / refill_rate
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / refill_rate)
+        if len(self._buckets) > self.max_keys:
+            self._prune(now)
+        return allowed, retry_after
+
+
+# 在Redis中原子地执行令牌桶计算，使用服务器时间避免各worker时钟偏差
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisRateLimitBackend:
+    """基于Redis的共享令牌桶存储
+
+    client 需提供 redis.asyncio 的 eval 接口，测试时可传入替身对象。
+    """
+
+    def __init__(self, client=None, url: Optional[str] = None, prefix: str = "ratelimit:"):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url or settings.redis_url)
+        self.client = client
+        self.prefix = prefix
+
+    async def acquire(self, key: str, capacity: float, refill_rate: float, cost: float = 1) -> Tuple[bool, float]:
+        allowed, retry_after = await self.client.eval(
+            _TOKEN_BUCKET_LUA, 1, self.prefix + key, capacity, refill_rate, cost
+        )
+        return bool(int(allowed)), float(retry_after)
+
+
+class RateLimitRule:
+    """一条路由限流规则，如 "POST /api/v1/videos/generate": "10/minute" """
+
+    def __init__(self, route: str, rate: str):
+        method, _, path = route.partition(" ")
+        if not path:
+            method, path = "*", route
+        self.name = route
+        self.method = method.upper()
+        if path == "*":
+            self.pattern: Pattern = re.compile(".*")
+        else:
+            self.pattern = re.compile("^" + re.sub(r"\{[^/]+\}", "[^/]+", path.rstrip("/")) + "/?$")
+        self.capacity, self.refill_rate = parse_rate(rate)
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.method == "*" or self.method == method) and bool(self.pattern.match(path))
+
+
+class LoopLagMonitor:
+    """通过定时器漂移测量事件循环延迟（指数滑动平均）"""
+
+    def __init__(self, interval: float = 0.1, alpha: float = 0.3):
+        self.interval = interval
+        self.alpha = alpha
+        self.lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, (loop.time() - start - self.interval) * 1000)
+            self.lag_ms = self.alpha * lag + (1 - self.alpha) * self.lag_ms
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class AdmissionController:
+    """根据事件循环延迟与连接池等待时间决定是否接纳新请求"""
+
+    def __init__(self, max_loop_lag_ms: float, max_pool_wait_ms: float, lag_monitor: LoopLagMonitor,
+                 pool_wait: PoolWaitTracker = pool_wait_tracker):
+        self.max_loop_lag_ms = max_loop_lag_ms
+        self.max_pool_wait_ms = max_pool_wait_ms
+        self.lag_monitor = lag_monitor
+        self.pool_wait = pool_wait
+        self.shed_count = 0
+        self.shed_by_reason: Dict[str, int] = {}
+
+    def overload_reason(self) -> Optional[str]:
+        if self.lag_monitor.lag_ms > self.max_loop_lag_ms:
+            return "event_loop_lag"
+        if self.pool_wait.wait_ms > self.max_pool_wait_ms:
+            return "db_pool_wait"
+        return None
+
+
+class RateLimitMiddleware:
+    """ASGI限流与准入控制中间件，只作用于HTTP请求"""
+
+    def __init__(self, app, rules: List[RateLimitRule], default_rule: Optional[RateLimitRule] = None,
+                 backend=None, admission: Optional[AdmissionController] = None,
+                 exempt_paths: Tuple[str, ...] = ("/health",)):
+        self.app = app
+        self.rules = rules
+        self.default_rule = default_rule
+        self.backend = backend or MemoryRateLimitBackend()
+        self.admission = admission
+        self.exempt_paths = exempt_paths
+
+    def _match(self, method: str, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return self.default_rule
+
+    @staticmethod
+    def _client_key(scope) -> str:
+        """优先使用JWT中的用户ID，未登录时退化为客户端IP"""
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and token:
+                    user_id = verify_token(token)
+                    if user_id:
+                        return f"user:{user_id}"
+                break
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    @staticmethod
+    async def _reject(send, status_code: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths) or scope["path"] == "/":
+            await self.app(scope, receive, send)
+            return
+
+        if self.admission is not None:
+            reason = self.admission.overload_reason()
+            if reason:
+                self.admission.shed_count += 1
+                self.admission.shed_by_reason[reason] = self.admission.shed_by_reason.get(reason, 0) + 1
+                # 过载时每个请求都会走到这里，按 log_rate_limits 限流，完整计数见 shed_by_reason
+                logger.warning("request_shed", reason=reason, method=scope["method"], path=scope["path"])
+                await self._reject(send, 503, "服务繁忙，请稍后再试", 1)
+                return
+
+        rule = self._match(scope["method"], scope["path"])
+        if rule is not None:
+            key = f"{rule.name}|{self._client_key(scope)}"
+            allowed, retry_after = await self.backend.acquire(key, rule.capacity, rule.refill_rate)
+            if not allowed:
+                await self._reject(send, 429, "请求过于频繁，请稍后再试", retry_after)
+                return
+
+        await self.app(scope, receive, send)
+
+
+loop_lag_monitor = LoopLagMonitor()
+admission_controller = AdmissionController(
+    max_loop_lag_ms=settings.admission_max_loop_lag_ms,
+    max_pool_wait_ms=settings.admission_max_pool_wait_ms,
+    lag_monitor=loop_lag_monitor,
+)
+
+
+def create_rate_limit_backend():
+    """根据配置创建限流存储"""
+    if settings.rate_limit_backend == "redis":
+        return RedisRateLimitBackend(url=settings.redis_url)
+    return MemoryRateLimitBackend()
+
+
+def build_rules() -> Tuple[List[RateLimitRule], Optional[RateLimitRule]]:
+    rules = [RateLimitRule(route, rate) for route, rate in settings.rate_limit_rules.items()]
+    default = RateLimitRule("*", settings.rate_limit_default) if settings.rate_limit_default else None
+    return rules, default
@@ -0,0 +1,183 @@
+"""刷新令牌与会话撤销
+
+登录只在会话开始时做一次 bcrypt 校验，之后客户端用刷新令牌换取新的访问令牌。刷新令牌是随机
+字符串，数据库只保存以 secret_key 为密钥的 HMAC-SHA256 摘要：令牌本身有足够的熵，不需要
+bcrypt 那样的慢哈希，校验只需几微秒，数据库泄露也无法还原出可用的令牌。
+
+每次刷新都会轮换：旧令牌作废并签发同一会话的新令牌。已作废的令牌再次出现说明令牌可能被盗用，
+此时撤销整个会话。访问令牌在 sid 声明中携带会话ID，会话撤销后记入撤销列表并保留到其访问令牌
+全部过期，鉴权时查一次撤销列表即可拒绝已注销会话的访问令牌。撤销列表默认在进程内存中，
+配置 token_revocation_backend=redis 后多个worker共享。
+
+刷新与登录时顺带清理该用户不再需要的令牌记录：已过期的令牌，以及已没有可用令牌的会话（已注销或
+已撤销）的全部记录。仍在使用的会话中轮换掉的旧令牌保留到过期，以便发现重放。
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+import hashlib
+import hmac
+import secrets
+import time
+import uuid
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from ..models.user import RefreshToken, User
+from .config import settings
+
+
+class InvalidRefreshToken(Exception):
+    """刷新令牌不存在、已过期或已被使用；revoked_session 为因此被撤销的会话"""
+
+    def __init__(self, message: str, revoked_session: Optional[str] = None):
+        super().__init__(message)
+        self.revoked_session = revoked_session
+
+
+def hash_refresh_token(token: str) -> str:
+    """刷新令牌的HMAC摘要"""
+    return hmac.new(settings.secret_key.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
+class MemoryRevocationBackend:
+    """进程内撤销列表，会话ID以16字节的二进制UUID为键，值为到期时间"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._revoked: Dict[bytes, float] = {}
+
+    @staticmethod
+    def _key(session_id: str) -> bytes:
+        return uuid.UUID(session_id).bytes
+
+    def _prune(self, now: float):
+        for key in [key for key, expires in self._revoked.items() if expires <= now]:
+            del self._revoked[key]
+
+    async def revoke(self, session_id: str, ttl: float):
+        now = time.monotonic()
+        self._revoked[self._key(session_id)] = now + ttl
+        if len(self._revoked) > self.max_keys:
+            self._prune(now)
+
+    async def is_revoked(self, session_id: str) -> bool:
+        try:
+            expires = self._revoked.get(self._key(session_id))
+        except ValueError:
+            return False
+        return expires is not None and expires > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+class RedisRevocationBackend:
+    """基于Redis的共享撤销列表，过期由Redis的键有效期处理
+
+    client 需提供 redis.asyncio 的 set/exists 接口，测试时可传入替身对象。
+    """
+
+    def __init__(self, client=None, url: Optional[str] = None, prefix: str = "revoked:"):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url or settings.redis_url)
+        self.client = client
+        self.prefix = prefix
+
+    async def revoke(self, session_id: str, ttl: float):
+        await self.client.set(self.prefix + session_id, 1, ex=max(1, int(ttl) + 1))
+
+    async def is_revoked(self, session_id: str) -> bool:
+        return bool(await self.client.exists(self.prefix + session_id))
+
+
+def create_revocation_backend():
+    """根据配置创建撤销列表存储"""
+    if settings.token_revocation_backend == "redis":
+        return RedisRevocationBackend(url=settings.redis_url)
+    return MemoryRevocationBackend()
+
+
+revocation_list = create_revocation_backend()
+
+
+def issue_refresh_token(db: Session, user_id: str, session_id: Optional[str] = None) -> Tuple[str, str]:
+    """签发刷新令牌（不提交），返回 (令牌, 会话ID)；不传会话ID时开始新会话"""
+    session_id = session_id or str(uuid.uuid4())
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        session_id=session_id,
+        token_hash=hash_refresh_token(token),
+        expires_at=datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days),
+    ))
+    return token, session_id
+
+
+def revoke_session(db: Session, session_id: str) -> int:
+    """作废会话中所有未使用的刷新令牌（不提交），返回作废数"""
+    return db.query(RefreshToken).filter(
+        RefreshToken.session_id == session_id,
+        RefreshToken.revoked_at.is_(None),
+    ).update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+
+
+def purge_refresh_tokens(db: Session, user_id: str) -> int:
+    """删除用户已过期的令牌及已失效会话的全部令牌（不提交），返回删除数"""
+    now = datetime.utcnow()
+    live_sessions = db.query(RefreshToken.session_id).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.revoked_at.is_(None),
+        RefreshToken.expires_at > now,
+    )
+    return db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        or_(RefreshToken.expires_at <= now, RefreshToken.session_id.notin_(live_sessions)),
+    ).delete(synchronize_session=False)
+
+
+def rotate_refresh_token(db: Session, token: str) -> Tuple[User, str, str]:
+    """用刷新令牌换取同一会话的新令牌并提交，返回 (用户, 新令牌, 会话ID)
+
+    旧令牌被重放时撤销整个会话后抛出 InvalidRefreshToken，调用方负责把会话记入撤销列表。
+    """
+    row = db.query(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(token)).first()
+    if row is None:
+        raise InvalidRefreshToken("刷新令牌无效")
+    now = datetime.utcnow()
+    # 条件更新保证并发使用同一令牌时只有一个请求能完成轮换
+    claimed = db.query(RefreshToken).filter(
+        RefreshToken.id == row.id,
+        RefreshToken.revoked_at.is_(None),
+        RefreshToken.expires_at > now,
+    ).update({"revoked_at": now}, synchronize_session=False)
+    if not claimed:
+        db.rollback()
+        if row.revoked_at is not None:
+            revoke_session(db, row.session_id)
+            db.commit()
+            raise InvalidRefreshToken("刷新令牌已被使用，会话已撤销", row.session_id)
+        raise InvalidRefreshToken("刷新令牌已过期")
+    user = db.get(User, row.user_id)
+    if user is None or not user.is_active:
+        db.rollback()
+        raise InvalidRefreshToken("用户不存在或已被禁用")
+    new_token, session_id = issue_refresh_token(db, row.user_id, row.session_id)
+    # 新令牌先写入，清理时本会话仍有可用令牌
+    db.flush()
+    purge_refresh_tokens(db, row.user_id)
+    db.commit()
+    return user, new_token, session_id
+
+
+def session_of(db: Session, token: str) -> Optional[str]:
+    """刷新令牌所属的会话ID"""
+    row = db.query(RefreshToken.session_id).filter(RefreshToken.token_hash == hash_refresh_token(token)).first()
+    return row[0] if row else None
+
+
+async def revoke_access(session_id: str):
+    """把会话记入撤销列表，保留到其访问令牌全部过期"""
+    await revocation_list.revoke(session_id, settings.access_token_expire_minutes * 60)
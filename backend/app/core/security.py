@@ -1,27 +1,36 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from ..core.database import get_db
+from starlette.requests import HTTPConnection
+from ..core.database import get_read_db
 from ..models.user import User
 from .config import settings
+from .lazy import lazy_import
+from .refresh_tokens import revocation_list
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# jose 的加密后端与 passlib 的 bcrypt 后端在首次使用时才加载，缩短冷启动时间
+jose = lazy_import("jose")
+jwt = lazy_import("jose.jwt")
+
+@lru_cache(maxsize=1)
+def get_pwd_context():
+    """密码加密上下文"""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # OAuth2密码Bearer
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """获取密码哈希值"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """创建访问令牌"""
@@ -35,35 +44,50 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
-    """验证令牌"""
+def decode_token(token: str) -> Optional[dict]:
+    """解码并校验令牌，失败时返回 None"""
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            return None
-        return user_id
-    except JWTError:
+    except jose.JWTError:
         return None
+    return payload if payload.get("sub") is not None else None
+
+def token_payload(connection: HTTPConnection) -> Optional[dict]:
+    """请求 Authorization 头中访问令牌的声明，同一请求内只解码一次"""
+    if "token_payload" not in connection.scope:
+        scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+        connection.scope["token_payload"] = decode_token(token) if scheme.lower() == "bearer" and token else None
+    return connection.scope["token_payload"]
+
+def verify_token(token: str) -> Optional[str]:
+    """验证令牌"""
+    payload = decode_token(token)
+    return payload["sub"] if payload else None
+
+async def is_session_revoked(payload: dict) -> bool:
+    """访问令牌所属的会话是否已注销"""
+    session_id = payload.get("sid")
+    return bool(session_id) and await revocation_list.is_revoked(session_id)
 
 async def get_current_user(
+    connection: HTTPConnection,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> User:
-    """获取当前用户"""
+    """获取当前用户
+
+    用户记录从只读会话查询（配置了副本时走副本），写接口的鉴权也不占用主库连接。
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无法验证凭据",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+    payload = token_payload(connection)
+    if payload is None or await is_session_revoked(payload):
         raise credentials_exception
+    user_id: str = payload["sub"]
     
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
@@ -74,9 +98,10 @@ async def get_current_user(
 async def get_current_user_websocket(token: str) -> Optional[User]:
     """WebSocket连接获取当前用户"""
     try:
-        user_id = verify_token(token)
-        if user_id is None:
+        payload = decode_token(token)
+        if payload is None or await is_session_revoked(payload):
             return None
+        user_id = payload["sub"]
         
         # 这里应该从数据库获取用户，暂时返回模拟数据
         return User(
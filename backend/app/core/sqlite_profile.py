@@ -0,0 +1,52 @@
+"""SQLite 单机部署配置
+
+每个连接建立时设置 WAL 日志、synchronous、页缓存、内存映射与忙等待超时。连接池为每个并发
+请求提供独立的连接，WAL 下读取互不阻塞，也不被写入阻塞。
+
+SQLite 同一时刻只允许一个写事务。sqlite3 模块在自动提交模式下执行 SELECT，只在第一条写语句前
+开始事务，这里把它开始的事务改为 BEGIN IMMEDIATE：事务一开始就取得写锁，写者（包括其他进程的
+迁移命令、worker）在 busy_timeout 内排队等待。写锁在 COMMIT/ROLLBACK 时释放，而不是持有到
+连接归还连接池。等待写锁的写入会在 busy_timeout 内阻塞调用线程，因此请求处理函数与任务worker的
+写语句和提交都经 asyncio.to_thread 在线程中执行，不在事件循环线程上写库。
+"""
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from .config import settings
+
+
+def is_memory_database(url: str) -> bool:
+    """内存数据库只能在单个共享连接上使用"""
+    database = make_url(url).database
+    return not database or database == ":memory:" or "mode=memory" in url
+
+
+def pragmas() -> Dict[str, object]:
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        # 负数表示以KB为单位
+        "cache_size": -settings.sqlite_cache_size_mb * 1024,
+        "mmap_size": settings.sqlite_mmap_size_mb * 1024 * 1024,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "temp_store": "memory",
+    }
+
+
+def apply_pragmas(dbapi_connection, connection_record):
+    """连接建立时设置 PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+    # sqlite3 在第一条写语句前隐式发出的 BEGIN 改为 BEGIN IMMEDIATE
+    dbapi_connection.isolation_level = "IMMEDIATE"
+
+
+def configure_engine(engine):
+    """为文件数据库引擎启用连接 PRAGMA 与 BEGIN IMMEDIATE 写事务"""
+    event.listen(engine, "connect", apply_pragmas)
@@ -0,0 +1,562 @@
+"""分布式追踪
+
+与 OpenTelemetry 数据模型兼容的轻量实现，不依赖 OpenTelemetry SDK：
+
+- 上下文：当前 span 保存在 contextvars 中，随 asyncio 任务、to_thread 与线程池调用传递；跨进程和
+  跨异步边界（HTTP请求头、任务调度载荷、WebSocket事件）使用 W3C traceparent 格式
+- span：HTTP请求（TracingMiddleware）、数据库语句（instrument_engine）、存储读写、AI调用与任务执行，
+  任务进度等推送记录为 span 事件。数据库、存储与AI的 span 只在已有追踪中创建，后台循环的查询
+  不会产生追踪
+- 尾部采样：本进程内同一个根 span 下的所有 span（一个片段，如一次请求或一次任务执行）先在内存中
+  攒齐，根 span 结束时再决定是否保留：出错或超过该类片段耗时阈值的全部保留，其余按 trace ID
+  以 trace_sample_ratio 保留，同一 trace 的各片段结论一致；已保留 trace 的后续片段（如请求之后的
+  任务执行）同样保留。未保留的片段直接丢弃，不做序列化
+- 导出：保留的片段放入有界队列，由后台线程转换为 OTLP/JSON（ExportTraceServiceRequest）后批量写入
+  文件（每行一个请求）或 POST 到 OTLP/HTTP 收集器的 /v1/traces；队列满时丢弃并计数，不阻塞事件循环
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+# 单个 span 最多记录的事件数（如任务进度推送），超出的只计数
+MAX_EVENTS = 128
+MAX_STATEMENT_LENGTH = 300
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_STOP = object()
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str]]:
+    """解析 W3C traceparent，返回 (trace_id, parent_span_id)，格式不合法时返回 None"""
+    if not header:
+        return None
+    match = _TRACEPARENT.match(header.strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id
+
+
+class _Segment:
+    """本进程内同一个根 span 下的 span"""
+
+    __slots__ = ("root", "spans", "dropped", "error")
+
+    def __init__(self):
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.error = False
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "events", "dropped_events", "status", "status_message", "segment")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], segment: _Segment,
+                 attributes: Optional[dict] = None, start_ns: Optional[int] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64) or 1:016x}"
+        self.parent_id = parent_id
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes) if attributes else {}
+        self.events: List[tuple] = []
+        self.dropped_events = 0
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.segment = segment
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes):
+        if len(self.events) < MAX_EVENTS:
+            self.events.append((time.time_ns(), name, attributes))
+        else:
+            self.dropped_events += 1
+
+    def set_error(self, message: str = ""):
+        self.status = STATUS_ERROR
+        self.status_message = message[:500]
+        self.segment.error = True
+
+    def record_exception(self, exc: BaseException):
+        self.set_error(str(exc))
+        self.add_event("exception", **{"exception.type": type(exc).__name__, "exception.message": str(exc)[:500]})
+
+
+class _NoopSpan:
+    """追踪关闭或没有父 span 时使用，所有操作为空"""
+
+    traceparent = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+    def set_error(self, message=""):
+        pass
+
+    def record_exception(self, exc):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def _otlp_span(span: Span) -> dict:
+    result = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": SPAN_KINDS.get(span.kind, 1),
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(span.attributes),
+        "status": {"code": span.status, **({"message": span.status_message} if span.status_message else {})},
+    }
+    if span.parent_id:
+        result["parentSpanId"] = span.parent_id
+    if span.events:
+        result["events"] = [
+            {"timeUnixNano": str(ts), "name": name, "attributes": _otlp_attributes(attributes)}
+            for ts, name, attributes in span.events
+        ]
+    if span.dropped_events:
+        result["droppedEventsCount"] = span.dropped_events
+    return result
+
+
+def to_otlp(spans: List[Span], service_name: str) -> dict:
+    """转换为 OTLP/JSON 的 ExportTraceServiceRequest"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({
+            "service.name": service_name,
+            "service.version": settings.app_version,
+            "deployment.environment": settings.environment,
+        })},
+        "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": [_otlp_span(span) for span in spans]}],
+    }]}
+
+
+class FileSpanExporter:
+    """每行写一个 OTLP/JSON 请求，可交给收集器的文件接收器或离线分析"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, request: dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(request, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def shutdown(self):
+        pass
+
+
+class OtlpHttpSpanExporter:
+    """以 OTLP/HTTP JSON 编码发送到收集器"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.timeout = timeout
+        self._client = None
+
+    def export(self, request: dict):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.Client(timeout=self.timeout)
+        self._client.post(self.url, json=request).raise_for_status()
+
+    def shutdown(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+def create_span_exporter():
+    """根据配置创建导出器，none 时不导出"""
+    if settings.trace_exporter == "otlp":
+        return OtlpHttpSpanExporter(settings.trace_otlp_endpoint)
+    if settings.trace_exporter == "file":
+        return FileSpanExporter(settings.trace_file)
+    return None
+
+
+class Tracer:
+    """创建 span、尾部采样并在后台线程导出保留的片段"""
+
+    def __init__(self, service_name: str, exporter=None, enabled: bool = True, sample_ratio: float = 0.01,
+                 slow_thresholds_ms: Optional[Dict[str, float]] = None, max_spans: int = 512,
+                 queue_size: int = 1000, batch_size: int = 64, export_interval: float = 2.0,
+                 sticky_traces: int = 10000):
+        self.service_name = service_name
+        self.exporter = exporter
+        self.enabled = enabled
+        self.sample_ratio = sample_ratio
+        self.slow_thresholds_ms = dict(slow_thresholds_ms or {})
+        self.max_spans = max_spans
+        self.batch_size = batch_size
+        self.export_interval = export_interval
+        # 最近保留的 trace，其后续片段同样保留
+        self.sticky_traces = sticky_traces
+        self._kept_traces: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self.segments = 0
+        self.kept = {"error": 0, "slow": 0, "sticky": 0, "sampled": 0}
+        self.dropped_by_sampling = 0
+        self.dropped_queue_full = 0
+        self.dropped_spans = 0
+        self.exported_spans = 0
+        self.export_errors = 0
+
+    # 创建与结束 span
+
+    def start_span(self, name: str, kind: str = "internal", parent: Optional[str] = None,
+                   attributes: Optional[dict] = None, start_ns: Optional[int] = None) -> Span:
+        """创建 span 但不设为当前 span；parent 为远程 traceparent，缺省时以当前 span 为父"""
+        local = _current.get() if parent is None else None
+        if local is not None:
+            span = Span(name, kind, local.trace_id, local.span_id, local.segment, attributes, start_ns)
+        else:
+            remote = parse_traceparent(parent)
+            trace_id = remote[0] if remote else f"{random.getrandbits(128) or 1:032x}"
+            span = Span(name, kind, trace_id, remote[1] if remote else None, _Segment(), attributes, start_ns)
+            span.segment.root = span
+        if len(span.segment.spans) < self.max_spans:
+            span.segment.spans.append(span)
+        else:
+            span.segment.dropped += 1
+        return span
+
+    def end(self, span: Span, end_ns: Optional[int] = None):
+        span.end_ns = end_ns or time.time_ns()
+        segment = span.segment
+        if segment.root is span:
+            self._finish(segment)
+            # span 与片段互相引用，断开后片段按引用计数立即释放，不会在每个请求后留下循环垃圾
+            segment.root = None
+            segment.spans = []
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", parent: Optional[str] = None,
+             attributes: Optional[dict] = None, start_ns: Optional[int] = None) -> Iterator[Span]:
+        """在 with 块内把新 span 设为当前 span；块内抛出的异常记录在 span 上"""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        span = self.start_span(name, kind, parent, attributes, start_ns)
+        token = _current.set(span)
+        try:
+            yield span
+        except asyncio.CancelledError:
+            span.add_event("cancelled")
+            raise
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current.reset(token)
+            self.end(span)
+
+    @contextmanager
+    def child_span(self, name: str, kind: str = "internal", attributes: Optional[dict] = None) -> Iterator[Span]:
+        """只在已有追踪中创建的 span（数据库、存储、AI调用），没有当前 span 时不记录"""
+        if not self.enabled or _current.get() is None:
+            yield NOOP_SPAN
+            return
+        with self.span(name, kind, attributes=attributes) as span:
+            yield span
+
+    def record_span(self, name: str, start_ns: int, end_ns: int, kind: str = "internal",
+                    attributes: Optional[dict] = None):
+        """补记一个已经结束的子 span，如任务在队列中的等待"""
+        if self.enabled and _current.get() is not None:
+            self.end(self.start_span(name, kind, attributes=attributes, start_ns=start_ns), end_ns)
+
+    # 尾部采样
+
+    def _keep_reason(self, segment: _Segment) -> Optional[str]:
+        root = segment.root
+        if segment.error:
+            return "error"
+        threshold = self.slow_thresholds_ms.get(root.kind)
+        if threshold is not None and (root.end_ns - root.start_ns) / 1e6 >= threshold:
+            return "slow"
+        with self._lock:
+            if root.trace_id in self._kept_traces:
+                self._kept_traces.move_to_end(root.trace_id)
+                return "sticky"
+        # 按 trace ID 的低64位决定，同一 trace 在各片段、各进程中的结论一致
+        if int(root.trace_id[16:], 16) < self.sample_ratio * 2 ** 64:
+            return "sampled"
+        return None
+
+    def _finish(self, segment: _Segment):
+        self.segments += 1
+        reason = self._keep_reason(segment)
+        if reason is None:
+            self.dropped_by_sampling += 1
+            return
+        self.kept[reason] += 1
+        with self._lock:
+            self._kept_traces[segment.root.trace_id] = None
+            if len(self._kept_traces) > self.sticky_traces:
+                self._kept_traces.popitem(last=False)
+        if self.exporter is None:
+            return
+        # 根 span 结束后仍未结束的子 span 不再导出
+        spans = [span for span in segment.spans if span.end_ns is not None]
+        self.dropped_spans += segment.dropped + len(segment.spans) - len(spans)
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped_queue_full += 1
+
+    # 后台导出
+
+    def _export(self, batch: List[List[Span]]):
+        spans = [span for segment in batch for span in segment]
+        try:
+            self.exporter.export(to_otlp(spans, self.service_name))
+            self.exported_spans += len(spans)
+        except Exception as e:
+            self.export_errors += 1
+            logger.warning("追踪数据导出失败: %s", e)
+
+    def _export_loop(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.export_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            while item is not _STOP:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._export(batch)
+            if item is _STOP:
+                return
+
+    def start(self):
+        if not self.enabled or self.exporter is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0):
+        """导出队列中剩余的片段后停止后台线程"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("追踪导出队列已满，剩余数据未导出")
+        self._thread.join(timeout)
+        self._thread = None
+        self.exporter.shutdown()
+
+    def stats(self) -> dict:
+        return {
+            "segments": self.segments,
+            "kept": dict(self.kept),
+            "dropped_by_sampling": self.dropped_by_sampling,
+            "dropped_queue_full": self.dropped_queue_full,
+            "dropped_spans": self.dropped_spans,
+            "exported_spans": self.exported_spans,
+            "export_errors": self.export_errors,
+            "queued": self._queue.qsize(),
+        }
+
+
+tracer = Tracer(
+    service_name=settings.app_name,
+    exporter=create_span_exporter(),
+    enabled=settings.tracing_enabled,
+    sample_ratio=settings.trace_sample_ratio,
+    slow_thresholds_ms=settings.trace_slow_thresholds_ms,
+    max_spans=settings.trace_max_spans,
+    queue_size=settings.trace_export_queue_size,
+    batch_size=settings.trace_export_batch_size,
+    export_interval=settings.trace_export_interval,
+)
+
+
+def current_span():
+    """当前 span，没有时返回空操作的 span"""
+    return _current.get() or NOOP_SPAN
+
+
+def inject_context(carrier: dict) -> dict:
+    """把当前追踪上下文以 traceparent 键写入任务载荷、推送事件等字典"""
+    span = _current.get()
+    if span is not None:
+        carrier["traceparent"] = span.traceparent
+    return carrier
+
+
+def traced(name: str, kind: str = "internal"):
+    """装饰同步或异步函数，在已有追踪中为每次调用记录子 span"""
+    def decorator(func: Callable):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.child_span(name, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.child_span(name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine):
+    """为引擎执行的每条语句记录数据库 span（只在已有追踪中）"""
+    from sqlalchemy import event
+
+    system = engine.dialect.name
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if not tracer.enabled or _current.get() is None:
+            return
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "QUERY"
+        span = tracer.start_span(operation, "client", attributes={
+            "db.system": system,
+            "db.operation": operation,
+            "db.statement": statement[:MAX_STATEMENT_LENGTH],
+        })
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            tracer.end(spans.pop())
+
+    def on_error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("trace_spans") if conn is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_exception(exception_context.original_exception)
+            tracer.end(span)
+
+    event.listen(engine, "before_cursor_execute", before_execute)
+    event.listen(engine, "after_cursor_execute", after_execute)
+    event.listen(engine, "handle_error", on_error)
+    return engine
+
+
+class TracingMiddleware:
+    """为每个HTTP请求创建 server span，接续请求头中的 traceparent，响应头带 X-Trace-Id"""
+
+    def __init__(self, app, router=None):
+        self.app = app
+        # 用于把匹配到的端点换算成路由模板，避免 span 名称包含路径参数
+        self.router = router
+        self._routes: Dict[Callable, str] = {}
+
+    def _route(self, scope) -> Optional[str]:
+        endpoint = scope.get("endpoint")
+        if endpoint is None or self.router is None:
+            return None
+        if endpoint not in self._routes:
+            self._routes = {getattr(route, "endpoint", None): route.path for route in self.router.routes}
+        return self._routes.get(endpoint)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope.get("headers", []):
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        method = scope["method"]
+        with tracer.span(method, "server", parent=traceparent, attributes={
+            "http.request.method": method,
+            "url.path": scope["path"],
+        }) as span:
+            status_code = 500
+
+            async def send_with_trace(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    message["headers"] = [*message.get("headers", []), (b"x-trace-id", span.trace_id.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                route = self._route(scope)
+                if route:
+                    span.name = f"{method} {route}"
+                    span.set_attribute("http.route", route)
+                span.set_attribute("http.response.status_code", status_code)
+                if status_code >= 500:
+                    span.set_error(f"HTTP {status_code}")
@@ -6,29 +6,82 @@ from contextlib import asynccontextmanager
 import time
 import logging
 
-from .core.database import init_db
+from .core.database import SessionLocal, init_db
 from .core.config import settings
+from .core.health import health_monitor
+from .core.log_pipeline import configure_logging
+from .core.rate_limit import (
+    RateLimitMiddleware,
+    admission_controller,
+    build_rules,
+    create_rate_limit_backend,
+    loop_lag_monitor,
+)
+from .core.tracing import TracingMiddleware, tracer
 from .api.v1.api import api_router
+from .services.character_reaper import character_reaper
+from .services.eta_estimator import eta_estimator
+from .services.progress_buffer import progress_buffer
+from .services.task_scheduler import task_scheduler
+from .services.upload_sessions import upload_session_store
+from .services.video_pipeline import task_worker_pool
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时
+    # 启动时配置日志：经队列由后台线程输出结构化日志，不阻塞事件循环
+    configure_logging()
     logger.info("Starting up AI Video Character Lab API...")
     try:
-        await init_db()
-        logger.info("Database initialized successfully")
+        if await init_db():
+            logger.info("Database initialized successfully")
+        else:
+            logger.error("Database schema is out of date, run python -m app.core.migrate before serving requests")
     except Exception as e:
-        logger.error(f"Failed to initialize database: {e}")
+        logger.error("Failed to initialize database: %s", e)
+    
+    # 重置上次崩溃时中断的任务，恢复待执行任务到调度队列
+    db = SessionLocal()
+    try:
+        task_scheduler.restore(db, settings.task_stale_seconds)
+    except Exception as e:
+        logger.error("Failed to restore pending tasks: %s", e)
+    finally:
+        db.close()
+    
+    # 用最近完成的任务热身完成时间预估模型
+    db = SessionLocal()
+    try:
+        eta_estimator.warm_start(db, settings.eta_warm_start_tasks)
+    except Exception as e:
+        logger.error("Failed to warm up ETA estimator: %s", e)
+    finally:
+        db.close()
+    
+    tracer.start()
+    await health_monitor.start()
+    loop_lag_monitor.start()
+    progress_buffer.start()
+    upload_session_store.start()
+    # 继续清理上次关闭前未完成的角色删除
+    character_reaper.start()
+    task_worker_pool.start()
     
     yield
     
     # 关闭时
     logger.info("Shutting down AI Video Character Lab API...")
+    await task_worker_pool.stop()
+    # worker停止后再写回剩余进度，保证关闭前缓冲中的进度全部落库
+    await progress_buffer.stop()
+    await upload_session_store.stop()
+    await character_reaper.stop()
+    await health_monitor.stop()
+    await loop_lag_monitor.stop()
+    # 最后停止追踪导出，写出worker停止前结束的任务片段
+    tracer.shutdown()
 
 def create_application() -> FastAPI:
     """创建并配置FastAPI应用"""
@@ -43,6 +96,17 @@ def create_application() -> FastAPI:
         lifespan=lifespan
     )
     
+    # 限流与准入控制（纯ASGI中间件，不影响WebSocket；先添加以位于CORS内层，拒绝响应同样带CORS头）
+    if settings.rate_limit_enabled or settings.admission_enabled:
+        rules, default_rule = build_rules() if settings.rate_limit_enabled else ([], None)
+        app.add_middleware(
+            RateLimitMiddleware,
+            rules=rules,
+            default_rule=default_rule,
+            backend=create_rate_limit_backend(),
+            admission=admission_controller if settings.admission_enabled else None,
+        )
+    
     # 添加中间件
     app.add_middleware(
         CORSMiddleware,
@@ -66,6 +130,10 @@ def create_application() -> FastAPI:
         response.headers["X-Process-Time"] = str(process_time)
         return response
     
+    # 分布式追踪（最外层，覆盖限流与其他中间件的耗时）
+    if settings.tracing_enabled:
+        app.add_middleware(TracingMiddleware, router=app.router)
+    
     # 添加异常处理器
     @app.exception_handler(Exception)
     async def global_exception_handler(request: Request, exc: Exception):
@@ -88,6 +156,18 @@ def create_application() -> FastAPI:
             "environment": settings.environment
         }
     
+    # 存活探针：只要事件循环能响应即为存活
+    @app.get("/health/live")
+    async def liveness_probe():
+        return {"status": "alive"}
+    
+    # 就绪探针：返回后台缓存的依赖检查结果，未就绪时返回503让负载均衡摘除该实例
+    @app.get("/health/ready")
+    async def readiness_probe():
+        readiness = health_monitor.readiness()
+        status_code = 200 if readiness["status"] == "ready" else 503
+        return JSONResponse(status_code=status_code, content=readiness)
+    
     # 根端点
     @app.get("/")
     async def root():
@@ -0,0 +1,4 @@
+# Models Module
+from .user import RefreshToken, User
+from .character import Character, CharacterImage
+from .video import Video, VideoTask
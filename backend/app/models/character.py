@@ -0,0 +1,41 @@
+from sqlalchemy import JSON, Boolean, Column, DateTime, Float, ForeignKey, LargeBinary, String, Text
+from sqlalchemy.sql import func
+from ..core.database import Base
+from .user import generate_uuid
+
+
+class Character(Base):
+    """角色"""
+    __tablename__ = "characters"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    name = Column(String(100), nullable=False)
+    description = Column(Text)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    embedding_vector = Column(Text)
+    # metadata 是SQLAlchemy保留属性名，列名保持与init.sql一致
+    character_data = Column("metadata", JSON, default=dict)
+    is_public = Column(Boolean, default=False)
+    # 软删除标记，关联的图片、任务、视频与文件由后台清理后再删除角色记录
+    deleted_at = Column(DateTime(timezone=True), index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class CharacterImage(Base):
+    """角色参考图片"""
+    __tablename__ = "character_images"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    character_id = Column(String(36), ForeignKey("characters.id", ondelete="CASCADE"), nullable=False, index=True)
+    image_url = Column(String(500), nullable=False)
+    image_type = Column(String(20), default="reference")  # reference, generated
+    file_size = Column(String(20))
+    mime_type = Column(String(100))
+    # 感知哈希（16位十六进制），用于近重复检测
+    phash = Column(String(16), index=True)
+    dhash = Column(String(16))
+    # 参考图片选择使用的质量分与float32特征向量
+    quality_score = Column(Float)
+    feature_vector = Column(LargeBinary)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
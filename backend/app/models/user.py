@@ -0,0 +1,37 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String
+from sqlalchemy.sql import func
+from ..core.database import Base
+import uuid
+
+
+def generate_uuid() -> str:
+    """生成字符串形式的UUID主键"""
+    return str(uuid.uuid4())
+
+
+class User(Base):
+    """用户"""
+    __tablename__ = "users"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    email = Column(String(255), unique=True, nullable=False, index=True)
+    username = Column(String(100), unique=True, nullable=False, index=True)
+    hashed_password = Column(String(255), nullable=False)
+    full_name = Column(String(255))
+    is_active = Column(Boolean, default=True)
+    is_verified = Column(Boolean, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class RefreshToken(Base):
+    """刷新令牌，只保存令牌的HMAC摘要；同一次登录轮换出的令牌属于同一会话"""
+    __tablename__ = "refresh_tokens"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    session_id = Column(String(36), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # UTC
+    revoked_at = Column(DateTime)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,63 @@
+from sqlalchemy import JSON, Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.sql import func, text
+from ..core.database import Base
+from .user import generate_uuid
+
+# 仍在执行中的任务状态：同一用户同一指纹最多一个，重复请求挂到该任务上
+IN_FLIGHT_STATUSES = ("pending", "processing")
+_IN_FLIGHT_CONDITION = text("status IN ({})".format(", ".join(f"'{status}'" for status in IN_FLIGHT_STATUSES)))
+
+
+class Video(Base):
+    """生成的视频"""
+    __tablename__ = "videos"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    title = Column(String(255), nullable=False)
+    description = Column(Text)
+    script = Column(Text, nullable=False)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    character_id = Column(String(36), ForeignKey("characters.id", ondelete="SET NULL"), index=True)
+    video_url = Column(String(500))
+    thumbnail_url = Column(String(500))
+    duration = Column(Integer)  # 秒
+    style = Column(String(50), default="realistic")
+    status = Column(String(20), default="processing")  # pending, processing, completed, failed
+    generation_settings = Column(JSON, default=dict)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class VideoTask(Base):
+    """视频生成任务"""
+    __tablename__ = "video_tasks"
+    __table_args__ = (
+        UniqueConstraint("user_id", "idempotency_key", name="uq_video_tasks_user_idempotency_key"),
+        # 部分唯一索引：两个并发的相同请求都通过了查重时，后提交的一个违反约束，转而返回先创建的任务
+        Index(
+            "uq_video_tasks_user_fingerprint_in_flight", "user_id", "fingerprint", unique=True,
+            sqlite_where=_IN_FLIGHT_CONDITION, postgresql_where=_IN_FLIGHT_CONDITION,
+        ),
+    )
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    character_id = Column(String(36), ForeignKey("characters.id", ondelete="CASCADE"), nullable=False, index=True)
+    video_id = Column(String(36), ForeignKey("videos.id", ondelete="SET NULL"))
+    script = Column(Text, nullable=False)
+    duration = Column(Integer, default=30)
+    style = Column(String(50), default="realistic")
+    quality = Column(String(20), default="standard")  # standard, high, ultra
+    status = Column(String(20), default="pending")  # pending, processing, completed, failed, cancelled
+    progress = Column(Integer, default=0)  # 0-100
+    preview = Column(Boolean, default=False)  # 是否先渲染低分辨率预览
+    preview_url = Column(String(500))
+    estimated_time = Column(Integer)  # 秒
+    # 规范化生成参数与参考图片集合的指纹，用于识别重复请求
+    fingerprint = Column(String(64), index=True)
+    idempotency_key = Column(String(255))
+    error_message = Column(Text)
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -24,4 +24,9 @@ class UserResponse(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
-    user: Optional[UserResponse] = None 
\ No newline at end of file
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # 访问令牌有效期（秒）
+    user: Optional[UserResponse] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str 
\ No newline at end of file
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class ImageUploadResponse(BaseModel):
@@ -9,16 +10,45 @@ class ImageUploadResponse(BaseModel):
     mime_type: str
     quality_score: float
     recommendations: List[str]
+    duplicate_of: Optional[str] = None  # 同一角色中与之近重复的图片ID
+    duplicate_distance: Optional[int] = None  # 与该图片的pHash汉明距离
+    similar_elsewhere: int = 0  # 当前用户其他角色中的近重复图片数
 
 class BatchUploadResponse(BaseModel):
     total_uploaded: int
     total_failed: int
     uploaded_images: List[ImageUploadResponse]
     failed_files: List[str]
+    rejected_duplicates: List[str] = []  # 因近重复被拒绝的文件名
 
 class UploadProgress(BaseModel):
     character_id: str
     total_files: int
     processed_files: int
     current_file: str
-    status: str  # 'uploading', 'processing', 'completed', 'failed' 
\ No newline at end of file
+    status: str  # 'uploading', 'processing', 'completed', 'failed' 
+class UploadFileSpec(BaseModel):
+    filename: str = Field(..., max_length=255)
+    size: int = Field(..., ge=0)  # 字节
+    content_type: str = "application/octet-stream"
+
+class UploadSessionCreate(BaseModel):
+    files: List[UploadFileSpec] = Field(..., min_length=1)
+    chunk_size: Optional[int] = Field(None, gt=0)  # 缺省使用服务配置，不能超过服务配置
+    reject_duplicates: Optional[bool] = None
+
+class UploadFileStatus(BaseModel):
+    index: int
+    filename: str
+    size: int
+    chunk_count: int
+    missing_chunks: List[int]  # 尚未收到的分块序号，偏移量 = 序号 × chunk_size
+    complete: bool
+
+class UploadSessionResponse(BaseModel):
+    session_id: str
+    character_id: str
+    chunk_size: int
+    expires_at: datetime  # 没有新的分块时会话在此时间后被清理
+    files: List[UploadFileStatus]
+    complete: bool
@@ -34,12 +34,15 @@ class VideoTaskCreate(BaseModel):
     duration: int = 30
     style: str = "realistic"
     quality: str = "standard"  # standard, high, ultra
+    preview: bool = False  # 先渲染低分辨率、低帧率预览，再继续渲染成片
 
 class VideoTaskResponse(BaseModel):
     id: str
-    status: str  # pending, processing, completed, failed
+    status: str  # pending, processing, completed, failed, cancelled
     progress: int  # 0-100
+    preview_url: Optional[str] = None  # 预览渲染完成后可用
     estimated_time: Optional[int] = None  # 秒
+    video_id: Optional[str] = None  # 已完成任务的视频结果
     created_at: datetime
 
 class VideoGenerationRequest(BaseModel):
@@ -0,0 +1,191 @@
+"""已删除角色的后台清理
+
+删除角色的请求只写入 deleted_at 标记并取消进行中的任务，立即返回；角色的参考图片、任务与视频
+记录及其文件由后台任务在线程中分批清理，每批先删文件再删记录并提交，事务短小，不长时间占用
+写锁，也不阻塞事件循环。
+
+清理进度完全由数据库中剩余的记录表示：进程崩溃或重启后重新执行即可从中断处继续，已删除的
+文件再次删除时直接跳过，多个进程同时清理同一个角色也不会出错。所有关联记录删除后才删除角色本身。
+"""
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import os
+import shutil
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.character import Character, CharacterImage
+from ..models.video import Video, VideoTask
+from .file_service import file_storage
+from .image_hash import image_hash_index
+from .reference_selection import reference_selector
+
+logger = logging.getLogger(__name__)
+
+
+class CharacterReaper:
+    """分批删除已标记删除的角色及其图片、任务、视频与文件"""
+
+    def __init__(self, batch_size: int = 200, interval: float = 30.0, batch_pause: float = 0.0):
+        self.batch_size = batch_size
+        self.interval = interval
+        # 每批之间让出的时间，给其他写入留出机会
+        self.batch_pause = batch_pause
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.characters_reaped = 0
+        self.rows_deleted = {"character_images": 0, "video_tasks": 0, "videos": 0}
+        self.files_deleted = 0
+        self.batches = 0
+
+    def pending(self) -> List[str]:
+        """等待清理的角色ID，先删除的先清理"""
+        db = SessionLocal()
+        try:
+            rows = db.query(Character.id).filter(
+                Character.deleted_at.isnot(None)
+            ).order_by(Character.deleted_at).limit(self.batch_size).all()
+        finally:
+            db.close()
+        return [row[0] for row in rows]
+
+    def _delete_files(self, paths) -> None:
+        for path in paths:
+            if path and file_storage.delete(path):
+                self.files_deleted += 1
+
+    def _images_batch(self, db, character_id: str) -> List[str]:
+        rows = db.query(CharacterImage.id, CharacterImage.image_url).filter(
+            CharacterImage.character_id == character_id
+        ).limit(self.batch_size).all()
+        if not rows:
+            return []
+        self._delete_files(url for _, url in rows)
+        ids = [image_id for image_id, _ in rows]
+        db.query(CharacterImage).filter(CharacterImage.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        self.rows_deleted["character_images"] += len(ids)
+        return ids
+
+    def _tasks_batch(self, db, character_id: str) -> List[str]:
+        rows = db.query(VideoTask.id, VideoTask.preview_url).filter(
+            VideoTask.character_id == character_id
+        ).limit(self.batch_size).all()
+        if not rows:
+            return []
+        self._delete_files(url for _, url in rows)
+        for task_id, _ in rows:
+            # 渲染输出目录按任务ID命名
+            shutil.rmtree(os.path.join(settings.generated_dir, task_id), ignore_errors=True)
+        ids = [task_id for task_id, _ in rows]
+        db.query(VideoTask).filter(VideoTask.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        self.rows_deleted["video_tasks"] += len(ids)
+        return ids
+
+    def _videos_batch(self, db, character_id: str) -> List[str]:
+        rows = db.query(Video.id, Video.video_url, Video.thumbnail_url).filter(
+            Video.character_id == character_id
+        ).limit(self.batch_size).all()
+        if not rows:
+            return []
+        self._delete_files(path for _, video_url, thumbnail_url in rows for path in (video_url, thumbnail_url))
+        ids = [row[0] for row in rows]
+        db.query(Video).filter(Video.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        self.rows_deleted["videos"] += len(ids)
+        return ids
+
+    def reap_batch(self, character_id: str) -> Tuple[bool, List[str]]:
+        """清理角色的一批关联记录，返回 (角色是否已清理完, 本批删除的图片ID)"""
+        db = SessionLocal()
+        try:
+            images = self._images_batch(db, character_id)
+            if images:
+                self.batches += 1
+                return False, images
+            # 任务引用视频，先删任务再删视频
+            for step in (self._tasks_batch, self._videos_batch):
+                if step(db, character_id):
+                    self.batches += 1
+                    return False, []
+            deleted = db.query(Character).filter(
+                Character.id == character_id,
+                Character.deleted_at.isnot(None)
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if deleted:
+            self.characters_reaped += 1
+        return True, []
+
+    async def reap_all(self) -> int:
+        """清理所有已标记删除的角色，返回清理完成的角色数"""
+        done = 0
+        while True:
+            pending = await asyncio.to_thread(self.pending)
+            if not pending:
+                return done
+            for character_id in pending:
+                while True:
+                    finished, images = await asyncio.to_thread(self.reap_batch, character_id)
+                    # 内存索引只在事件循环线程中修改
+                    for image_id in images:
+                        image_hash_index.remove(image_id)
+                    if finished:
+                        break
+                    if self.batch_pause:
+                        await asyncio.sleep(self.batch_pause)
+                reference_selector.invalidate(character_id)
+                done += 1
+
+    def wake(self):
+        """有新删除的角色时立即开始清理"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                reaped = await self.reap_all()
+                if reaped:
+                    logger.info("已清理删除的角色 %s 个", reaped)
+            except Exception as e:
+                logger.error("清理删除的角色失败: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+
+    def stats(self) -> dict:
+        return {
+            "characters_reaped": self.characters_reaped,
+            "rows_deleted": dict(self.rows_deleted),
+            "files_deleted": self.files_deleted,
+            "batches": self.batches,
+        }
+
+
+character_reaper = CharacterReaper(
+    batch_size=settings.character_reaper_batch_size,
+    interval=settings.character_reaper_interval,
+    batch_pause=settings.character_reaper_batch_pause,
+)
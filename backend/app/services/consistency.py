@@ -0,0 +1,100 @@
+"""角色一致性评分
+
+对成片按固定帧率抽样，为每一帧提取与参考图片相同的特征向量（见 reference_selection），
+与角色参考图片的特征做余弦相似度：帧得分取与各参考图片相似度的最大值，场景得分为该场景
+抽样帧得分的均值，整体得分按帧数加权。得分低于阈值的场景标记为漂移，需要重新渲染。
+
+帧特征按 chunk_size 分块写入预分配的 float32 缓冲区，每块与参考矩阵做一次矩阵乘法，
+内存占用只与块大小有关，与视频长度无关。
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from ..core.config import settings
+from ..core.lazy import lazy_import
+from .reference_selection import describe_image
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+logger = logging.getLogger(__name__)
+
+
+def frame_features(frame) -> "np.ndarray":
+    """提取一帧（BGR像素数组）的特征向量"""
+    # 先按整数步长抽取像素缩小到接近256，与上传时JPEG按draft解码的作用相同，省去大部分缩放开销
+    step = max(1, max(frame.shape[:2]) // 256)
+    return describe_image(Image.fromarray(np.ascontiguousarray(frame[::step, ::step, ::-1])))[0]
+
+
+def normalize_rows(matrix) -> "np.ndarray":
+    """按行L2归一化，零向量保持为零"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def self_consistency(references) -> float:
+    """参考图片之间两两余弦相似度的均值，只有一张时为 1.0"""
+    references = normalize_rows(references)
+    n = len(references)
+    if n < 2:
+        return 1.0
+    similarity = references @ references.T
+    return round(float((similarity.sum() - np.trace(similarity)) / (n * (n - 1))), 4)
+
+
+class ConsistencyScorer:
+    """分块计算抽样帧与参考图片的相似度矩阵，汇总场景与整体得分"""
+
+    def __init__(self, chunk_size: int = 1024, drift_threshold: float = 0.5):
+        self.chunk_size = chunk_size
+        self.drift_threshold = drift_threshold
+
+    def score(self, references, frames: Iterable[Tuple[int, "np.ndarray"]]) -> dict:
+        """frames 为 (场景序号, BGR帧) 的可迭代对象，逐帧提取特征后分块打分"""
+        return self.score_features(references, ((scene, frame_features(frame)) for scene, frame in frames))
+
+    def score_features(self, references, features: Iterable[Tuple[int, "np.ndarray"]]) -> dict:
+        """features 为 (场景序号, 特征向量) 的可迭代对象"""
+        references = normalize_rows(references)
+        sums: Dict[int, float] = {}
+        counts: Dict[int, int] = {}
+        buffer: Optional["np.ndarray"] = None
+        scenes: List[int] = []
+
+        def flush():
+            chunk = normalize_rows(buffer[:len(scenes)])
+            best = (chunk @ references.T).max(axis=1)
+            labels, inverse = np.unique(np.asarray(scenes), return_inverse=True)
+            totals = np.bincount(inverse, weights=best, minlength=len(labels))
+            sizes = np.bincount(inverse, minlength=len(labels))
+            for label, total, size in zip(labels.tolist(), totals.tolist(), sizes.tolist()):
+                sums[label] = sums.get(label, 0.0) + total
+                counts[label] = counts.get(label, 0) + size
+            scenes.clear()
+
+        for scene, vector in features:
+            if buffer is None:
+                buffer = np.empty((self.chunk_size, len(vector)), dtype=np.float32)
+            buffer[len(scenes)] = vector
+            scenes.append(scene)
+            if len(scenes) == self.chunk_size:
+                flush()
+        if scenes:
+            flush()
+
+        frames = sum(counts.values())
+        scene_scores = {scene: round(sums[scene] / counts[scene], 4) for scene in sorted(sums)}
+        return {
+            "consistency_score": round(sum(sums.values()) / frames, 4) if frames else None,
+            "scene_scores": scene_scores,
+            "drifting_scenes": [scene for scene, value in scene_scores.items() if value < self.drift_threshold],
+            "frames_scored": frames,
+        }
+
+
+consistency_scorer = ConsistencyScorer(
+    chunk_size=settings.consistency_chunk_size,
+    drift_threshold=settings.consistency_drift_threshold,
+)
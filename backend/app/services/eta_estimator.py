@@ -0,0 +1,289 @@
+"""视频任务完成时间预估
+
+任务的 estimated_time 是距离完成还需的秒数，由两部分组成：
+
+- 排队等待：以排队任务数、排队总成本（时长 × 档位成本系数）、执行中的任务数，以及同档位的活跃用户数
+  和本用户排在前面的任务数（调度器档位内按用户轮询）为特征的线性模型，任务开始执行时用实际等待时间更新
+- 执行耗时：对 log(执行秒数 / 成本) 做回归，特征为时长、质量档位、风格、是否预览、参考图片数、
+  开始执行时的并发任务数与排队深度，任务完成时用实际耗时更新
+
+两个模型都用带遗忘因子的递推最小二乘（RLS）在线训练，每次更新只做一次 d×d 的矩阵运算，不保留
+历史样本，遗忘因子让模型跟上渲染器与负载的变化。未训练时模型等于 成本 × eta_prior_seconds_per_cost
+的先验。执行耗时的对数残差另用随机逼近跟踪分位数，估计值取 eta_quantile 分位。
+
+执行中按进度修正剩余时间（remaining），进度越高越相信按已用时间外推的结果。进程启动时用最近
+完成的任务热身，之后每完成一个任务增量更新。
+"""
+from typing import Callable, Dict, Optional, Tuple
+import logging
+import math
+import time
+import zlib
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.lazy import lazy_import
+from ..models.character import CharacterImage
+from ..models.video import VideoTask
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+# 风格是自由字符串，按哈希分桶后做独热编码
+STYLE_BUCKETS = 8
+# 等待开始执行的任务快照上限，超出时丢弃最早的（只影响等待模型少一个训练样本）
+MAX_WAITING = 10000
+
+
+class RecursiveLeastSquares:
+    """带遗忘因子的递推最小二乘"""
+
+    def __init__(self, dim: int, forgetting: float = 0.995, prior=None, prior_variance: float = 1.0):
+        self.theta = np.zeros(dim) if prior is None else np.array(prior, dtype=float)
+        self.P = np.eye(dim) * prior_variance
+        self.forgetting = forgetting
+        # 长期没有出现的特征方向上 P 会按 1/遗忘因子 持续放大，总不确定度超过先验时停止放大
+        self.max_trace = dim * prior_variance
+        self.samples = 0
+
+    def predict(self, x) -> float:
+        return float(self.theta @ x)
+
+    def update(self, x, y: float) -> float:
+        """用一个样本更新参数，返回更新前的预测误差"""
+        px = self.P @ x
+        gain = px / (self.forgetting + x @ px)
+        error = y - float(self.theta @ x)
+        self.theta += gain * error
+        self.P -= np.outer(gain, px)
+        if np.trace(self.P) < self.max_trace:
+            self.P /= self.forgetting
+        self.samples += 1
+        return error
+
+
+class StreamingQuantile:
+    """随机逼近跟踪分位数：每个样本把估计值向样本一侧移动固定步长"""
+
+    def __init__(self, q: float, step: float = 0.01, initial: float = 0.0):
+        self.q = q
+        self.step = step
+        self.value = initial
+
+    def update(self, sample: float):
+        self.value += self.step * (self.q - (sample < self.value))
+
+
+class EtaEstimator:
+    """在线训练的排队等待与执行耗时模型"""
+
+    def __init__(self, tier_costs: Dict[str, float], workers: int, reference_k: int,
+                 prior_seconds_per_cost: float = 2.0, forgetting: float = 0.995,
+                 quantile: float = 0.5, quantile_step: float = 0.01, queue_features: bool = True,
+                 clock: Callable[[], float] = time.monotonic):
+        self.tier_costs = dict(tier_costs)
+        self.tiers = list(self.tier_costs)
+        self.workers = max(1, workers)
+        self.reference_k = max(1, reference_k)
+        self.prior_seconds_per_cost = prior_seconds_per_cost
+        self.forgetting = forgetting
+        self.quantile = quantile
+        self.quantile_step = quantile_step
+        # 关闭时忽略排队与并发特征（基准中的对照组）
+        self.queue_features = queue_features
+        self.clock = clock
+        self.reset()
+
+    @property
+    def run_dim(self) -> int:
+        # 截距、log(时长)、档位、风格、预览、参考图片数、并发任务数、排队深度
+        return 2 + len(self.tiers) + STYLE_BUCKETS + 4
+
+    def reset(self):
+        """丢弃已训练的模型；模型的 numpy 数组在第一次使用时才创建，导入本模块不加载 numpy"""
+        self._run_model: Optional[RecursiveLeastSquares] = None
+        self._wait_model: Optional[RecursiveLeastSquares] = None
+        self.residuals = {
+            q: StreamingQuantile(q, self.quantile_step) for q in sorted({0.5, 0.9, self.quantile})
+        }
+        # task_id -> (等待特征, 创建时刻)
+        self._waiting: Dict[str, Tuple[object, float]] = {}
+        self.run_abs_log_error = 0.0
+        self.wait_abs_error = 0.0
+
+    def _create_models(self):
+        self._run_model = RecursiveLeastSquares(self.run_dim, self.forgetting)
+        # 未训练时等待时间 = 每个worker分摊的排队成本 × 先验秒数
+        prior = np.zeros(self.wait_dim)
+        prior[2] = self.prior_seconds_per_cost
+        self._wait_model = RecursiveLeastSquares(
+            self.wait_dim, self.forgetting, prior=prior, prior_variance=self.prior_seconds_per_cost ** 2,
+        )
+
+    @property
+    def run_model(self) -> RecursiveLeastSquares:
+        if self._run_model is None:
+            self._create_models()
+        return self._run_model
+
+    @property
+    def wait_model(self) -> RecursiveLeastSquares:
+        if self._wait_model is None:
+            self._create_models()
+        return self._wait_model
+
+    def cost(self, duration: int, quality: str) -> float:
+        return max(1, duration or 30) * self.tier_costs.get(quality, 1.0)
+
+    def run_features(self, duration: int, quality: str, style: str, preview: bool,
+                     references: int, running: int, queued: int):
+        x = np.zeros(self.run_dim)
+        x[0] = 1.0
+        x[1] = math.log(max(1, duration or 30))
+        offset = 2
+        if quality in self.tier_costs:
+            x[offset + self.tiers.index(quality)] = 1.0
+        offset += len(self.tiers)
+        x[offset + zlib.crc32((style or "").encode()) % STYLE_BUCKETS] = 1.0
+        offset += STYLE_BUCKETS
+        x[offset] = 1.0 if preview else 0.0
+        x[offset + 1] = min(references, self.reference_k) / self.reference_k
+        if self.queue_features:
+            x[offset + 2] = running / self.workers
+            x[offset + 3] = math.log1p(queued)
+        return x
+
+    @property
+    def wait_dim(self) -> int:
+        # 截距、排队任务数、排队成本、执行中任务数、同档位的排队任务数/用户数/本用户排队任务数及其与用户数之积、
+        # 按档位区分的排队成本
+        return 8 + len(self.tiers)
+
+    def wait_features(self, scheduler, quality: str, user_id: str, running: int):
+        w = np.zeros(self.wait_dim)
+        w[0] = 1.0
+        if not self.queue_features:
+            return w
+        tier = scheduler.tiers.get(quality)
+        tier_queued = len(tier) if tier else 0
+        tier_users = len(tier.user_queues) if tier else 0
+        # 档位内按用户赤字轮询：本用户排在前面的任务越多、档位内活跃用户越多，等待越久
+        own = len(tier.user_queues.get(user_id, ())) if tier else 0
+        w[1:8] = (len(scheduler), scheduler.queued_cost, running, tier_queued, tier_users, own, own * tier_users)
+        w[1:8] /= self.workers
+        # 档位间按权重轮询，同样的排队成本对不同档位的任务意味着不同的等待
+        if quality in self.tier_costs:
+            w[8 + self.tiers.index(quality)] = scheduler.queued_cost / self.workers
+        return w
+
+    def predict_run(self, duration: int, quality: str, x, quantile: Optional[float] = None) -> float:
+        """预计执行秒数"""
+        residual = self.residuals.get(self.quantile if quantile is None else quantile)
+        log_ratio = self.run_model.predict(x) + (residual.value if residual else 0.0)
+        return self.cost(duration, quality) * self.prior_seconds_per_cost * math.exp(log_ratio)
+
+    def predict_wait(self, w) -> float:
+        """预计排队秒数"""
+        return max(0.0, self.wait_model.predict(w))
+
+    def observe_run(self, duration: int, quality: str, x, seconds: float):
+        if seconds <= 0:
+            return
+        y = math.log(seconds / (self.cost(duration, quality) * self.prior_seconds_per_cost))
+        error = self.run_model.update(x, y)
+        # 残差分位数按更新后的模型计算
+        residual = y - self.run_model.predict(x)
+        for tracker in self.residuals.values():
+            tracker.update(residual)
+        self.run_abs_log_error += (abs(error) - self.run_abs_log_error) * 0.05
+
+    def observe_wait(self, w, seconds: float):
+        error = self.wait_model.update(w, max(0.0, seconds))
+        self.wait_abs_error += (abs(error) - self.wait_abs_error) * 0.05
+
+    @staticmethod
+    def remaining(expected_run: float, elapsed: float, fraction: float) -> float:
+        """执行中的剩余秒数：在模型预计与按已用时间外推之间加权，外推的权重为进度的平方根"""
+        fraction = min(max(fraction, 0.0), 1.0)
+        prior = max(0.0, expected_run - elapsed)
+        if fraction <= 0.0:
+            return prior
+        extrapolated = elapsed * (1 - fraction) / fraction
+        weight = math.sqrt(fraction)
+        return (1 - weight) * prior + weight * extrapolated
+
+    # 与调度器、worker的衔接
+
+    def estimate_new_task(self, task, scheduler, running: int, references: int) -> int:
+        """任务创建时预计的总秒数（排队 + 执行），并记下排队快照供开始执行时训练等待模型"""
+        quality = task.quality or "standard"
+        w = self.wait_features(scheduler, quality, str(task.user_id), running)
+        x = self.run_features(task.duration, quality, task.style, bool(task.preview),
+                              references, running + 1, len(scheduler))
+        if len(self._waiting) >= MAX_WAITING:
+            self._waiting.pop(next(iter(self._waiting)))
+        self._waiting[str(task.id)] = (w, self.clock())
+        return int(round(self.predict_wait(w) + self.predict_run(task.duration, quality, x)))
+
+    def task_started(self, task_id: str):
+        snapshot = self._waiting.pop(task_id, None)
+        if snapshot is not None:
+            w, created = snapshot
+            self.observe_wait(w, self.clock() - created)
+
+    def forget(self, task_id: str):
+        """任务在开始执行前被取消"""
+        self._waiting.pop(task_id, None)
+
+    def warm_start(self, db: Session, limit: int) -> int:
+        """用最近完成的任务训练执行耗时模型，返回使用的任务数"""
+        rows = db.query(
+            VideoTask.character_id, VideoTask.duration, VideoTask.quality, VideoTask.style,
+            VideoTask.preview, VideoTask.started_at, VideoTask.completed_at,
+        ).filter(
+            VideoTask.status == "completed",
+            VideoTask.started_at.isnot(None),
+            VideoTask.completed_at.isnot(None),
+        ).order_by(VideoTask.completed_at.desc()).limit(limit).all()
+        if not rows:
+            return 0
+        # 历史任务没有记录参考图片数，按角色当前图片数（不超过选择数）近似
+        references = dict(db.query(CharacterImage.character_id, func.count(CharacterImage.id)).filter(
+            CharacterImage.character_id.in_({row.character_id for row in rows})
+        ).group_by(CharacterImage.character_id))
+        used = 0
+        # 从旧到新训练，遗忘因子下最近的任务权重最大；历史并发与排队深度未知，按空闲处理
+        for row in reversed(rows):
+            seconds = (row.completed_at - row.started_at).total_seconds()
+            quality = row.quality or "standard"
+            x = self.run_features(row.duration, quality, row.style, bool(row.preview),
+                                  references.get(row.character_id, 0), 1, 0)
+            if seconds > 0:
+                self.observe_run(row.duration, quality, x, seconds)
+                used += 1
+        logger.info("完成时间预估模型已用 %s 个历史任务热身", used)
+        return used
+
+    def stats(self) -> dict:
+        return {
+            "run_samples": self._run_model.samples if self._run_model else 0,
+            "wait_samples": self._wait_model.samples if self._wait_model else 0,
+            "run_abs_log_error": round(self.run_abs_log_error, 4),
+            "wait_abs_error_s": round(self.wait_abs_error, 2),
+            "residual_quantiles": {str(q): round(t.value, 4) for q, t in self.residuals.items()},
+            "waiting": len(self._waiting),
+        }
+
+
+eta_estimator = EtaEstimator(
+    tier_costs=settings.scheduler_tier_costs,
+    workers=settings.task_workers,
+    reference_k=settings.reference_select_k,
+    prior_seconds_per_cost=settings.eta_prior_seconds_per_cost,
+    forgetting=settings.eta_forgetting,
+    quantile=settings.eta_quantile,
+    quantile_step=settings.eta_quantile_step,
+)
@@ -0,0 +1,221 @@
+"""用户数据导出
+
+导出用户的角色、参考图片、视频与任务。记录按表依次用服务端游标（yield_per）分批读取，逐条
+序列化后按 export_chunk_size 攒成数据块交给流式响应，内存占用与账户大小无关：
+
+- ndjson：每行一条记录，第一行是导出信息，之后每条记录的 type 字段为
+  character / character_image / video / video_task
+- zip：export.ndjson（同上，图片记录附带 archive_path）加上 images/<角色ID>/<图片ID>.<扩展名>
+  原始图片。ZIP 写入不可回退的输出流，每个成员的大小与CRC写在其后的数据描述符中，
+  图片已压缩，直接存储不再压缩；读取失败的图片列在 missing_images.txt 中。ZIP 的中央目录
+  写在归档末尾，导出期间每张图片保留一条约1KB的目录项
+
+生成器在线程池中迭代，整个导出使用同一个只读会话，结束或客户端断开时关闭。
+"""
+from datetime import date, datetime
+from typing import Callable, Iterable, Iterator, List, Optional
+import itertools
+import json
+import logging
+import os
+import time
+import zipfile
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.character import Character, CharacterImage
+from ..models.video import Video, VideoTask
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# 不导出的内部列：特征向量是二进制缓存，可由图片重新计算
+_EXCLUDED_COLUMNS = {"feature_vector", "deleted_at"}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return None
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+def _encode(record: dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False, default=_json_default, separators=(",", ":")).encode() + b"\n"
+
+
+def _columns(model) -> list:
+    return [column for column in model.__table__.columns if column.name not in _EXCLUDED_COLUMNS]
+
+
+def _image_query(user_id: str, *columns):
+    return select(*columns).join(
+        Character, Character.id == CharacterImage.character_id
+    ).where(
+        Character.user_id == user_id, Character.deleted_at.is_(None)
+    ).order_by(CharacterImage.character_id, CharacterImage.id)
+
+
+def _queries(user_id: str) -> list:
+    """(记录类型, 查询) 列表，已删除角色及其关联数据不导出"""
+    live_character = Character.deleted_at.is_(None)
+    return [
+        ("character", select(*_columns(Character)).where(
+            Character.user_id == user_id, live_character
+        ).order_by(Character.created_at, Character.id)),
+        ("character_image", _image_query(user_id, *_columns(CharacterImage))),
+        ("video", select(*_columns(Video)).outerjoin(
+            Character, Character.id == Video.character_id
+        ).where(Video.user_id == user_id, or_(Character.id.is_(None), live_character)).order_by(Video.id)),
+        ("video_task", select(*_columns(VideoTask)).join(
+            Character, Character.id == VideoTask.character_id
+        ).where(VideoTask.user_id == user_id, live_character).order_by(VideoTask.id)),
+    ]
+
+
+def iter_records(db: Session, user_id: str, batch_size: int) -> Iterator[dict]:
+    """按表依次流式读出用户的所有记录"""
+    for record_type, query in _queries(user_id):
+        result = db.execute(query.execution_options(yield_per=batch_size))
+        for row in result.mappings():
+            yield {"type": record_type, **row}
+
+
+def _image_path(record: dict) -> str:
+    extension = os.path.splitext(record["image_url"] or "")[1] or ".bin"
+    return f"images/{record['character_id']}/{record['id']}{extension}"
+
+
+def _header(user_id: str, export_format: str) -> dict:
+    return {
+        "type": "export",
+        "format": export_format,
+        "format_version": FORMAT_VERSION,
+        "user_id": user_id,
+        "exported_at": datetime.utcnow(),
+    }
+
+
+def _chunked(pieces: Iterable[bytes], chunk_size: int) -> Iterator[bytes]:
+    """把小片段攒成不小于 chunk_size 的数据块"""
+    buffer: List[bytes] = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def stream_ndjson(session_factory: Callable[[], Session], user_id: str,
+                  batch_size: Optional[int] = None, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    """以NDJSON格式流式导出"""
+    batch_size = batch_size or settings.export_batch_size
+    db = session_factory()
+    try:
+        lines = (_encode(record) for record in iter_records(db, user_id, batch_size))
+        header = _encode(_header(user_id, "ndjson"))
+        yield from _chunked(itertools.chain([header], lines), chunk_size or settings.export_chunk_size)
+    finally:
+        db.close()
+
+
+class _StreamSink:
+    """ZipFile 的输出目标：只能追加，写入的数据由生成器取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.buffered = 0
+        self.position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self.buffered += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks, self.buffered = [], 0
+        return data
+
+
+def stream_zip(session_factory: Callable[[], Session], user_id: str,
+               batch_size: Optional[int] = None, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    """以ZIP格式流式导出记录与原始图片"""
+    batch_size = batch_size or settings.export_batch_size
+    chunk_size = chunk_size or settings.export_chunk_size
+    timestamp = time.localtime()[:6]
+    sink = _StreamSink()
+    archive = zipfile.ZipFile(sink, "w")
+    db = session_factory()
+    try:
+        info = zipfile.ZipInfo("export.ndjson", timestamp)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, "w", force_zip64=True) as member:
+            member.write(_encode(_header(user_id, "zip")))
+            for record in iter_records(db, user_id, batch_size):
+                if record["type"] == "character_image":
+                    record["archive_path"] = _image_path(record)
+                member.write(_encode(record))
+                if sink.buffered >= chunk_size:
+                    yield sink.drain()
+
+        # 第二遍只读取图片路径，逐个把文件按块复制进归档
+        missing = []
+        images = db.execute(
+            _image_query(user_id, CharacterImage.id, CharacterImage.character_id, CharacterImage.image_url)
+            .execution_options(yield_per=batch_size)
+        ).mappings()
+        for record in images:
+            path = record["image_url"]
+            try:
+                source = open(path, "rb")
+            except OSError:
+                missing.append(path or str(record["id"]))
+                continue
+            with source:
+                info = zipfile.ZipInfo(_image_path(record), timestamp)
+                info.compress_type = zipfile.ZIP_STORED
+                info.file_size = os.fstat(source.fileno()).st_size
+                with archive.open(info, "w") as member:
+                    while True:
+                        block = source.read(chunk_size)
+                        if not block:
+                            break
+                        member.write(block)
+                        if sink.buffered >= chunk_size:
+                            yield sink.drain()
+        if missing:
+            logger.warning("导出用户 %s 时 %s 张图片读取失败", user_id, len(missing))
+            archive.writestr("missing_images.txt", "\n".join(missing) + "\n")
+        archive.close()
+        yield sink.drain()
+    except BaseException:
+        # 客户端断开或出错时丢弃未写完的归档
+        try:
+            archive.close()
+        except Exception:
+            pass
+        raise
+    finally:
+        db.close()
+
+
+EXPORT_FORMATS = {
+    "ndjson": (stream_ndjson, "application/x-ndjson", "ndjson"),
+    "zip": (stream_zip, "application/zip", "zip"),
+}
@@ -1 +1,51 @@
- 
\ No newline at end of file
+"""文件存储
+
+上传的图片保存在本地目录。写入接口按数据块流式写入，先写临时文件再改名，
+读取方不会看到写了一半的文件；换成对象存储时调用方不需要改动。
+"""
+from typing import Iterable, Tuple
+import os
+import uuid
+
+from ..core.config import settings
+from ..core.tracing import tracer
+
+
+class LocalFileStorage:
+    """本地目录存储"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def save_stream(self, filename: str, blocks: Iterable[bytes]) -> Tuple[str, int]:
+        """把数据块依次写入文件，返回 (路径, 字节数)"""
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, filename)
+        temp = f"{path}.{uuid.uuid4().hex}.tmp"
+        size = 0
+        with tracer.child_span("storage.save", "client", attributes={"storage.path": path}) as span:
+            try:
+                with open(temp, "wb") as f:
+                    for block in blocks:
+                        f.write(block)
+                        size += len(block)
+                os.replace(temp, path)
+            except BaseException:
+                if os.path.exists(temp):
+                    os.remove(temp)
+                raise
+            span.set_attribute("storage.bytes", size)
+        return path, size
+
+    def delete(self, path: str) -> bool:
+        """删除文件，文件不存在时返回 False"""
+        with tracer.child_span("storage.delete", "client", attributes={"storage.path": path}) as span:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                span.set_attribute("storage.missing", True)
+                return False
+        return True
+
+
+file_storage = LocalFileStorage(settings.upload_dir)
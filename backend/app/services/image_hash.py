@@ -0,0 +1,243 @@
+"""参考图片感知哈希与近重复检测
+
+上传时为每张图片计算 pHash（DCT低频）与 dHash（相邻像素梯度），以16位十六进制
+字符串存入 CharacterImage。两个哈希的汉明距离都不超过阈值时视为近重复。
+
+- 同一角色内：直接查询数据库中该角色的哈希（通常只有几十到几百张），多进程下也准确
+- 跨角色：进程内的多索引哈希（MIH），首次使用时从数据库加载，本进程上传/删除时增量维护；
+  查询结果只包含同一用户的角色，不泄露其他用户的图片信息
+"""
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import io
+import logging
+
+from sqlalchemy.orm import Session
+
+from ..core.database import SessionLocal
+from ..core.lazy import lazy_import
+from ..models.character import Character, CharacterImage
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+
+def _dct_matrix(n: int):
+    """DCT-II 变换矩阵，避免引入scipy"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT_32 = None
+
+
+def _bits_to_int(bits) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8)).tobytes(), "big")
+
+
+def phash(image, hash_size: int = 8, highfreq_factor: int = 4) -> int:
+    """感知哈希：灰度缩放后取DCT左上角低频系数，与中位数比较"""
+    global _DCT_32
+    size = hash_size * highfreq_factor
+    pixels = np.asarray(image.convert("L").resize((size, size), Image.LANCZOS), dtype=np.float64)
+    if size == 32:
+        if _DCT_32 is None:
+            _DCT_32 = _dct_matrix(32)
+        dct = _DCT_32
+    else:
+        dct = _dct_matrix(size)
+    low = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    return _bits_to_int(low.flatten() > np.median(low))
+
+
+def dhash(image, hash_size: int = 8) -> int:
+    """差异哈希：比较水平相邻像素的亮度"""
+    pixels = np.asarray(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int((pixels[:, 1:] > pixels[:, :-1]).flatten())
+
+
+def to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def from_hex(value: str) -> int:
+    return int(value, 16)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def compute_hashes(content: bytes) -> Optional[Tuple[str, str]]:
+    """计算图片内容的 (pHash, dHash)，无法解码为图片时返回 None"""
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.draft("L", (256, 256))  # JPEG可在解码阶段直接缩小，大图也很快
+            return to_hex(phash(image)), to_hex(dhash(image))
+    except Exception as e:
+        logger.debug("图片哈希计算失败: %s", e)
+        return None
+
+
+class MultiIndexHash:
+    """64位哈希的多索引哈希表，支持汉明半径查询
+
+    把哈希切成 segments 段，每段建一个精确匹配的字典。两个哈希距离不超过 r 时，
+    至少有一段的距离不超过 r // segments（抽屉原理），因此只需枚举每段该半径内的
+    邻居桶，再对候选逐个校验完整距离。
+    """
+
+    def __init__(self, segments: int = 4):
+        if HASH_BITS % segments:
+            raise ValueError("segments 必须能整除64")
+        self.segments = segments
+        self.segment_bits = HASH_BITS // segments
+        self._mask = (1 << self.segment_bits) - 1
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(segments)]
+        # 槽位 -> (图片ID, 所属角色, 哈希)；删除后槽位置为 None
+        self._entries: List[Optional[Tuple[str, str, int]]] = []
+        self._slots: Dict[str, int] = {}
+        self._flip_masks: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _split(self, value: int) -> List[int]:
+        return [(value >> (i * self.segment_bits)) & self._mask for i in range(self.segments)]
+
+    def _neighbors(self, radius: int) -> List[int]:
+        """段内距离不超过 radius 的所有翻转掩码"""
+        masks = self._flip_masks.get(radius)
+        if masks is None:
+            masks = [0]
+            for r in range(1, radius + 1):
+                for bits in combinations(range(self.segment_bits), r):
+                    masks.append(sum(1 << bit for bit in bits))
+            self._flip_masks[radius] = masks
+        return masks
+
+    def add(self, image_id: str, owner: str, value: int):
+        if image_id in self._slots:
+            self.remove(image_id)
+        slot = len(self._entries)
+        self._entries.append((image_id, owner, value))
+        self._slots[image_id] = slot
+        for bucket, part in zip(self._buckets, self._split(value)):
+            bucket.setdefault(part, []).append(slot)
+
+    def remove(self, image_id: str) -> bool:
+        slot = self._slots.pop(image_id, None)
+        if slot is None:
+            return False
+        value = self._entries[slot][2]
+        for bucket, part in zip(self._buckets, self._split(value)):
+            slots = bucket[part]
+            slots.remove(slot)
+            if not slots:
+                del bucket[part]
+        self._entries[slot] = None
+        return True
+
+    def query(self, value: int, radius: int) -> List[Tuple[str, str, int]]:
+        """返回距离不超过 radius 的 (图片ID, 所属角色, 距离)，按距离升序"""
+        masks = self._neighbors(radius // self.segments)
+        seen = set()
+        results = []
+        for bucket, part in zip(self._buckets, self._split(value)):
+            for mask in masks:
+                for slot in bucket.get(part ^ mask, ()):
+                    if slot in seen:
+                        continue
+                    seen.add(slot)
+                    image_id, owner, candidate = self._entries[slot]
+                    distance = (candidate ^ value).bit_count()
+                    if distance <= radius:
+                        results.append((image_id, owner, distance))
+        results.sort(key=lambda item: item[2])
+        return results
+
+
+def find_character_duplicate(db: Session, character_id: str, hashes: Tuple[str, str],
+                             threshold: int) -> Optional[Tuple[str, int]]:
+    """在同一角色的图片中查找近重复，返回 (图片ID, pHash距离)"""
+    p_value, d_value = from_hex(hashes[0]), from_hex(hashes[1])
+    best = None
+    rows = db.query(CharacterImage.id, CharacterImage.phash, CharacterImage.dhash).filter(
+        CharacterImage.character_id == character_id,
+        CharacterImage.phash.isnot(None)
+    )
+    for image_id, p_hex, d_hex in rows:
+        distance = hamming(p_value, from_hex(p_hex))
+        if distance <= threshold and hamming(d_value, from_hex(d_hex)) <= threshold:
+            if best is None or distance < best[1]:
+                best = (str(image_id), distance)
+    return best
+
+
+class ImageHashIndex:
+    """跨角色近重复索引（pHash），首次使用时从数据库加载"""
+
+    def __init__(self, segments: int = 4, load_batch_size: int = 10000):
+        self.index = MultiIndexHash(segments)
+        # 角色ID -> 所属用户ID，查询时按用户过滤候选
+        self.owners: Dict[str, str] = {}
+        self.load_batch_size = load_batch_size
+        self.loaded = False
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _load(self):
+        index = MultiIndexHash(self.index.segments)
+        owners = {}
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                CharacterImage.id, CharacterImage.character_id, Character.user_id, CharacterImage.phash
+            ).join(Character, Character.id == CharacterImage.character_id).filter(
+                CharacterImage.phash.isnot(None)
+            ).yield_per(self.load_batch_size)
+            for image_id, character_id, user_id, p_hex in rows:
+                index.add(str(image_id), str(character_id), from_hex(p_hex))
+                owners[str(character_id)] = str(user_id)
+        finally:
+            db.close()
+        self.index = index
+        self.owners = owners
+        self.loaded = True
+        logger.info("图片哈希索引加载完成，共 %s 张", len(index))
+
+    async def ensure_loaded(self):
+        if self.loaded:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.loaded:
+                await asyncio.to_thread(self._load)
+
+    def add(self, image_id: str, character_id: str, user_id: str, phash_hex: str):
+        if self.loaded:
+            self.index.add(image_id, character_id, from_hex(phash_hex))
+            self.owners[character_id] = user_id
+
+    def remove(self, image_id: str):
+        if self.loaded:
+            self.index.remove(image_id)
+
+    def similar(self, phash_hex: str, threshold: int, user_id: str,
+                exclude_character: Optional[str] = None) -> List[Tuple[str, str, int]]:
+        """该用户各角色中的近重复候选，可排除指定角色自己的图片"""
+        return [
+            match for match in self.index.query(from_hex(phash_hex), threshold)
+            if match[1] != exclude_character and self.owners.get(match[1]) == user_id
+        ]
+
+
+image_hash_index = ImageHashIndex()
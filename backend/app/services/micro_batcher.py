@@ -0,0 +1,104 @@
+"""推理请求微批处理
+
+模型推理（当前在CPU上，之后换GPU）按批执行比逐条执行高效得多。MicroBatcher 收集并发
+提交的单条请求，攒够 max_batch_size 条或距本批第一条请求超过 max_latency_ms 时，
+把整批交给线程中的批处理函数执行，再按顺序把结果分别交还给每个调用方的 future。
+
+- 批处理函数签名为 List[输入] -> List[结果]，返回条数必须与输入一致；结果为异常实例时
+  只让对应的调用方失败，函数整体抛出异常时整批调用方都收到该异常
+- 同时执行的批数由 max_concurrent_batches 限制，执行中新到的请求继续在下一批中积攒
+- 不常驻后台任务：第一条请求到达时挂一个定时器，批满或定时器到期时刷出
+"""
+from typing import Any, Callable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """按批大小与延迟预算合并并发请求"""
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 16,
+                 max_latency_ms: float = 5.0, max_concurrent_batches: int = 1, name: str = "batcher"):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size 必须大于0")
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.name = name
+        self.max_concurrent_batches = max_concurrent_batches
+        # (输入, future, 提交时间)
+        self._pending: List[Tuple[Any, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+        self.wait_seconds = 0.0
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # 信号量与定时器绑定事件循环，换循环（如测试中多次启动应用）时重建
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._pending = []
+            self._timer = None
+        return loop
+
+    async def submit(self, item: Any) -> Any:
+        """提交单条请求，等待所在批次执行完后返回该条的结果"""
+        loop = self._bind_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_latency, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        job = asyncio.ensure_future(self._run(batch))
+        self._running.add(job)
+        job.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        async with self._slots:
+            started = time.perf_counter()
+            self.batches += 1
+            self.items += len(batch)
+            self.wait_seconds += sum(started - submitted for _, _, submitted in batch)
+            try:
+                results = await asyncio.to_thread(self.fn, [item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name} 批处理返回 {len(results)} 条结果，期望 {len(batch)} 条")
+            except Exception as e:
+                logger.error("%s 批处理失败: %s", self.name, e)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for (_, future, _), result in zip(batch, results):
+                if future.done():  # 调用方已取消
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "avg_wait_ms": round(self.wait_seconds / self.items * 1000, 3) if self.items else 0.0,
+        }
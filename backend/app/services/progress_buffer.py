@@ -0,0 +1,139 @@
+"""任务进度写回缓冲
+
+worker 每个百分点都会上报一次进度，逐条写库会产生 任务数 × 100 条 UPDATE。这里在内存中
+按任务合并进度，只保留最新值，每隔 progress_flush_interval 秒用一条带 CASE 的批量
+UPDATE 写回（只更新仍处于 processing 的任务），同一次刷写中查出已不是 processing 的任务
+（被其他请求或进程取消），worker 下次上报进度时据此停止渲染。
+
+进度附带的剩余时间预估（estimated_time）按同样方式合并，在同一条 UPDATE 中写回。
+任务进入终态时缓冲中的进度随终态一起写入（take），不再单独刷写；进程关闭时由
+lifespan 调用 stop 把剩余进度全部写回。
+"""
+from typing import Dict, List, Optional, Set
+import asyncio
+import logging
+
+from sqlalchemy import case, update
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.video import VideoTask
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressWriteBuffer:
+    """按任务合并进度并定期批量写库"""
+
+    def __init__(self, interval: float = 1.0, chunk_size: int = 300):
+        self.interval = interval
+        # 每条批量UPDATE包含的任务数，控制SQL参数个数
+        self.chunk_size = chunk_size
+        self._pending: Dict[str, int] = {}
+        self._estimates: Dict[str, int] = {}
+        self._stopped: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.records = 0
+        self.flushes = 0
+        self.statements = 0
+
+    def record(self, task_id: str, progress: int, estimated_time: Optional[int] = None):
+        self._pending[task_id] = progress
+        if estimated_time is not None:
+            self._estimates[task_id] = estimated_time
+        self.records += 1
+
+    def take(self, task_id: str) -> dict:
+        """取出任务尚未写回的进度，供终态UPDATE一并写入"""
+        self._stopped.discard(task_id)
+        self._estimates.pop(task_id, None)
+        progress = self._pending.pop(task_id, None)
+        return {} if progress is None else {"progress": progress}
+
+    def is_stopped(self, task_id: str) -> bool:
+        """最近一次刷写时任务已不是 processing（被取消等）"""
+        return task_id in self._stopped
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _write(self, pending: Dict[str, int], estimates: Dict[str, int]) -> Set[str]:
+        db = SessionLocal()
+        stopped = set()
+        try:
+            items = list(pending.items())
+            for start in range(0, len(items), self.chunk_size):
+                chunk = dict(items[start:start + self.chunk_size])
+                ids: List[str] = list(chunk)
+                values = {"progress": case(chunk, value=VideoTask.id)}
+                chunk_estimates = {task_id: estimates[task_id] for task_id in ids if task_id in estimates}
+                if chunk_estimates:
+                    values["estimated_time"] = case(
+                        chunk_estimates, value=VideoTask.id, else_=VideoTask.estimated_time
+                    )
+                db.execute(
+                    update(VideoTask)
+                    .where(VideoTask.id.in_(ids), VideoTask.status == "processing")
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                stopped.update(str(task_id) for (task_id,) in db.query(VideoTask.id).filter(
+                    VideoTask.id.in_(ids), VideoTask.status != "processing"
+                ))
+                self.statements += 1
+            db.commit()
+        finally:
+            db.close()
+        return stopped
+
+    async def flush(self):
+        """把缓冲中的进度写回数据库，写失败时放回缓冲等待下次重试"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            estimates, self._estimates = self._estimates, {}
+            try:
+                stopped = await asyncio.to_thread(self._write, pending, estimates)
+            except Exception as e:
+                logger.error("进度批量写回失败: %s", e)
+                for task_id, progress in pending.items():
+                    self._pending.setdefault(task_id, progress)
+                for task_id, estimate in estimates.items():
+                    self._estimates.setdefault(task_id, estimate)
+                return
+            self.flushes += 1
+            self._stopped.update(stopped)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "records": self.records,
+            "flushes": self.flushes,
+            "statements": self.statements,
+            "pending": len(self._pending),
+        }
+
+
+progress_buffer = ProgressWriteBuffer(interval=settings.progress_flush_interval)
@@ -0,0 +1,183 @@
+"""参考图片子集选择
+
+生成时不把角色的全部参考图片交给生成器，而是挑选 k 张：既要质量高，又要彼此差异大
+（不同角度、光照、表情）。每张图片上传时提取一个紧凑的特征向量和质量分并存库，
+选择阶段在NumPy中做质量加权的最远点采样。结果按角色缓存，图片变化时失效。
+"""
+from typing import Dict, List, Optional, Tuple
+import io
+import logging
+import os
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.lazy import lazy_import
+from ..models.character import CharacterImage
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+logger = logging.getLogger(__name__)
+
+
+def quality_metrics(gray) -> Dict[str, float]:
+    """由 0-1 灰度数组计算清晰度（拉普拉斯方差）、曝光、对比度与综合质量分，均为 0-1"""
+    laplacian = (gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1] - 4 * gray[1:-1, 1:-1])
+    sharpness = float(laplacian.var())
+    sharpness = sharpness / (sharpness + 0.002)
+    brightness = float(gray.mean())
+    exposure = 1.0 - 2.0 * abs(brightness - 0.5)
+    contrast = min(1.0, float(gray.std()) / 0.25)
+    return {
+        "brightness": round(brightness, 4),
+        "exposure": round(exposure, 4),
+        "contrast": round(contrast, 4),
+        "sharpness": round(sharpness, 4),
+        "quality_score": round(0.5 * sharpness + 0.25 * exposure + 0.25 * contrast, 4),
+    }
+
+
+def describe_image(image) -> Tuple["np.ndarray", float]:
+    """计算PIL图片的 (float32特征向量, 质量分)
+
+    特征由 8x8 灰度缩略图与 HSV 颜色直方图拼接而成，各部分分别做L2归一化；
+    质量分见 quality_metrics。
+    """
+    image = image.convert("RGB")
+    image.thumbnail((256, 256))
+    gray = np.asarray(image.convert("L"), dtype=np.float32) / 255.0
+    hsv = np.asarray(image.convert("HSV"), dtype=np.uint8)
+    layout = np.asarray(image.convert("L").resize((8, 8), Image.BILINEAR), dtype=np.float32)
+
+    layout = layout.flatten() - layout.mean()
+    histograms = [
+        np.bincount(hsv[..., channel].flatten().astype(np.int32) * bins // 256, minlength=bins).astype(np.float32)
+        for channel, bins in ((0, 16), (1, 8), (2, 8))
+    ]
+    parts = [layout] + histograms
+    vector = np.concatenate([part / (np.linalg.norm(part) or 1.0) for part in parts]).astype(np.float32)
+    return vector, quality_metrics(gray)["quality_score"]
+
+
+def extract_features(content: bytes) -> Optional[Tuple[bytes, float]]:
+    """提取图片内容的 (float32特征向量字节, 质量分)，无法解码为图片时返回 None"""
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.draft("RGB", (256, 256))
+            vector, quality = describe_image(image)
+    except Exception as e:
+        logger.debug("图片特征提取失败: %s", e)
+        return None
+    return vector.tobytes(), quality
+
+
+def select_diverse(quality, features, k: int, diversity_weight: float = 0.5) -> List[int]:
+    """质量加权的最远点采样，返回选中图片的下标
+
+    先选质量最高的一张，之后每一步选 (1-w)·质量 + w·到已选集合的最小距离 最大的一张。
+    到已选集合的最小距离数组每步只需与新选中的一张比较后取 minimum，整体 O(n·k·d)。
+    """
+    quality = np.asarray(quality, dtype=np.float32)
+    features = np.asarray(features, dtype=np.float32)
+    n = len(quality)
+    if n <= k:
+        return [int(i) for i in np.argsort(-quality)]
+    span = float(quality.max() - quality.min()) or 1.0
+    quality = (quality - quality.min()) / span
+
+    first = int(np.argmax(quality))
+    selected = [first]
+    min_dist = np.linalg.norm(features - features[first], axis=1)
+    min_dist[first] = -np.inf
+    for _ in range(k - 1):
+        scale = float(min_dist.max()) or 1.0
+        score = (1 - diversity_weight) * quality + diversity_weight * (min_dist / scale)
+        pick = int(np.argmax(score))
+        selected.append(pick)
+        min_dist = np.minimum(min_dist, np.linalg.norm(features - features[pick], axis=1))
+        min_dist[selected] = -np.inf
+    return selected
+
+
+class ReferenceSelector:
+    """按角色缓存参考图片选择结果
+
+    缓存键包含角色图片数量与最新上传时间，其他进程增删图片后也会自动失效；
+    本进程上传或删除图片时调用 invalidate 立即失效。
+    """
+
+    def __init__(self, k: int, diversity_weight: float, max_entries: int = 1000):
+        self.k = k
+        self.diversity_weight = diversity_weight
+        self.max_entries = max_entries
+        self._cache: Dict[str, Tuple[tuple, List[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, character_id: str):
+        self._cache.pop(character_id, None)
+
+    @staticmethod
+    def _version(db: Session, character_id: str) -> tuple:
+        count, latest = db.query(func.count(CharacterImage.id), func.max(CharacterImage.created_at)).filter(
+            CharacterImage.character_id == character_id
+        ).one()
+        return count, str(latest)
+
+    @staticmethod
+    def _backfill(db: Session, images: List[CharacterImage]):
+        """为没有特征的历史图片补算特征"""
+        changed = False
+        for image in images:
+            if image.feature_vector is not None or not os.path.exists(image.image_url):
+                continue
+            with open(image.image_url, "rb") as f:
+                extracted = extract_features(f.read())
+            if extracted:
+                image.feature_vector, image.quality_score = extracted
+                changed = True
+        if changed:
+            db.commit()
+
+    def select(self, db: Session, character_id: str, k: Optional[int] = None) -> List[str]:
+        """返回选中的图片ID列表，按选择顺序排列"""
+        k = k or self.k
+        version = self._version(db, character_id) + (k,)
+        cached = self._cache.get(character_id)
+        if cached and cached[0] == version:
+            self.hits += 1
+            return list(cached[1])
+        self.misses += 1
+
+        images = db.query(CharacterImage).filter(
+            CharacterImage.character_id == character_id,
+            CharacterImage.image_type == "reference"
+        ).order_by(CharacterImage.created_at).all()
+        self._backfill(db, images)
+        usable = [image for image in images if image.feature_vector is not None]
+        if usable:
+            quality = np.array([image.quality_score or 0.0 for image in usable], dtype=np.float32)
+            features = np.frombuffer(b"".join(image.feature_vector for image in usable), dtype=np.float32)
+            picks = select_diverse(quality, features.reshape(len(usable), -1), k, self.diversity_weight)
+            selected = [str(usable[i].id) for i in picks]
+        else:
+            selected = []
+        # 无法提取特征的图片（非图片文件、文件缺失）只在名额未满时按上传顺序补充
+        for image in images:
+            if len(selected) >= k:
+                break
+            if image.feature_vector is None:
+                selected.append(str(image.id))
+
+        if len(self._cache) >= self.max_entries:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[character_id] = (version, selected)
+        return list(selected)
+
+
+reference_selector = ReferenceSelector(
+    k=settings.reference_select_k,
+    diversity_weight=settings.reference_diversity_weight,
+)
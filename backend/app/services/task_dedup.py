@@ -0,0 +1,87 @@
+from typing import Iterable, Optional, Union
+import hashlib
+import json
+import logging
+from sqlalchemy.orm import Session
+from ..models.character import CharacterImage
+from ..models.video import IN_FLIGHT_STATUSES, VideoTask
+from ..schemas.video import VideoTaskCreate
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_generation_params(task_data: Union[VideoTaskCreate, VideoTask]) -> dict:
+    """规范化生成参数，去除不影响生成结果的差异（空白、大小写）；请求与已保存的任务都可传入"""
+    return {
+        "character_id": str(task_data.character_id),
+        "script": " ".join((task_data.script or "").split()),
+        "duration": int(task_data.duration or 0),
+        "style": (task_data.style or "").strip().lower(),
+        "quality": (task_data.quality or "").strip().lower(),
+        # 预览任务与成片任务的产出不同，不能互相复用
+        "preview": bool(task_data.preview),
+    }
+
+
+def same_request(task: VideoTask, task_data: VideoTaskCreate) -> bool:
+    """幂等键重放是否与原请求参数一致；只比较请求本身，角色图片之后的变化不影响重试"""
+    return normalize_generation_params(task) == normalize_generation_params(task_data)
+
+
+def generation_fingerprint(task_data: VideoTaskCreate, image_ids: Iterable[str]) -> str:
+    """根据规范化参数与角色当前参考图片集合计算生成指纹
+
+    图片记录不可变（替换图片会产生新记录），因此用图片ID集合即可代表角色当前形象。
+    """
+    payload = normalize_generation_params(task_data)
+    payload["images"] = sorted(str(image_id) for image_id in image_ids)
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def character_fingerprint(db: Session, task_data: VideoTaskCreate) -> str:
+    image_ids = [row.id for row in db.query(CharacterImage.id).filter(
+        CharacterImage.character_id == task_data.character_id
+    )]
+    return generation_fingerprint(task_data, image_ids)
+
+
+def find_by_idempotency_key(db: Session, user_id: str, idempotency_key: str) -> Optional[VideoTask]:
+    return db.query(VideoTask).filter(
+        VideoTask.user_id == user_id,
+        VideoTask.idempotency_key == idempotency_key
+    ).first()
+
+
+def find_reusable_task(db: Session, user_id: str, fingerprint: str) -> Optional[VideoTask]:
+    """查找可复用的任务：优先执行中的任务，其次已完成且有视频结果的任务"""
+    in_flight = db.query(VideoTask).filter(
+        VideoTask.user_id == user_id,
+        VideoTask.fingerprint == fingerprint,
+        VideoTask.status.in_(IN_FLIGHT_STATUSES)
+    ).order_by(VideoTask.created_at.desc()).first()
+    if in_flight:
+        return in_flight
+
+    return db.query(VideoTask).filter(
+        VideoTask.user_id == user_id,
+        VideoTask.fingerprint == fingerprint,
+        VideoTask.status == "completed",
+        VideoTask.video_id.isnot(None)
+    ).order_by(VideoTask.created_at.desc()).first()
+
+
+class DedupStats:
+    """统计去重命中次数"""
+
+    def __init__(self):
+        self.idempotent_replays = 0
+        self.attached_in_flight = 0
+        self.reused_results = 0
+        self.created = 0
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+dedup_stats = DedupStats()
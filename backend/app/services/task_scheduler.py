@@ -0,0 +1,266 @@
+"""视频任务调度器
+
+位于任务执行之前，决定worker下一个执行哪个任务：
+
+1. 质量档位之间按权重做平滑加权轮询（settings.scheduler_tier_weights），standard 预览
+   不会被大量 ultra 任务堵住，ultra 也能按比例获得执行机会。
+2. 同一档位内按用户做赤字轮询（DRR），每个用户每轮获得 scheduler_user_quantum 的
+   成本额度，任务成本为 时长 × 档位成本系数，单个用户提交再多任务也只能占用自己的份额。
+3. 老化：某个非空档位超过 scheduler_aging_seconds 未被调度时优先调度该档位，避免低权重
+   档位饿死；老化按档位而不是按任务计算，积压的大批任务不会因为都“变老”而退化成先进先出。
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, Optional
+import asyncio
+import logging
+import time
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScheduledTask:
+    task_id: str
+    user_id: str
+    quality: str
+    duration: int
+    enqueued_at: Optional[float] = None
+    payload: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_model(cls, task, enqueued_at: Optional[float] = None) -> "ScheduledTask":
+        return cls(
+            task_id=str(task.id),
+            user_id=str(task.user_id),
+            quality=task.quality or "standard",
+            duration=task.duration or 30,
+            enqueued_at=enqueued_at,
+        )
+
+
+class _TierQueue:
+    """单个质量档位内按用户的赤字轮询队列"""
+
+    def __init__(self):
+        self.user_queues: Dict[str, Deque[ScheduledTask]] = {}
+        self.active_users: Deque[str] = deque()
+        self.deficits: Dict[str, float] = {}
+        self.current_weight = 0.0
+        self.size = 0
+        # 最近一次被调度（或从空变为非空）的时间，用于档位老化
+        self.last_served = 0.0
+        # 队首用户本轮是否已获得额度
+        self._granted = False
+
+    def __len__(self) -> int:
+        return self.size
+
+    def push(self, task: ScheduledTask):
+        if self.size == 0:
+            self.last_served = task.enqueued_at
+        queue = self.user_queues.get(task.user_id)
+        if queue is None:
+            queue = self.user_queues[task.user_id] = deque()
+            self.active_users.append(task.user_id)
+            self.deficits[task.user_id] = 0.0
+        queue.append(task)
+        self.size += 1
+
+    def oldest(self) -> Optional[ScheduledTask]:
+        """等待最久的队首任务（用于统计）"""
+        heads = [queue[0] for queue in self.user_queues.values() if queue]
+        return min(heads, key=lambda task: task.enqueued_at) if heads else None
+
+    def _drop_user_if_empty(self, user_id: str):
+        if self.user_queues[user_id]:
+            return
+        if self.active_users[0] == user_id:
+            self._granted = False
+        del self.user_queues[user_id]
+        del self.deficits[user_id]
+        self.active_users.remove(user_id)
+
+    def remove(self, task: ScheduledTask):
+        self.user_queues[task.user_id].remove(task)
+        self.size -= 1
+        self._drop_user_if_empty(task.user_id)
+
+    def _next_user(self):
+        self.active_users.rotate(-1)
+        self._granted = False
+
+    def pop(self, quantum: float, cost: Callable[[ScheduledTask], float]) -> ScheduledTask:
+        """DRR：每轮给队首用户补充额度，额度足够支付队首任务成本时出队"""
+        skipped = 0
+        while True:
+            user_id = self.active_users[0]
+            queue = self.user_queues[user_id]
+            if not self._granted:
+                self.deficits[user_id] += quantum
+                self._granted = True
+            head_cost = cost(queue[0])
+            if self.deficits[user_id] >= head_cost:
+                task = queue.popleft()
+                self.size -= 1
+                self.deficits[user_id] -= head_cost
+                self._drop_user_if_empty(user_id)
+                return task
+            self._next_user()
+            skipped += 1
+            if skipped >= len(self.active_users):
+                # 整轮都无人能支付时，一次性给所有用户补足若干轮额度，避免成本远大于额度时空转
+                rounds = min(
+                    (cost(self.user_queues[uid][0]) - self.deficits[uid]) // quantum
+                    for uid in self.active_users
+                )
+                if rounds > 0:
+                    for uid in self.active_users:
+                        self.deficits[uid] += rounds * quantum
+                skipped = 0
+
+
+class TaskScheduler:
+    """按质量档位加权、按用户公平分享、带老化的任务调度器"""
+
+    def __init__(self, tier_weights: Dict[str, float], tier_costs: Dict[str, float],
+                 user_quantum: float, aging_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.tiers: Dict[str, _TierQueue] = {}
+        self.tasks: Dict[str, ScheduledTask] = {}
+        self.configure(tier_weights, tier_costs, user_quantum, aging_seconds)
+        self._not_empty = asyncio.Event()
+
+    def configure(self, tier_weights: Dict[str, float], tier_costs: Dict[str, float],
+                  user_quantum: float, aging_seconds: float):
+        """运行时调整调度参数"""
+        self.tier_weights = dict(tier_weights)
+        self.tier_costs = dict(tier_costs)
+        self.user_quantum = user_quantum
+        self.aging_seconds = aging_seconds
+        for tier in self.tier_weights:
+            self.tiers.setdefault(tier, _TierQueue())
+        # 排队任务的总成本，供完成时间预估使用
+        self.queued_cost = sum(self.task_cost(task) for task in self.tasks.values())
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self.tasks
+
+    def task_cost(self, task: ScheduledTask) -> float:
+        return task.duration * self.tier_costs.get(task.quality, 1.0)
+
+    def _tier_of(self, task: ScheduledTask) -> str:
+        return task.quality if task.quality in self.tiers else "standard"
+
+    def submit(self, task: ScheduledTask):
+        """加入队列；同一任务重复提交会被忽略"""
+        if task.task_id in self.tasks:
+            return
+        if task.enqueued_at is None:
+            task.enqueued_at = self.clock()
+        self.tiers.setdefault(self._tier_of(task), _TierQueue()).push(task)
+        self.tasks[task.task_id] = task
+        self.queued_cost += self.task_cost(task)
+        self._not_empty.set()
+
+    def cancel(self, task_id: str) -> bool:
+        """从队列中移除尚未执行的任务"""
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return False
+        self.tiers[self._tier_of(task)].remove(task)
+        self.queued_cost = max(0.0, self.queued_cost - self.task_cost(task)) if self.tasks else 0.0
+        return True
+
+    def _starved_tier(self, now: float) -> Optional[_TierQueue]:
+        starved = [
+            queue for queue in self.tiers.values()
+            if len(queue) and now - queue.last_served >= self.aging_seconds
+        ]
+        return min(starved, key=lambda queue: queue.last_served) if starved else None
+
+    def _select_tier(self) -> _TierQueue:
+        """平滑加权轮询（与nginx upstream相同的算法）选择档位"""
+        candidates = [(name, queue) for name, queue in self.tiers.items() if len(queue)]
+        total = 0.0
+        best = None
+        for name, queue in candidates:
+            weight = self.tier_weights.get(name, 1.0)
+            queue.current_weight += weight
+            total += weight
+            if best is None or queue.current_weight > best.current_weight:
+                best = queue
+        best.current_weight -= total
+        return best
+
+    def next_task(self, now: Optional[float] = None) -> Optional[ScheduledTask]:
+        """取出下一个应执行的任务，队列为空时返回 None"""
+        if not self.tasks:
+            return None
+        now = self.clock() if now is None else now
+        tier = self._starved_tier(now) or self._select_tier()
+        task = tier.pop(self.user_quantum, self.task_cost)
+        tier.last_served = now
+        del self.tasks[task.task_id]
+        self.queued_cost = max(0.0, self.queued_cost - self.task_cost(task)) if self.tasks else 0.0
+        return task
+
+    async def get(self) -> ScheduledTask:
+        """等待并取出下一个任务，供worker循环调用"""
+        while True:
+            task = self.next_task()
+            if task is not None:
+                return task
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+    def stats(self) -> dict:
+        now = self.clock()
+        result = {}
+        for name, queue in self.tiers.items():
+            oldest = queue.oldest()
+            result[name] = {
+                "queued": len(queue),
+                "users": len(queue.user_queues),
+                "oldest_wait_s": round(now - oldest.enqueued_at, 3) if oldest else 0.0,
+            }
+        return result
+
+    def restore(self, db, stale_seconds: Optional[float] = None):
+        """进程启动时把数据库中等待执行的任务重新放回队列
+
+        进程崩溃时正在执行的任务停留在 processing。指定 stale_seconds 时，先把超过该时长
+        没有更新的 processing 任务重置为 pending 再恢复；执行中的任务每次写回进度都会刷新
+        updated_at，多进程部署时不会重置其他进程正在执行的任务。
+        """
+        from ..models.video import VideoTask
+
+        if stale_seconds is not None:
+            reset = db.query(VideoTask).filter(
+                VideoTask.status == "processing",
+                VideoTask.updated_at < datetime.utcnow() - timedelta(seconds=stale_seconds)
+            ).update({"status": "pending", "progress": 0}, synchronize_session=False)
+            db.commit()
+            if reset:
+                logger.warning("重置 %d 个中断的执行中任务为待执行", reset)
+        pending = db.query(VideoTask).filter(VideoTask.status == "pending").order_by(VideoTask.created_at)
+        restored = 0
+        for task in pending:
+            self.submit(ScheduledTask.from_model(task))
+            restored += 1
+        if restored:
+            logger.info("恢复 %d 个待执行任务到调度队列", restored)
+
+
+task_scheduler = TaskScheduler(
+    tier_weights=settings.scheduler_tier_weights,
+    tier_costs=settings.scheduler_tier_costs,
+    user_quantum=settings.scheduler_user_quantum,
+    aging_seconds=settings.scheduler_aging_seconds,
+)
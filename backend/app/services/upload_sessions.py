@@ -0,0 +1,291 @@
+"""可续传的分块上传会话
+
+批量上传在一个 multipart 请求中传完所有图片，网络中断就要整批重传。分块上传先创建会话声明
+要上传的文件与大小，再按偏移量逐块 PUT（可并行、可乱序），随时可以查询已收到哪些分块并只补传
+缺失的部分，全部收齐后 finalize 按顺序把分块流式拼接写入存储。会话属于创建它的用户，其他用户
+查询、上传或入库时按会话不存在处理。
+
+会话状态放在磁盘上，多个worker进程共享：
+
+    <root>/<session_id>/session.json               会话元数据，每次收到分块时刷新修改时间
+    <root>/<session_id>/<文件序号>/<分块序号>.part  已完整收到的分块（先写临时文件再改名）
+    <root>/<session_id>/finalize.lock              入库锁，同一会话同时只有一个 finalize 执行
+
+finalize 每处理完一个文件就把结果记入 session.json，请求中断或超时后重试时跳过已入库的文件。
+
+超过 upload_session_ttl 秒没有活动的会话由后台清理任务删除。
+"""
+from datetime import datetime
+from typing import IO, Iterator, List, Optional
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+
+from ..core.config import settings
+from ..core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+_MANIFEST = "session.json"
+_FINALIZE_LOCK = "finalize.lock"
+
+
+class UploadSessionError(Exception):
+    """上传会话请求不合法"""
+
+
+class UploadSessionNotFound(UploadSessionError):
+    """会话不存在或已过期"""
+
+
+class UploadSessionBusy(UploadSessionError):
+    """会话正在由另一个请求入库"""
+
+
+class UploadSessionStore:
+    """磁盘上的分块上传会话"""
+
+    def __init__(self, root: str, chunk_size: int, ttl: float, purge_interval: float = 300.0):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._task: Optional[asyncio.Task] = None
+        self.chunks_received = 0
+        self.bytes_received = 0
+        self.chunks_rejected = 0
+        self.sessions_expired = 0
+
+    def _session_dir(self, session_id: str) -> str:
+        # 会话ID作为目录名，只接受合法UUID
+        try:
+            return os.path.join(self.root, str(uuid.UUID(session_id)))
+        except ValueError:
+            raise UploadSessionNotFound(session_id)
+
+    def _manifest_path(self, session_id: str) -> str:
+        return os.path.join(self._session_dir(session_id), _MANIFEST)
+
+    def _write_manifest(self, session_id: str, manifest: dict):
+        path = self._manifest_path(session_id)
+        temp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({key: value for key, value in manifest.items() if key != "expires_at"}, f, ensure_ascii=False)
+        os.replace(temp, path)
+
+    def create(self, character_id: str, user_id: str, files: List[dict], chunk_size: Optional[int] = None,
+               **options) -> dict:
+        """创建会话，files 为 [{"filename", "size", "content_type"}]"""
+        chunk_size = min(chunk_size or self.chunk_size, self.chunk_size)
+        session_id = str(uuid.uuid4())
+        manifest = {
+            "session_id": session_id,
+            "character_id": character_id,
+            "user_id": user_id,
+            "chunk_size": chunk_size,
+            "created_at": time.time(),
+            "options": options,
+            "files": [
+                {**spec, "index": index, "chunk_count": max(1, -(-spec["size"] // chunk_size))}
+                for index, spec in enumerate(files)
+            ],
+        }
+        path = self._session_dir(session_id)
+        os.makedirs(path)
+        for spec in manifest["files"]:
+            os.makedirs(os.path.join(path, str(spec["index"])))
+        self._write_manifest(session_id, manifest)
+        return manifest
+
+    def load(self, session_id: str, user_id: Optional[str] = None) -> dict:
+        """读取会话元数据；指定 user_id 时会话不属于该用户按不存在处理"""
+        path = self._manifest_path(session_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            last_active = os.path.getmtime(path)
+        except FileNotFoundError:
+            raise UploadSessionNotFound(session_id)
+        if time.time() - last_active > self.ttl:
+            raise UploadSessionNotFound(session_id)
+        if user_id is not None and manifest.get("user_id") != user_id:
+            raise UploadSessionNotFound(session_id)
+        manifest["expires_at"] = last_active + self.ttl
+        return manifest
+
+    def _file_spec(self, manifest: dict, file_index: int) -> dict:
+        if not 0 <= file_index < len(manifest["files"]):
+            raise UploadSessionError(f"文件序号 {file_index} 不存在")
+        return manifest["files"][file_index]
+
+    @staticmethod
+    def expected_length(manifest: dict, spec: dict, chunk_index: int) -> int:
+        """分块的应有长度，最后一块可能不满"""
+        chunk_size = manifest["chunk_size"]
+        return min(chunk_size, spec["size"] - chunk_index * chunk_size)
+
+    def chunk_index(self, manifest: dict, file_index: int, offset: int) -> int:
+        """校验偏移量并返回分块序号，偏移量必须对齐分块大小"""
+        spec = self._file_spec(manifest, file_index)
+        chunk_size = manifest["chunk_size"]
+        if offset < 0 or offset % chunk_size or offset >= max(spec["size"], 1):
+            raise UploadSessionError(f"偏移量 {offset} 不合法，必须是 {chunk_size} 的整数倍且小于文件大小")
+        return offset // chunk_size
+
+    def write_chunk(self, session_id: str, file_index: int, offset: int, data: bytes,
+                    user_id: Optional[str] = None) -> dict:
+        """保存一个完整分块；重复上传同一分块时覆盖，返回文件的接收状态"""
+        manifest = self.load(session_id, user_id)
+        spec = self._file_spec(manifest, file_index)
+        index = self.chunk_index(manifest, file_index, offset)
+        expected = self.expected_length(manifest, spec, index)
+        if len(data) != expected:
+            self.chunks_rejected += 1
+            raise UploadSessionError(f"分块长度 {len(data)} 与应有长度 {expected} 不符")
+        directory = os.path.join(self._session_dir(session_id), str(file_index))
+        final = os.path.join(directory, f"{index}.part")
+        temp = f"{final}.{uuid.uuid4().hex}.tmp"
+        with tracer.child_span("storage.write_chunk", "client", attributes={"storage.bytes": len(data)}):
+            with open(temp, "wb") as f:
+                f.write(data)
+            os.replace(temp, final)
+        os.utime(self._manifest_path(session_id))
+        self.chunks_received += 1
+        self.bytes_received += len(data)
+        return self.file_status(session_id, manifest, spec)
+
+    def received_chunks(self, session_id: str, file_index: int) -> List[int]:
+        directory = os.path.join(self._session_dir(session_id), str(file_index))
+        return sorted(int(name[:-5]) for name in os.listdir(directory) if name.endswith(".part"))
+
+    def file_status(self, session_id: str, manifest: dict, spec: dict) -> dict:
+        received = set(self.received_chunks(session_id, spec["index"]))
+        missing = [i for i in range(spec["chunk_count"]) if i not in received]
+        return {
+            "index": spec["index"],
+            "filename": spec["filename"],
+            "size": spec["size"],
+            "chunk_count": spec["chunk_count"],
+            "missing_chunks": missing,
+            "complete": not missing,
+        }
+
+    def status(self, session_id: str, user_id: Optional[str] = None) -> dict:
+        manifest = self.load(session_id, user_id)
+        files = [self.file_status(session_id, manifest, spec) for spec in manifest["files"]]
+        return {
+            "session_id": session_id,
+            "character_id": manifest["character_id"],
+            "chunk_size": manifest["chunk_size"],
+            "expires_at": datetime.utcfromtimestamp(manifest["expires_at"]),
+            "files": files,
+            "complete": all(item["complete"] for item in files),
+        }
+
+    def iter_file(self, session_id: str, file_index: int, block_size: int = 256 * 1024) -> Iterator[bytes]:
+        """按顺序流式读出文件的所有分块"""
+        directory = os.path.join(self._session_dir(session_id), str(file_index))
+        manifest = self.load(session_id)
+        for index in range(self._file_spec(manifest, file_index)["chunk_count"]):
+            with open(os.path.join(directory, f"{index}.part"), "rb") as f:
+                while True:
+                    block = f.read(block_size)
+                    if not block:
+                        break
+                    yield block
+
+    def lock_finalize(self, session_id: str, user_id: Optional[str] = None) -> IO:
+        """取得会话的入库锁，返回持锁的文件对象，关闭即释放
+
+        其他请求（含其他worker进程）正在入库时抛出 UploadSessionBusy。锁随文件描述符释放，
+        持锁进程崩溃后不会把会话永远卡在入库中。
+        """
+        self.load(session_id, user_id)
+        try:
+            lock = open(os.path.join(self._session_dir(session_id), _FINALIZE_LOCK), "a")
+        except FileNotFoundError:
+            raise UploadSessionNotFound(session_id)
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            raise UploadSessionBusy(session_id)
+        try:
+            # 取得锁之前上一个 finalize 可能刚完成并删除了会话
+            self.load(session_id, user_id)
+        except UploadSessionError:
+            lock.close()
+            raise
+        return lock
+
+    def record_result(self, session_id: str, file_index: int, result: dict):
+        """记录文件的入库结果（持有入库锁时调用），重试 finalize 时跳过该文件"""
+        manifest = self.load(session_id)
+        manifest.setdefault("results", {})[str(file_index)] = result
+        self._write_manifest(session_id, manifest)
+
+    def delete(self, session_id: str):
+        shutil.rmtree(self._session_dir(session_id), ignore_errors=True)
+
+    def purge_expired(self) -> int:
+        """删除超过有效期没有活动的会话，返回删除数"""
+        if not os.path.isdir(self.root):
+            return 0
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                last_active = os.path.getmtime(os.path.join(path, _MANIFEST))
+            except FileNotFoundError:
+                # 创建到一半的会话按目录时间判断
+                last_active = os.path.getmtime(path)
+            if now - last_active > self.ttl:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        self.sessions_expired += removed
+        return removed
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                removed = await asyncio.to_thread(self.purge_expired)
+                if removed:
+                    logger.info("清理过期上传会话 %s 个", removed)
+            except Exception as e:
+                logger.error("清理上传会话失败: %s", e)
+
+    def start(self):
+        os.makedirs(self.root, exist_ok=True)
+        if self._task is None:
+            self._task = asyncio.create_task(self._purge_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "chunks_received": self.chunks_received,
+            "bytes_received": self.bytes_received,
+            "chunks_rejected": self.chunks_rejected,
+            "sessions_expired": self.sessions_expired,
+        }
+
+
+upload_session_store = UploadSessionStore(
+    root=settings.upload_session_dir,
+    chunk_size=settings.upload_chunk_size,
+    ttl=settings.upload_session_ttl,
+)
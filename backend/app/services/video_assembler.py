@@ -0,0 +1,180 @@
+"""视频帧流式组装
+
+生成器返回的帧逐帧编码进输出容器，不在内存中收集整段视频的帧：内存占用只取决于
+单帧大小和缓冲批次数，与视频时长无关。缩略图取自开头附近的一帧。
+帧格式与OpenCV一致：uint8、形状为 (高, 宽, 3) 的BGR数组。
+"""
+from typing import AsyncIterable, Iterable, Iterator, List, Optional
+import asyncio
+import logging
+import os
+
+from ..core.lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+
+class FrameAssemblyError(Exception):
+    """帧组装失败"""
+
+
+class FrameAssembler:
+    """把帧流式写入视频文件
+
+    编码器在收到第一帧时按帧尺寸打开。视频先写入临时文件，close() 成功后才替换为
+    目标文件，中途失败不会留下半个视频。
+    """
+
+    def __init__(self, output_path: str, fps: int = 24, codec: str = "mp4v",
+                 thumbnail_path: Optional[str] = None, thumbnail_at: float = 1.0, thumbnail_width: int = 320):
+        self.output_path = output_path
+        self.fps = fps
+        self.codec = codec
+        self.thumbnail_path = thumbnail_path
+        self.thumbnail_index = int(thumbnail_at * fps)
+        self.thumbnail_width = thumbnail_width
+        root, ext = os.path.splitext(output_path)
+        # OpenCV按扩展名选择容器，临时文件保留原扩展名
+        self._partial_path = f"{root}.part{ext}"
+        self._writer = None
+        self._first_frame = None
+        self.frame_size = None  # (宽, 高)
+        self.frames = 0
+        self.thumbnail_written = False
+
+    def _open(self, frame):
+        if frame.ndim != 3 or frame.shape[2] != 3:
+            raise FrameAssemblyError(f"不支持的帧形状: {frame.shape}")
+        self.frame_size = (frame.shape[1], frame.shape[0])
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        fourcc = cv2.VideoWriter_fourcc(*self.codec)
+        self._writer = cv2.VideoWriter(self._partial_path, fourcc, float(self.fps), self.frame_size)
+        if not self._writer.isOpened():
+            self._writer = None
+            raise FrameAssemblyError(f"无法打开视频编码器: {self.codec}")
+
+    def _write_thumbnail(self, frame):
+        if not self.thumbnail_path:
+            return
+        height, width = frame.shape[:2]
+        if width > self.thumbnail_width:
+            size = (self.thumbnail_width, max(1, round(height * self.thumbnail_width / width)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        os.makedirs(os.path.dirname(os.path.abspath(self.thumbnail_path)), exist_ok=True)
+        if not cv2.imwrite(self.thumbnail_path, frame):
+            raise FrameAssemblyError(f"缩略图写入失败: {self.thumbnail_path}")
+        self.thumbnail_written = True
+        self._first_frame = None
+
+    def write(self, frame):
+        if self._writer is None:
+            self._open(frame)
+        elif (frame.shape[1], frame.shape[0]) != self.frame_size:
+            raise FrameAssemblyError(f"帧尺寸不一致: {frame.shape[1]}x{frame.shape[0]}")
+        if frame.dtype != np.uint8:
+            frame = frame.astype(np.uint8)
+        self._writer.write(frame)
+        if not self.thumbnail_written:
+            if self.frames >= self.thumbnail_index:
+                self._write_thumbnail(frame)
+            elif self._first_frame is None:
+                # 视频可能短于缩略图时间点，保留首帧作为兜底
+                self._first_frame = frame.copy()
+        self.frames += 1
+
+    def write_many(self, frames: Iterable):
+        for frame in frames:
+            self.write(frame)
+
+    def close(self) -> dict:
+        """结束编码并返回输出信息"""
+        if self._writer is None:
+            raise FrameAssemblyError("没有收到任何帧")
+        self._writer.release()
+        self._writer = None
+        if not self.thumbnail_written and self._first_frame is not None:
+            self._write_thumbnail(self._first_frame)
+        os.replace(self._partial_path, self.output_path)
+        return {
+            "video_path": self.output_path,
+            "thumbnail_path": self.thumbnail_path if self.thumbnail_written else None,
+            "frames": self.frames,
+            "fps": self.fps,
+            "duration": round(self.frames / self.fps, 3),
+            "width": self.frame_size[0],
+            "height": self.frame_size[1],
+            "file_size": os.path.getsize(self.output_path),
+        }
+
+    def abort(self):
+        """放弃输出，删除临时文件"""
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        self._first_frame = None
+        if os.path.exists(self._partial_path):
+            os.remove(self._partial_path)
+
+    def __enter__(self) -> "FrameAssembler":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+
+
+def assemble_video(frames: Iterable, output_path: str, **kwargs) -> dict:
+    """同步地把帧迭代器编码为视频文件"""
+    assembler = FrameAssembler(output_path, **kwargs)
+    with assembler:
+        assembler.write_many(frames)
+        return assembler.close()
+
+
+async def assemble_video_async(frames: AsyncIterable, output_path: str, batch_size: int = 8, **kwargs) -> dict:
+    """把异步帧流编码为视频文件
+
+    编码在线程中进行，同时继续从生成器接收下一批帧；最多同时持有两批帧，
+    生成快于编码时由等待上一批编码完成形成背压。
+    """
+    assembler = FrameAssembler(output_path, **kwargs)
+    pending: Optional[asyncio.Future] = None
+    batch: List = []
+    try:
+        async for frame in frames:
+            batch.append(frame)
+            if len(batch) >= batch_size:
+                if pending is not None:
+                    await pending
+                pending = asyncio.ensure_future(asyncio.to_thread(assembler.write_many, batch))
+                batch = []
+        if pending is not None:
+            await pending
+            pending = None
+        if batch:
+            await asyncio.to_thread(assembler.write_many, batch)
+        return await asyncio.to_thread(assembler.close)
+    except BaseException:
+        if pending is not None:
+            # 线程中的编码无法中断，等它结束后再清理
+            await asyncio.gather(pending, return_exceptions=True)
+        assembler.abort()
+        raise
+
+
+def synthetic_frames(count: int, width: int = 640, height: int = 360, seed: int = 0) -> Iterator:
+    """生成测试图案帧（渐变背景上移动的竖条），用于占位视频与基准测试"""
+    rng = np.random.default_rng(seed)
+    base = np.empty((height, width, 3), dtype=np.uint8)
+    base[:, :, 0] = np.linspace(0, 255, width, dtype=np.uint8)
+    base[:, :, 1] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+    base[:, :, 2] = rng.integers(0, 256)
+    bar = max(1, width // 40)
+    for i in range(count):
+        frame = base.copy()
+        x = (i * bar) % width
+        frame[:, x:x + bar] = 255
+        yield frame
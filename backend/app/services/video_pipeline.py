@@ -0,0 +1,587 @@
+"""视频生成流水线
+
+一个视频任务拆成按场景划分的子任务DAG：各场景互不依赖，在共享的场景worker池上并行渲染，
+全部完成后进入拼接阶段。单个场景失败只重试该场景；任务整体进度由各子任务进度
+按场景时长加权汇总。
+
+- ScenePipeline：纯粹的DAG执行器，不依赖数据库，便于基准测试
+- TaskWorkerPool：从任务调度器取任务，负责数据库状态、进度推送与结果落库
+
+开启预览的任务先渲染低分辨率、低帧率草稿并通过进度通道推送地址，再继续渲染成片；
+用户看到预览后取消任务会立即停止成片渲染。
+"""
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Set
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..core.tracing import current_span, tracer
+from ..models.character import CharacterImage
+from ..models.video import Video, VideoTask
+from .ai_service import ai_service
+from .eta_estimator import eta_estimator
+from .progress_buffer import progress_buffer
+from .reference_selection import reference_selector
+from .task_scheduler import ScheduledTask, task_scheduler
+from .video_assembler import assemble_video_async, synthetic_frames
+from .websocket_service import progress_tracker
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[float], Awaitable[None]]
+
+# 开启预览时预览阶段在任务总进度中的占比
+PREVIEW_PROGRESS_WEIGHT = 0.1
+
+
+class SceneRenderError(Exception):
+    """场景渲染失败"""
+
+
+class TaskCancelledError(Exception):
+    """任务已被取消（可能由其他进程标记）"""
+
+
+@dataclass
+class SceneJob:
+    index: int
+    start: float
+    end: float
+    description: str = ""
+    status: str = "pending"  # pending, running, completed, failed
+    progress: float = 0.0  # 0-1
+    attempts: int = 0
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return max(self.end - self.start, 0.0)
+
+
+@dataclass
+class GenerationContext:
+    """一次生成所需的参数"""
+    task_id: str
+    user_id: str
+    character_id: str
+    script: str
+    duration: int
+    style: str = "realistic"
+    quality: str = "standard"
+    preview: bool = False
+    extra: dict = field(default_factory=dict)
+
+
+class FakeSceneRenderer:
+    """本地假渲染器：按场景时长睡眠模拟远程生成，可注入失败率，用于开发与基准测试
+
+    指定 output_dir 时拼接阶段会把各场景的测试图案帧流式编码为真实的占位视频和缩略图。
+    """
+
+    def __init__(self, seconds_per_scene_second: float = 0.01, stitch_seconds_per_scene: float = 0.002,
+                 failure_rate: float = 0.0, steps: int = 10, seed: Optional[int] = None,
+                 output_dir: Optional[str] = None, fps: int = 24, frame_size: tuple = (640, 360),
+                 preview_fps: int = 8, preview_scale: float = 0.25, preview_cost_ratio: float = 0.1):
+        self.seconds_per_scene_second = seconds_per_scene_second
+        self.stitch_seconds_per_scene = stitch_seconds_per_scene
+        self.failure_rate = failure_rate
+        self.steps = steps
+        self.rng = random.Random(seed)
+        self.output_dir = output_dir
+        self.fps = fps
+        self.frame_size = frame_size
+        self.preview_fps = preview_fps
+        self.preview_frame_size = tuple(max(2, int(d * preview_scale) // 2 * 2) for d in frame_size)
+        self.preview_cost_ratio = preview_cost_ratio
+
+    async def render_scene(self, context: GenerationContext, scene: SceneJob, on_progress: ProgressCallback) -> dict:
+        step_seconds = scene.duration * self.seconds_per_scene_second / self.steps
+        fail_at = self.rng.randrange(self.steps) if self.rng.random() < self.failure_rate else None
+        for step in range(self.steps):
+            await asyncio.sleep(step_seconds)
+            if step == fail_at:
+                raise SceneRenderError(f"场景 {scene.index} 渲染失败（模拟）")
+            await on_progress((step + 1) / self.steps)
+        return {"scene": scene.index, "clip_url": f"generated/{context.task_id}/scene_{scene.index}.mp4"}
+
+    async def scene_frames(self, scenes: List[SceneJob], on_progress: ProgressCallback, fps: int, frame_size: tuple):
+        """按场景顺序逐帧产出测试图案，每个场景结束时报告进度"""
+        width, height = frame_size
+        for position, scene in enumerate(scenes):
+            for frame in synthetic_frames(round(scene.duration * fps), width, height, seed=scene.index):
+                yield frame
+            await on_progress((position + 1) / len(scenes))
+
+    def sample_frames(self, context: GenerationContext, scenes: List[SceneJob], fps: float) -> Iterator:
+        """按 fps 抽样各场景的成片帧，产出 (场景序号, 帧)，供一致性评分"""
+        width, height = self.frame_size
+        step = max(1, round(self.fps / fps))
+        for scene in scenes:
+            frames = synthetic_frames(round(scene.duration * self.fps), width, height, seed=scene.index)
+            for i, frame in enumerate(frames):
+                if i % step == 0:
+                    yield scene.index, frame
+
+    async def render_preview(self, context: GenerationContext, scenes: List[SceneJob],
+                             on_progress: ProgressCallback) -> dict:
+        duration = sum(scene.duration for scene in scenes)
+        step_seconds = duration * self.seconds_per_scene_second * self.preview_cost_ratio / self.steps
+        for step in range(self.steps):
+            await asyncio.sleep(step_seconds)
+            await on_progress((step + 1) / self.steps * (0.5 if self.output_dir else 1.0))
+        if self.output_dir is None:
+            return {"preview_url": f"generated/{context.task_id}/preview.mp4"}
+
+        async def on_encode_progress(value: float):
+            await on_progress(0.5 + value / 2)
+
+        output = await assemble_video_async(
+            self.scene_frames(scenes, on_encode_progress, self.preview_fps, self.preview_frame_size),
+            os.path.join(self.output_dir, context.task_id, "preview.mp4"),
+            fps=self.preview_fps,
+        )
+        return {"preview_url": output["video_path"], "width": output["width"], "height": output["height"]}
+
+    async def stitch(self, context: GenerationContext, scenes: List[SceneJob], on_progress: ProgressCallback) -> dict:
+        if self.output_dir is None:
+            await asyncio.sleep(self.stitch_seconds_per_scene * len(scenes))
+            await on_progress(1.0)
+            return {
+                "video_url": f"generated/{context.task_id}/video.mp4",
+                "thumbnail_url": f"generated/{context.task_id}/thumbnail.jpg",
+            }
+        task_dir = os.path.join(self.output_dir, context.task_id)
+        output = await assemble_video_async(
+            self.scene_frames(scenes, on_progress, self.fps, self.frame_size),
+            os.path.join(task_dir, "video.mp4"),
+            fps=self.fps,
+            thumbnail_path=os.path.join(task_dir, "thumbnail.jpg"),
+        )
+        return {
+            "video_url": output["video_path"],
+            "thumbnail_url": output["thumbnail_path"],
+            "frames": output["frames"],
+            "file_size": output["file_size"],
+        }
+
+
+class ScenePipeline:
+    """场景DAG执行器：场景并行渲染 → 拼接"""
+
+    def __init__(self, renderer, scene_workers: int, max_retries: int = 2, stitch_weight: float = 0.1):
+        self.renderer = renderer
+        # 所有任务共享同一组场景worker，不同任务的场景也能交错执行
+        self.scene_slots = asyncio.Semaphore(scene_workers)
+        self.max_retries = max_retries
+        self.stitch_weight = stitch_weight
+
+    @staticmethod
+    def build_scenes(script_result: dict, duration: int) -> List[SceneJob]:
+        """根据 generate_video_script 返回的分镜构建场景任务，按请求时长等比缩放"""
+        scenes = script_result.get("scenes") or [{"start": 0, "end": duration, "description": ""}]
+        script_duration = script_result.get("duration") or scenes[-1]["end"] or duration
+        scale = duration / script_duration if script_duration else 1.0
+        return [
+            SceneJob(index=i, start=scene["start"] * scale, end=scene["end"] * scale,
+                     description=scene.get("description", ""))
+            for i, scene in enumerate(scenes)
+        ]
+
+    def overall_progress(self, scenes: List[SceneJob], stitch_progress: float = 0.0) -> float:
+        """按场景时长加权汇总进度，拼接阶段占 stitch_weight"""
+        total = sum(scene.duration for scene in scenes) or len(scenes)
+        rendered = sum((scene.duration or 1) * scene.progress for scene in scenes) / total
+        return rendered * (1 - self.stitch_weight) + stitch_progress * self.stitch_weight
+
+    async def render_preview(self, context: GenerationContext, scenes: List[SceneJob],
+                             on_progress: Optional[ProgressCallback] = None) -> dict:
+        """渲染整段视频的低分辨率预览，占用一个场景worker"""
+
+        async def report(value: float):
+            if on_progress is not None:
+                await on_progress(value)
+
+        async with self.scene_slots:
+            return await self.renderer.render_preview(context, scenes, report)
+
+    async def _render_scene(self, context: GenerationContext, scene: SceneJob, report: Callable[[], Awaitable[None]]):
+        while True:
+            scene.attempts += 1
+            scene.status = "running"
+            scene.progress = 0.0
+
+            async def on_progress(value: float):
+                scene.progress = value
+                await report()
+
+            try:
+                async with self.scene_slots:
+                    scene.result = await self.renderer.render_scene(context, scene, on_progress)
+                scene.status, scene.progress = "completed", 1.0
+                await report()
+                return
+            except (asyncio.CancelledError, TaskCancelledError):
+                # 取消不是渲染失败，不重试
+                raise
+            except Exception as e:
+                scene.error = str(e)
+                if scene.attempts > self.max_retries:
+                    scene.status = "failed"
+                    raise
+                logger.warning("任务 %s 场景 %s 第%s次渲染失败，重试: %s",
+                               context.task_id, scene.index, scene.attempts, e)
+
+    async def run(self, context: GenerationContext, scenes: List[SceneJob],
+                  on_progress: Optional[Callable[[float], Awaitable[None]]] = None) -> dict:
+        """执行DAG，返回拼接结果；任一场景重试耗尽时抛出异常并取消其余场景"""
+
+        async def report(stitch_progress: float = 0.0):
+            if on_progress is not None:
+                await on_progress(self.overall_progress(scenes, stitch_progress))
+
+        jobs = [asyncio.create_task(self._render_scene(context, scene, report)) for scene in scenes]
+        try:
+            await asyncio.gather(*jobs)
+        except BaseException:
+            for job in jobs:
+                job.cancel()
+            await asyncio.gather(*jobs, return_exceptions=True)
+            raise
+
+        async def on_stitch_progress(value: float):
+            await report(value)
+
+        result = await self.renderer.stitch(context, scenes, on_stitch_progress)
+        result["scenes"] = [
+            {"index": s.index, "start": s.start, "end": s.end, "attempts": s.attempts} for s in scenes
+        ]
+        return result
+
+
+class CancellationStats:
+    """统计提前取消节省的计算量，单位为 时长 × 质量档位成本系数"""
+
+    def __init__(self):
+        # queued：开始执行前取消；rendering：渲染中取消；after_preview：看到预览后取消
+        self.cancelled = {"queued": 0, "rendering": 0, "after_preview": 0}
+        self.completed = 0
+        self.compute_spent = 0.0
+        self.compute_saved = 0.0
+
+    def record_cancel(self, stage: str, full_cost: float, fraction_done: float = 0.0, preview_cost: float = 0.0):
+        self.cancelled[stage] += 1
+        self.compute_spent += preview_cost + full_cost * fraction_done
+        self.compute_saved += full_cost * (1 - fraction_done)
+
+    def record_completed(self, full_cost: float, preview_cost: float = 0.0):
+        self.completed += 1
+        self.compute_spent += full_cost + preview_cost
+
+    def as_dict(self) -> dict:
+        total = self.compute_spent + self.compute_saved
+        return {
+            "cancelled": dict(self.cancelled),
+            "completed": self.completed,
+            "compute_spent": round(self.compute_spent, 2),
+            "compute_saved": round(self.compute_saved, 2),
+            "saved_ratio": round(self.compute_saved / total, 4) if total else 0.0,
+        }
+
+
+cancellation_stats = CancellationStats()
+
+
+class TaskWorkerPool:
+    """从任务调度器取任务并执行生成流水线"""
+
+    def __init__(self, scheduler, pipeline: ScenePipeline, workers: int, preview_cost_ratio: float = 0.1):
+        self.scheduler = scheduler
+        self.pipeline = pipeline
+        self.workers = workers
+        self.preview_cost_ratio = preview_cost_ratio
+        self._tasks: List[asyncio.Task] = []
+        # 本进程中正在执行的任务及收到取消请求的任务
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancel_requested: Set[str] = set()
+
+    @property
+    def running(self) -> int:
+        """本进程中正在执行的任务数"""
+        return len(self._running)
+
+    @staticmethod
+    def _update_task(task_id: str, expected_status: Optional[str] = None, **fields) -> bool:
+        """更新任务字段；指定 expected_status 时只在状态匹配时更新，返回是否更新成功"""
+        db = SessionLocal()
+        try:
+            query = db.query(VideoTask).filter(VideoTask.id == task_id)
+            if expected_status is not None:
+                query = query.filter(VideoTask.status == expected_status)
+            updated = query.update(fields, synchronize_session=False)
+            db.commit()
+            return updated > 0
+        finally:
+            db.close()
+
+    @staticmethod
+    def _load_context(task_id: str) -> Optional[GenerationContext]:
+        db = SessionLocal()
+        try:
+            task = db.query(VideoTask).filter(VideoTask.id == task_id).first()
+            if task is None or task.status != "pending":
+                return None
+            # 只把挑选出的少量高质量、差异大的参考图片交给生成器
+            reference_ids = reference_selector.select(db, str(task.character_id))
+            rows = {
+                image_id: (url, features) for image_id, url, features in db.query(
+                    CharacterImage.id, CharacterImage.image_url, CharacterImage.feature_vector
+                ).filter(CharacterImage.id.in_(reference_ids))
+            } if reference_ids else {}
+            references = [rows[i] for i in reference_ids if i in rows]
+            return GenerationContext(
+                task_id=str(task.id), user_id=str(task.user_id), character_id=str(task.character_id),
+                script=task.script, duration=task.duration or 30, style=task.style or "realistic",
+                quality=task.quality or "standard", preview=bool(task.preview),
+                extra={
+                    "reference_images": [url for url, _ in references],
+                    "reference_features": [features for _, features in references if features is not None],
+                },
+            )
+        finally:
+            db.close()
+
+    @staticmethod
+    def _save_result(context: GenerationContext, result: dict) -> str:
+        db = SessionLocal()
+        try:
+            video = Video(
+                title=context.script[:50] or "未命名视频",
+                script=context.script,
+                user_id=context.user_id,
+                character_id=context.character_id,
+                duration=context.duration,
+                style=context.style,
+                video_url=result.get("video_url"),
+                thumbnail_url=result.get("thumbnail_url"),
+                status="completed",
+                generation_settings={
+                    "quality": context.quality,
+                    "scenes": result.get("scenes", []),
+                    "consistency": result.get("consistency", {}),
+                },
+            )
+            db.add(video)
+            db.flush()
+            updated = db.query(VideoTask).filter(
+                VideoTask.id == context.task_id, VideoTask.status == "processing"
+            ).update({
+                "status": "completed", "progress": 100, "estimated_time": 0, "video_id": video.id,
+                "completed_at": datetime.utcnow(),
+            }, synchronize_session=False)
+            if not updated:
+                db.rollback()
+                raise TaskCancelledError(context.task_id)
+            db.commit()
+            return str(video.id)
+        finally:
+            db.close()
+
+    def task_cost(self, context: GenerationContext) -> float:
+        return self.scheduler.task_cost(
+            ScheduledTask(context.task_id, context.user_id, context.quality, context.duration)
+        )
+
+    async def execute(self, task_id: str, traceparent: Optional[str] = None, enqueued_at: Optional[float] = None):
+        """执行任务；traceparent 来自创建任务的请求，任务的 span 接在该请求的 trace 下"""
+        with tracer.span("video_task.execute", "consumer", parent=traceparent,
+                         attributes={"video_task.id": task_id}):
+            if enqueued_at is not None:
+                now = time.time_ns()
+                waited = max(0.0, self.scheduler.clock() - enqueued_at)
+                tracer.record_span("video_task.queued", now - int(waited * 1e9), now)
+            await self._execute(task_id)
+
+    async def _execute(self, task_id: str):
+        # 参考图片选择可能要为历史图片补算特征（读取并解码图片），不能在事件循环上执行
+        context = await asyncio.to_thread(self._load_context, task_id)
+        if context is None:
+            return
+        current_span().set_attributes({
+            "video_task.quality": context.quality,
+            "video_task.duration": context.duration,
+            "video_task.preview": context.preview,
+        })
+        eta_features = eta_estimator.run_features(
+            context.duration, context.quality, context.style, context.preview,
+            len(context.extra["reference_images"]), len(self._running), len(self.scheduler),
+        )
+        expected_run = eta_estimator.predict_run(context.duration, context.quality, eta_features)
+        # 只认领仍处于pending的任务，与取消请求竞争时以先写入者为准
+        if not await asyncio.to_thread(self._update_task, task_id, "pending", status="processing",
+                                       started_at=datetime.utcnow(), estimated_time=int(round(expected_run))):
+            return
+        eta_estimator.task_started(task_id)
+        started = time.monotonic()
+        preview_weight = PREVIEW_PROGRESS_WEIGHT if context.preview else 0.0
+        preview_done = False
+        rendered = 0.0
+        last_percent = -1
+
+        async def report(value: float):
+            nonlocal last_percent
+            percent = min(99, int(value * 100))
+            if percent == last_percent:
+                return
+            last_percent = percent
+            # 进度经写回缓冲批量落库；任务被其他请求或进程取消后，下一次刷写会发现状态
+            # 不再是processing，之后的上报即停止渲染
+            if progress_buffer.is_stopped(task_id):
+                raise TaskCancelledError(task_id)
+            remaining = eta_estimator.remaining(expected_run, time.monotonic() - started, value)
+            await progress_tracker.update_task_progress(task_id, context.user_id, percent, "processing",
+                                                        estimated_time=int(round(remaining)))
+
+        async def on_preview_progress(value: float):
+            await report(value * preview_weight)
+
+        async def on_render_progress(value: float):
+            nonlocal rendered
+            rendered = value
+            await report(preview_weight + (1 - preview_weight) * value)
+
+        try:
+            references = context.extra["reference_images"], context.extra["reference_features"]
+            await ai_service.enhance_character_consistency(context.character_id, *references)
+            script = await ai_service.generate_video_script(context.script, context.character_id)
+            scenes = self.pipeline.build_scenes(script, context.duration)
+            if context.preview:
+                with tracer.child_span("video_task.preview"):
+                    preview = await self.pipeline.render_preview(context, scenes, on_preview_progress)
+                preview_done = True
+                if not await asyncio.to_thread(self._update_task, task_id, "processing",
+                                               preview_url=preview["preview_url"]):
+                    raise TaskCancelledError(task_id)
+                await progress_tracker.publish_preview(task_id, context.user_id, preview)
+            with tracer.child_span("video_task.render", attributes={"video_task.scenes": len(scenes)}):
+                result = await self.pipeline.run(context, scenes, on_render_progress)
+            result["consistency"] = await self._score_consistency(context, scenes, references)
+            result["video_id"] = await asyncio.to_thread(self._save_result, context, result)
+            eta_estimator.observe_run(context.duration, context.quality, eta_features, time.monotonic() - started)
+            cancellation_stats.record_completed(
+                self.task_cost(context), self.task_cost(context) * self.preview_cost_ratio if preview_done else 0.0
+            )
+            await progress_tracker.complete_task(task_id, context.user_id, result)
+        except (asyncio.CancelledError, TaskCancelledError) as e:
+            if isinstance(e, asyncio.CancelledError) and task_id not in self._cancel_requested:
+                # 进程关闭：放回待执行状态，重启后由调度器恢复
+                await asyncio.to_thread(self._update_task, task_id, "processing", status="pending", progress=0)
+                raise
+            full_cost = self.task_cost(context)
+            cancellation_stats.record_cancel(
+                "after_preview" if preview_done else "rendering",
+                full_cost,
+                fraction_done=rendered,
+                preview_cost=full_cost * self.preview_cost_ratio if context.preview else 0.0,
+            )
+            logger.info("任务 %s 已取消，成片渲染完成 %.0f%%", task_id, rendered * 100)
+            await progress_tracker.cancel_task(task_id, context.user_id)
+        except Exception as e:
+            logger.error("任务 %s 生成失败: %s", task_id, e)
+            current_span().record_exception(e)
+            await asyncio.to_thread(self._update_task, task_id, "processing", status="failed", error_message=str(e),
+                                    completed_at=datetime.utcnow(), **progress_buffer.take(task_id))
+            await progress_tracker.fail_task(task_id, context.user_id, str(e))
+        finally:
+            # 终态已由上面的UPDATE写入，缓冲中剩余的进度不再需要刷写
+            progress_buffer.take(task_id)
+
+    async def _score_consistency(self, context: GenerationContext, scenes: List[SceneJob], references) -> dict:
+        """对成片抽样帧做角色一致性评分，漂移场景记录在结果中供重新渲染"""
+        sample_frames = getattr(self.pipeline.renderer, "sample_frames", None)
+        if sample_frames is None or not references[1]:
+            return {}
+        scored = await ai_service.enhance_character_consistency(
+            context.character_id, *references,
+            frames=sample_frames(context, scenes, settings.consistency_sample_fps),
+        )
+        if scored.get("drifting_scenes"):
+            logger.warning("任务 %s 场景 %s 角色一致性偏低", context.task_id, scored['drifting_scenes'])
+        return {key: scored.get(key) for key in ("consistency_score", "scene_scores", "drifting_scenes")}
+
+    def cancel(self, task_id: str) -> bool:
+        """取消本进程中正在执行的任务，任务不在本进程执行时返回 False"""
+        job = self._running.get(task_id)
+        if job is None or job.done():
+            return False
+        self._cancel_requested.add(task_id)
+        job.cancel()
+        return True
+
+    async def _worker(self):
+        while True:
+            scheduled = await self.scheduler.get()
+            # 每个任务在单独的asyncio任务中执行，取消单个任务不影响worker循环
+            job = asyncio.create_task(
+                self.execute(scheduled.task_id, scheduled.payload.get("traceparent"), scheduled.enqueued_at)
+            )
+            self._running[scheduled.task_id] = job
+            try:
+                await asyncio.wait({job})
+                if not job.cancelled() and job.exception() is not None:
+                    logger.error("任务worker异常: %s", job.exception())
+            except asyncio.CancelledError:
+                job.cancel()
+                await asyncio.gather(job, return_exceptions=True)
+                raise
+            finally:
+                self._running.pop(scheduled.task_id, None)
+                self._cancel_requested.discard(scheduled.task_id)
+
+    def start(self):
+        if self.pipeline.renderer is None:
+            if self.workers:
+                logger.warning("未配置场景渲染器（SCENE_RENDERER），本进程不执行生成任务，任务保持 pending")
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def _create_renderer():
+    """按 scene_renderer 配置创建场景渲染器，未接入真实渲染器时返回 None"""
+    if settings.scene_renderer == "fake":
+        return FakeSceneRenderer(
+            output_dir=settings.generated_dir if settings.render_placeholder_video else None,
+            fps=settings.video_fps,
+            frame_size=(settings.video_width, settings.video_height),
+            preview_fps=settings.preview_fps,
+            preview_scale=settings.preview_scale,
+            preview_cost_ratio=settings.preview_cost_ratio,
+        )
+    if settings.scene_renderer != "none":
+        raise ValueError(f"未知的场景渲染器: {settings.scene_renderer}")
+    return None
+
+
+def _create_worker_pool() -> TaskWorkerPool:
+    pipeline = ScenePipeline(
+        _create_renderer(),
+        scene_workers=settings.scene_workers,
+        max_retries=settings.scene_max_retries,
+    )
+    return TaskWorkerPool(task_scheduler, pipeline, workers=settings.task_workers,
+                          preview_cost_ratio=settings.preview_cost_ratio)
+
+
+task_worker_pool = _create_worker_pool()
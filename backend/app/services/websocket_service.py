@@ -1,11 +1,14 @@
 import asyncio
-import json
-import logging
 from typing import Dict, Set, Optional
 from fastapi import WebSocket, WebSocketDisconnect
 from datetime import datetime
 
-logger = logging.getLogger(__name__)
+from ..core.log_pipeline import get_logger
+from ..core.tracing import current_span, inject_context
+from . import ws_protocol
+from .progress_buffer import ProgressWriteBuffer, progress_buffer
+
+logger = get_logger(__name__)
 
 class ConnectionManager:
     def __init__(self):
@@ -13,10 +16,12 @@ class ConnectionManager:
         self.active_connections: Dict[str, Set[WebSocket]] = {}
         # 存储用户连接
         self.user_connections: Dict[str, WebSocket] = {}
+        # 每个连接协商出的消息编码
+        self.codecs: Dict[WebSocket, ws_protocol.Codec] = {}
         
     async def connect(self, websocket: WebSocket, user_id: str, connection_type: str = "general"):
         """建立WebSocket连接"""
-        await websocket.accept()
+        self.codecs[websocket] = await ws_protocol.accept(websocket)
         
         # 添加到活跃连接
         if connection_type not in self.active_connections:
@@ -26,13 +31,14 @@ class ConnectionManager:
         # 添加到用户连接
         self.user_connections[user_id] = websocket
         
-        logger.info(f"User {user_id} connected to {connection_type}")
+        logger.info("ws_connected", user_id=user_id, connection_type=connection_type)
         
         # 发送连接确认
         await self.send_personal_message({
             "type": "connection_established",
             "message": "WebSocket连接已建立",
-            "timestamp": datetime.utcnow().isoformat()
+            "protocol": self.codecs[websocket].name,
+            "timestamp": datetime.utcnow()
         }, websocket)
     
     def disconnect(self, websocket: WebSocket, user_id: str, connection_type: str = "general"):
@@ -42,36 +48,41 @@ class ConnectionManager:
         
         if user_id in self.user_connections:
             del self.user_connections[user_id]
+        self.codecs.pop(websocket, None)
         
-        logger.info(f"User {user_id} disconnected from {connection_type}")
+        logger.info("ws_disconnected", user_id=user_id, connection_type=connection_type)
     
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """发送个人消息"""
         try:
-            await websocket.send_text(json.dumps(message, ensure_ascii=False))
+            await ws_protocol.send(websocket, self.codecs.get(websocket, ws_protocol.json_codec), message)
         except Exception as e:
-            logger.error(f"Failed to send personal message: {e}")
+            logger.error("ws_send_failed", error=str(e))
     
     async def send_to_user(self, user_id: str, message: dict):
         """发送消息给特定用户"""
         if user_id in self.user_connections:
             websocket = self.user_connections[user_id]
-            await self.send_personal_message(message, websocket)
+            # 在追踪中发出的事件附带 traceparent，客户端上报问题时可据此查到对应的 trace
+            await self.send_personal_message(inject_context(message), websocket)
     
     async def broadcast_to_type(self, message: dict, connection_type: str):
         """广播消息给特定类型的连接"""
         if connection_type in self.active_connections:
             disconnected = set()
+            encoded = {}
             for websocket in self.active_connections[connection_type]:
+                codec = self.codecs.get(websocket, ws_protocol.json_codec)
                 try:
-                    await websocket.send_text(json.dumps(message, ensure_ascii=False))
+                    await ws_protocol.send(websocket, codec, ws_protocol.encode_once(codec, message, encoded))
                 except Exception as e:
-                    logger.error(f"Failed to broadcast message: {e}")
+                    logger.error("ws_broadcast_failed", connection_type=connection_type, error=str(e))
                     disconnected.add(websocket)
             
             # 清理断开的连接
             for websocket in disconnected:
                 self.active_connections[connection_type].discard(websocket)
+                self.codecs.pop(websocket, None)
     
     async def broadcast_to_all(self, message: dict):
         """广播消息给所有连接"""
@@ -79,16 +90,22 @@ class ConnectionManager:
             await self.broadcast_to_type(message, connection_type)
 
 class ProgressTracker:
-    def __init__(self, connection_manager: ConnectionManager):
+    def __init__(self, connection_manager: ConnectionManager, write_buffer: Optional[ProgressWriteBuffer] = None):
         self.connection_manager = connection_manager
         self.task_progress: Dict[str, dict] = {}
+        # 进度写库经缓冲合并后批量写回，见 progress_buffer
+        self.write_buffer = write_buffer
     
-    async def update_task_progress(self, task_id: str, user_id: str, progress: int, status: str, message: str = ""):
-        """更新任务进度"""
+    async def update_task_progress(self, task_id: str, user_id: str, progress: int, status: str, message: str = "",
+                                   estimated_time: Optional[int] = None):
+        """更新任务进度，estimated_time 为预计剩余秒数"""
+        if self.write_buffer is not None and status == "processing":
+            self.write_buffer.record(task_id, progress, estimated_time)
         self.task_progress[task_id] = {
             "progress": progress,
             "status": status,
             "message": message,
+            "estimated_time": estimated_time,
             "timestamp": datetime.utcnow().isoformat()
         }
         
@@ -99,12 +116,15 @@ class ProgressTracker:
             "progress": progress,
             "status": status,
             "message": message,
-            "timestamp": datetime.utcnow().isoformat()
+            "estimated_time": estimated_time,
+            "timestamp": datetime.utcnow()
         }
         
+        # 进度推送频繁，记为任务 span 上的事件而不是单独的 span
+        current_span().add_event("task_progress", progress=progress, estimated_time=estimated_time)
         await self.connection_manager.send_to_user(user_id, progress_message)
         
-        logger.info(f"Task {task_id} progress updated: {progress}% - {status}")
+        logger.info("task_progress", task_id=task_id, progress=progress, status=status)
     
     async def complete_task(self, task_id: str, user_id: str, result: dict):
         """完成任务"""
@@ -120,12 +140,13 @@ class ProgressTracker:
             "type": "task_completed",
             "task_id": task_id,
             "result": result,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
         
+        current_span().add_event("task_completed")
         await self.connection_manager.send_to_user(user_id, completion_message)
         
-        logger.info(f"Task {task_id} completed for user {user_id}")
+        logger.info("task_completed", task_id=task_id, user_id=user_id)
     
     async def fail_task(self, task_id: str, user_id: str, error: str):
         """任务失败"""
@@ -141,16 +162,52 @@ class ProgressTracker:
             "type": "task_failed",
             "task_id": task_id,
             "error": error,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
         
+        current_span().add_event("task_failed")
         await self.connection_manager.send_to_user(user_id, failure_message)
         
-        logger.error(f"Task {task_id} failed for user {user_id}: {error}")
+        logger.error("task_failed", task_id=task_id, user_id=user_id, error=error)
+
+    async def publish_preview(self, task_id: str, user_id: str, preview: dict):
+        """预览可用"""
+        self.task_progress.setdefault(task_id, {})["preview"] = preview
+
+        # 发送预览通知，客户端可据此决定是否取消成片渲染
+        preview_message = {
+            "type": "task_preview_ready",
+            "task_id": task_id,
+            "preview": preview,
+            "timestamp": datetime.utcnow()
+        }
+
+        current_span().add_event("task_preview_ready")
+        await self.connection_manager.send_to_user(user_id, preview_message)
+
+        logger.info("task_preview_ready", task_id=task_id, user_id=user_id)
+
+    async def cancel_task(self, task_id: str, user_id: str):
+        """任务已取消"""
+        self.task_progress[task_id] = {
+            "status": "cancelled",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+        cancel_message = {
+            "type": "task_cancelled",
+            "task_id": task_id,
+            "timestamp": datetime.utcnow()
+        }
+
+        current_span().add_event("task_cancelled")
+        await self.connection_manager.send_to_user(user_id, cancel_message)
+
+        logger.info("task_cancelled", task_id=task_id, user_id=user_id)
 
 # 创建全局实例
 connection_manager = ConnectionManager()
-progress_tracker = ProgressTracker(connection_manager)
+progress_tracker = ProgressTracker(connection_manager, progress_buffer)
 
 async def websocket_endpoint(websocket: WebSocket, user_id: str, connection_type: str = "general"):
     """WebSocket端点"""
@@ -158,31 +215,37 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str, connection_type
     
     try:
         while True:
-            # 接收消息
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            # 接收消息，无法解码的帧回复错误后继续接收
+            try:
+                message = await ws_protocol.receive(
+                    websocket, connection_manager.codecs.get(websocket, ws_protocol.json_codec)
+                )
+            except ws_protocol.ProtocolError as e:
+                logger.info("ws_protocol_error", user_id=user_id, error=str(e))
+                await connection_manager.send_personal_message({"type": "error", "message": str(e)}, websocket)
+                continue
             
             # 处理不同类型的消息
             if message.get("type") == "ping":
                 await connection_manager.send_personal_message({
                     "type": "pong",
-                    "timestamp": datetime.utcnow().isoformat()
+                    "timestamp": datetime.utcnow()
                 }, websocket)
             
             elif message.get("type") == "subscribe_task":
                 task_id = message.get("task_id")
                 if task_id:
                     # 订阅特定任务的进度更新
-                    logger.info(f"User {user_id} subscribed to task {task_id}")
+                    logger.info("ws_subscription", user_id=user_id, task_id=task_id, action="subscribe")
             
             elif message.get("type") == "unsubscribe_task":
                 task_id = message.get("task_id")
                 if task_id:
                     # 取消订阅
-                    logger.info(f"User {user_id} unsubscribed from task {task_id}")
+                    logger.info("ws_subscription", user_id=user_id, task_id=task_id, action="unsubscribe")
     
     except WebSocketDisconnect:
         connection_manager.disconnect(websocket, user_id, connection_type)
     except Exception as e:
-        logger.error(f"WebSocket error: {e}")
+        logger.error("ws_error", user_id=user_id, error=str(e))
         connection_manager.disconnect(websocket, user_id, connection_type) 
\ No newline at end of file
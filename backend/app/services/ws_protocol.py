@@ -0,0 +1,220 @@
+"""WebSocket消息编码协商
+
+连接时客户端通过 Sec-WebSocket-Protocol 子协议（或查询参数 protocol=msgpack|json）选择编码：
+
+- aivcl.json.v1 / 未指定：原有的JSON文本帧，时间戳为ISO字符串，兼容旧客户端
+- aivcl.msgpack.v1：二进制帧，首字节为标志位（0 原始，1 zlib压缩），其后是msgpack；
+  顶层字段名与消息类型替换为短代码，时间戳为毫秒整数。超过 ws_compress_threshold 字节的
+  消息（如带结果的 task_completed）整体压缩
+
+传输层的 permessage-deflate 由uvicorn与客户端协商，对两种编码都生效；应用层压缩只用于
+大消息，小的进度消息不压缩以节省CPU。服务端未安装msgpack时只提供JSON。
+
+客户端发来无法解码的帧（空帧、未知标志位、损坏的zlib或msgpack、不是对象的消息）时
+抛出 ProtocolError，连接端点回复 error 消息后继续接收。
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple, Union
+import json
+import zlib
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from ..core.config import settings
+from ..core.lazy import lazy_import
+
+try:
+    msgpack = lazy_import("msgpack")
+except ImportError:  # 可选依赖，未安装时只提供JSON
+    msgpack = None
+
+SUBPROTOCOL_JSON = "aivcl.json.v1"
+SUBPROTOCOL_MSGPACK = "aivcl.msgpack.v1"
+
+FIELD_CODES = {
+    "type": "t",
+    "task_id": "i",
+    "user_id": "u",
+    "progress": "p",
+    "status": "s",
+    "message": "m",
+    "timestamp": "ts",
+    "result": "r",
+    "error": "e",
+    "preview": "v",
+    "protocol": "pr",
+}
+TYPE_CODES = {
+    "task_progress_update": 1,
+    "task_completed": 2,
+    "task_failed": 3,
+    "task_preview_ready": 4,
+    "task_cancelled": 5,
+    "connection_established": 6,
+    "ping": 7,
+    "pong": 8,
+    "subscribe_task": 9,
+    "unsubscribe_task": 10,
+    "echo": 11,
+    "task_progress": 12,
+    "error": 13,
+}
+_FIELD_NAMES = {code: name for name, code in FIELD_CODES.items()}
+_TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+FLAG_RAW = 0
+FLAG_ZLIB = 1
+
+# 客户端消息解压后的最大字节数，防止压缩炸弹
+MAX_MESSAGE_SIZE = 1 << 20
+
+
+class ProtocolError(ValueError):
+    """客户端发送的帧无法解码"""
+
+
+def _as_message(value: Any) -> dict:
+    if not isinstance(value, dict):
+        raise ProtocolError("消息必须是对象")
+    return value
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+def _epoch_ms(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+class JsonCodec:
+    """原有JSON文本编码"""
+
+    name = "json"
+    binary = False
+
+    def encode(self, message: dict) -> str:
+        return json.dumps(message, ensure_ascii=False, default=_json_default)
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        try:
+            value = json.loads(data)
+        except (TypeError, ValueError) as e:
+            raise ProtocolError("无法解析JSON消息") from e
+        return _as_message(value)
+
+
+class MsgpackCodec:
+    """短字段代码 + 毫秒时间戳的msgpack二进制编码，大消息zlib压缩"""
+
+    name = "msgpack"
+    binary = True
+
+    def __init__(self, compress_threshold: int = 1024, compress_level: int = 1):
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    @staticmethod
+    def _default(value: Any):
+        if isinstance(value, datetime):
+            return _epoch_ms(value)
+        raise TypeError(f"无法序列化 {type(value).__name__}")
+
+    def encode(self, message: dict) -> bytes:
+        compact = {}
+        for key, value in message.items():
+            if key == "type":
+                value = TYPE_CODES.get(value, value)
+            elif isinstance(value, datetime):
+                value = _epoch_ms(value)
+            compact[FIELD_CODES.get(key, key)] = value
+        payload = msgpack.packb(compact, use_bin_type=True, default=self._default)
+        if len(payload) > self.compress_threshold:
+            return bytes((FLAG_ZLIB,)) + zlib.compress(payload, self.compress_level)
+        return bytes((FLAG_RAW,)) + payload
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        if not isinstance(data, bytes):
+            # 二进制客户端发送的文本帧按JSON处理
+            return json_codec.decode(data)
+        if not data:
+            raise ProtocolError("空帧")
+        flag, payload = data[0], data[1:]
+        if flag == FLAG_ZLIB:
+            decompressor = zlib.decompressobj()
+            try:
+                payload = decompressor.decompress(payload, MAX_MESSAGE_SIZE)
+            except zlib.error as e:
+                raise ProtocolError("zlib数据损坏") from e
+            if decompressor.unconsumed_tail:
+                raise ProtocolError("消息过大")
+        elif flag != FLAG_RAW:
+            raise ProtocolError(f"未知的标志位 {flag}")
+        try:
+            unpacked = msgpack.unpackb(payload, raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise ProtocolError("无法解析msgpack消息") from e
+        message = {}
+        for key, value in _as_message(unpacked).items():
+            key = _FIELD_NAMES.get(key, key)
+            if key == "type":
+                value = _TYPE_NAMES.get(value, value)
+            message[key] = value
+        return message
+
+
+Codec = Union[JsonCodec, MsgpackCodec]
+
+json_codec = JsonCodec()
+msgpack_codec = MsgpackCodec(settings.ws_compress_threshold, settings.ws_compress_level)
+
+
+def negotiate(websocket: WebSocket) -> Tuple[Codec, Optional[str]]:
+    """根据客户端提供的子协议或查询参数选择编码，返回 (编码器, 应答的子协议)"""
+    offered = websocket.scope.get("subprotocols") or []
+    wanted = websocket.query_params.get("protocol")
+    msgpack_ok = msgpack is not None and settings.ws_msgpack_enabled
+    if msgpack_ok and SUBPROTOCOL_MSGPACK in offered:
+        return msgpack_codec, SUBPROTOCOL_MSGPACK
+    if SUBPROTOCOL_JSON in offered:
+        return json_codec, SUBPROTOCOL_JSON
+    if msgpack_ok and wanted == "msgpack":
+        return msgpack_codec, None
+    return json_codec, None
+
+
+async def accept(websocket: WebSocket) -> Codec:
+    """协商编码并接受连接"""
+    codec, subprotocol = negotiate(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    return codec
+
+
+async def send(websocket: WebSocket, codec: Codec, message: Union[dict, str, bytes]):
+    """发送消息；传入已编码的 str/bytes 时直接发送（广播时每种编码只编码一次）"""
+    data = codec.encode(message) if isinstance(message, dict) else message
+    if isinstance(data, bytes):
+        await websocket.send_bytes(data)
+    else:
+        await websocket.send_text(data)
+
+
+async def receive(websocket: WebSocket, codec: Codec) -> dict:
+    """接收并解码一条消息，连接断开时抛出 WebSocketDisconnect，无法解码时抛出 ProtocolError"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    data = message.get("bytes")
+    return codec.decode(data if data is not None else message.get("text"))
+
+
+def encode_once(codec: Codec, message: dict, cache: Dict[str, Union[str, bytes]]) -> Union[str, bytes]:
+    """同一条消息发给多个连接时，每种编码只编码一次"""
+    encoded = cache.get(codec.name)
+    if encoded is None:
+        encoded = cache[codec.name] = codec.encode(message)
+    return encoded
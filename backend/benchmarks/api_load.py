@@ -0,0 +1,262 @@
+"""API与WebSocket层端到端负载基准
+
+在SQLite与进程内连接管理器上启动 create_application()，按场景驱动真实的请求组合，
+记录 RPS、p50/p95/p99、内存和SQL语句数，输出可用于回归比较的JSON基线。
+
+用法:
+    python -m benchmarks.api_load --profile quick --output baseline.json
+    python -m benchmarks.compare baseline.json current.json
+"""
+from typing import Awaitable, Callable, Dict, List
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from .common import LatencyRecorder, QueryCounter, bootstrap, peak_rss_mb, write_report
+
+PROFILES = {
+    "quick": {"users": 4, "logins": 20, "crud_cycles": 50, "uploads": 10, "files_per_upload": 5,
+              "tasks": 100, "websockets": 500, "ticks": 10, "concurrency": 10},
+    "full": {"users": 20, "logins": 200, "crud_cycles": 500, "uploads": 100, "files_per_upload": 20,
+             "tasks": 1000, "websockets": 5000, "ticks": 50, "concurrency": 50},
+}
+
+# 最小的合法PNG文件头，足以通过上传流程
+PNG_BYTES = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00"
+    b"\x1f\x15\xc4\x89\x00\x00\x00\rIDATx\x9cc\xf8\x0f\x00\x00\x01\x01\x00\x05\x18\xd8N\x00"
+    b"\x00\x00\x00IEND\xaeB`\x82"
+)
+
+
+async def run_concurrently(count: int, concurrency: int, recorder: LatencyRecorder,
+                           op: Callable[[int], Awaitable[bool]]):
+    """以固定并发度执行 count 次操作，op 返回是否成功"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = await op(i)
+            except Exception:
+                ok = False
+            recorder.add(time.perf_counter() - start, ok)
+
+    await asyncio.gather(*(one(i) for i in range(count)))
+    recorder.stop()
+
+
+class APILoadBenchmark:
+    """按场景驱动应用并收集指标"""
+
+    def __init__(self, app, engine, params: dict):
+        import httpx
+
+        self.app = app
+        self.params = params
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost")
+        self.queries = QueryCounter(engine)
+        self.users: List[dict] = []
+        self.results: Dict[str, dict] = {}
+
+    def _record(self, name: str, recorder: LatencyRecorder):
+        summary = recorder.summary()
+        queries = self.queries.take()
+        summary["db_queries"] = queries
+        summary["db_queries_per_request"] = round(queries / max(1, summary["requests"]), 2)
+        summary["peak_rss_mb"] = peak_rss_mb()
+        self.results[name] = summary
+
+    def _headers(self, i: int) -> dict:
+        return {"Authorization": f"Bearer {self.users[i % len(self.users)]['token']}"}
+
+    async def setup_users(self):
+        recorder = LatencyRecorder("register")
+
+        async def register(i: int) -> bool:
+            user = {"email": f"bench{i}@example.com", "username": f"bench{i}", "password": "benchmark-pass"}
+            response = await self.client.post("/api/v1/auth/register", json=user)
+            if response.status_code != 200:
+                return False
+            user["token"] = response.json()["access_token"]
+            self.users.append(user)
+            return True
+
+        await run_concurrently(self.params["users"], self.params["concurrency"], recorder, register)
+        self._record("register", recorder)
+        if not self.users:
+            raise RuntimeError("无法注册基准测试用户")
+
+    async def bench_login(self):
+        recorder = LatencyRecorder("login")
+
+        async def login(i: int) -> bool:
+            user = self.users[i % len(self.users)]
+            response = await self.client.post(
+                "/api/v1/auth/login", json={"email": user["email"], "password": user["password"]}
+            )
+            return response.status_code == 200
+
+        await run_concurrently(self.params["logins"], self.params["concurrency"], recorder, login)
+        self._record("login", recorder)
+
+    async def bench_character_crud(self):
+        recorder = LatencyRecorder("character_crud")
+
+        async def cycle(i: int) -> bool:
+            headers = self._headers(i)
+            created = await self.client.post(
+                "/api/v1/characters/", json={"name": f"角色{i}", "description": "benchmark"}, headers=headers
+            )
+            if created.status_code != 200:
+                return False
+            character_id = created.json()["id"]
+            steps = [
+                self.client.get(f"/api/v1/characters/{character_id}", headers=headers),
+                self.client.get("/api/v1/characters/", headers=headers),
+                self.client.put(f"/api/v1/characters/{character_id}", json={"description": "updated"}, headers=headers),
+                self.client.delete(f"/api/v1/characters/{character_id}", headers=headers),
+            ]
+            for step in steps:
+                if (await step).status_code != 200:
+                    return False
+            return True
+
+        await run_concurrently(self.params["crud_cycles"], self.params["concurrency"], recorder, cycle)
+        self._record("character_crud", recorder)
+
+    async def _create_character(self, i: int) -> str:
+        response = await self.client.post(
+            "/api/v1/characters/", json={"name": f"基准角色{i}"}, headers=self._headers(i)
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def bench_batch_upload(self):
+        character_ids = [await self._create_character(i) for i in range(len(self.users))]
+        self.queries.take()
+        recorder = LatencyRecorder("batch_upload")
+        files_per_upload = self.params["files_per_upload"]
+
+        async def upload(i: int) -> bool:
+            files = [("files", (f"ref{n}.png", PNG_BYTES, "image/png")) for n in range(files_per_upload)]
+            response = await self.client.post(
+                f"/api/v1/upload/character/{character_ids[i % len(character_ids)]}/images",
+                files=files, headers=self._headers(i),
+            )
+            return response.status_code == 200 and response.json()["total_failed"] == 0
+
+        await run_concurrently(self.params["uploads"], self.params["concurrency"], recorder, upload)
+        self._record("batch_upload", recorder)
+        self.results["batch_upload"]["files_per_request"] = files_per_upload
+
+    async def bench_task_create(self):
+        character_ids = [await self._create_character(i) for i in range(len(self.users))]
+        self.queries.take()
+        recorder = LatencyRecorder("task_create")
+
+        async def create(i: int) -> bool:
+            response = await self.client.post(
+                "/api/v1/videos/generate",
+                json={"character_id": character_ids[i % len(character_ids)], "script": f"脚本{i}",
+                      "duration": 30, "quality": "standard"},
+                headers=self._headers(i),
+            )
+            return response.status_code == 200
+
+        await run_concurrently(self.params["tasks"], self.params["concurrency"], recorder, create)
+        self._record("task_create", recorder)
+
+    async def bench_websocket_progress(self):
+        """建立大量进度连接，测量连接建立、进度扇出与ping往返延迟"""
+        from app.api.v1.websocket import manager
+        from app.core.security import create_access_token
+        from .asgi_ws import ASGIWebSocket
+
+        count = self.params["websockets"]
+        # 每个连接使用独立的用户ID，贴近真实的一人一连接场景
+        user_ids = [f"ws-user-{i}" for i in range(count)]
+        tokens = {uid: create_access_token({"sub": uid}) for uid in user_ids}
+        sockets = [ASGIWebSocket(self.app, f"/api/v1/ws/{uid}", f"token={tokens[uid]}") for uid in user_ids]
+
+        connect = LatencyRecorder("ws_connect")
+
+        async def open_socket(i: int) -> bool:
+            return await sockets[i].connect()
+
+        await run_concurrently(count, self.params["concurrency"] * 10, connect, open_socket)
+        self._record("ws_connect", connect)
+        self.results["ws_connect"]["open_connections"] = sum(len(v) for v in manager.active_connections.values())
+
+        fanout = LatencyRecorder("ws_progress_fanout")
+        for tick in range(self.params["ticks"]):
+            start = time.perf_counter()
+            message = '{"type": "task_progress_update", "task_id": "bench", "progress": %d}' % tick
+            await asyncio.gather(*(manager.send_personal_message(message, uid) for uid in user_ids))
+            received = await asyncio.gather(
+                *(ws.receive_text(timeout=10) for ws in sockets if ws.accepted), return_exceptions=True
+            )
+            ok = not any(isinstance(r, Exception) for r in received)
+            fanout.add(time.perf_counter() - start, ok)
+        fanout.stop()
+        self._record("ws_progress_fanout", fanout)
+        self.results["ws_progress_fanout"]["messages_per_s"] = round(
+            count * self.params["ticks"] / max(fanout.summary()["elapsed_s"], 1e-9), 1
+        )
+
+        ping = LatencyRecorder("ws_ping")
+
+        async def roundtrip(i: int) -> bool:
+            ws = sockets[i % count]
+            await ws.send_json({"type": "ping"})
+            return "pong" in await ws.receive_text(timeout=10)
+
+        await run_concurrently(min(count, 1000), self.params["concurrency"] * 10, ping, roundtrip)
+        self._record("ws_ping", ping)
+
+        await asyncio.gather(*(ws.close() for ws in sockets))
+
+    async def run(self, scenarios: List[str]) -> Dict[str, dict]:
+        await self.setup_users()
+        for name in scenarios:
+            await getattr(self, f"bench_{name}")()
+        await self.client.aclose()
+        self.queries.close()
+        return self.results
+
+
+SCENARIOS = ["login", "character_crud", "batch_upload", "task_create", "websocket_progress"]
+
+
+async def main_async(args) -> dict:
+    from app.core.database import engine
+    from app.main import create_application
+
+    # 基准测试只关心性能数据，屏蔽逐请求的INFO日志
+    logging.getLogger().setLevel(logging.WARNING)
+
+    app = create_application()
+    params = dict(PROFILES[args.profile])
+    async with app.router.lifespan_context(app):
+        results = await APILoadBenchmark(app, engine, params).run(args.scenarios)
+    return write_report(args.output, "api_load", results, {"profile": args.profile, **params})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API与WebSocket负载基准")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    parser.add_argument("--workdir", help="SQLite与上传文件所在目录，缺省使用临时目录")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap(args.workdir)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
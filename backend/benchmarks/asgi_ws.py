@@ -0,0 +1,83 @@
+"""进程内ASGI WebSocket客户端
+
+直接通过ASGI接口驱动应用，不占用真实端口和线程，单进程即可模拟数千个并发连接。
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+
+
+class ASGIWebSocket:
+    """一个连接到ASGI应用的WebSocket客户端"""
+
+    def __init__(self, app, path: str, query_string: str = "", headers: Optional[List[Tuple[bytes, bytes]]] = None):
+        self.app = app
+        self.scope: Dict[str, Any] = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "server": ("localhost", 80),
+            "client": ("127.0.0.1", 50000),
+            "root_path": "",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query_string.encode(),
+            "headers": [(b"host", b"localhost")] + (headers or []),
+            "subprotocols": [],
+        }
+        self._inbound: asyncio.Queue = asyncio.Queue()
+        self._outbound: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.accepted = False
+        self.closed = False
+        self.close_code: Optional[int] = None
+
+    async def _receive(self) -> dict:
+        return await self._inbound.get()
+
+    async def _send(self, message: dict):
+        await self._outbound.put(message)
+
+    async def connect(self, timeout: float = 10.0) -> bool:
+        """发起握手，返回服务端是否接受连接"""
+        self._task = asyncio.create_task(self.app(self.scope, self._receive, self._send))
+        await self._inbound.put({"type": "websocket.connect"})
+        message = await asyncio.wait_for(self._outbound.get(), timeout)
+        if message["type"] == "websocket.accept":
+            self.accepted = True
+            return True
+        self.closed = True
+        self.close_code = message.get("code")
+        return False
+
+    async def send_text(self, text: str):
+        await self._inbound.put({"type": "websocket.receive", "text": text})
+
+    async def send_json(self, data: dict):
+        await self.send_text(json.dumps(data))
+
+    async def receive(self, timeout: Optional[float] = None) -> dict:
+        """返回下一个 websocket.send 消息"""
+        while True:
+            message = await asyncio.wait_for(self._outbound.get(), timeout)
+            if message["type"] == "websocket.send":
+                return message
+            if message["type"] == "websocket.close":
+                self.closed = True
+                self.close_code = message.get("code")
+                raise ConnectionError(f"websocket closed: {self.close_code}")
+
+    async def receive_text(self, timeout: Optional[float] = None) -> str:
+        message = await self.receive(timeout)
+        return message.get("text") or message.get("bytes", b"").decode()
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        await self._inbound.put({"type": "websocket.disconnect", "code": code})
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, 5)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
@@ -0,0 +1,234 @@
+"""删除大角色的请求延迟基准
+
+为一个角色准备若干参考图片、视频任务与视频（均带磁盘文件），比较两种删除方式：
+- inline：旧方式的完整版本，在请求处理中同步删除所有文件与关联记录后删除角色
+- soft：DELETE /characters/{id} 只做软删除，后台分批清理
+
+删除进行时另有一个探测协程每隔 --probe-interval 秒请求一次角色列表，衡量删除对其他请求的影响
+（inline 在事件循环上执行文件与数据库操作，期间所有请求都要等待）。报告删除请求延迟、从请求到
+记录与文件全部清理完成的时间、探测请求的 p50/p99 延迟与事件循环最长停顿，以及清理后残留的记录与
+文件数。--remove-latency-ms 为每次删除文件附加的延迟，模拟网络文件系统或对象存储。
+
+用法:
+    python -m benchmarks.character_delete --images 100 1000 --tasks 200 --output delete.json
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from .common import LatencyRecorder, bootstrap, write_report
+
+PASSWORD = "benchmark-pass"
+
+
+def seed_character(user_id: str, images: int, tasks: int, file_kb: int, tag: str) -> tuple:
+    """批量写入角色及其关联记录与文件，返回 (角色ID, 文件路径列表)"""
+    from app.core.config import settings
+    from app.core.database import SessionLocal
+    from app.models.character import Character, CharacterImage
+    from app.models.video import Video, VideoTask
+
+    directory = os.path.join(settings.upload_dir, tag)
+    os.makedirs(directory, exist_ok=True)
+    payload = os.urandom(file_kb * 1024)
+    paths = []
+
+    def write(name: str) -> str:
+        path = os.path.join(directory, name)
+        with open(path, "wb") as f:
+            f.write(payload)
+        paths.append(path)
+        return path
+
+    db = SessionLocal()
+    try:
+        character = Character(name=tag, user_id=user_id)
+        db.add(character)
+        db.flush()
+        db.add_all([CharacterImage(character_id=character.id, image_url=write(f"img{i}.png"), mime_type="image/png")
+                    for i in range(images)])
+        videos = [Video(title=f"v{i}", script="s", user_id=user_id, character_id=character.id,
+                        video_url=write(f"video{i}.mp4"), thumbnail_url=write(f"thumb{i}.jpg"))
+                  for i in range(tasks)]
+        db.add_all(videos)
+        db.flush()
+        db.add_all([VideoTask(user_id=user_id, character_id=character.id, video_id=video.id, script="s",
+                              status="completed", preview_url=write(f"preview{i}.mp4"))
+                     for i, video in enumerate(videos)])
+        db.commit()
+        return character.id, paths
+    finally:
+        db.close()
+
+
+def inline_delete(character_id: str):
+    """在调用线程中同步删除角色的所有文件与记录"""
+    from app.core.database import SessionLocal
+    from app.models.character import Character, CharacterImage
+    from app.models.video import Video, VideoTask
+
+    db = SessionLocal()
+    try:
+        for image in db.query(CharacterImage).filter(CharacterImage.character_id == character_id).all():
+            if os.path.exists(image.image_url):
+                os.remove(image.image_url)
+            db.delete(image)
+        for task in db.query(VideoTask).filter(VideoTask.character_id == character_id).all():
+            if task.preview_url and os.path.exists(task.preview_url):
+                os.remove(task.preview_url)
+            db.delete(task)
+        db.flush()
+        for video in db.query(Video).filter(Video.character_id == character_id).all():
+            for path in (video.video_url, video.thumbnail_url):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            db.delete(video)
+        db.query(Character).filter(Character.id == character_id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def remaining(character_id: str, paths: list) -> dict:
+    from app.core.database import SessionLocal
+    from app.models.character import Character, CharacterImage
+    from app.models.video import Video, VideoTask
+
+    db = SessionLocal()
+    try:
+        rows = sum(
+            db.query(model).filter(column == character_id).count()
+            for model, column in ((Character, Character.id), (CharacterImage, CharacterImage.character_id),
+                                  (VideoTask, VideoTask.character_id), (Video, Video.character_id))
+        )
+    finally:
+        db.close()
+    return {"rows": rows, "files": sum(1 for path in paths if os.path.exists(path))}
+
+
+async def probe(client, headers: dict, interval: float, recorder: LatencyRecorder, stop: asyncio.Event,
+                stalls: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/api/v1/characters/", headers=headers)
+        recorder.add(time.perf_counter() - start, response.status_code == 200)
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        # 睡眠超出的时间即事件循环被占用的时间
+        stalls.append(time.perf_counter() - start - interval)
+
+
+def slow_down_removal(latency_ms: float):
+    """为 os.remove 附加固定延迟"""
+    remove = os.remove
+
+    def slow_remove(path, *args, **kwargs):
+        time.sleep(latency_ms / 1000)
+        return remove(path, *args, **kwargs)
+
+    os.remove = slow_remove
+
+
+async def run_case(client, headers: dict, user_id: str, mode: str, images: int, args) -> dict:
+    from app.services.character_reaper import character_reaper
+
+    character_id, paths = await asyncio.to_thread(
+        seed_character, user_id, images, args.tasks, args.file_kb, f"{mode}{images}")
+    recorder = LatencyRecorder("probe")
+    stop = asyncio.Event()
+    stalls = []
+    prober = asyncio.create_task(probe(client, headers, args.probe_interval, recorder, stop, stalls))
+    await asyncio.sleep(args.probe_interval * 5)
+
+    start = time.perf_counter()
+    if mode == "inline":
+        # 与旧接口一样在事件循环上同步执行
+        inline_delete(character_id)
+        status_code = 200
+    else:
+        response = await client.delete(f"/api/v1/characters/{character_id}", headers=headers)
+        status_code = response.status_code
+    request_ms = (time.perf_counter() - start) * 1000
+
+    deadline = time.perf_counter() + args.timeout
+    left = await asyncio.to_thread(remaining, character_id, paths)
+    while (left["rows"] or left["files"]) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+        left = await asyncio.to_thread(remaining, character_id, paths)
+    cleanup_s = time.perf_counter() - start
+
+    await asyncio.sleep(args.probe_interval * 5)
+    stop.set()
+    await prober
+    recorder.stop()
+    summary = recorder.summary()
+    return {
+        "status_code": status_code,
+        "delete_request_ms": round(request_ms, 3),
+        "cleanup_s": round(cleanup_s, 3),
+        "probe_p50_ms": summary.get("p50_ms"),
+        "probe_p99_ms": summary.get("p99_ms"),
+        "loop_stall_max_ms": round(max(stalls) * 1000, 3) if stalls else None,
+        "remaining_rows": left["rows"],
+        "remaining_files": left["files"],
+        "files": len(paths),
+        "reaper": character_reaper.stats() if mode == "soft" else None,
+    }
+
+
+async def main_async(args) -> dict:
+    import httpx
+
+    from app.core.config import settings
+    from app.core.database import SessionLocal
+    from app.main import create_application
+    from app.models.user import User
+
+    settings.rate_limit_enabled = False
+    settings.admission_enabled = False
+    app = create_application()
+    results = {}
+    async with app.router.lifespan_context(app):
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost")
+        response = await client.post("/api/v1/auth/register",
+                                     json={"email": "delete@example.com", "username": "delete", "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        db = SessionLocal()
+        user_id = db.query(User.id).filter(User.username == "delete").scalar()
+        db.close()
+        for images in args.images:
+            for mode in ("inline", "soft"):
+                results[f"{mode}@{images}img"] = await run_case(client, headers, user_id, mode, images, args)
+        await client.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="删除大角色的请求延迟基准")
+    parser.add_argument("--images", type=int, nargs="+", default=[100, 2000], help="角色的参考图片数")
+    parser.add_argument("--tasks", type=int, default=500, help="角色的任务数（每个任务对应一个视频）")
+    parser.add_argument("--remove-latency-ms", type=float, default=1.0, help="每次删除文件附加的延迟")
+    parser.add_argument("--file-kb", type=int, default=64)
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=120.0, help="等待清理完成的最长时间（秒）")
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap()
+    if args.remove_latency_ms:
+        slow_down_removal(args.remove_latency_ms)
+    from app.core.database import engine
+    from app.core.migrate import migrate
+
+    logging.getLogger().setLevel(logging.WARNING)
+    engine.echo = False
+    migrate()
+    results = asyncio.run(main_async(args))
+    write_report(args.output, "character_delete", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
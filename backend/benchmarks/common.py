@@ -0,0 +1,165 @@
+"""基准测试公共工具：环境引导、延迟统计、内存与SQL计数、报告读写"""
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bootstrap(workdir: Optional[str] = None, **env: str) -> str:
+    """在导入app之前准备隔离的运行环境
+
+    settings 与 engine 在模块导入时即创建，因此必须先设置环境变量再导入 app。
+    上传目录是相对路径，这里切换到临时工作目录避免污染仓库。
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="aivcl-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    defaults = {
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "DEBUG": "false",
+        "ENVIRONMENT": "benchmark",
+        "SECRET_KEY": "benchmark-secret-key",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        # 吞吐基准需要打满接口，限流与准入控制由专门的公平性基准覆盖
+        "RATE_LIMIT_ENABLED": "false",
+        "ADMISSION_ENABLED": "false",
+        # 不在API进程内执行生成任务，避免后台任务干扰接口测量
+        "TASK_WORKERS": "0",
+        # 开启worker的基准使用本地假渲染器
+        "SCENE_RENDERER": "fake",
+    }
+    defaults.update(env)
+    os.environ.update(defaults)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+    return workdir
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """最近秩法计算百分位数"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class LatencyRecorder:
+    """记录单个场景的请求延迟、错误与吞吐"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.samples: List[float] = []
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    @contextmanager
+    def measure(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+    def add(self, seconds: float, ok: bool = True):
+        self.samples.append(seconds)
+        if not ok:
+            self.errors += 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def summary(self) -> Dict[str, float]:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        count = len(self.samples)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 4),
+            "rps": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+            "p50_ms": round(percentile(self.samples, 50) * 1000, 3),
+            "p95_ms": round(percentile(self.samples, 95) * 1000, 3),
+            "p99_ms": round(percentile(self.samples, 99) * 1000, 3),
+        }
+
+
+class QueryCounter:
+    """基于SQLAlchemy事件统计执行的SQL语句数"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self._engine = engine
+        self._event = event
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def take(self) -> int:
+        """返回并清零当前计数"""
+        value, self.count = self.count, 0
+        return value
+
+    def close(self):
+        self._event.remove(self._engine, "before_cursor_execute", self._on_execute)
+
+
+def peak_rss_mb() -> float:
+    """进程峰值常驻内存（MB）"""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    if sys.platform == "darwin":
+        return round(usage / 1024 / 1024, 2)
+    return round(usage / 1024, 2)
+
+
+@contextmanager
+def traced_memory() -> Iterator[Dict[str, float]]:
+    """统计代码块内Python分配的峰值内存（MB）"""
+    result: Dict[str, float] = {}
+    tracemalloc.start()
+    try:
+        yield result
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["python_peak_mb"] = round(peak / 1024 / 1024, 3)
+
+
+def write_report(path: Optional[str], suite: str, results: Dict[str, dict], params: Optional[dict] = None) -> dict:
+    """写出JSON报告，path 为空时打印到标准输出"""
+    report = {
+        "suite": suite,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params or {},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return report
+
+
+def load_report(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,81 @@
+"""比较两份基准报告，检测性能回归
+
+用法:
+    python -m benchmarks.compare baseline.json current.json --threshold 0.10
+
+延迟、内存、SQL语句数越高越差，吞吐越低越差；任一指标超出阈值时以非零状态退出。
+"""
+from typing import List, Tuple
+import argparse
+import sys
+
+from .common import load_report
+
+# 指标名后缀 -> 方向（1 表示越大越差，-1 表示越小越差）
+METRIC_DIRECTIONS = {
+    "_ms": 1,
+    "_mb": 1,
+    "db_queries_per_request": 1,
+    "errors": 1,
+    "rps": -1,
+    "_per_s": -1,
+}
+
+
+def metric_direction(name: str) -> int:
+    for suffix, direction in METRIC_DIRECTIONS.items():
+        if name.endswith(suffix):
+            return direction
+    return 0
+
+
+def compare_reports(baseline: dict, current: dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """返回 (回归列表, 所有比较行)"""
+    regressions: List[str] = []
+    lines: List[str] = []
+    for scenario, base_metrics in baseline.get("results", {}).items():
+        cur_metrics = current.get("results", {}).get(scenario)
+        if cur_metrics is None:
+            regressions.append(f"{scenario}: 当前报告缺少该场景")
+            continue
+        for metric, base_value in base_metrics.items():
+            direction = metric_direction(metric)
+            cur_value = cur_metrics.get(metric)
+            if not direction or not isinstance(base_value, (int, float)) or not isinstance(cur_value, (int, float)):
+                continue
+            if base_value == 0:
+                change = 0.0 if cur_value == 0 else float("inf")
+            else:
+                change = (cur_value - base_value) / abs(base_value)
+            line = f"{scenario}.{metric}: {base_value} -> {cur_value} ({change:+.1%})"
+            lines.append(line)
+            if change * direction > threshold:
+                regressions.append(line)
+    return regressions, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较基准报告并检测回归")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="允许的相对退化比例")
+    args = parser.parse_args()
+
+    baseline, current = load_report(args.baseline), load_report(args.current)
+    if baseline.get("suite") != current.get("suite"):
+        print(f"报告类型不一致: {baseline.get('suite')} != {current.get('suite')}")
+        sys.exit(2)
+
+    regressions, lines = compare_reports(baseline, current, args.threshold)
+    for line in lines:
+        print(line)
+    if regressions:
+        print(f"\n发现 {len(regressions)} 项超过 {args.threshold:.0%} 的回归:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\n未发现回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""角色一致性评分基准
+
+- score_<时长>s：长视频按抽样帧率端到端评分（合成帧 -> 特征提取 -> 分块相似度），
+  报告每秒评分帧数与峰值内存
+- matrix_<帧数>_<模式>：只测相似度阶段，随机特征向量下分块（chunked）与一次性整矩阵
+  （full）的每秒帧数和内存；loop 为逐帧Python点积的参照，仅对较小帧数运行
+
+每个用例在独立子进程中运行，峰值常驻内存互不影响。
+
+用法:
+    python -m benchmarks.consistency_scoring --durations 600 1800 3600 --output consistency.json
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from .common import bootstrap, peak_rss_mb, traced_memory, write_report
+
+
+def reference_matrix(count: int, width: int, height: int):
+    import numpy as np
+    from app.services.consistency import frame_features
+    from app.services.video_assembler import synthetic_frames
+
+    return np.stack([frame_features(next(synthetic_frames(1, width, height, seed=1000 + i))) for i in range(count)])
+
+
+def run_scoring(duration: int, args_dict: dict, workdir: str) -> dict:
+    bootstrap(workdir)
+    from app.services.consistency import ConsistencyScorer
+    from app.services.video_assembler import synthetic_frames
+
+    references = reference_matrix(args_dict["references"], args_dict["width"], args_dict["height"])
+    scene_seconds = args_dict["scene_seconds"]
+    per_scene = max(1, round(scene_seconds * args_dict["sample_fps"]))
+
+    def frames():
+        for scene in range(max(1, duration // scene_seconds)):
+            for frame in synthetic_frames(per_scene, args_dict["width"], args_dict["height"], seed=scene):
+                yield scene, frame
+
+    scorer = ConsistencyScorer(chunk_size=args_dict["chunk_size"])
+    baseline_rss = peak_rss_mb()
+    start = time.perf_counter()
+    result = scorer.score(references, frames())
+    elapsed = time.perf_counter() - start
+    return {
+        "frames": result["frames_scored"],
+        "scenes": len(result["scene_scores"]),
+        "elapsed_s": round(elapsed, 3),
+        "frames_per_s": round(result["frames_scored"] / elapsed, 1),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": round(peak_rss_mb() - baseline_rss, 2),
+    }
+
+
+def run_matrix(frames: int, mode: str, args_dict: dict, workdir: str) -> dict:
+    bootstrap(workdir)
+    import numpy as np
+    from app.services.consistency import ConsistencyScorer, normalize_rows
+
+    rng = np.random.default_rng(0)
+    dim, per_scene = 96, 48
+    references = rng.normal(size=(args_dict["references"], dim)).astype(np.float32)
+    chunk = rng.normal(size=(4096, dim)).astype(np.float32)
+
+    def features():
+        # 循环复用同一块随机向量，避免输入本身占用与帧数成正比的内存
+        for i in range(frames):
+            yield i // per_scene, chunk[i % len(chunk)]
+
+    baseline_rss = peak_rss_mb()
+    with traced_memory() as memory:
+        start = time.perf_counter()
+        if mode == "loop":
+            refs = normalize_rows(references)
+            sums = {}
+            for scene, vector in features():
+                vector = vector / np.linalg.norm(vector)
+                sums[scene] = sums.get(scene, 0.0) + max(float(vector @ ref) for ref in refs)
+        else:
+            chunk_size = args_dict["chunk_size"] if mode == "chunked" else frames
+            ConsistencyScorer(chunk_size=chunk_size).score_features(references, features())
+        elapsed = time.perf_counter() - start
+    return {
+        "frames": frames,
+        "elapsed_s": round(elapsed, 3),
+        "frames_per_s": round(frames / elapsed, 1),
+        "python_peak_mb": memory["python_peak_mb"],
+        "rss_growth_mb": round(peak_rss_mb() - baseline_rss, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="角色一致性评分基准")
+    parser.add_argument("--durations", type=int, nargs="+", default=[600, 1800, 3600], help="视频时长（秒）")
+    parser.add_argument("--sample-fps", type=float, default=2.0)
+    parser.add_argument("--scene-seconds", type=int, default=10)
+    parser.add_argument("--references", type=int, default=8)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--matrix-frames", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--loop-max", type=int, default=100_000, help="逐帧Python点积参照只在不超过该帧数时运行")
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    workdir = tempfile.mkdtemp(prefix="aivcl-consistency-")
+    args_dict = vars(args)
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+
+    def isolated(fn, *fn_args):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            return pool.submit(fn, *fn_args, args_dict, workdir).result()
+
+    for duration in args.durations:
+        results[f"score_{duration}s"] = isolated(run_scoring, duration)
+    for frames in args.matrix_frames:
+        for mode in ("chunked", "full", "loop"):
+            if mode == "loop" and frames > args.loop_max:
+                continue
+            results[f"matrix_{frames}_{mode}"] = isolated(run_matrix, frames, mode)
+    write_report(args.output, "consistency_scoring", results, args_dict)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""完成时间预估离线重放基准
+
+在虚拟时钟上用真实的 TaskScheduler 仿真固定数量的worker执行合成任务流，按时间顺序重放
+创建、开始、完成事件：创建时各预估方法给出总耗时（排队 + 执行），开始与完成时用实际值在线更新。
+合成任务的真实执行耗时 = 成本 × 每单位秒数 × 风格系数 × 参考图片数与预览的开销 × 并发争用 ×
+对数正态噪声；到达率按正弦起伏，队列周期性积压与排空；--drift-at 之后渲染器整体提速为
+--drift 倍，检验模型能否跟上变化。
+
+创建时的预估方法：
+- global_mean：已完成任务的平均总耗时
+- cost_rate：按已完成任务的平均 秒数/成本 估计执行时间，排队时间为每个worker分摊的排队成本 × 同一速率
+- model_no_queue：EtaEstimator 去掉排队深度与并发特征
+- model：EtaEstimator
+
+执行中按进度 25%/50%/75% 评估剩余时间：prior（开始时的模型预计减去已用时间）、extrapolate
+（按已用时间线性外推）与 blend（EtaEstimator.remaining）。任务的真实进度曲线为 (t/执行耗时)^γ，
+γ 随任务不同。报告跳过前 --warmup 个任务后的 MAE、MAPE、绝对百分比误差 p50/p90 与平均偏差，
+以及模型每次预估与每次更新的耗时。
+
+用法:
+    python -m benchmarks.eta_replay --tasks 5000 --workers 4 --output eta.json
+"""
+from typing import Dict, List
+import argparse
+import heapq
+import math
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from .common import BACKEND_DIR, percentile, write_report
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+STYLE_FACTORS = {"realistic": 1.0, "anime": 0.8, "cartoon": 0.7, "cinematic": 1.3, "watercolor": 1.1}
+QUALITY_MIX = [("standard", 0.6), ("high", 0.3), ("ultra", 0.1)]
+DURATIONS = [15, 30, 30, 60, 90, 120]
+PROGRESS_POINTS = (0.25, 0.5, 0.75)
+
+
+def true_run_seconds(task, running: int, drifted: bool, args, costs: Dict[str, float]) -> float:
+    """合成任务的真实执行耗时"""
+    seconds = task.duration * costs.get(task.quality, 1.0) * args.seconds_per_unit
+    seconds *= STYLE_FACTORS[task.style] * (1 + 0.06 * min(task.references, 8))
+    seconds *= (1.1 if task.preview else 1.0) * (task.duration / 30) ** 0.15
+    seconds *= 1 + args.contention * (running - 1)
+    if drifted:
+        seconds *= args.drift
+    return seconds * task.noise
+
+
+def workload(args, costs: Dict[str, float], rng: random.Random) -> List[SimpleNamespace]:
+    tasks = []
+    for i in range(args.tasks):
+        quality = rng.choices([q for q, _ in QUALITY_MIX], weights=[w for _, w in QUALITY_MIX])[0]
+        tasks.append(SimpleNamespace(
+            id=str(i), user_id=f"user{int(rng.paretovariate(1.2)) % args.users}", quality=quality,
+            duration=rng.choice(DURATIONS), style=rng.choice(list(STYLE_FACTORS)),
+            preview=rng.random() < args.preview_ratio, references=rng.randint(0, 12),
+            noise=math.exp(rng.gauss(0, args.noise)), gamma=rng.uniform(0.8, 1.25),
+        ))
+    # 按满并发下的平均执行耗时折算到达率，使平均利用率为 --utilization
+    mean_run = sum(true_run_seconds(t, args.workers, False, args, costs) for t in tasks) / len(tasks)
+    base_rate = args.utilization * args.workers / mean_run
+    now = 0.0
+    for task in tasks:
+        rate = base_rate * (1 + args.burst * math.sin(2 * math.pi * now / args.burst_period))
+        now += rng.expovariate(max(rate, base_rate * 0.05))
+        task.arrival = now
+    return tasks
+
+
+class GlobalMean:
+    def __init__(self, prior: float):
+        self.total = 0.0
+        self.count = 0
+        self.prior = prior
+
+    def predict(self, task, scheduler, running) -> float:
+        return self.total / self.count if self.count else self.prior
+
+    def start(self, task, scheduler, running):
+        pass
+
+    def complete(self, task, run_seconds: float):
+        self.total += task.completed - task.arrival
+        self.count += 1
+
+
+class CostRate:
+    def __init__(self, costs: Dict[str, float], workers: int, prior_rate: float):
+        self.costs = costs
+        self.workers = workers
+        self.seconds = 0.0
+        self.units = 0.0
+        self.prior_rate = prior_rate
+
+    def rate(self) -> float:
+        return self.seconds / self.units if self.units else self.prior_rate
+
+    def predict(self, task, scheduler, running) -> float:
+        cost = task.duration * self.costs.get(task.quality, 1.0)
+        return self.rate() * (cost + scheduler.queued_cost / self.workers)
+
+    def start(self, task, scheduler, running):
+        pass
+
+    def complete(self, task, run_seconds: float):
+        self.seconds += run_seconds
+        self.units += task.duration * self.costs.get(task.quality, 1.0)
+
+
+class Model:
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.features = {}
+        self.expected = {}
+        self.predict_s = 0.0
+        self.update_s = 0.0
+        self.predictions = 0
+        self.updates = 0
+
+    def predict(self, task, scheduler, running) -> float:
+        start = time.perf_counter()
+        estimate = self.estimator.estimate_new_task(task, scheduler, running, task.references)
+        self.predict_s += time.perf_counter() - start
+        self.predictions += 1
+        return estimate
+
+    def start(self, task, scheduler, running):
+        x = self.estimator.run_features(task.duration, task.quality, task.style, task.preview,
+                                        task.references, running, len(scheduler))
+        self.features[task.id] = x
+        self.expected[task.id] = self.estimator.predict_run(task.duration, task.quality, x)
+        start = time.perf_counter()
+        self.estimator.task_started(task.id)
+        self.update_s += time.perf_counter() - start
+
+    def complete(self, task, run_seconds: float):
+        start = time.perf_counter()
+        self.estimator.observe_run(task.duration, task.quality, self.features.pop(task.id), run_seconds)
+        self.update_s += time.perf_counter() - start
+        self.updates += 1
+
+
+def simulate(args, tasks: List[SimpleNamespace], predictors: dict, clock: list, scheduler, costs) -> Dict[str, list]:
+    from app.services.task_scheduler import ScheduledTask
+
+    predictions = {name: {} for name in predictors}
+    completions: List[tuple] = []
+    running = 0
+    drift_index = int(len(tasks) * args.drift_at)
+    i = 0
+    while i < len(tasks) or len(scheduler) or completions:
+        next_arrival = tasks[i].arrival if i < len(tasks) else float("inf")
+        now = min(next_arrival, completions[0][0] if completions else float("inf"))
+        clock[0] = now
+        while completions and completions[0][0] <= now:
+            _, index = heapq.heappop(completions)
+            task = tasks[index]
+            running -= 1
+            for predictor in predictors.values():
+                predictor.complete(task, task.run)
+        while i < len(tasks) and tasks[i].arrival <= now:
+            task = tasks[i]
+            for name, predictor in predictors.items():
+                predictions[name][i] = predictor.predict(task, scheduler, running)
+            scheduler.submit(ScheduledTask(task.id, task.user_id, task.quality, task.duration, enqueued_at=now))
+            i += 1
+        while running < args.workers and len(scheduler):
+            task = tasks[int(scheduler.next_task(now).task_id)]
+            running += 1
+            task.started = now
+            task.run = true_run_seconds(task, running, int(task.id) >= drift_index, args, costs)
+            task.completed = now + task.run
+            for predictor in predictors.values():
+                predictor.start(task, scheduler, running)
+            heapq.heappush(completions, (task.completed, int(task.id)))
+    return predictions
+
+
+def error_summary(predicted: List[float], actual: List[float]) -> dict:
+    abs_errors = [abs(p - a) for p, a in zip(predicted, actual)]
+    pct = [abs(p - a) / a for p, a in zip(predicted, actual) if a > 0]
+    signed = [(p - a) / a for p, a in zip(predicted, actual) if a > 0]
+    return {
+        "count": len(actual),
+        "mae_s": round(sum(abs_errors) / len(abs_errors), 2),
+        "mape": round(sum(pct) / len(pct), 4),
+        "ape_p50": round(percentile(pct, 50), 4),
+        "ape_p90": round(percentile(pct, 90), 4),
+        "bias": round(sum(signed) / len(signed), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="完成时间预估离线重放")
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--utilization", type=float, default=0.85, help="满并发下的平均利用率")
+    parser.add_argument("--burst", type=float, default=0.5, help="到达率正弦起伏的幅度")
+    parser.add_argument("--burst-period", type=float, default=4 * 3600.0)
+    parser.add_argument("--seconds-per-unit", type=float, default=0.5, help="真实的每单位成本执行秒数")
+    parser.add_argument("--contention", type=float, default=0.1, help="每多一个并发任务执行耗时增加的比例")
+    parser.add_argument("--preview-ratio", type=float, default=0.3)
+    parser.add_argument("--noise", type=float, default=0.15, help="执行耗时对数正态噪声的标准差")
+    parser.add_argument("--drift", type=float, default=0.7, help="渲染器变化后的执行耗时倍数")
+    parser.add_argument("--drift-at", type=float, default=0.6, help="从该比例的任务开始发生变化")
+    parser.add_argument("--warmup", type=int, default=200, help="不计入误差的前若干个任务")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    from app.services.eta_estimator import EtaEstimator
+    from app.services.task_scheduler import TaskScheduler
+
+    costs = settings.scheduler_tier_costs
+    tasks = workload(args, costs, random.Random(args.seed))
+    clock = [0.0]
+
+    def estimator(queue_features: bool) -> EtaEstimator:
+        return EtaEstimator(
+            tier_costs=costs, workers=args.workers, reference_k=settings.reference_select_k,
+            prior_seconds_per_cost=settings.eta_prior_seconds_per_cost, forgetting=settings.eta_forgetting,
+            quantile=settings.eta_quantile, quantile_step=settings.eta_quantile_step,
+            queue_features=queue_features, clock=lambda: clock[0],
+        )
+
+    predictors = {
+        "global_mean": GlobalMean(prior=60.0),
+        "cost_rate": CostRate(costs, args.workers, settings.eta_prior_seconds_per_cost),
+        "model_no_queue": Model(estimator(False)),
+        "model": Model(estimator(True)),
+    }
+    scheduler = TaskScheduler(
+        tier_weights=settings.scheduler_tier_weights,
+        tier_costs=costs,
+        user_quantum=settings.scheduler_user_quantum,
+        aging_seconds=settings.scheduler_aging_seconds,
+        clock=lambda: clock[0],
+    )
+    predictions = simulate(args, tasks, predictors, clock, scheduler, costs)
+
+    evaluated = range(args.warmup, len(tasks))
+    actual_total = [tasks[i].completed - tasks[i].arrival for i in evaluated]
+    waits = [tasks[i].started - tasks[i].arrival for i in evaluated]
+    results = {}
+    for name, predicted in predictions.items():
+        results[f"create:{name}"] = error_summary([predicted[i] for i in evaluated], actual_total)
+    drift_index = int(len(tasks) * args.drift_at)
+    for name in ("cost_rate", "model"):
+        after = range(drift_index + args.warmup, len(tasks))
+        results[f"create_after_drift:{name}"] = error_summary(
+            [predictions[name][i] for i in after], [tasks[i].completed - tasks[i].arrival for i in after])
+
+    model = predictors["model"]
+    for point in PROGRESS_POINTS:
+        predicted = {"prior": [], "extrapolate": [], "blend": []}
+        actual = []
+        for i in evaluated:
+            task = tasks[i]
+            elapsed = task.run * point ** (1 / task.gamma)
+            expected = model.expected[task.id]
+            actual.append(task.run - elapsed)
+            predicted["prior"].append(max(0.0, expected - elapsed))
+            predicted["extrapolate"].append(elapsed * (1 - point) / point)
+            predicted["blend"].append(EtaEstimator.remaining(expected, elapsed, point))
+        for method, values in predicted.items():
+            results[f"progress{int(point * 100)}:{method}"] = error_summary(values, actual)
+
+    results["workload"] = {
+        "wait_p50_s": round(percentile(waits, 50), 1),
+        "wait_p90_s": round(percentile(waits, 90), 1),
+        "total_p50_s": round(percentile(actual_total, 50), 1),
+        "total_p90_s": round(percentile(actual_total, 90), 1),
+        "model_predict_us": round(model.predict_s / model.predictions * 1e6, 2),
+        "model_update_us": round(model.update_s / model.updates * 1e6, 2),
+        "model_stats": model.estimator.stats(),
+    }
+    write_report(args.output, "eta_replay", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
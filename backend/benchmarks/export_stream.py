@@ -0,0 +1,217 @@
+"""流式导出基准
+
+准备两个账户：large（默认约10万条记录、5GB参考图片）与 small（规模的十分之一），图片为稀疏
+文件，读取时返回全零数据而不占用磁盘。每种方式在独立子进程中运行，报告导出耗时、首字节时间、
+输出字节数、吞吐、导出期间Python分配的峰值内存（tracemalloc）与进程峰值常驻内存相对导出前的
+增量（含SQLite页缓存与内存映射，上限由 SQLITE_CACHE_SIZE_MB / SQLITE_MMAP_SIZE_MB 决定）：
+- buffered：旧做法，把账户的所有记录查成ORM对象列表后整体序列化（只导出记录）
+- ndjson：GET /export，服务端游标 + 流式响应
+- zip：GET /export?format=zip，记录加原始图片
+
+请求直接调用ASGI应用，响应体边收边丢弃（httpx 的 ASGITransport 会在内存中缓存整个响应体，
+无法衡量流式输出的内存）。small 与 large 的Python峰值内存接近说明内存与账户大小无关。
+
+用法:
+    python -m benchmarks.export_stream --characters 1000 --images-per-character 40 --image-gb 5 --output export.json
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from .common import bootstrap, peak_rss_mb, traced_memory, write_report
+
+
+def seed(args) -> dict:
+    """批量写入两个账户的数据，返回各账户的记录数、用户ID与访问令牌"""
+    from app.core.config import settings
+    from app.core.database import engine
+    from app.core.security import create_access_token
+    from app.models.character import Character, CharacterImage
+    from app.models.user import User, generate_uuid
+    from app.models.video import Video, VideoTask
+
+    image_count = args.characters * args.images_per_character
+    image_size = int(args.image_gb * 1024 ** 3 / image_count)
+    accounts = {}
+    with engine.begin() as connection:
+        for name, scale in (("large", 1.0), ("small", 0.1)):
+            user_id = generate_uuid()
+            connection.execute(User.__table__.insert(), [
+                {"id": user_id, "email": f"{name}@example.com", "username": name, "hashed_password": "x"}])
+            rows = 0
+            for c in range(max(1, int(args.characters * scale))):
+                character_id = generate_uuid()
+                connection.execute(Character.__table__.insert(), [
+                    {"id": character_id, "name": f"角色{c}", "description": "导出基准" * 10, "user_id": user_id,
+                     "character_data": {"traits": ["brave", "kind"], "index": c}}])
+                directory = os.path.join(settings.upload_dir, character_id)
+                os.makedirs(directory)
+                images = []
+                for i in range(args.images_per_character):
+                    path = os.path.join(directory, f"{i}.png")
+                    with open(path, "wb") as f:
+                        f.truncate(image_size)
+                    images.append({"id": generate_uuid(), "character_id": character_id, "image_url": path,
+                                   "file_size": str(image_size), "mime_type": "image/png",
+                                   "phash": "0" * 16, "quality_score": 0.8, "feature_vector": b"\0" * 256})
+                connection.execute(CharacterImage.__table__.insert(), images)
+                videos = [{"id": generate_uuid(), "title": f"v{i}", "script": "脚本" * 50, "user_id": user_id,
+                           "character_id": character_id, "video_url": f"generated/{i}/video.mp4", "duration": 30}
+                          for i in range(args.videos_per_character)]
+                connection.execute(Video.__table__.insert(), videos)
+                connection.execute(VideoTask.__table__.insert(), [
+                    {"id": generate_uuid(), "user_id": user_id, "character_id": character_id, "video_id": video["id"],
+                     "script": video["script"], "status": "completed", "progress": 100}
+                    for video in videos])
+                rows += 1 + len(images) + 2 * len(videos)
+            accounts[name] = {"rows": rows, "token": create_access_token({"sub": user_id}), "user_id": user_id}
+    return accounts
+
+
+async def asgi_get(app, path: str, query: str, token: str) -> dict:
+    """直接调用ASGI应用发起GET请求，只统计响应体字节数"""
+    state = {"status": None, "bytes": 0, "first_byte_s": None}
+    start = time.perf_counter()
+    done = asyncio.Event()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query.encode(), "server": ("localhost", 80), "client": ("127.0.0.1", 1234),
+        "headers": [(b"host", b"localhost"), (b"authorization", f"Bearer {token}".encode())],
+    }
+
+    async def receive():
+        if not state.get("requested"):
+            state["requested"] = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            if body and state["first_byte_s"] is None:
+                state["first_byte_s"] = time.perf_counter() - start
+            state["bytes"] += len(body)
+            if not message.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    state["elapsed_s"] = time.perf_counter() - start
+    state.pop("requested", None)
+    return state
+
+
+def buffered_export(user_id: str) -> dict:
+    """旧做法：查出全部ORM对象后整体序列化"""
+    from app.core.database import SessionLocal
+    from app.models.character import Character, CharacterImage
+    from app.models.video import Video, VideoTask
+    from app.services.export_service import _json_default
+
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        characters = db.query(Character).filter(Character.user_id == user_id).all()
+        character_ids = [character.id for character in characters]
+        records = [("character", characters)]
+        records.append(("character_image", db.query(CharacterImage).filter(
+            CharacterImage.character_id.in_(character_ids)).all()))
+        records.append(("video", db.query(Video).filter(Video.user_id == user_id).all()))
+        records.append(("video_task", db.query(VideoTask).filter(VideoTask.user_id == user_id).all()))
+        payload = [
+            {"type": kind, **{column.key: getattr(row, column.key) for column in type(row).__mapper__.column_attrs
+                              if column.key != "feature_vector"}}
+            for kind, rows in records for row in rows
+        ]
+        body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode()
+    finally:
+        db.close()
+    return {"status": 200, "bytes": len(body), "first_byte_s": time.perf_counter() - start,
+            "elapsed_s": time.perf_counter() - start}
+
+
+def run_case(mode: str, account: dict, workdir: str) -> dict:
+    bootstrap(workdir)
+    import logging
+
+    from app.core.database import engine
+    from app.main import create_application
+
+    logging.getLogger().setLevel(logging.WARNING)
+    engine.echo = False
+    app = create_application()
+
+    async def go():
+        async with app.router.lifespan_context(app):
+            # 预热：加载鉴权、序列化等延迟导入的模块
+            await asgi_get(app, "/api/v1/characters/", "limit=1", account["token"])
+            baseline = peak_rss_mb()
+            with traced_memory() as memory:
+                if mode == "buffered":
+                    result = await asyncio.to_thread(buffered_export, account["user_id"])
+                else:
+                    query = "format=zip" if mode == "zip" else "format=ndjson"
+                    result = await asgi_get(app, "/api/v1/export", query, account["token"])
+            result.update(memory)
+            result["rss_baseline_mb"] = baseline
+            result["rss_peak_mb"] = peak_rss_mb()
+            return result
+
+    result = asyncio.run(go())
+    return {
+        "status": result["status"],
+        "rows": account["rows"],
+        "bytes": result["bytes"],
+        "elapsed_s": round(result["elapsed_s"], 3),
+        "first_byte_ms": round(result["first_byte_s"] * 1000, 3) if result["first_byte_s"] else None,
+        "throughput_mb_s": round(result["bytes"] / 1024 ** 2 / result["elapsed_s"], 2),
+        "python_peak_mb": result["python_peak_mb"],
+        "rss_peak_mb": result["rss_peak_mb"],
+        "rss_growth_mb": round(result["rss_peak_mb"] - result["rss_baseline_mb"], 2),
+    }
+
+
+def prepare(workdir: str, args_dict: dict) -> dict:
+    bootstrap(workdir)
+    from app.core.database import engine
+    from app.core.migrate import migrate
+
+    engine.echo = False
+    migrate()
+    return seed(argparse.Namespace(**args_dict))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式导出基准")
+    parser.add_argument("--characters", type=int, default=1000)
+    parser.add_argument("--images-per-character", type=int, default=40)
+    parser.add_argument("--videos-per-character", type=int, default=30, help="每个视频另有一条任务记录")
+    parser.add_argument("--image-gb", type=float, default=5.0, help="large 账户的图片总大小")
+    parser.add_argument("--modes", nargs="+", default=["buffered", "ndjson", "zip"])
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    workdir = tempfile.mkdtemp(prefix="aivcl-export-")
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        accounts = pool.submit(prepare, workdir, vars(args)).result()
+    results = {}
+    for name in ("small", "large"):
+        for mode in args.modes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results[f"{mode}@{name}"] = pool.submit(run_case, mode, accounts[name], workdir).result()
+    write_report(args.output, "export_stream", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""视频帧组装内存与吞吐基准
+
+用NumPy合成测试图案帧，对比两种组装方式在不同视频时长下的峰值内存与每秒编码帧数：
+- streaming：FrameAssembler 边生成边编码（当前实现）
+- collect：先把所有帧收集到列表再编码（旧做法，仅对较短时长运行）
+
+每个用例在独立子进程中运行，峰值常驻内存互不影响。
+
+用法:
+    python -m benchmarks.frame_assembly --durations 30 60 120 --output frames.json
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from .common import bootstrap, peak_rss_mb, traced_memory, write_report
+
+
+def run_case(mode: str, duration: int, fps: int, width: int, height: int, workdir: str) -> dict:
+    bootstrap(workdir)
+    from app.services.video_assembler import FrameAssembler, synthetic_frames
+
+    count = duration * fps
+    output = os.path.join(workdir, f"{mode}_{duration}.mp4")
+    baseline_rss = peak_rss_mb()
+    with traced_memory() as memory:
+        start = time.perf_counter()
+        frames = synthetic_frames(count, width, height)
+        if mode == "collect":
+            frames = list(frames)
+        with FrameAssembler(output, fps=fps, thumbnail_path=os.path.join(workdir, f"{mode}_{duration}.jpg")) as assembler:
+            assembler.write_many(frames)
+            info = assembler.close()
+        elapsed = time.perf_counter() - start
+    return {
+        "frames": info["frames"],
+        "elapsed_s": round(elapsed, 3),
+        "frames_per_s": round(info["frames"] / elapsed, 1),
+        "python_peak_mb": memory["python_peak_mb"],
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": round(peak_rss_mb() - baseline_rss, 2),
+        "file_size_mb": round(info["file_size"] / 1024 / 1024, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="视频帧组装基准")
+    parser.add_argument("--durations", type=int, nargs="+", default=[30, 60, 120], help="视频时长（秒）")
+    parser.add_argument("--fps", type=int, default=24)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--collect-max", type=int, default=30,
+                        help="collect 模式只在不超过该时长时运行，避免耗尽内存")
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    workdir = tempfile.mkdtemp(prefix="aivcl-frames-")
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for duration in args.durations:
+        for mode in ("streaming", "collect"):
+            if mode == "collect" and duration > args.collect_max:
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results[f"{mode}_{duration}s"] = pool.submit(
+                    run_case, mode, duration, args.fps, args.width, args.height, workdir
+                ).result()
+    write_report(args.output, "frame_assembly", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
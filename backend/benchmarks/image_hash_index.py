@@ -0,0 +1,151 @@
+"""图片感知哈希索引基准
+
+在内存中构建百万级 pHash 的多索引哈希（MIH），测量建索引耗时与内存、半径查询延迟，
+并与NumPy向量化全量扫描对比（同时校验两者结果一致）。另测量上传时单张图片计算
+pHash/dHash 的耗时。
+
+哈希按簇生成：每个簇一个随机基准哈希，簇内图片在其上随机翻转少量比特，模拟同一
+角色的近似帧。
+
+用法:
+    python -m benchmarks.image_hash_index --images 1000000 --output hash_index.json
+"""
+import argparse
+import io
+import os
+import random
+import time
+
+from .common import LatencyRecorder, bootstrap, peak_rss_mb, write_report
+
+
+def synthetic_hashes(count: int, cluster_size: int, max_flips: int, seed: int):
+    rng = random.Random(seed)
+    hashes = []
+    while len(hashes) < count:
+        base = rng.getrandbits(64)
+        for _ in range(min(cluster_size, count - len(hashes))):
+            value = base
+            for bit in rng.sample(range(64), rng.randint(0, max_flips)):
+                value ^= 1 << bit
+            hashes.append(value)
+    return hashes
+
+
+def numpy_popcount_table():
+    import numpy as np
+
+    return np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def brute_force(array, table, value: int, radius: int):
+    import numpy as np
+
+    xor = np.bitwise_xor(array, np.uint64(value))
+    distances = table[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+    return np.nonzero(distances <= radius)[0]
+
+
+def bench_hashing(samples: int) -> dict:
+    import numpy as np
+    from PIL import Image
+    from app.services.image_hash import compute_hashes
+
+    rng = np.random.default_rng(0)
+    pixels = (rng.random((128, 128, 3)) * 255).astype(np.uint8)
+    image = Image.fromarray(np.kron(pixels, np.ones((8, 8, 1), dtype=np.uint8)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    content = buffer.getvalue()
+    recorder = LatencyRecorder("hash")
+    for _ in range(samples):
+        with recorder.measure():
+            compute_hashes(content)
+    recorder.stop()
+    summary = recorder.summary()
+    return {"image": "1024x1024 JPEG", "p50_ms": summary["p50_ms"], "p99_ms": summary["p99_ms"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图片感知哈希索引基准")
+    parser.add_argument("--images", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--radius", type=int, default=6)
+    parser.add_argument("--segments", type=int, default=4)
+    parser.add_argument("--cluster-size", type=int, default=20)
+    parser.add_argument("--max-flips", type=int, default=4, help="簇内哈希相对基准哈希最多翻转的比特数")
+    parser.add_argument("--brute-queries", type=int, default=50, help="NumPy全量扫描对比的查询数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap()
+    import numpy as np
+    from app.services.image_hash import MultiIndexHash
+
+    hashes = synthetic_hashes(args.images, args.cluster_size, args.max_flips, args.seed)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    index = MultiIndexHash(args.segments)
+    for i, value in enumerate(hashes):
+        index.add(str(i), str(i // args.cluster_size), value)
+    build_s = time.perf_counter() - start
+    rss_growth = peak_rss_mb() - rss_before
+
+    rng = random.Random(args.seed + 1)
+    queries = []
+    for i in range(args.queries):
+        if i % 2 == 0:
+            # 已有图片的近似帧
+            value = rng.choice(hashes)
+            for bit in rng.sample(range(64), rng.randint(0, 2)):
+                value ^= 1 << bit
+        else:
+            value = rng.getrandbits(64)
+        queries.append(value)
+
+    mih = LatencyRecorder("mih")
+    matches = 0
+    for value in queries:
+        with mih.measure():
+            matches += len(index.query(value, args.radius))
+    mih.stop()
+
+    array = np.array(hashes, dtype=np.uint64)
+    table = numpy_popcount_table()
+    brute = LatencyRecorder("brute")
+    mismatches = 0
+    for value in queries[:args.brute_queries]:
+        with brute.measure():
+            found = brute_force(array, table, value, args.radius)
+        expected = {str(i) for i in found}
+        if expected != {match[0] for match in index.query(value, args.radius)}:
+            mismatches += 1
+    brute.stop()
+
+    mih_summary, brute_summary = mih.summary(), brute.summary()
+    results = {
+        "build": {
+            "images": len(index),
+            "elapsed_s": round(build_s, 2),
+            "inserts_per_s": round(len(index) / build_s, 1),
+            "rss_growth_mb": round(rss_growth, 1),
+        },
+        "mih_query": {
+            "p50_ms": mih_summary["p50_ms"],
+            "p99_ms": mih_summary["p99_ms"],
+            "avg_matches": round(matches / len(queries), 2),
+        },
+        "numpy_scan_query": {
+            "p50_ms": brute_summary["p50_ms"],
+            "p99_ms": brute_summary["p99_ms"],
+            "result_mismatches": mismatches,
+        },
+        "hash_upload_image": bench_hashing(50),
+    }
+    write_report(args.output, "image_hash_index", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""日志对事件循环延迟的影响基准
+
+模拟大量任务高频上报进度并各记录一条日志，测量事件循环延迟（定时器漂移）p50/p99/最大值：
+- off：日志级别为 WARNING，INFO 日志直接被过滤
+- sync：旧做法，basicConfig 式的同步 StreamHandler，f-string 拼接消息
+- pipeline：队列日志管道（JSON，后台线程写出），不采样不限流
+- pipeline_sampled：队列日志管道，按配置对高频事件采样与限流
+
+日志写到临时文件，每次 flush 额外睡眠 --write-latency-ms 模拟慢磁盘或被阻塞的日志采集管道。
+
+用法:
+    python -m benchmarks.log_overhead --tasks 500 --seconds 5 --output logging.json
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from .common import bootstrap, percentile, write_report
+
+
+class SlowFile:
+    """每次 flush 额外阻塞一段时间的文件"""
+
+    def __init__(self, path: str, latency: float):
+        self._file = open(path, "w", encoding="utf-8")
+        self.latency = latency
+        self.lines = 0
+
+    def write(self, text: str):
+        self.lines += text.count("\n")
+        return self._file.write(text)
+
+    def flush(self):
+        self._file.flush()
+        if self.latency:
+            time.sleep(self.latency)
+
+    def close(self):
+        self._file.close()
+
+
+async def drive(logger, structured: bool, args) -> dict:
+    lags = []
+    done = asyncio.Event()
+
+    async def monitor():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    async def task(index: int):
+        task_id = f"task-{index}"
+        deadline = time.perf_counter() + args.seconds
+        progress = 0
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(args.tick_interval)
+            progress = (progress + 1) % 100
+            if structured:
+                logger.info("task_progress", task_id=task_id, progress=progress, status="processing")
+            else:
+                logger.info(f"Task {task_id} progress updated: {progress}% - processing")
+
+    watcher = asyncio.create_task(monitor())
+    await asyncio.gather(*(task(i) for i in range(args.tasks)))
+    done.set()
+    await watcher
+    return {
+        "loop_lag_p50_ms": round(percentile(lags, 50) * 1000, 3),
+        "loop_lag_p99_ms": round(percentile(lags, 99) * 1000, 3),
+        "loop_lag_max_ms": round(max(lags) * 1000, 3),
+    }
+
+
+def run_mode(mode: str, args, workdir: str) -> dict:
+    from app.core import log_pipeline
+
+    stream = SlowFile(os.path.join(workdir, f"{mode}.log"), args.write_latency_ms / 1000)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if mode in ("off", "sync"):
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+        root.addHandler(handler)
+        root.setLevel(logging.WARNING if mode == "off" else logging.INFO)
+        logger = logging.getLogger("benchmark.progress")
+        structured = False
+    else:
+        throttle = log_pipeline.event_throttle
+        throttle.sample_rates, throttle.rate_limits = (
+            (dict(args.sample_rates), dict(args.rate_limits)) if mode == "pipeline_sampled" else ({}, {})
+        )
+        throttle.dropped.clear()
+        log_pipeline.queue_handler.dropped = 0
+        log_pipeline.configure_logging(stream=stream, level="INFO")
+        logger = log_pipeline.get_logger("benchmark.progress")
+        structured = True
+
+    start = time.perf_counter()
+    result = asyncio.run(drive(logger, structured, args))
+    loop_done = time.perf_counter() - start
+    if mode.startswith("pipeline"):
+        result["dropped_by_sampling"] = sum(log_pipeline.event_throttle.dropped.values())
+        result["dropped_queue_full"] = log_pipeline.queue_handler.dropped
+        log_pipeline.shutdown_logging()
+    result["drain_s"] = round(time.perf_counter() - start - loop_done, 3)
+    stream.close()
+    result["lines_written"] = stream.lines
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志对事件循环延迟的影响基准")
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--tick-interval", type=float, default=0.05, help="每个任务上报进度的间隔（秒）")
+    parser.add_argument("--write-latency-ms", type=float, default=0.05, help="每次写出日志的额外阻塞时间")
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap()
+    from app.core.config import settings
+
+    args.sample_rates = settings.log_sample_rates
+    args.rate_limits = settings.log_rate_limits
+    workdir = tempfile.mkdtemp(prefix="aivcl-logging-")
+    results = {mode: run_mode(mode, args, workdir) for mode in ("off", "sync", "pipeline", "pipeline_sampled")}
+    write_report(args.output, "log_overhead", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""推理微批处理基准
+
+在不同并发数下对比逐条执行（direct：每条请求单独 to_thread）与 MicroBatcher
+按不同 (批大小, 延迟预算) 合并执行的吞吐与延迟：
+- model：模拟单个推理设备，每批固定开销加每条边际开销，同一时刻只能执行一批
+- features：真实的参考图片特征提取（1024x1024 JPEG，CPU）
+
+added_p50_ms 为同并发下相对 direct 的 p50 延迟增量（负数表示更快），
+avg_wait_ms 为请求在批中等待刷出的平均时间。
+
+用法:
+    python -m benchmarks.micro_batching --concurrency 1 8 32 128 --output batching.json
+"""
+import argparse
+import asyncio
+import io
+import os
+import threading
+import time
+
+from .common import LatencyRecorder, bootstrap, write_report
+
+
+class SimulatedModel:
+    """单设备推理模型：批调用耗时 = 固定开销 + 条数 × 边际开销"""
+
+    def __init__(self, overhead_ms: float, per_item_ms: float):
+        self.overhead = overhead_ms / 1000
+        self.per_item = per_item_ms / 1000
+        self.device = threading.Lock()
+
+    def __call__(self, items):
+        with self.device:
+            time.sleep(self.overhead + self.per_item * len(items))
+        return [len(item) for item in items]
+
+
+def sample_jpeg() -> bytes:
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    pixels = (rng.random((128, 128, 3)) * 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(np.kron(pixels, np.ones((8, 8, 1), dtype=np.uint8))).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def run_case(fn, item, concurrency: int, requests: int, batcher=None) -> dict:
+    recorder = LatencyRecorder("case")
+    remaining = requests
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            with recorder.measure():
+                if batcher is None:
+                    await asyncio.to_thread(fn, [item])
+                else:
+                    await batcher.submit(item)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    recorder.stop()
+    summary = recorder.summary()
+    result = {
+        "concurrency": concurrency,
+        "rps": summary["rps"],
+        "p50_ms": summary["p50_ms"],
+        "p99_ms": summary["p99_ms"],
+    }
+    if batcher is not None:
+        stats = batcher.stats()
+        result["avg_batch_size"] = stats["avg_batch_size"]
+        result["avg_wait_ms"] = stats["avg_wait_ms"]
+    return result
+
+
+async def main_async(args) -> dict:
+    from app.services.micro_batcher import MicroBatcher
+    from app.services.reference_selection import extract_features
+
+    workloads = {
+        "model": (SimulatedModel(args.model_overhead_ms, args.model_per_item_ms), b"x" * 64, args.requests),
+        "features": (lambda contents: [extract_features(c) for c in contents], sample_jpeg(), args.feature_requests),
+    }
+    configs = [tuple(int(v) for v in config.split(":")) for config in args.configs]
+    results = {}
+    for workload, (fn, item, requests) in workloads.items():
+        for concurrency in args.concurrency:
+            direct = await run_case(fn, item, concurrency, requests)
+            results[f"{workload}_c{concurrency}_direct"] = direct
+            for size, latency in configs:
+                batcher = MicroBatcher(fn, max_batch_size=size, max_latency_ms=latency,
+                                       max_concurrent_batches=args.workers, name=workload)
+                batched = await run_case(fn, item, concurrency, requests, batcher)
+                batched["added_p50_ms"] = round(batched["p50_ms"] - direct["p50_ms"], 3)
+                results[f"{workload}_c{concurrency}_b{size}_t{latency}"] = batched
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推理微批处理基准")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--configs", nargs="+", default=["8:2", "16:5", "32:10"], help="批大小:延迟预算毫秒")
+    parser.add_argument("--workers", type=int, default=1, help="同时执行的批数")
+    parser.add_argument("--requests", type=int, default=1000, help="model 负载每个用例的请求数")
+    parser.add_argument("--feature-requests", type=int, default=300, help="features 负载每个用例的请求数")
+    parser.add_argument("--model-overhead-ms", type=float, default=4.0, help="模拟模型每批固定开销")
+    parser.add_argument("--model-per-item-ms", type=float, default=0.2, help="模拟模型每条边际开销")
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap()
+    results = asyncio.run(main_async(args))
+    write_report(args.output, "micro_batching", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
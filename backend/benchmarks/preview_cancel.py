@@ -0,0 +1,112 @@
+"""预览与提前取消基准
+
+模拟用户看到结果后按一定比例放弃视频：
+- final：不开启预览，用户只能在成片完成后放弃，被放弃视频的计算全部浪费
+- preview：开启预览，用户在预览可用后立即取消，只消耗预览与已完成部分的成片计算
+
+报告用户首次看到画面的时间（预览或成片）、计算消耗与取消节省的计算量
+（单位为 时长 × 质量档位成本系数）。任务由进程内worker池使用本地假渲染器执行。
+
+用法:
+    python -m benchmarks.preview_cancel --tasks 16 --reject-ratio 0.4 --output preview.json
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+
+from .common import LatencyRecorder, bootstrap, write_report
+
+QUALITY_COST = {"standard": 1.0, "high": 3.0, "ultra": 10.0}
+
+
+async def run_mode(client, user: dict, preview: bool, args) -> dict:
+    from app.services.video_pipeline import cancellation_stats
+
+    rng = random.Random(args.seed)
+    before = cancellation_stats.as_dict()
+    first_view = LatencyRecorder("first_view")
+    rejected_work = 0.0
+
+    async def one(i: int):
+        nonlocal rejected_work
+        duration = rng.choice([30, 60, 90, 120])
+        quality = rng.choices(["standard", "high", "ultra"], [6, 3, 1])[0]
+        reject = rng.random() < args.reject_ratio
+        response = await client.post("/api/v1/videos/generate", headers=user["headers"], json={
+            "character_id": user["character_id"], "script": f"preview-{preview}-{i}",
+            "duration": duration, "quality": quality, "preview": preview})
+        task_id = response.json()["id"]
+        start = time.perf_counter()
+        seen = False
+        while True:
+            task = (await client.get(f"/api/v1/videos/tasks/{task_id}", headers=user["headers"])).json()
+            if not seen and (task["preview_url"] or task["status"] == "completed"):
+                seen = True
+                first_view.add(time.perf_counter() - start)
+                if reject and task["status"] != "completed":
+                    await client.post(f"/api/v1/videos/tasks/{task_id}/cancel", headers=user["headers"])
+            if task["status"] in ("completed", "failed", "cancelled"):
+                break
+            await asyncio.sleep(args.poll_interval)
+        if reject and task["status"] == "completed":
+            # 成片完成后才放弃，计算全部浪费
+            rejected_work += duration * QUALITY_COST[quality]
+
+    await asyncio.gather(*(one(i) for i in range(args.tasks)))
+    first_view.stop()
+    after = cancellation_stats.as_dict()
+    spent = after["compute_spent"] - before["compute_spent"]
+    saved = after["compute_saved"] - before["compute_saved"]
+    summary = first_view.summary()
+    return {
+        "tasks": args.tasks,
+        "first_view_p50_ms": summary["p50_ms"],
+        "first_view_p95_ms": summary["p95_ms"],
+        "elapsed_s": summary["elapsed_s"],
+        "compute_spent": round(spent, 1),
+        "compute_saved": round(saved, 1),
+        "compute_wasted_on_rejected": round(rejected_work, 1),
+        "cancelled": {stage: after["cancelled"][stage] - before["cancelled"][stage] for stage in after["cancelled"]},
+    }
+
+
+async def main_async(args) -> dict:
+    import httpx
+    from app.main import create_application
+
+    logging.getLogger().setLevel(logging.WARNING)
+    app = create_application()
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost") as client:
+            r = await client.post("/api/v1/auth/register", json={
+                "email": "preview@example.com", "username": "preview", "password": "benchmark-pass"})
+            headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+            character = await client.post("/api/v1/characters/", json={"name": "preview"}, headers=headers)
+            user = {"headers": headers, "character_id": character.json()["id"]}
+            results = {
+                "final": await run_mode(client, user, False, args),
+                "preview": await run_mode(client, user, True, args),
+            }
+    return write_report(args.output, "preview_cancel", results, vars(args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预览与提前取消基准")
+    parser.add_argument("--tasks", type=int, default=16)
+    parser.add_argument("--reject-ratio", type=float, default=0.4, help="看到画面后放弃视频的比例")
+    parser.add_argument("--task-workers", type=int, default=4)
+    parser.add_argument("--poll-interval", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap(TASK_WORKERS=str(args.task_workers))
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""任务进度写库基准
+
+大量任务同时上报进度（每个任务从 1% 报到 100%，上报间隔随机），对比两种落库方式：
+- per_tick：每次上报执行一条条件UPDATE（旧做法）
+- buffered：ProgressWriteBuffer 在内存中合并，按刷写间隔批量UPDATE，结束时 stop 写回剩余进度
+
+报告写库的UPDATE语句数、SQL语句总数、墙钟时间、事件循环最大延迟，并校验结束后数据库中的
+进度与最后一次上报一致。
+
+用法:
+    python -m benchmarks.progress_writes --tasks 1000 --ticks 100 --output progress.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from .common import bootstrap, write_report
+
+
+def create_tasks(count: int):
+    from app.core.database import SessionLocal
+    from app.models.character import Character
+    from app.models.user import User
+    from app.models.video import VideoTask
+
+    db = SessionLocal()
+    user = User(email=f"progress{time.time_ns()}@example.com", username=f"progress{time.time_ns()}",
+                hashed_password="x")
+    db.add(user)
+    db.flush()
+    character = Character(name="progress", user_id=user.id)
+    db.add(character)
+    db.flush()
+    tasks = [VideoTask(user_id=user.id, character_id=character.id, script="p", status="processing")
+             for _ in range(count)]
+    db.add_all(tasks)
+    db.commit()
+    ids = [str(task.id) for task in tasks]
+    db.close()
+    return ids
+
+
+def count_statements(engine):
+    from sqlalchemy import event
+
+    counts = {"update": 0, "total": 0}
+
+    def on_execute(conn, cursor, statement, *args):
+        counts["total"] += 1
+        if statement.lstrip().upper().startswith("UPDATE"):
+            counts["update"] += 1
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    return counts, lambda: event.remove(engine, "before_cursor_execute", on_execute)
+
+
+async def run_mode(mode: str, args) -> dict:
+    from app.core.database import SessionLocal, engine
+    from app.models.video import VideoTask
+    from app.services.progress_buffer import ProgressWriteBuffer
+    from app.services.video_pipeline import TaskWorkerPool
+
+    ids = create_tasks(args.tasks)
+    rng = random.Random(args.seed)
+    buffer = ProgressWriteBuffer(interval=args.flush_interval)
+    counts, detach = count_statements(engine)
+    max_lag = 0.0
+    done = asyncio.Event()
+
+    async def watch_lag():
+        nonlocal max_lag
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_lag = max(max_lag, time.perf_counter() - start - 0.01)
+
+    async def report(task_id: str):
+        mean_gap = args.seconds / args.ticks
+        for percent in range(1, args.ticks + 1):
+            await asyncio.sleep(rng.uniform(0, 2 * mean_gap))
+            progress = percent * 100 // args.ticks
+            if mode == "per_tick":
+                TaskWorkerPool._update_task(task_id, "processing", progress=progress)
+            else:
+                buffer.record(task_id, progress)
+
+    watcher = asyncio.create_task(watch_lag())
+    if mode == "buffered":
+        buffer.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(report(task_id) for task_id in ids))
+    if mode == "buffered":
+        await buffer.stop()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await watcher
+    detach()
+
+    db = SessionLocal()
+    stale = db.query(VideoTask).filter(VideoTask.id.in_(ids), VideoTask.progress != 100).count()
+    db.close()
+    return {
+        "tasks": args.tasks,
+        "progress_reports": args.tasks * args.ticks,
+        "db_updates": counts["update"],
+        "db_statements": counts["total"],
+        "elapsed_s": round(elapsed, 2),
+        "max_loop_lag_ms": round(max_lag * 1000, 1),
+        "rows_not_final": stale,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务进度写库基准")
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--ticks", type=int, default=100, help="每个任务上报进度的次数")
+    parser.add_argument("--seconds", type=float, default=10.0, help="每个任务上报进度的大致时长")
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap()
+    from app.core.migrate import migrate
+
+    migrate()
+    results = {mode: asyncio.run(run_mode(mode, args)) for mode in ("per_tick", "buffered")}
+    results["reduction"] = {
+        "db_updates_ratio": round(results["buffered"]["db_updates"] / results["per_tick"]["db_updates"], 5),
+    }
+    write_report(args.output, "progress_writes", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
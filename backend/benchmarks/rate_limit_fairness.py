@@ -0,0 +1,149 @@
+"""限流公平性基准（吵闹邻居场景）
+
+一个用户以高并发不停提交 POST /videos/generate，其余用户按固定速率提交。分别在
+不限流、仅限流、限流+准入控制三种配置下运行，比较安静用户的延迟与成功率、
+吵闹用户被拒绝的比例，以及各用户实际获得吞吐的 Jain 公平性指数。
+
+用法:
+    python -m benchmarks.rate_limit_fairness --duration 10 --output fairness.json
+"""
+from typing import Dict, List
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from .common import LatencyRecorder, bootstrap, write_report
+
+MODES = {
+    "off": {"rate_limit_enabled": False, "admission_enabled": False},
+    "rate_limit": {"rate_limit_enabled": True, "admission_enabled": False},
+    "rate_limit_admission": {"rate_limit_enabled": True, "admission_enabled": True},
+}
+
+
+def jain_index(values: List[float]) -> float:
+    """Jain公平性指数，1 表示完全公平"""
+    if not values or not any(values):
+        return 0.0
+    return round(sum(values) ** 2 / (len(values) * sum(v * v for v in values)), 4)
+
+
+async def register(client, name: str) -> dict:
+    response = await client.post(
+        "/api/v1/auth/register",
+        json={"email": f"{name}@example.com", "username": name, "password": "benchmark-pass"},
+    )
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    character = await client.post("/api/v1/characters/", json={"name": name}, headers=headers)
+    character.raise_for_status()
+    return {"name": name, "headers": headers, "character_id": character.json()["id"]}
+
+
+async def run_mode(mode: str, users: List[dict], args) -> Dict[str, dict]:
+    import httpx
+    from app.core.config import settings
+    from app.main import create_application
+
+    for key, value in MODES[mode].items():
+        setattr(settings, key, value)
+    settings.rate_limit_rules = {"POST /api/v1/videos/generate": args.limit}
+
+    app = create_application()
+    noisy, quiet = users[0], users[1:]
+    recorders = {user["name"]: LatencyRecorder(user["name"]) for user in users}
+    accepted = {user["name"]: 0 for user in users}
+    rejected = {user["name"]: 0 for user in users}
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost") as client:
+            deadline = time.perf_counter() + args.duration
+
+            async def submit(user: dict):
+                start = time.perf_counter()
+                response = await client.post(
+                    "/api/v1/videos/generate",
+                    json={"character_id": user["character_id"], "script": "fairness", "quality": "standard"},
+                    headers=user["headers"],
+                )
+                ok = response.status_code == 200
+                if ok:
+                    accepted[user["name"]] += 1
+                    recorders[user["name"]].add(time.perf_counter() - start)
+                elif response.status_code in (429, 503):
+                    rejected[user["name"]] += 1
+
+            async def noisy_worker():
+                while time.perf_counter() < deadline:
+                    await submit(noisy)
+
+            async def quiet_worker(user: dict):
+                interval = 1 / args.quiet_rps
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    await submit(user)
+                    await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+            await asyncio.gather(
+                *(noisy_worker() for _ in range(args.noisy_concurrency)),
+                *(quiet_worker(user) for user in quiet),
+            )
+
+    quiet_samples: List[float] = []
+    for user in quiet:
+        quiet_samples.extend(recorders[user["name"]].samples)
+    quiet_recorder = LatencyRecorder("quiet")
+    quiet_recorder.samples = quiet_samples
+    quiet_summary = quiet_recorder.summary()
+    quiet_demand = args.quiet_rps * args.duration * len(quiet)
+
+    return {
+        "quiet_p50_ms": quiet_summary["p50_ms"],
+        "quiet_p99_ms": quiet_summary["p99_ms"],
+        "quiet_success_ratio": round(sum(accepted[u["name"]] for u in quiet) / max(1, quiet_demand), 4),
+        "noisy_accepted_per_s": round(accepted[noisy["name"]] / args.duration, 2),
+        "noisy_rejected": rejected[noisy["name"]],
+        "jain_fairness": jain_index([accepted[u["name"]] / args.duration for u in users]),
+    }
+
+
+async def main_async(args) -> dict:
+    import httpx
+    from app.core.config import settings
+    from app.main import create_application
+
+    logging.getLogger().setLevel(logging.ERROR)
+    # 注册时bcrypt会阻塞事件循环，准备阶段关闭限流与准入控制
+    for key, value in MODES["off"].items():
+        setattr(settings, key, value)
+    setup_app = create_application()
+    async with setup_app.router.lifespan_context(setup_app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=setup_app), base_url="http://localhost") as client:
+            users = [await register(client, "noisy")]
+            users += [await register(client, f"quiet{i}") for i in range(args.quiet_users)]
+
+    results = {}
+    for mode in MODES:
+        results[mode] = await run_mode(mode, users, args)
+    return write_report(args.output, "rate_limit_fairness", results, vars(args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="限流公平性基准")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--quiet-users", type=int, default=4)
+    parser.add_argument("--quiet-rps", type=float, default=2.0, help="每个安静用户每秒请求数")
+    parser.add_argument("--noisy-concurrency", type=int, default=20)
+    parser.add_argument("--limit", default="5/second", help="生成接口的限流规则")
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
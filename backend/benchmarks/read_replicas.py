@@ -0,0 +1,170 @@
+"""只读副本路由基准
+
+主库与副本都是临时目录中的 SQLite 文件，副本是初始化数据后主库的静态拷贝（不复制后续写入），
+因此读到副本即读不到之后的写入，可以直接统计“读不到自己的写入”的次数。按场景在独立子进程中
+启动应用（副本配置在导入时读取），以固定并发混合执行角色列表读取与“更新角色后立即读取详情”：
+- primary_only：不配置副本，所有读取都在主库
+- replicas：两个副本轮询，写入后 5 秒内读主库
+- replicas_no_sticky：两个副本轮询，关闭写后读主库
+- replica_down：一个正常副本加一个无法打开的副本，验证摘除与回退
+
+报告读取与写入的吞吐和 p50/p95/p99、各连接池签出次数与失败次数、主库承担的读取比例、
+写后读主库次数，以及读到旧数据的次数。
+
+用法:
+    python -m benchmarks.read_replicas --users 100 --reads 2000 --output replicas.json
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from .common import LatencyRecorder, bootstrap, write_report
+
+MODES = {
+    "primary_only": {"replicas": 0, "sticky": 5.0, "broken": False},
+    "replicas": {"replicas": 2, "sticky": 5.0, "broken": False},
+    "replicas_no_sticky": {"replicas": 2, "sticky": 0.0, "broken": False},
+    "replica_down": {"replicas": 2, "sticky": 5.0, "broken": True},
+}
+
+
+async def seed(client, users: int, characters: int) -> list:
+    sessions = []
+    for i in range(users):
+        response = await client.post("/api/v1/auth/register", json={
+            "email": f"replica{i}@example.com", "username": f"replica{i}", "password": "benchmark-pass"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        ids = []
+        for j in range(characters):
+            created = await client.post("/api/v1/characters/", json={"name": f"角色{j}", "description": "v0"},
+                                        headers=headers)
+            ids.append(created.json()["id"])
+        sessions.append({"headers": headers, "characters": ids})
+    return sessions
+
+
+async def drive(client, sessions: list, args) -> dict:
+    reads = LatencyRecorder("read")
+    writes = LatencyRecorder("write")
+    stale = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def read(i: int):
+        session = sessions[i % len(sessions)]
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get("/api/v1/characters/", headers=session["headers"])
+            reads.add(time.perf_counter() - start, response.status_code == 200)
+
+    async def write_then_read(i: int):
+        nonlocal stale
+        session = sessions[(i // args.write_every) % len(sessions)]
+        character_id = session["characters"][i % len(session["characters"])]
+        description = f"v{i + 1}"
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.put(f"/api/v1/characters/{character_id}", json={"description": description},
+                                        headers=session["headers"])
+            writes.add(time.perf_counter() - start, response.status_code == 200)
+            start = time.perf_counter()
+            response = await client.get(f"/api/v1/characters/{character_id}", headers=session["headers"])
+            reads.add(time.perf_counter() - start, response.status_code == 200)
+            if response.status_code == 200 and response.json()["description"] != description:
+                stale += 1
+
+    # 每 write_every 次读取插入一次写后读
+    jobs = [write_then_read(i) if i % args.write_every == 0 else read(i) for i in range(args.reads)]
+    await asyncio.gather(*jobs)
+    reads.stop()
+    writes.stop()
+    return {"read": reads.summary(), "write": writes.summary(), "stale_reads": stale}
+
+
+def run_case(mode: str, args_dict: dict, workdir: str) -> dict:
+    args = argparse.Namespace(**args_dict)
+    config = MODES[mode]
+    primary = os.path.join(workdir, "primary.db")
+    replica_paths = [os.path.join(workdir, f"replica{i}.db") for i in range(config["replicas"])]
+    urls = [f"sqlite:///{path}" for path in replica_paths]
+    if config["broken"]:
+        urls[-1] = f"sqlite:///{os.path.join(workdir, 'missing', 'replica.db')}"
+    bootstrap(workdir, DATABASE_URL=f"sqlite:///{primary}", READ_REPLICA_URLS=json.dumps(urls),
+              REPLICA_STICKY_SECONDS=str(config["sticky"]))
+    import logging
+
+    import httpx
+
+    from app.core.database import engine, replica_router
+    from app.core.migrate import migrate
+    from app.main import create_application
+
+    logging.getLogger().setLevel(logging.WARNING)
+    engine.echo = False
+    for replica in replica_router.replicas:
+        replica.engine.echo = False
+    migrate()
+    app = create_application()
+
+    async def main_async():
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost")
+        # 初始化数据只写主库、读主库（鉴权也走只读会话，副本此时还没有数据）
+        replicas, replica_router.replicas = replica_router.replicas, []
+        sessions = await seed(client, args.users, args.characters)
+        replica_router.replicas = replicas
+        # 副本是初始化后的静态拷贝，副本引擎在首次签出时才连接
+        for path in replica_paths[:len(urls) - config["broken"]]:
+            shutil.copyfile(primary, path)
+        primary_seed_checkouts = replica_router.primary.checkouts
+        # 初始化数据的写入不计入写后读窗口
+        replica_router._recent_writes.clear()
+        result = await drive(client, sessions, args)
+        await client.aclose()
+        return result, primary_seed_checkouts
+
+    result, primary_seed_checkouts = asyncio.run(main_async())
+    stats = replica_router.stats()
+    pools = stats["pools"]
+    # 每个写请求在主库签出一个写会话，其余签出都是只读会话（含鉴权查询）
+    read_checkouts = sum(pool["checkouts"] for pool in pools.values()) - primary_seed_checkouts \
+        - result["write"]["requests"]
+    primary_reads = pools["primary"]["checkouts"] - primary_seed_checkouts - result["write"]["requests"]
+    result.update({
+        "pools": {name: {"checkouts": pool["checkouts"], "failures": pool["failures"], "healthy": pool["healthy"]}
+                  for name, pool in pools.items()},
+        "sticky_reads": stats["sticky_reads"],
+        "fallback_reads": stats["fallback_reads"],
+        "primary_read_share": round(primary_reads / max(1, read_checkouts), 3),
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="只读副本路由基准")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--characters", type=int, default=20, help="每个用户的角色数（列表读取的行数）")
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--write-every", type=int, default=20, help="每隔多少次读取插入一次写后读")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for mode in args.modes:
+        workdir = tempfile.mkdtemp(prefix=f"aivcl-replicas-{mode}-")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[mode] = pool.submit(run_case, mode, vars(args), workdir).result()
+    write_report(args.output, "read_replicas", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""参考图片子集选择基准
+
+合成按簇分布的特征向量（每簇代表一种角度/光照，簇内是几乎相同的帧），测量：
+- select_diverse 在不同图片数下的耗时
+- 选中子集覆盖的簇数，与只按质量取前 k 张对比
+- 生成器输入规模的缩减（张数与字节数）
+- ReferenceSelector 在SQLite上冷选择（加载特征+计算）与缓存命中的延迟
+- 单张图片提取特征的耗时
+
+用法:
+    python -m benchmarks.reference_selection --images 1000 --k 8 --output refs.json
+"""
+import argparse
+import io
+import os
+import time
+
+from .common import LatencyRecorder, bootstrap, write_report
+
+
+def synthetic_features(n: int, clusters: int, dim: int, seed: int):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    # 簇大小不均：少数角度的帧占大多数
+    weights = rng.dirichlet(np.full(clusters, 0.5))
+    labels = rng.choice(clusters, size=n, p=weights)
+    features = centers[labels] + rng.normal(scale=0.05, size=(n, dim)).astype(np.float32)
+    quality = rng.beta(5, 2, size=n).astype(np.float32)
+    return features, quality, labels
+
+
+def time_selection(n: int, args) -> dict:
+    import numpy as np
+    from app.services.reference_selection import select_diverse
+
+    features, quality, labels = synthetic_features(n, args.clusters, args.dim, args.seed)
+    recorder = LatencyRecorder(f"select_{n}")
+    for _ in range(args.repeats):
+        with recorder.measure():
+            picks = select_diverse(quality, features, args.k, args.diversity_weight)
+    recorder.stop()
+    top_quality = np.argsort(-quality)[:args.k]
+    summary = recorder.summary()
+    return {
+        "p50_ms": summary["p50_ms"],
+        "p99_ms": summary["p99_ms"],
+        "clusters_covered": int(len(set(labels[picks]))),
+        "clusters_covered_top_quality": int(len(set(labels[top_quality]))),
+        "mean_quality": round(float(quality[picks].mean()), 3),
+        "mean_quality_top_quality": round(float(quality[top_quality].mean()), 3),
+        "input_images": args.k,
+        "input_reduction": round(1 - args.k / n, 4),
+        "input_bytes_mb": round(args.k * args.avg_image_kb / 1024, 2),
+        "input_bytes_mb_all": round(n * args.avg_image_kb / 1024, 2),
+    }
+
+
+def time_cached_selector(args) -> dict:
+    from app.core.database import SessionLocal
+    from app.core.migrate import migrate
+    from app.models.character import Character, CharacterImage
+    from app.models.user import User
+    from app.services.reference_selection import ReferenceSelector
+
+    migrate()
+    features, quality, _ = synthetic_features(args.images, args.clusters, 96, args.seed)
+    db = SessionLocal()
+    user = User(email="refs@example.com", username="refs", hashed_password="x")
+    db.add(user)
+    db.flush()
+    character = Character(name="refs", user_id=user.id)
+    db.add(character)
+    db.flush()
+    db.add_all([
+        CharacterImage(character_id=character.id, image_url=f"refs/{i}.jpg", quality_score=float(quality[i]),
+                       feature_vector=features[i].tobytes())
+        for i in range(args.images)
+    ])
+    db.commit()
+
+    selector = ReferenceSelector(k=args.k, diversity_weight=args.diversity_weight)
+    cold, warm = LatencyRecorder("cold"), LatencyRecorder("warm")
+    for _ in range(args.repeats):
+        selector.invalidate(character.id)
+        with cold.measure():
+            selector.select(db, character.id)
+        with warm.measure():
+            selector.select(db, character.id)
+    db.close()
+    cold_summary, warm_summary = cold.summary(), warm.summary()
+    return {
+        "images": args.images,
+        "cold_p50_ms": cold_summary["p50_ms"],
+        "cached_p50_ms": warm_summary["p50_ms"],
+    }
+
+
+def time_extraction(samples: int) -> dict:
+    import numpy as np
+    from PIL import Image
+    from app.services.reference_selection import extract_features
+
+    rng = np.random.default_rng(0)
+    pixels = (rng.random((128, 128, 3)) * 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(np.kron(pixels, np.ones((8, 8, 1), dtype=np.uint8))).save(buffer, "JPEG", quality=90)
+    content = buffer.getvalue()
+    recorder = LatencyRecorder("extract")
+    for _ in range(samples):
+        with recorder.measure():
+            extract_features(content)
+    recorder.stop()
+    summary = recorder.summary()
+    return {"image": "1024x1024 JPEG", "p50_ms": summary["p50_ms"], "p99_ms": summary["p99_ms"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="参考图片子集选择基准")
+    parser.add_argument("--images", type=int, default=1000, help="数据库冷/热选择使用的图片数")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 1000, 10000])
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--clusters", type=int, default=12)
+    parser.add_argument("--dim", type=int, default=96)
+    parser.add_argument("--diversity-weight", type=float, default=0.5)
+    parser.add_argument("--avg-image-kb", type=float, default=500.0, help="估算输入字节数用的平均图片大小")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap()
+
+    results = {f"select_{n}": time_selection(n, args) for n in args.sizes}
+    results["selector_sqlite"] = time_cached_selector(args)
+    results["extract_features"] = time_extraction(50)
+    write_report(args.output, "reference_selection", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""SQLite 并发读写基准
+
+在独立子进程中分别以两种 SQLite 配置启动（引擎在导入时创建）：
+- static：旧配置，StaticPool 让所有线程共享一个连接，回滚日志模式
+- queue：WAL + 连接 PRAGMA + 连接池，写入由进程内写锁串行
+
+每种配置在同一份数据上运行两个负载，线程模拟 FastAPI 线程池中并发的请求：
+- read：若干线程反复读取某个用户的角色列表
+- mixed：读取线程之外再加写入线程，每次写入更新一个角色并插入一条任务后提交
+
+报告读/写每秒次数、p50/p99 延迟、失败次数（如 database is locked、事务被其他线程回滚），
+并核对数据库中实际插入的任务数与成功提交的写入数是否一致。共享连接在并发写入下可能使子进程
+崩溃，此时该配置的结果记为 crashed。
+
+用法:
+    python -m benchmarks.sqlite_profile --readers 8 --writers 2 --seconds 5 --output sqlite.json
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+from .common import LatencyRecorder, bootstrap, write_report
+
+
+def seed(users: int, characters: int) -> list:
+    from app.core.database import SessionLocal
+    from app.models.character import Character
+    from app.models.user import User
+
+    db = SessionLocal()
+    owners = []
+    for i in range(users):
+        user = User(email=f"sqlite{i}@example.com", username=f"sqlite{i}", hashed_password="x")
+        db.add(user)
+        db.flush()
+        rows = [Character(name=f"角色{j}", description="v0", user_id=user.id) for j in range(characters)]
+        db.add_all(rows)
+        db.flush()
+        owners.append((user.id, [row.id for row in rows]))
+    db.commit()
+    db.close()
+    return owners
+
+
+def close_quietly(db):
+    try:
+        db.close()
+    except Exception:
+        pass
+
+
+def run_load(owners: list, readers: int, writers: int, seconds: float, seed_value: int) -> dict:
+    from app.core.database import SessionLocal
+    from app.models.character import Character
+    from app.models.video import VideoTask
+
+    reads = LatencyRecorder("read")
+    writes = LatencyRecorder("write")
+    committed = [0]
+    count_lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def reader(index: int):
+        rng = random.Random(seed_value + index)
+        while time.perf_counter() < deadline:
+            user_id, _ = rng.choice(owners)
+            start = time.perf_counter()
+            db = SessionLocal()
+            try:
+                rows = db.query(Character).filter(Character.user_id == user_id).limit(50).all()
+                ok = len(rows) > 0
+                db.close()
+            except Exception:
+                # 共享连接上其他线程的事务可能让这里的查询或归还连接失败
+                ok = False
+                close_quietly(db)
+            reads.add(time.perf_counter() - start, ok)
+
+    def writer(index: int):
+        rng = random.Random(seed_value + 1000 + index)
+        while time.perf_counter() < deadline:
+            user_id, character_ids = rng.choice(owners)
+            character_id = rng.choice(character_ids)
+            start = time.perf_counter()
+            db = SessionLocal()
+            try:
+                db.query(Character).filter(Character.id == character_id).update(
+                    {"description": f"w{index}-{time.perf_counter_ns()}"}, synchronize_session=False)
+                db.add(VideoTask(user_id=user_id, character_id=character_id, script="sqlite benchmark"))
+                db.commit()
+                db.close()
+                ok = True
+            except Exception:
+                ok = False
+                close_quietly(db)
+            writes.add(time.perf_counter() - start, ok)
+            if ok:
+                with count_lock:
+                    committed[0] += 1
+
+    with ThreadPoolExecutor(max_workers=readers + writers) as pool:
+        futures = [pool.submit(reader, i) for i in range(readers)] + [pool.submit(writer, i) for i in range(writers)]
+        for future in futures:
+            future.result()
+    reads.stop()
+    writes.stop()
+
+    db = SessionLocal()
+    try:
+        inserted = db.query(VideoTask).count()
+        db.query(VideoTask).delete()
+        db.commit()
+    finally:
+        db.close()
+    result = {"read": reads.summary()}
+    if writers:
+        result["write"] = writes.summary()
+        result["committed_writes"] = committed[0]
+        result["rows_inserted"] = inserted
+    return result
+
+
+def run_case(mode: str, args_dict: dict, workdir: str) -> dict:
+    args = argparse.Namespace(**args_dict)
+    bootstrap(workdir, SQLITE_POOL=mode, DB_POOL_SIZE=str(args.readers + args.writers), DB_MAX_OVERFLOW="0")
+    import logging
+
+    from app.core.database import engine, replica_router
+    from app.core.migrate import migrate
+
+    logging.getLogger().setLevel(logging.WARNING)
+    engine.echo = False
+    migrate()
+    owners = seed(args.users, args.characters)
+    results = {
+        "read": run_load(owners, args.readers, 0, args.seconds, args.seed),
+        "mixed": run_load(owners, args.readers, args.writers, args.seconds, args.seed),
+    }
+    with engine.connect() as connection:
+        results["journal_mode"] = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+    results["pool"] = replica_router.stats()["pools"]["primary"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 并发读写基准")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--characters", type=int, default=50)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for mode in ("static", "queue"):
+        workdir = tempfile.mkdtemp(prefix=f"aivcl-sqlite-{mode}-")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            try:
+                results[mode] = pool.submit(run_case, mode, vars(args), workdir).result()
+            except BrokenProcessPool as e:
+                # 共享连接在多线程并发写入时可能让 sqlite3 模块直接崩溃
+                results[mode] = {"crashed": True, "error": str(e)}
+    write_report(args.output, "sqlite_profile", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
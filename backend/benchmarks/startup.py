@@ -0,0 +1,130 @@
+"""应用启动时间基准
+
+1. `python -X importtime -c "import app.main"` 的导入耗时分解（按顶层包汇总）
+2. 从拉起 uvicorn 进程到 /health 首次返回 200 的时间，分别测量空库（启动时自动迁移）
+   与结构已是最新（只做指纹检查）两种情况
+
+用法:
+    python -m benchmarks.startup --runs 5 --output startup.json
+"""
+from typing import Dict, List
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from .common import BACKEND_DIR, bootstrap, write_report
+
+
+def _child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def import_breakdown(top: int = 15) -> dict:
+    """解析 -X importtime 输出，返回总耗时与按顶层包汇总的自身耗时"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, env=_child_env(),
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+
+    by_package: Dict[str, int] = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue
+        name = parts[2].strip()
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+        if name == "app.main":
+            total_us = cumulative_us
+
+    ranked = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "import_app_main_ms": round(total_us / 1000, 2),
+        "process_wall_ms": round(wall * 1000, 2),
+        "top_packages_ms": {name: round(us / 1000, 2) for name, us in ranked},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_healthy(timeout: float = 30.0) -> float:
+    """拉起一个uvicorn进程，返回到 /health 首次成功响应的秒数"""
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=_child_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn进程提前退出")
+            time.sleep(0.01)
+        raise TimeoutError("等待 /health 超时")
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def _summary(samples: List[float]) -> dict:
+    return {
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "min_ms": round(min(samples) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="应用启动时间基准")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = bootstrap()
+    db_path = os.path.join(workdir, "bench.db")
+
+    results = {"import": import_breakdown()}
+
+    cold = []
+    for _ in range(args.runs):
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        cold.append(time_to_healthy())
+    results["first_healthy_empty_db"] = _summary(cold)
+
+    warm = [time_to_healthy() for _ in range(args.runs)]
+    results["first_healthy_schema_current"] = _summary(warm)
+
+    write_report(output, "startup", results, {"runs": args.runs})
+
+
+if __name__ == "__main__":
+    main()
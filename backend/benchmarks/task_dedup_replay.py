@@ -0,0 +1,170 @@
+"""重放请求日志，统计任务去重节省的生成工作量
+
+日志为NDJSON，每行一个 POST /videos/generate 请求：
+    {"user": 0, "character": 1, "script": "...", "duration": 30, "style": "realistic",
+     "quality": "high", "idempotency_key": null, "add_image": false}
+add_image 为 true 时在请求前给角色新增一张参考图片（角色形象变化，不应被去重）。
+未指定 --log 时生成一份包含双击、带幂等键重试、完成后重提、空白/大小写差异的合成日志。
+重放过程中模拟worker：每隔 --complete-every 个请求把所有执行中任务标记为完成并生成视频。
+
+用法:
+    python -m benchmarks.task_dedup_replay --requests 2000 --output dedup.json
+"""
+from collections import Counter
+from typing import List
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+
+from .common import bootstrap, write_report
+
+# 各质量档位相对 standard 的单位时长生成成本
+QUALITY_COST = {"standard": 1.0, "high": 3.0, "ultra": 10.0}
+
+
+def synthetic_log(requests: int, users: int, characters: int, seed: int) -> List[dict]:
+    rng = random.Random(seed)
+    log: List[dict] = []
+    # (插入位置, 请求)：稍后重新提交的请求
+    scheduled: List[tuple] = []
+    while len(log) < requests:
+        due = [item for item in scheduled if item[0] <= len(log)]
+        for item in due:
+            scheduled.remove(item)
+            log.append(item[1])
+        base = {
+            "user": rng.randrange(users),
+            "character": rng.randrange(characters),
+            "script": f"场景脚本 {rng.randrange(requests)}",
+            "duration": rng.choice([30, 60, 90, 120]),
+            "style": rng.choice(["realistic", "cartoon", "artistic"]),
+            "quality": rng.choices(["standard", "high", "ultra"], [6, 3, 1])[0],
+            "idempotency_key": None,
+            "add_image": rng.random() < 0.05,
+        }
+        pattern = rng.random()
+        if pattern < 0.15:
+            # 客户端带幂等键的超时重试
+            base["idempotency_key"] = f"key-{len(log)}"
+        log.append(base)
+        repeat = dict(base, add_image=False)
+        if pattern < 0.40:
+            # 幂等键重试或双击：立即重复提交
+            log.append(repeat)
+        elif pattern < 0.50:
+            # 仅空白与大小写不同的重复请求
+            log.append(dict(repeat, script=f"  {base['script']}  ", quality=base["quality"].upper()))
+        elif pattern < 0.60:
+            # 稍后重新提交同一请求（多半已完成）
+            scheduled.append((len(log) + 50, repeat))
+    return log[:requests]
+
+
+def work_units(entry: dict) -> float:
+    return entry["duration"] * QUALITY_COST.get(entry["quality"].strip().lower(), 1.0)
+
+
+def complete_in_flight(session_factory):
+    """模拟worker完成所有执行中的任务"""
+    from app.models.video import Video, VideoTask
+
+    db = session_factory()
+    try:
+        for task in db.query(VideoTask).filter(VideoTask.status.in_(("pending", "processing"))):
+            video = Video(title="replay", script=task.script, user_id=task.user_id,
+                          character_id=task.character_id, duration=task.duration, status="completed")
+            db.add(video)
+            db.flush()
+            task.status, task.progress, task.video_id = "completed", 100, video.id
+        db.commit()
+    finally:
+        db.close()
+
+
+async def replay(log: List[dict], complete_every: int) -> dict:
+    import httpx
+    from app.core.database import SessionLocal
+    from app.main import create_application
+    from app.models.character import CharacterImage
+
+    app = create_application()
+    outcomes: Counter = Counter()
+    requested = executed = 0.0
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost") as client:
+            users = {}
+            for uid in sorted({entry["user"] for entry in log}):
+                r = await client.post("/api/v1/auth/register", json={
+                    "email": f"replay{uid}@example.com", "username": f"replay{uid}", "password": "benchmark-pass"})
+                users[uid] = {"Authorization": f"Bearer {r.json()['access_token']}"}
+            characters = {}
+            for uid, cid in sorted({(entry["user"], entry["character"]) for entry in log}):
+                r = await client.post("/api/v1/characters/", json={"name": f"c{cid}"}, headers=users[uid])
+                characters[(uid, cid)] = r.json()["id"]
+
+            for i, entry in enumerate(log):
+                character_id = characters[(entry["user"], entry["character"])]
+                if entry.get("add_image"):
+                    db = SessionLocal()
+                    db.add(CharacterImage(character_id=character_id, image_url=f"replay/{i}.png"))
+                    db.commit()
+                    db.close()
+                headers = dict(users[entry["user"]])
+                if entry.get("idempotency_key"):
+                    headers["Idempotency-Key"] = entry["idempotency_key"]
+                response = await client.post("/api/v1/videos/generate", headers=headers, json={
+                    "character_id": character_id, "script": entry["script"], "duration": entry["duration"],
+                    "style": entry["style"], "quality": entry["quality"]})
+                outcome = response.headers.get("x-task-deduplicated", "created") if response.status_code == 200 \
+                    else f"http_{response.status_code}"
+                outcomes[outcome] += 1
+                requested += work_units(entry)
+                if outcome == "created":
+                    executed += work_units(entry)
+                if complete_every and (i + 1) % complete_every == 0:
+                    complete_in_flight(SessionLocal)
+
+    return {
+        "requests": len(log),
+        "tasks_created": outcomes["created"],
+        "outcomes": dict(outcomes),
+        "work_requested_units": round(requested, 1),
+        "work_executed_units": round(executed, 1),
+        "work_saved_ratio": round(1 - executed / requested, 4) if requested else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务去重重放基准")
+    parser.add_argument("--log", help="NDJSON请求日志，缺省生成合成日志")
+    parser.add_argument("--dump-log", help="把使用的请求日志写到该路径")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--characters", type=int, default=3)
+    parser.add_argument("--complete-every", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    paths = {name: os.path.abspath(p) if p else None for name, p in
+             (("log", args.log), ("dump", args.dump_log), ("output", args.output))}
+
+    if paths["log"]:
+        with open(paths["log"], encoding="utf-8") as f:
+            log = [json.loads(line) for line in f if line.strip()]
+    else:
+        log = synthetic_log(args.requests, args.users, args.characters, args.seed)
+    if paths["dump"]:
+        with open(paths["dump"], "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in log)
+
+    bootstrap()
+    logging.getLogger().setLevel(logging.WARNING)
+    results = asyncio.run(replay(log, args.complete_every))
+    write_report(paths["output"], "task_dedup_replay", {"replay": results}, vars(args))
+
+
+if __name__ == "__main__":
+    main()
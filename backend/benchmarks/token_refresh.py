@@ -0,0 +1,132 @@
+"""令牌续期CPU开销基准
+
+访问令牌过期后客户端有两种续期方式：
+- relogin：旧方式，重新用邮箱密码登录，每次都做一次 bcrypt 校验
+- refresh：用刷新令牌换取新令牌（HMAC摘要查库、条件更新轮换、签发JWT），只在会话开始时登录一次
+
+请求都经过进程内的真实应用，用 time.process_time 统计每次续期消耗的CPU时间（含路由、数据库与
+JSON开销），并单独测量 bcrypt 校验、HMAC 摘要与撤销列表查询本身的耗时。按访问令牌有效期折算
+每个会话小时的CPU开销（refresh 摊入会话开始时的一次登录）与单核可承载的在线会话数。
+
+用法:
+    python -m benchmarks.token_refresh --renewals 50 --access-ttl-minutes 5 15 30 --output refresh.json
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+from .common import LatencyRecorder, bootstrap, write_report
+
+PASSWORD = "benchmark-pass"
+
+
+def cpu_per_call_us(fn, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return round((time.process_time() - start) / repeat * 1e6, 3)
+
+
+async def measure_renewals(client, mode: str, email: str, renewals: int) -> dict:
+    """连续续期 renewals 次，返回每次续期的CPU时间与延迟"""
+    recorder = LatencyRecorder(mode)
+    login = await client.post("/api/v1/auth/login", json={"email": email, "password": PASSWORD})
+    refresh_token = login.json()["refresh_token"]
+    cpu = 0.0
+    for _ in range(renewals):
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        if mode == "relogin":
+            response = await client.post("/api/v1/auth/login", json={"email": email, "password": PASSWORD})
+        else:
+            response = await client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+        recorder.add(time.perf_counter() - start, response.status_code == 200)
+        cpu += time.process_time() - cpu_start
+        if response.status_code == 200:
+            refresh_token = response.json()["refresh_token"]
+    recorder.stop()
+    return {"cpu_ms_per_renewal": round(cpu / renewals * 1000, 3), "latency": recorder.summary()}
+
+
+async def main_async(args) -> dict:
+    import httpx
+
+    from app.core.config import settings
+    from app.core.refresh_tokens import MemoryRevocationBackend, hash_refresh_token
+    from app.core.security import get_password_hash, verify_password
+    from app.main import create_application
+
+    settings.rate_limit_enabled = False
+    settings.admission_enabled = False
+    app = create_application()
+    results = {}
+    async with app.router.lifespan_context(app):
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost")
+        email = "refresh@example.com"
+        await client.post("/api/v1/auth/register",
+                          json={"email": email, "username": "refresh", "password": PASSWORD})
+        # 预热
+        await measure_renewals(client, "refresh", email, 3)
+        per_renewal = {mode: await measure_renewals(client, mode, email, args.renewals)
+                       for mode in ("relogin", "refresh")}
+        await client.aclose()
+
+    hashed = get_password_hash(PASSWORD)
+    revocations = MemoryRevocationBackend()
+    for _ in range(args.revoked_sessions):
+        await revocations.revoke(str(uuid.uuid4()), 3600)
+    session_id = str(uuid.uuid4())
+    start = time.process_time()
+    for _ in range(args.micro_repeat):
+        await revocations.is_revoked(session_id)
+    lookup_us = round((time.process_time() - start) / args.micro_repeat * 1e6, 3)
+    results["primitives"] = {
+        "bcrypt_verify_us": cpu_per_call_us(lambda: verify_password(PASSWORD, hashed), max(5, args.renewals // 5)),
+        "hmac_digest_us": cpu_per_call_us(lambda: hash_refresh_token("x" * 43), args.micro_repeat),
+        "revocation_lookup_us": lookup_us,
+        "revocation_list_sessions": len(revocations),
+    }
+
+    login_cpu_ms = per_renewal["relogin"]["cpu_ms_per_renewal"]
+    for ttl in args.access_ttl_minutes:
+        renewals_per_hour = 60 / ttl
+        for mode, measured in per_renewal.items():
+            cpu_ms = measured["cpu_ms_per_renewal"] * renewals_per_hour
+            if mode == "refresh":
+                cpu_ms += login_cpu_ms / args.session_hours
+            results[f"{mode}@ttl{ttl}m"] = {
+                **measured,
+                "renewals_per_hour": round(renewals_per_hour, 2),
+                "cpu_ms_per_session_hour": round(cpu_ms, 3),
+                "sessions_per_core": int(3_600_000 / cpu_ms) if cpu_ms else None,
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="令牌续期CPU开销基准")
+    parser.add_argument("--renewals", type=int, default=50, help="每种方式连续续期的次数")
+    parser.add_argument("--access-ttl-minutes", type=float, nargs="+", default=[5, 15, 30])
+    parser.add_argument("--session-hours", type=float, default=8.0, help="一次登录持续的会话时长，用于摊销登录开销")
+    parser.add_argument("--revoked-sessions", type=int, default=100_000, help="撤销列表中的会话数")
+    parser.add_argument("--micro-repeat", type=int, default=100_000)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap()
+    from app.core.database import engine
+    from app.core.migrate import migrate
+
+    logging.getLogger().setLevel(logging.WARNING)
+    engine.echo = False
+    migrate()
+    results = asyncio.run(main_async(args))
+    write_report(args.output, "token_refresh", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
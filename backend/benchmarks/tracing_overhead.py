@@ -0,0 +1,226 @@
+"""分布式追踪开销基准
+
+每种模式在独立子进程中运行同一组接口请求（角色列表、角色详情、任务查询、不存在的角色），
+并发客户端经ASGI直接调用应用。报告延迟 p50/p99、每请求CPU时间、每请求创建的 span 数、
+尾部采样保留/丢弃的片段数、导出的 span 数与写出的文件字节数。同一机器上前后两次运行的
+CPU时间可相差两成以上，各模式交替运行 --rounds 轮，延迟与CPU时间取各轮中位数：
+- off：TRACING_ENABLED=false
+- tail：默认尾部采样（出错与慢请求全部保留，其余按 trace ID 保留 1%）
+- keep_all：采样率 1.0，导出全部 span（上限）
+
+之后另起一个开启任务worker的子进程，以 keep_all 模式创建一个生成任务并等待完成，检查
+worker 侧的 span 是否与创建任务的请求属于同一 trace，报告该 trace 的 span 名称与数量。
+
+用法:
+    python -m benchmarks.tracing_overhead --requests 5000 --concurrency 8 --output tracing.json
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import collections
+import json
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from .common import LatencyRecorder, bootstrap, write_report
+
+MODES = {
+    "off": {"TRACING_ENABLED": "false"},
+    "tail": {"TRACING_ENABLED": "true", "TRACE_SAMPLE_RATIO": "0.01"},
+    "keep_all": {"TRACING_ENABLED": "true", "TRACE_SAMPLE_RATIO": "1.0"},
+}
+# 多轮运行时取中位数的指标，其余指标取最后一轮
+ROUND_MEDIAN_KEYS = ("rps", "p50_ms", "p95_ms", "p99_ms", "cpu_us_per_request")
+
+
+def seed(characters: int) -> dict:
+    """写入一个用户、若干角色与任务，返回访问令牌和请求路径"""
+    from app.core.database import engine
+    from app.core.security import create_access_token
+    from app.models.character import Character
+    from app.models.user import User, generate_uuid
+    from app.models.video import VideoTask
+
+    user_id = generate_uuid()
+    character_ids = [generate_uuid() for _ in range(characters)]
+    task_ids = [generate_uuid() for _ in range(characters)]
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"id": user_id, "email": "trace@example.com", "username": "trace", "hashed_password": "x"}])
+        connection.execute(Character.__table__.insert(), [
+            {"id": character_id, "name": f"角色{i}", "description": "追踪基准", "user_id": user_id}
+            for i, character_id in enumerate(character_ids)])
+        connection.execute(VideoTask.__table__.insert(), [
+            {"id": task_id, "user_id": user_id, "character_id": character_id, "script": "脚本",
+             "status": "completed", "progress": 100}
+            for task_id, character_id in zip(task_ids, character_ids)])
+    paths = ["/api/v1/characters/?limit=20", "/api/v1/characters/missing"]
+    paths += [f"/api/v1/characters/{character_id}" for character_id in character_ids]
+    paths += [f"/api/v1/videos/tasks/{task_id}" for task_id in task_ids]
+    return {"token": create_access_token({"sub": user_id}), "paths": paths, "character_id": character_ids[0]}
+
+
+def _trace_file_bytes() -> int:
+    from app.core.config import settings
+
+    try:
+        return os.path.getsize(settings.trace_file)
+    except OSError:
+        return 0
+
+
+def run_mode(mode: str, args_dict: dict) -> dict:
+    workdir = tempfile.mkdtemp(prefix="aivcl-trace-")
+    bootstrap(workdir, **MODES[mode])
+    import logging
+
+    import httpx
+
+    from app.core.database import engine
+    from app.core.migrate import migrate
+    from app.core.tracing import tracer
+    from app.main import create_application
+
+    logging.getLogger().setLevel(logging.WARNING)
+    engine.echo = False
+    migrate()
+    data = seed(args_dict["characters"])
+    app = create_application()
+    headers = {"Authorization": f"Bearer {data['token']}"}
+    paths = data["paths"]
+    # 统计创建的 span 数（含被采样丢弃的），不影响采样与导出
+    created = {"spans": 0}
+    start_span = tracer.start_span
+
+    def counting_start_span(*args, **kwargs):
+        created["spans"] += 1
+        return start_span(*args, **kwargs)
+
+    tracer.start_span = counting_start_span
+
+    async def client_loop(client, recorder, count, offset):
+        for i in range(count):
+            path = paths[(offset + i) % len(paths)]
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            recorder.add(time.perf_counter() - start, response.status_code < 500)
+
+    async def go():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+                # 预热：加载鉴权、序列化等延迟导入的模块，并填充路由模板缓存
+                for path in paths[:4]:
+                    await client.get(path, headers=headers)
+                created["spans"] = 0
+                segments = tracer.segments
+                concurrency = args_dict["concurrency"]
+                per_client = args_dict["requests"] // concurrency
+                recorder = LatencyRecorder(mode)
+                cpu = time.process_time()
+                await asyncio.gather(*(client_loop(client, recorder, per_client, k * 7)
+                                       for k in range(concurrency)))
+                cpu = time.process_time() - cpu
+                recorder.stop()
+                segments = tracer.segments - segments
+        # lifespan 结束时 tracer.shutdown() 已导出队列中的剩余数据
+        return recorder, cpu, segments
+
+    recorder, cpu, segments = asyncio.run(go())
+    summary = recorder.summary()
+    stats = tracer.stats()
+    summary.update({
+        "cpu_us_per_request": round(cpu / summary["requests"] * 1e6, 1),
+        "spans_per_request": round(created["spans"] / summary["requests"], 2),
+        "segments": segments,
+        "kept": stats["kept"],
+        "dropped_by_sampling": stats["dropped_by_sampling"],
+        "exported_spans": stats["exported_spans"],
+        "trace_file_bytes": _trace_file_bytes(),
+    })
+    return summary
+
+
+def run_task_trace(args_dict: dict) -> dict:
+    """开启worker创建一个生成任务，检查worker侧的 span 是否接在请求的 trace 下"""
+    workdir = tempfile.mkdtemp(prefix="aivcl-trace-task-")
+    bootstrap(workdir, TASK_WORKERS="1", **MODES["keep_all"])
+    import logging
+
+    import httpx
+
+    from app.core.config import settings
+    from app.core.database import engine
+    from app.core.migrate import migrate
+    from app.main import create_application
+
+    logging.getLogger().setLevel(logging.WARNING)
+    engine.echo = False
+    migrate()
+    data = seed(1)
+    app = create_application()
+    headers = {"Authorization": f"Bearer {data['token']}"}
+
+    async def go():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+                response = await client.post("/api/v1/videos/generate", headers=headers, json={
+                    "character_id": data["character_id"], "script": "追踪基准", "duration": 10})
+                task = response.json()
+                for _ in range(args_dict["task_timeout"] * 10):
+                    task = (await client.get(f"/api/v1/videos/tasks/{task['id']}", headers=headers)).json()
+                    if task["status"] in ("completed", "failed"):
+                        break
+                    await asyncio.sleep(0.1)
+                return response.headers.get("x-trace-id"), task["status"]
+
+    trace_id, status = asyncio.run(go())
+    names = collections.Counter()
+    with open(settings.trace_file, encoding="utf-8") as f:
+        for line in f:
+            for resource_spans in json.loads(line)["resourceSpans"]:
+                for scope_spans in resource_spans["scopeSpans"]:
+                    names.update(span["name"] for span in scope_spans["spans"] if span["traceId"] == trace_id)
+    return {
+        "task_status": status,
+        "trace_id": trace_id,
+        "worker_spans_in_trace": names["video_task.execute"] > 0,
+        "span_names": dict(names),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分布式追踪开销基准")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--characters", type=int, default=20)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--task-timeout", type=int, default=30, help="等待生成任务完成的秒数")
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    context = multiprocessing.get_context("spawn")
+    rounds = {mode: [] for mode in args.modes}
+    for _ in range(args.rounds):
+        for mode in args.modes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                rounds[mode].append(pool.submit(run_mode, mode, vars(args)).result())
+    results = {}
+    for mode, runs in rounds.items():
+        results[mode] = dict(runs[-1])
+        for key in ROUND_MEDIAN_KEYS:
+            results[mode][key] = round(statistics.median(run[key] for run in runs), 3)
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        results["task_trace"] = pool.submit(run_task_trace, vars(args)).result()
+    write_report(args.output, "tracing_overhead", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""断点续传上传基准
+
+模拟不稳定的移动网络：链路按字节计数，断线间隔服从均值为 --mean-drop-kb 的指数分布，
+传输中途断线时已发出的字节白白浪费。对同一批随机噪声PNG（不可压缩）比较：
+- batch：一个 multipart 请求上传整批，断线后整批重传
+- chunked_<KB>：创建会话后按分块并行 PUT，断线的分块（服务端收到被截断的分块并拒绝）
+  在查询会话状态后单独补传，最后 finalize
+
+请求都经过进程内的真实应用。报告有效载荷字节数、实际发送字节数、重传字节数（发送 - 有效载荷）、
+发送放大倍数、请求数、断线次数与是否在尝试上限内完成，并核对入库的图片数。
+
+用法:
+    python -m benchmarks.upload_resume --files 20 --file-kb 200 --mean-drop-kb 1024 4096 --output upload.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import time
+
+from .common import bootstrap, write_report
+
+
+class FlakyLink:
+    """按字节计的链路，断线间隔服从指数分布"""
+
+    def __init__(self, mean_bytes: float, rng: random.Random):
+        self.mean_bytes = mean_bytes
+        self.rng = rng
+        self.until_drop = rng.expovariate(1 / mean_bytes)
+        self.sent = 0
+        self.drops = 0
+        self.requests = 0
+
+    def transmit(self, size: int) -> int:
+        """发送 size 字节，返回断线前送达的字节数"""
+        self.requests += 1
+        if self.until_drop >= size:
+            self.until_drop -= size
+            self.sent += size
+            return size
+        delivered = int(self.until_drop)
+        self.sent += delivered
+        self.drops += 1
+        self.until_drop = self.rng.expovariate(1 / self.mean_bytes)
+        return delivered
+
+
+def noise_png(kb: int, seed: int) -> bytes:
+    import numpy as np
+    from PIL import Image
+
+    side = int((kb * 1024 / 3) ** 0.5)
+    pixels = np.random.default_rng(seed).integers(0, 256, (side, side, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def create_character(client, name: str) -> tuple:
+    response = await client.post("/api/v1/auth/register", json={
+        "email": f"{name}@example.com", "username": name, "password": "benchmark-pass"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.post("/api/v1/characters/", json={"name": name}, headers=headers)
+    return response.json()["id"], headers
+
+
+async def upload_batch(client, character_id: str, headers: dict, files: list, link: FlakyLink,
+                       max_attempts: int) -> dict:
+    multipart = [("files", (f"{i}.png", data, "image/png")) for i, data in enumerate(files)]
+    request = client.build_request("POST", f"/api/v1/upload/character/{character_id}/images", files=multipart,
+                                   headers=headers)
+    size = len(request.read())
+    for _ in range(max_attempts):
+        if link.transmit(size) == size:
+            response = await client.send(request)
+            return {"completed": True, "uploaded": response.json()["total_uploaded"]}
+    return {"completed": False, "uploaded": 0}
+
+
+async def upload_chunked(client, character_id: str, headers: dict, files: list, link: FlakyLink, chunk_size: int,
+                         concurrency: int, max_rounds: int) -> dict:
+    body = json.dumps({"files": [{"filename": f"{i}.png", "size": len(data), "content_type": "image/png"}
+                                 for i, data in enumerate(files)], "chunk_size": chunk_size})
+    while link.transmit(len(body)) < len(body):
+        pass
+    session = (await client.post(f"/api/v1/upload/character/{character_id}/sessions", content=body,
+                                 headers={**headers, "Content-Type": "application/json"})).json()
+    session_id, chunk_size = session["session_id"], session["chunk_size"]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def put_chunk(file_index: int, chunk: int):
+        offset = chunk * chunk_size
+        data = files[file_index][offset:offset + chunk_size]
+        async with semaphore:
+            delivered = link.transmit(len(data))
+            # 断线时服务端收到被截断的分块，校验长度后拒绝
+            await client.put(f"/api/v1/upload/sessions/{session_id}/files/{file_index}",
+                             params={"offset": offset}, content=data[:delivered], headers=headers)
+
+    missing = [(spec["index"], chunk) for spec in session["files"] for chunk in spec["missing_chunks"]]
+    for _ in range(max_rounds):
+        await asyncio.gather(*(put_chunk(file_index, chunk) for file_index, chunk in missing))
+        status = (await client.get(f"/api/v1/upload/sessions/{session_id}", headers=headers)).json()
+        link.requests += 1
+        missing = [(spec["index"], chunk) for spec in status["files"] for chunk in spec["missing_chunks"]]
+        if not missing:
+            break
+    if missing:
+        return {"completed": False, "uploaded": 0}
+    link.requests += 1
+    response = await client.post(f"/api/v1/upload/sessions/{session_id}/finalize", headers=headers)
+    return {"completed": True, "uploaded": response.json()["total_uploaded"]}
+
+
+async def main_async(args) -> dict:
+    import httpx
+
+    from app.main import create_application
+
+    app = create_application()
+    files = [noise_png(args.file_kb, seed) for seed in range(args.files)]
+    payload = sum(len(data) for data in files)
+    results = {}
+    async with app.router.lifespan_context(app):
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://localhost")
+        modes = ["batch"] + [f"chunked_{kb}kb" for kb in args.chunk_kb]
+        for mean_kb in args.mean_drop_kb:
+            for mode in modes:
+                link = FlakyLink(mean_kb * 1024, random.Random(args.seed))
+                character_id, headers = await create_character(client, f"{mode}_{mean_kb}")
+                start = time.perf_counter()
+                if mode == "batch":
+                    outcome = await upload_batch(client, character_id, headers, files, link, args.max_attempts)
+                else:
+                    chunk_size = int(mode.split("_")[1][:-2]) * 1024
+                    outcome = await upload_chunked(client, character_id, headers, files, link, chunk_size,
+                                                   args.concurrency, args.max_attempts)
+                results[f"{mode}@drop{mean_kb}kb"] = {
+                    **outcome,
+                    "payload_bytes": payload,
+                    "bytes_sent": link.sent,
+                    "bytes_retransmitted": max(0, link.sent - payload),
+                    "send_amplification": round(link.sent / payload, 3),
+                    "requests": link.requests,
+                    "drops": link.drops,
+                    "wall_s": round(time.perf_counter() - start, 3),
+                }
+        await client.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="断点续传上传基准")
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--file-kb", type=int, default=200)
+    parser.add_argument("--mean-drop-kb", type=int, nargs="+", default=[1024, 4096, 16384],
+                        help="平均每发送多少KB断线一次")
+    parser.add_argument("--chunk-kb", type=int, nargs="+", default=[64, 256])
+    parser.add_argument("--concurrency", type=int, default=4, help="并行上传的分块数")
+    parser.add_argument("--max-attempts", type=int, default=200, help="整批重传次数/补传轮数上限")
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap()
+    from app.core.database import engine
+    from app.core.migrate import migrate
+
+    logging.getLogger().setLevel(logging.WARNING)
+    engine.echo = False
+    migrate()
+    results = asyncio.run(main_async(args))
+    write_report(args.output, "upload_resume", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""WebSocket消息编码基准
+
+按典型比例合成 1 万条推送事件（大部分是进度更新，少量预览、完成与失败，完成事件带较大的
+结果字典），对比各编码每条事件的平均字节数与编码/解码CPU时间：
+- json：原有编码（ISO时间戳字符串、完整字段名）
+- json_deflate：json 加上传输层 permessage-deflate（上下文接管的 zlib 流、每条消息同步刷新）
+- msgpack：短字段代码、毫秒整数时间戳，超过阈值的大消息 zlib 压缩
+- msgpack_deflate：msgpack 再叠加 permessage-deflate
+
+CPU时间为进程CPU时间，按每 1 万条事件折算。
+
+用法:
+    python -m benchmarks.ws_protocol --events 10000 --output ws_protocol.json
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+from .common import bootstrap, write_report
+
+
+def synthetic_events(count: int, seed: int):
+    rng = random.Random(seed)
+    tasks = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(200)]
+    start = datetime(2024, 1, 1)
+    events = []
+    for i in range(count):
+        task_id = rng.choice(tasks)
+        timestamp = start + timedelta(milliseconds=i * 37)
+        kind = rng.choices(["progress", "preview", "completed", "failed"], [90, 4, 5, 1])[0]
+        if kind == "progress":
+            events.append({"type": "task_progress_update", "task_id": task_id, "progress": rng.randint(0, 99),
+                           "status": "processing", "message": "", "timestamp": timestamp})
+        elif kind == "preview":
+            events.append({"type": "task_preview_ready", "task_id": task_id, "timestamp": timestamp, "preview": {
+                "preview_url": f"./generated/{task_id}/preview.mp4", "width": 160, "height": 90}})
+        elif kind == "completed":
+            scenes = [{"index": s, "start": s * 10.0, "end": (s + 1) * 10.0, "attempts": 1} for s in range(12)]
+            events.append({"type": "task_completed", "task_id": task_id, "timestamp": timestamp, "result": {
+                "video_url": f"./generated/{task_id}/video.mp4",
+                "thumbnail_url": f"./generated/{task_id}/thumbnail.jpg",
+                "video_id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "scenes": scenes,
+                "consistency": {"consistency_score": 0.93,
+                                "scene_scores": {str(s): round(rng.uniform(0.8, 1.0), 4) for s in range(12)},
+                                "drifting_scenes": []},
+            }})
+        else:
+            events.append({"type": "task_failed", "task_id": task_id, "timestamp": timestamp,
+                           "error": "场景 3 渲染失败（模拟）"})
+    return events
+
+
+def measure(codec, events, deflate: bool, repeats: int) -> dict:
+    encode_cpu = decode_cpu = 0.0
+    total_bytes = 0
+    for _ in range(repeats):
+        compressor = zlib.compressobj(wbits=-15) if deflate else None
+        decompressor = zlib.decompressobj(wbits=-15) if deflate else None
+        start = time.process_time()
+        frames = []
+        for event in events:
+            data = codec.encode(event)
+            if deflate:
+                raw = data.encode() if isinstance(data, str) else data
+                data = compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            frames.append(data)
+        encode_cpu += time.process_time() - start
+        total_bytes = sum(len(frame.encode() if isinstance(frame, str) else frame) for frame in frames)
+
+        start = time.process_time()
+        for frame in frames:
+            if deflate:
+                frame = decompressor.decompress(frame)
+                if not codec.binary:
+                    frame = frame.decode()
+            codec.decode(frame)
+        decode_cpu += time.process_time() - start
+    scale = 10000 / len(events) / repeats
+    return {
+        "bytes_per_event": round(total_bytes / len(events), 1),
+        "total_kb": round(total_bytes / 1024, 1),
+        "encode_cpu_ms_per_10k": round(encode_cpu * 1000 * scale, 2),
+        "decode_cpu_ms_per_10k": round(decode_cpu * 1000 * scale, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket消息编码基准")
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--output", help="JSON报告输出路径，缺省打印到标准输出")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    bootstrap()
+    from app.services.ws_protocol import json_codec, msgpack_codec
+
+    events = synthetic_events(args.events, args.seed)
+    results = {
+        "json": measure(json_codec, events, False, args.repeats),
+        "json_deflate": measure(json_codec, events, True, args.repeats),
+        "msgpack": measure(msgpack_codec, events, False, args.repeats),
+        "msgpack_deflate": measure(msgpack_codec, events, True, args.repeats),
+    }
+    baseline = results["json"]["bytes_per_event"]
+    for result in results.values():
+        result["bytes_vs_json"] = round(result["bytes_per_event"] / baseline, 3)
+    write_report(args.output, "ws_protocol", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
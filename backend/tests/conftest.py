@@ -0,0 +1,68 @@
+"""测试环境：settings 与 engine 在导入 app 时即创建，必须先设置环境变量"""
+import os
+import tempfile
+
+import pytest
+
+_WORKDIR = tempfile.mkdtemp(prefix="aivcl-test-")
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_WORKDIR, 'test.db')}",
+    "DEBUG": "false",
+    "ENVIRONMENT": "test",
+    "SECRET_KEY": "test-secret-key",
+    "UPLOAD_DIR": os.path.join(_WORKDIR, "uploads"),
+    "UPLOAD_SESSION_DIR": os.path.join(_WORKDIR, "upload_sessions"),
+    "TASK_WORKERS": "0",
+    "TRACING_ENABLED": "false",
+    "RATE_LIMIT_ENABLED": "false",
+    "ADMISSION_ENABLED": "false",
+})
+
+
+def _drop_all_tables():
+    from sqlalchemy import inspect, text
+
+    from app.core.database import engine
+
+    with engine.begin() as connection:
+        for name in inspect(connection).get_table_names():
+            connection.execute(text(f"DROP TABLE {name}"))
+
+
+@pytest.fixture
+def empty_database():
+    _drop_all_tables()
+    yield
+    _drop_all_tables()
+
+
+@pytest.fixture
+def database(empty_database):
+    from app.core.migrate import migrate
+
+    migrate()
+
+
+@pytest.fixture
+def client(database):
+    from fastapi.testclient import TestClient
+
+    from app.main import create_application
+
+    # 非调试模式只允许 localhost 作为 Host
+    with TestClient(create_application(), base_url="http://localhost") as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def register(client):
+    """注册用户，返回带访问令牌的请求头与令牌响应"""
+    def _register(name: str = "alice") -> dict:
+        response = client.post("/api/v1/auth/register", json={
+            "email": f"{name}@example.com", "username": name, "password": "password123",
+        })
+        assert response.status_code == 200, response.text
+        tokens = response.json()
+        return {"headers": {"Authorization": f"Bearer {tokens['access_token']}"}, **tokens}
+    return _register
@@ -0,0 +1,86 @@
+"""准入控制：连接池等待过载后随时间解除"""
+import asyncio
+
+from app.core.database import PoolWaitTracker
+from app.core.rate_limit import AdmissionController, LoopLagMonitor, RateLimitMiddleware
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _call(app, path: str = "/api/v1/characters/") -> int:
+    """发起一次HTTP请求，返回状态码"""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": [], "client": ("127.0.0.1", 1)}
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"]
+
+
+def _app(tracker: PoolWaitTracker, checkout_seconds: float = 0.001):
+    """每次请求都签出一次连接（记录一个等待样本）的应用，外面套上准入控制"""
+    async def endpoint(scope, receive, send):
+        tracker.observe(checkout_seconds)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    admission = AdmissionController(
+        max_loop_lag_ms=200.0, max_pool_wait_ms=500.0, lag_monitor=LoopLagMonitor(), pool_wait=tracker
+    )
+    return RateLimitMiddleware(endpoint, rules=[], admission=admission), admission
+
+
+def test_pool_wait_decays_over_time():
+    clock = FakeClock()
+    tracker = PoolWaitTracker(alpha=1.0, half_life=2.0, clock=clock)
+    tracker.observe(1.0)
+    assert tracker.wait_ms == 1000.0
+    clock.now = 2.0
+    assert abs(tracker.wait_ms - 500.0) < 1e-9
+    clock.now = 4.0
+    assert abs(tracker.wait_ms - 250.0) < 1e-9
+
+
+def test_overload_clears_after_slow_checkout():
+    clock = FakeClock()
+    tracker = PoolWaitTracker(alpha=1.0, half_life=2.0, clock=clock)
+    app, admission = _app(tracker)
+
+    # 一次慢签出使平均等待超过阈值，之后的请求在到达处理函数前被拒绝
+    tracker.observe(1.0)
+    assert admission.overload_reason() == "db_pool_wait"
+    assert _call(app) == 503
+    assert _call(app) == 503
+    assert admission.shed_count == 2
+    assert admission.shed_by_reason == {"db_pool_wait": 2}
+
+    # 被拒绝的请求不产生新样本，平均值仍随时间衰减，超过一个半衰期后恢复接纳
+    clock.now = 2.5
+    assert admission.overload_reason() is None
+    assert _call(app) == 200
+    assert _call(app) == 200
+    assert tracker.wait_ms < 500.0
+
+
+def test_sustained_overload_keeps_shedding():
+    clock = FakeClock()
+    tracker = PoolWaitTracker(alpha=1.0, half_life=2.0, clock=clock)
+    app, _ = _app(tracker, checkout_seconds=2.0)
+
+    tracker.observe(2.0)
+    assert _call(app) == 503
+    # 衰减后放进的请求再次遇到慢签出，过载判断重新生效
+    clock.now = 5.0
+    assert _call(app) == 200
+    assert _call(app) == 503
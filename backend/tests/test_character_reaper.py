@@ -0,0 +1,177 @@
+"""角色软删除与后台分批清理"""
+import asyncio
+import io
+import os
+from datetime import datetime
+
+import pytest
+from PIL import Image
+
+from app.core.database import SessionLocal
+from app.models.character import Character, CharacterImage
+from app.models.user import User, generate_uuid
+from app.models.video import Video, VideoTask
+from app.services.character_reaper import CharacterReaper, character_reaper
+from app.services.task_scheduler import task_scheduler
+from app.services.video_pipeline import task_worker_pool
+
+
+def _png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), (200, 10, 10)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _rows(model, character_id: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(model).filter(model.character_id == character_id).count()
+    finally:
+        db.close()
+
+
+def _character_exists(character_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(Character).filter(Character.id == character_id).count() == 1
+    finally:
+        db.close()
+
+
+def test_deleted_character_is_hidden_from_endpoints(client, register, monkeypatch):
+    # 不让后台立即清理，确认接口按 deleted_at 过滤而不是依赖记录已被删除
+    monkeypatch.setattr(character_reaper, "wake", lambda: None)
+    user = register()
+    headers = user["headers"]
+    kept = client.post("/api/v1/characters/", json={"name": "保留"}, headers=headers).json()["id"]
+    deleted = client.post("/api/v1/characters/", json={"name": "删除"}, headers=headers).json()["id"]
+
+    assert client.delete(f"/api/v1/characters/{deleted}", headers=headers).status_code == 200
+
+    assert [c["id"] for c in client.get("/api/v1/characters/", headers=headers).json()] == [kept]
+    assert client.get(f"/api/v1/characters/{deleted}", headers=headers).status_code == 404
+    assert client.put(f"/api/v1/characters/{deleted}", json={"name": "改名"}, headers=headers).status_code == 404
+    assert client.delete(f"/api/v1/characters/{deleted}", headers=headers).status_code == 404
+    files = {"files": ("a.png", _png(), "image/png")}
+    assert client.post(f"/api/v1/upload/character/{deleted}/images", files=files,
+                       headers=headers).status_code == 404
+    response = client.post(f"/api/v1/upload/character/{deleted}/sessions", headers=headers,
+                           json={"files": [{"filename": "a.png", "size": 10}]})
+    assert response.status_code == 404
+    assert client.post(f"/api/v1/upload/character/{kept}/images", files=files,
+                       headers=headers).status_code == 200
+    # 记录仍在，等待后台清理
+    assert _character_exists(deleted)
+
+
+def test_delete_cancels_in_flight_tasks(client, register, monkeypatch):
+    monkeypatch.setattr(character_reaper, "wake", lambda: None)
+    cancelled_in_workers = []
+    monkeypatch.setattr(task_worker_pool, "cancel", cancelled_in_workers.append)
+    headers = register()["headers"]
+    character_id = client.post("/api/v1/characters/", json={"name": "角色"}, headers=headers).json()["id"]
+    response = client.post("/api/v1/videos/generate", json={"character_id": character_id, "script": "脚本",
+                                                            "duration": 10}, headers=headers)
+    assert response.status_code == 200, response.text
+    task_id = response.json()["id"]
+    assert task_id in task_scheduler.tasks
+
+    assert client.delete(f"/api/v1/characters/{character_id}", headers=headers).status_code == 200
+
+    assert task_id not in task_scheduler.tasks
+    assert cancelled_in_workers == [task_id]
+    db = SessionLocal()
+    try:
+        task = db.query(VideoTask).filter(VideoTask.id == task_id).one()
+        assert task.status == "cancelled"
+        assert task.completed_at is not None
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def deleted_character(database, tmp_path):
+    """一个已标记删除的角色：5张图片、3个任务、2个视频，每条记录都有对应的文件"""
+    db = SessionLocal()
+    try:
+        user = User(id=generate_uuid(), email="reaper@example.com", username="reaper", hashed_password="x")
+        character = Character(id=generate_uuid(), name="角色", user_id=user.id, deleted_at=datetime.utcnow())
+        survivor = Character(id=generate_uuid(), name="保留", user_id=user.id)
+        db.add_all([user, character, survivor])
+        db.flush()
+
+        def touch(name: str) -> str:
+            path = str(tmp_path / name)
+            open(path, "wb").close()
+            return path
+
+        videos = [Video(id=generate_uuid(), title="v", script="s", user_id=user.id, character_id=character.id,
+                        video_url=touch(f"video{i}.mp4"), thumbnail_url=touch(f"thumb{i}.jpg")) for i in range(2)]
+        db.add_all(videos)
+        db.flush()
+        db.add_all(CharacterImage(id=generate_uuid(), character_id=character.id, image_url=touch(f"image{i}.png"))
+                   for i in range(5))
+        db.add_all(VideoTask(id=generate_uuid(), user_id=user.id, character_id=character.id, script="s",
+                             status="completed", video_id=videos[i % 2].id, preview_url=touch(f"preview{i}.mp4"))
+                   for i in range(3))
+        db.add(CharacterImage(id=generate_uuid(), character_id=survivor.id, image_url=touch("survivor.png")))
+        db.commit()
+        return {"id": character.id, "survivor": survivor.id, "dir": tmp_path}
+    finally:
+        db.close()
+
+
+def test_reaps_in_batches_and_deletes_files(deleted_character):
+    reaper = CharacterReaper(batch_size=2)
+    character_id = deleted_character["id"]
+    assert reaper.pending() == [character_id]
+
+    # 每批最多删除 batch_size 条记录，图片删完才删任务，任务删完才删视频
+    steps = []
+    while True:
+        finished, _ = reaper.reap_batch(character_id)
+        steps.append((_rows(CharacterImage, character_id), _rows(VideoTask, character_id),
+                      _rows(Video, character_id), _character_exists(character_id)))
+        if finished:
+            break
+    assert steps == [
+        (3, 3, 2, True), (1, 3, 2, True), (0, 3, 2, True),
+        (0, 1, 2, True), (0, 0, 2, True),
+        (0, 0, 0, True),
+        (0, 0, 0, False),
+    ]
+    assert reaper.batches == 6
+    assert reaper.stats()["rows_deleted"] == {"character_images": 5, "video_tasks": 3, "videos": 2}
+    assert reaper.characters_reaped == 1
+    assert reaper.files_deleted == 12
+    # 未删除的角色及其文件不受影响
+    assert sorted(os.listdir(deleted_character["dir"])) == ["survivor.png"]
+    assert _rows(CharacterImage, deleted_character["survivor"]) == 1
+    assert reaper.pending() == []
+
+
+def test_interrupted_pass_resumes_from_remaining_rows(deleted_character, monkeypatch):
+    character_id = deleted_character["id"]
+    crashing = CharacterReaper(batch_size=2)
+
+    def crash(db, character_id):
+        raise RuntimeError("进程退出")
+
+    # 图片删完后、删除任务时中断
+    monkeypatch.setattr(crashing, "_tasks_batch", crash)
+    with pytest.raises(RuntimeError):
+        asyncio.run(crashing.reap_all())
+    assert _rows(CharacterImage, character_id) == 0
+    assert _rows(VideoTask, character_id) == 3
+    assert _character_exists(character_id)
+
+    # 有一个文件已经不在了：跳过，不影响记录删除
+    os.remove(deleted_character["dir"] / "preview0.mp4")
+    resumed = CharacterReaper(batch_size=2)
+
+    assert asyncio.run(resumed.reap_all()) == 1
+
+    assert resumed.stats()["rows_deleted"] == {"character_images": 0, "video_tasks": 3, "videos": 2}
+    assert resumed.files_deleted == 6
+    assert not _character_exists(character_id)
+    assert sorted(os.listdir(deleted_character["dir"])) == ["survivor.png"]
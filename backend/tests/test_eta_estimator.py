@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+from app.services.eta_estimator import EtaEstimator
+from app.services.task_scheduler import TaskScheduler
+
+_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_app_does_not_load_heavy_dependencies():
+    # 这些依赖由 lazy_import 延迟加载，导入时只在 sys.modules 中放占位模块，真正加载会导入其子模块；
+    # "jose.jwt"、"PIL.Image" 这样的子模块不会提前执行父包
+    sentinels = ("numpy.", "PIL._version", "jose.exceptions", "structlog.")
+    code = f"import sys, app.main; print(any(name.startswith({sentinels!r}) for name in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=_BACKEND, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_models_are_created_on_first_use():
+    estimator = EtaEstimator({"standard": 1.0, "ultra": 2.0}, workers=2, reference_k=4)
+    assert estimator.stats()["run_samples"] == 0
+    assert estimator._run_model is None
+
+    scheduler = TaskScheduler({"standard": 1.0}, {"standard": 1.0}, 30.0, 60.0)
+    w = estimator.wait_features(scheduler, "standard", "u1", 0)
+    x = estimator.run_features(30, "standard", "realistic", False, 2, 1, 0)
+    # 未训练时等于先验：空队列不需要等待，执行耗时 = 成本 × 先验秒数
+    assert estimator.predict_wait(w) == 0.0
+    assert round(estimator.predict_run(30, "standard", x)) == 60
+    estimator.observe_run(30, "standard", x, 90.0)
+    assert estimator.stats()["run_samples"] == 1
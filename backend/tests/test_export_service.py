@@ -0,0 +1,136 @@
+"""用户数据流式导出：NDJSON 与 ZIP"""
+from datetime import datetime
+import io
+import json
+import zipfile
+
+import pytest
+
+from app.core.database import SessionLocal
+from app.core.security import decode_token
+from app.models.character import Character, CharacterImage
+from app.models.user import User, generate_uuid
+from app.models.video import Video, VideoTask
+from app.services.export_service import stream_ndjson, stream_zip
+
+
+@pytest.fixture
+def account(database, tmp_path):
+    """一个角色（一张图片在磁盘上、一张文件缺失）、一个已删除的角色、一个没有角色的视频，以及另一个用户的角色"""
+    db = SessionLocal()
+    try:
+        user = User(id=generate_uuid(), email="export@example.com", username="export", hashed_password="x")
+        other = User(id=generate_uuid(), email="other@example.com", username="other", hashed_password="x")
+        live = Character(id=generate_uuid(), name="角色", user_id=user.id)
+        deleted = Character(id=generate_uuid(), name="已删除", user_id=user.id, deleted_at=datetime.utcnow())
+        foreign = Character(id=generate_uuid(), name="别人的", user_id=other.id)
+        db.add_all([user, other, live, deleted, foreign])
+        db.flush()
+        image_path = tmp_path / "face.png"
+        image_path.write_bytes(b"\x89PNG" + bytes(range(256)) * 40)
+        stored = CharacterImage(id=generate_uuid(), character_id=live.id, image_url=str(image_path))
+        missing = CharacterImage(id=generate_uuid(), character_id=live.id, image_url=str(tmp_path / "gone.jpg"))
+        video = Video(id=generate_uuid(), title="视频", script="s", user_id=user.id, character_id=live.id)
+        orphan = Video(id=generate_uuid(), title="无角色", script="s", user_id=user.id)
+        db.add_all([
+            stored, missing, video, orphan,
+            VideoTask(id=generate_uuid(), user_id=user.id, character_id=live.id, script="s", status="completed"),
+            CharacterImage(id=generate_uuid(), character_id=deleted.id, image_url=str(image_path)),
+            Video(id=generate_uuid(), title="已删除", script="s", user_id=user.id, character_id=deleted.id),
+            VideoTask(id=generate_uuid(), user_id=user.id, character_id=deleted.id, script="s", status="cancelled"),
+            CharacterImage(id=generate_uuid(), character_id=foreign.id, image_url=str(image_path)),
+        ])
+        db.commit()
+        return {
+            "user_id": user.id, "character_id": live.id, "deleted_id": deleted.id,
+            "stored": stored.id, "missing": missing.id, "missing_path": missing.image_url,
+            "image_bytes": image_path.read_bytes(), "videos": {video.id, orphan.id},
+        }
+    finally:
+        db.close()
+
+
+def _parse(data: bytes) -> list:
+    lines = data.decode().splitlines()
+    assert data.endswith(b"\n")
+    return [json.loads(line) for line in lines]
+
+
+def _check_records(records: list, account: dict, export_format: str):
+    header, *records = records
+    assert header["type"] == "export"
+    assert header["format"] == export_format
+    assert header["user_id"] == account["user_id"]
+    by_type = {}
+    for record in records:
+        by_type.setdefault(record["type"], []).append(record)
+
+    assert [c["id"] for c in by_type["character"]] == [account["character_id"]]
+    assert {i["id"] for i in by_type["character_image"]} == {account["stored"], account["missing"]}
+    assert {v["id"] for v in by_type["video"]} == account["videos"]
+    assert [t["character_id"] for t in by_type["video_task"]] == [account["character_id"]]
+    # 已删除角色的任何数据都不导出，内部列也不导出
+    assert account["deleted_id"] not in json.dumps(records)
+    assert all("deleted_at" not in c for c in by_type["character"])
+    assert all("feature_vector" not in i for i in by_type["character_image"])
+    return by_type
+
+
+def test_ndjson_parses_line_by_line(account):
+    chunks = list(stream_ndjson(SessionLocal, account["user_id"], batch_size=1, chunk_size=64))
+
+    # 记录按 chunk_size 攒块发送，行可以跨块，拼接后每行是一条完整的JSON
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 64 for chunk in chunks[:-1])
+    _check_records(_parse(b"".join(chunks)), account, "ndjson")
+
+
+def test_zip_stream_opens_with_images_and_missing_list(account):
+    chunks = list(stream_zip(SessionLocal, account["user_id"], batch_size=1, chunk_size=1024))
+    assert len(chunks) > 1
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        stored_path = f"images/{account['character_id']}/{account['stored']}.png"
+        assert archive.namelist() == ["export.ndjson", stored_path, "missing_images.txt"]
+        assert archive.getinfo(stored_path).compress_type == zipfile.ZIP_STORED
+        assert archive.read(stored_path) == account["image_bytes"]
+        assert archive.read("missing_images.txt").decode() == account["missing_path"] + "\n"
+        by_type = _check_records(_parse(archive.read("export.ndjson")), account, "zip")
+
+    archive_paths = {i["id"]: i["archive_path"] for i in by_type["character_image"]}
+    assert archive_paths[account["stored"]] == stored_path
+    assert archive_paths[account["missing"]] == f"images/{account['character_id']}/{account['missing']}.jpg"
+
+
+def test_zip_without_missing_images_has_no_missing_list(account, tmp_path):
+    (tmp_path / "gone.jpg").write_bytes(b"jpeg")
+
+    data = b"".join(stream_zip(SessionLocal, account["user_id"]))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert "missing_images.txt" not in archive.namelist()
+        assert len([name for name in archive.namelist() if name.startswith("images/")]) == 2
+
+
+def test_export_endpoint_streams_only_own_live_data(client, register):
+    user = register()
+    headers = user["headers"]
+    kept = client.post("/api/v1/characters/", json={"name": "保留"}, headers=headers).json()["id"]
+    deleted = client.post("/api/v1/characters/", json={"name": "删除"}, headers=headers).json()["id"]
+    client.delete(f"/api/v1/characters/{deleted}", headers=headers)
+    client.post("/api/v1/characters/", json={"name": "别人的"}, headers=register("bob")["headers"])
+
+    response = client.get("/api/v1/export", params={"format": "ndjson"}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"].endswith('.ndjson"')
+    header, *records = _parse(response.content)
+    assert header["user_id"] == decode_token(user["access_token"])["sub"]
+    assert [(r["type"], r["id"]) for r in records] == [("character", kept)]
+
+    response = client.get("/api/v1/export", params={"format": "zip"}, headers=headers)
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.namelist() == ["export.ndjson"]
@@ -0,0 +1,84 @@
+"""生成任务的幂等键重放"""
+from app.core.database import SessionLocal
+from app.models.character import CharacterImage
+from app.models.user import generate_uuid
+
+
+def _create_character(client, headers) -> str:
+    response = client.post("/api/v1/characters/", json={"name": "角色", "description": "测试"}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def _add_image(character_id: str):
+    db = SessionLocal()
+    try:
+        db.add(CharacterImage(id=generate_uuid(), character_id=character_id, image_url="x.png"))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_retry_after_image_change_replays_original_task(client, register):
+    headers = register()["headers"]
+    character_id = _create_character(client, headers)
+    request = {"character_id": character_id, "script": "一段 脚本", "duration": 10}
+    keyed = {**headers, "Idempotency-Key": "retry-1"}
+
+    first = client.post("/api/v1/videos/generate", json=request, headers=keyed)
+    assert first.status_code == 200, first.text
+
+    # 角色图片变化后，用同一幂等键重试同样的请求仍返回原任务
+    _add_image(character_id)
+    retry = client.post("/api/v1/videos/generate", json={**request, "script": " 一段  脚本 "}, headers=keyed)
+    assert retry.status_code == 200, retry.text
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["X-Task-Deduplicated"] == "idempotency-key"
+
+
+def test_idempotency_key_reused_for_different_request_conflicts(client, register):
+    headers = register()["headers"]
+    character_id = _create_character(client, headers)
+    keyed = {**headers, "Idempotency-Key": "retry-2"}
+
+    first = client.post("/api/v1/videos/generate", json={"character_id": character_id, "script": "a"}, headers=keyed)
+    assert first.status_code == 200, first.text
+    other = client.post("/api/v1/videos/generate", json={"character_id": character_id, "script": "b"}, headers=keyed)
+    assert other.status_code == 409
+
+
+def test_concurrent_identical_requests_share_one_task(client, register, monkeypatch):
+    from app.api.v1 import videos
+    from app.models.video import VideoTask
+
+    headers = register()["headers"]
+    character_id = _create_character(client, headers)
+    request = {"character_id": character_id, "script": "同一个请求", "duration": 10}
+    first = client.post("/api/v1/videos/generate", json=request, headers=headers)
+    assert first.status_code == 200, first.text
+
+    # 模拟并发：第二个请求查重时第一个请求尚未提交，两者都尝试创建任务
+    find_reusable_task = videos.find_reusable_task
+    calls = []
+
+    def racing_lookup(*args):
+        calls.append(args)
+        return None if len(calls) == 1 else find_reusable_task(*args)
+
+    monkeypatch.setattr(videos, "find_reusable_task", racing_lookup)
+    second = client.post("/api/v1/videos/generate", json=request, headers=headers)
+
+    assert second.status_code == 200, second.text
+    assert second.json()["id"] == first.json()["id"]
+    assert second.headers["X-Task-Deduplicated"] == "in-flight"
+    db = SessionLocal()
+    try:
+        assert db.query(VideoTask).filter(VideoTask.character_id == character_id).count() == 1
+        # 结束的任务不占用唯一索引，相同请求可以重新生成
+        db.query(VideoTask).update({"status": "failed"})
+        db.commit()
+    finally:
+        db.close()
+    third = client.post("/api/v1/videos/generate", json=request, headers=headers)
+    assert third.status_code == 200, third.text
+    assert third.json()["id"] != first.json()["id"]
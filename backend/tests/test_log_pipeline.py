@@ -0,0 +1,28 @@
+import io
+import logging
+
+from app.core import log_pipeline
+
+
+def test_reconfiguring_registers_exit_hook_once(monkeypatch):
+    registered = []
+    monkeypatch.setattr(log_pipeline.atexit, "register", registered.append)
+    monkeypatch.setattr(log_pipeline, "_atexit_registered", False)
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    stream = io.StringIO()
+    try:
+        log_pipeline.configure_logging(stream=stream, level="INFO")
+        log_pipeline.configure_logging(stream=stream, level="INFO")
+        logging.getLogger("test").info("延迟格式化 %s", "参数")
+        log_pipeline.get_logger("test").info("structured_event", key="value")
+    finally:
+        # 停止时写出队列中剩余的日志
+        log_pipeline.shutdown_logging()
+        root.handlers[:] = handlers
+        root.setLevel(level)
+
+    assert registered == [log_pipeline.shutdown_logging]
+    output = stream.getvalue()
+    assert "延迟格式化 参数" in output
+    assert '"key": "value"' in output
@@ -0,0 +1,70 @@
+"""结构迁移：已有表上缺失的索引与唯一约束"""
+import pytest
+from sqlalchemy import MetaData, UniqueConstraint, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from app.core.database import Base, engine
+from app.core.migrate import migrate, schema_diff, schema_fingerprint, schema_is_current, schema_version
+
+MISSING_INDEXES = {
+    "video_tasks": "ix_video_tasks_fingerprint",
+    "character_images": "ix_character_images_phash",
+    "characters": "ix_characters_deleted_at",
+}
+
+
+def _create_old_schema():
+    """建出升级前的结构：表都在，但缺少后来加的索引与唯一约束，且已记录当前指纹"""
+    old = MetaData()
+    for table in Base.metadata.sorted_tables:
+        copy = table.to_metadata(old)
+        for index in list(copy.indexes):
+            if index.name == MISSING_INDEXES.get(table.name):
+                copy.indexes.discard(index)
+        if table.name == "video_tasks":
+            for constraint in list(copy.constraints):
+                if isinstance(constraint, UniqueConstraint):
+                    copy.constraints.discard(constraint)
+    old.create_all(engine)
+    schema_version.create(engine)
+    with engine.begin() as connection:
+        connection.execute(schema_version.insert().values(fingerprint=schema_fingerprint()))
+
+
+def _insert_task(connection, task_id: str, idempotency_key: str):
+    connection.execute(text(
+        "INSERT INTO video_tasks (id, user_id, character_id, script, status, progress, idempotency_key) "
+        "VALUES (:id, 'u1', 'c1', 's', 'pending', 0, :key)"
+    ), {"id": task_id, "key": idempotency_key})
+
+
+def test_migrate_creates_missing_indexes_and_unique_constraints(empty_database):
+    _create_old_schema()
+    with engine.connect() as connection:
+        missing = schema_diff(connection).describe()
+    assert "唯一约束 uq_video_tasks_user_idempotency_key" in missing
+    assert {f"索引 {name}" for name in MISSING_INDEXES.values()} <= set(missing)
+    # 记录的指纹与模型一致，但数据库实际结构不完整
+    assert not schema_is_current()
+
+    assert migrate() is True
+    assert schema_is_current()
+    with engine.connect() as connection:
+        inspector = inspect(connection)
+        for table, name in MISSING_INDEXES.items():
+            assert name in {index["name"] for index in inspector.get_indexes(table)}
+
+    with engine.begin() as connection:
+        _insert_task(connection, "t1", "key-1")
+    with pytest.raises(IntegrityError):
+        with engine.begin() as connection:
+            _insert_task(connection, "t2", "key-1")
+
+    assert migrate() is False
+
+
+def test_migrate_fresh_database(empty_database):
+    assert not schema_is_current()
+    assert migrate() is True
+    assert schema_is_current()
+    assert migrate() is False
@@ -0,0 +1,224 @@
+"""令牌桶限流：进程内存储与Redis存储（Lua脚本在替身的嵌入式Lua中执行）"""
+import asyncio
+import math
+
+import pytest
+
+from app.core.rate_limit import (
+    _TOKEN_BUCKET_LUA,
+    MemoryRateLimitBackend,
+    RateLimitMiddleware,
+    RateLimitRule,
+    RedisRateLimitBackend,
+)
+from app.core.security import create_access_token
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """redis.asyncio 客户端替身
+
+    哈希与过期时间存在内存中，TIME 取自可控的时钟；eval 用 lupa 执行真实的 Lua 脚本，
+    按Redis的规则转换参数与返回值（参数都是字符串，数字返回值截断为整数，字符串返回 bytes）。
+    """
+
+    def __init__(self, clock: FakeClock):
+        from lupa import LuaRuntime
+
+        self.clock = clock
+        self.hashes = {}
+        self.expires_at = {}
+        self.lua = LuaRuntime()
+        self._redis = self.lua.table_from({"call": self.call})
+
+    def _live(self, key):
+        if key in self.expires_at and self.expires_at[key] <= self.clock():
+            self.hashes.pop(key, None)
+            del self.expires_at[key]
+        return self.hashes.get(key)
+
+    @staticmethod
+    def _arg(value) -> str:
+        if isinstance(value, float):
+            return str(int(value)) if value.is_integer() else repr(value)
+        return str(value)
+
+    def call(self, command, *args):
+        args = [self._arg(arg) for arg in args]
+        command = command.upper()
+        if command == "TIME":
+            seconds, fraction = divmod(self.clock(), 1)
+            return self.lua.table_from([str(int(seconds)), str(int(fraction * 1_000_000))])
+        if command == "HMGET":
+            fields = self._live(args[0]) or {}
+            return self.lua.table_from([fields.get(name, False) for name in args[1:]])
+        if command == "HSET":
+            fields = self._live(args[0])
+            if fields is None:
+                fields = self.hashes[args[0]] = {}
+            fields.update(zip(args[1::2], args[2::2]))
+            return len(args[1:]) // 2
+        if command == "EXPIRE":
+            if self._live(args[0]) is None:
+                return 0
+            self.expires_at[args[0]] = self.clock() + int(args[1])
+            return 1
+        raise NotImplementedError(command)
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args):
+        run = self.lua.eval(f"function(KEYS, ARGV, redis) {script} end")
+        keys = self.lua.table_from([str(key) for key in keys_and_args[:numkeys]])
+        argv = self.lua.table_from([self._arg(arg) for arg in keys_and_args[numkeys:]])
+        reply = run(keys, argv, self._redis)
+        return [item.encode() if isinstance(item, str) else int(item) for item in reply.values()]
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    clock = FakeClock()
+    if request.param == "memory":
+        return MemoryRateLimitBackend(clock=clock), clock
+    pytest.importorskip("lupa")
+    return RedisRateLimitBackend(client=FakeRedis(clock)), clock
+
+
+def _acquire(backend, key="k", capacity=3.0, refill_rate=1.0):
+    return asyncio.run(backend.acquire(key, capacity, refill_rate))
+
+
+def test_bucket_bursts_to_capacity_and_refills(backend):
+    backend, clock = backend
+
+    # 初始满桶：一次突发最多放行容量个请求
+    assert [_acquire(backend)[0] for _ in range(3)] == [True, True, True]
+    allowed, retry_after = _acquire(backend)
+    assert not allowed and retry_after == pytest.approx(1.0)
+
+    clock.now += 0.5
+    allowed, retry_after = _acquire(backend)
+    assert not allowed and retry_after == pytest.approx(0.5)
+
+    # 每秒补充一个令牌
+    clock.now += 0.5
+    assert _acquire(backend)[0]
+    assert not _acquire(backend)[0]
+
+    # 长时间空闲后令牌数不超过容量
+    clock.now += 100
+    assert [_acquire(backend)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_lua_script_stores_bucket_with_expiry():
+    pytest.importorskip("lupa")
+    clock = FakeClock()
+    redis = FakeRedis(clock)
+    # 两个worker各自持有客户端，共享同一组桶
+    workers = [RedisRateLimitBackend(client=redis), RedisRateLimitBackend(client=redis)]
+
+    assert _acquire(workers[0], capacity=2, refill_rate=0.5)[0]
+    assert _acquire(workers[1], capacity=2, refill_rate=0.5)[0]
+    assert not _acquire(workers[0], capacity=2, refill_rate=0.5)[0]
+
+    bucket = redis.hashes["ratelimit:k"]
+    assert float(bucket["tokens"]) == 0.0
+    assert float(bucket["ts"]) == pytest.approx(clock.now)
+    # 过期时间为回满所需秒数加1，过期的桶与满桶等价
+    assert redis.expires_at["ratelimit:k"] == clock.now + math.ceil(2 / 0.5) + 1
+    clock.now += 5
+    assert redis._live("ratelimit:k") is None
+    assert [_acquire(workers[1], capacity=2, refill_rate=0.5)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_lua_script_returns_fractional_retry_after():
+    pytest.importorskip("lupa")
+    redis = FakeRedis(FakeClock())
+
+    allowed, retry = asyncio.run(redis.eval(_TOKEN_BUCKET_LUA, 1, "bucket", 1, 4, 2))
+
+    # 数字返回值会被截断，等待秒数以字符串返回
+    assert allowed == 0
+    assert float(retry) == pytest.approx(0.25)
+
+
+def _app(backend, rules):
+    calls = []
+
+    async def endpoint(scope, receive, send):
+        calls.append(scope["path"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    return RateLimitMiddleware(endpoint, rules=rules, backend=backend), calls
+
+
+def _call(app, method: str, path: str, user_id=None, client=("10.0.0.1", 1)):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    headers = []
+    if user_id:
+        headers.append((b"authorization", f"Bearer {create_access_token({'sub': user_id})}".encode()))
+    scope = {"type": "http", "method": method, "path": path, "headers": headers, "client": client}
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+def _status(app, *args, **kwargs) -> int:
+    return _call(app, *args, **kwargs)[0]["status"]
+
+
+def test_buckets_are_keyed_per_route_and_user():
+    pytest.importorskip("lupa")
+    clock = FakeClock()
+    redis = FakeRedis(clock)
+    rules = [RateLimitRule("POST /api/v1/videos/generate", "1/minute"),
+             RateLimitRule("POST /api/v1/characters/", "1/minute")]
+    app, calls = _app(RedisRateLimitBackend(client=redis), rules)
+
+    assert _status(app, "POST", "/api/v1/videos/generate", user_id="alice") == 200
+    assert _status(app, "POST", "/api/v1/videos/generate", user_id="alice") == 429
+    # 其他用户、同一用户的其他路由各有自己的桶
+    assert _status(app, "POST", "/api/v1/videos/generate", user_id="bob") == 200
+    assert _status(app, "POST", "/api/v1/characters", user_id="alice") == 200
+    # 未登录请求按客户端IP计数；未匹配规则的请求不限流
+    assert _status(app, "POST", "/api/v1/videos/generate", client=("10.0.0.2", 1)) == 200
+    assert _status(app, "GET", "/api/v1/videos/generate", user_id="alice") == 200
+    assert _status(app, "GET", "/api/v1/videos/generate", user_id="alice") == 200
+
+    assert len(calls) == 6
+    assert set(redis.hashes) == {
+        "ratelimit:POST /api/v1/videos/generate|user:alice",
+        "ratelimit:POST /api/v1/videos/generate|user:bob",
+        "ratelimit:POST /api/v1/characters/|user:alice",
+        "ratelimit:POST /api/v1/videos/generate|ip:10.0.0.2",
+    }
+
+
+def test_rejected_request_gets_429_with_retry_after():
+    clock = FakeClock()
+    app, calls = _app(MemoryRateLimitBackend(clock=clock), [RateLimitRule("POST /api/v1/videos/generate", "2/minute")])
+    _call(app, "POST", "/api/v1/videos/generate", user_id="alice")
+    _call(app, "POST", "/api/v1/videos/generate", user_id="alice")
+    clock.now += 10.5
+
+    start, body = _call(app, "POST", "/api/v1/videos/generate", user_id="alice")
+
+    assert start["status"] == 429
+    headers = dict(start["headers"])
+    # 每30秒补充一个令牌，还需等待19.5秒，向上取整到整秒
+    assert headers[b"retry-after"] == b"20"
+    assert headers[b"content-type"] == b"application/json"
+    assert body["body"].decode() == '{"detail": "请求过于频繁，请稍后再试"}'
+    assert len(calls) == 2
@@ -0,0 +1,87 @@
+"""只读副本路由：两个本地 SQLite 文件充当副本"""
+from collections import Counter
+
+import pytest
+from sqlalchemy import create_engine
+from starlette.requests import HTTPConnection
+
+from app.core import database
+from app.core.database import PoolMetrics, ReplicaRouter, _sticky_key
+
+
+def _pool(name: str, url: str) -> PoolMetrics:
+    return PoolMetrics(name, create_engine(url))
+
+
+@pytest.fixture
+def router(tmp_path):
+    primary = _pool("primary", f"sqlite:///{tmp_path / 'primary.db'}")
+    replicas = [_pool(f"replica-{i}", f"sqlite:///{tmp_path / f'replica{i}.db'}") for i in range(2)]
+    return ReplicaRouter(primary, replicas, sticky_seconds=5.0, retry_seconds=30.0)
+
+
+def _served_by(router: ReplicaRouter, key=None) -> str:
+    db = router.open_session(key)
+    try:
+        bind = db.get_bind()
+        return next(pool.name for pool in [router.primary, *router.replicas] if pool.engine is bind)
+    finally:
+        db.close()
+
+
+def test_reads_round_robin_across_replicas(router):
+    served = Counter(_served_by(router) for _ in range(6))
+    assert served == {"replica-0": 3, "replica-1": 3}
+    assert router.primary.checkouts == 0
+
+
+def test_unavailable_replica_fails_over(router, tmp_path):
+    router.replicas[0] = _pool("replica-0", f"sqlite:///{tmp_path / 'missing' / 'replica0.db'}")
+
+    served = Counter(_served_by(router) for _ in range(4))
+    assert served == {"replica-1": 4}
+    assert not router.is_healthy(router.replicas[0])
+    assert router.replicas[0].failures == 1
+
+    # 所有副本都不可用时回退到主库
+    router.mark_down(router.replicas[1], RuntimeError("down"))
+    assert _served_by(router) == "primary"
+    assert router.fallback_reads == 1
+
+
+def test_reads_stick_to_primary_after_a_write(router):
+    router.note_write("user-1")
+
+    assert _served_by(router, "user-1") == "primary"
+    assert _served_by(router, "user-2").startswith("replica-")
+    assert router.sticky_reads == 1
+
+
+def _connection(token: str) -> HTTPConnection:
+    return HTTPConnection({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+
+def test_sticky_key_survives_token_refresh(client, register):
+    user = register()
+    refreshed = client.post("/api/v1/auth/refresh", json={"refresh_token": user["refresh_token"]}).json()
+    other_session = client.post("/api/v1/auth/login", json={"email": "alice@example.com",
+                                                            "password": "password123"}).json()
+
+    keys = {_sticky_key(_connection(tokens["access_token"])) for tokens in (user, refreshed, other_session)}
+    assert len(keys) == 1 and None not in keys
+
+
+def test_authentication_reads_from_replica(client, register, monkeypatch):
+    user = register()
+    # 与主库同一个文件的另一个引擎充当没有复制延迟的副本
+    replica = PoolMetrics("replica-0", create_engine(database.engine.url))
+    monkeypatch.setattr(database.replica_router, "replicas", [replica])
+    monkeypatch.setattr(database.replica_router, "_recent_writes", {})
+    primary_checkouts = database.primary_pool.checkouts
+
+    response = client.get("/api/v1/characters/", headers=user["headers"])
+
+    assert response.status_code == 200
+    assert database.primary_pool.checkouts == primary_checkouts
+    # 鉴权与接口在同一请求内共用一个只读会话
+    assert replica.checkouts == 1
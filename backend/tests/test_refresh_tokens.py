@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+import asyncio
+
+from app.core.database import SessionLocal
+from app.core.refresh_tokens import hash_refresh_token
+from app.core.security import decode_token, is_session_revoked
+from app.models.user import RefreshToken
+
+
+def _refresh(client, refresh_token: str):
+    return client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+
+
+def _row(refresh_token: str):
+    db = SessionLocal()
+    try:
+        return db.query(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(refresh_token)).first()
+    finally:
+        db.close()
+
+
+def _session_rows(session_id: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(RefreshToken).filter(RefreshToken.session_id == session_id).count()
+    finally:
+        db.close()
+
+
+def _headers(tokens: dict) -> dict:
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def test_refresh_rotates_token_within_session(client, register):
+    user = register()
+
+    response = _refresh(client, user["refresh_token"])
+
+    assert response.status_code == 200, response.text
+    rotated = response.json()
+    assert rotated["refresh_token"] != user["refresh_token"]
+    assert _row(user["refresh_token"]).revoked_at is not None
+    assert _row(rotated["refresh_token"]).session_id == _row(user["refresh_token"]).session_id
+    assert client.get("/api/v1/characters/", headers=_headers(rotated)).status_code == 200
+    assert _refresh(client, rotated["refresh_token"]).status_code == 200
+
+
+def test_reused_refresh_token_revokes_session(client, register):
+    user = register()
+    rotated = _refresh(client, user["refresh_token"]).json()
+
+    # 旧令牌被重放：拒绝并撤销整个会话，轮换出的新令牌与其访问令牌一并失效
+    assert _refresh(client, user["refresh_token"]).status_code == 401
+    assert _row(rotated["refresh_token"]).revoked_at is not None
+    assert _refresh(client, rotated["refresh_token"]).status_code == 401
+    assert client.get("/api/v1/characters/", headers=_headers(rotated)).status_code == 401
+
+
+def test_expired_refresh_token_is_rejected(client, register):
+    user = register()
+    db = SessionLocal()
+    try:
+        db.query(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(user["refresh_token"])).update(
+            {"expires_at": datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+    response = _refresh(client, user["refresh_token"])
+
+    assert response.status_code == 401
+    assert response.json()["detail"] == "刷新令牌已过期"
+
+
+def test_logout_rejects_session_access_tokens(client, register):
+    user = register()
+    payload = decode_token(user["access_token"])
+    assert not asyncio.run(is_session_revoked(payload))
+
+    assert client.post("/api/v1/auth/logout", json={"refresh_token": user["refresh_token"]}).status_code == 200
+
+    assert asyncio.run(is_session_revoked(payload))
+    assert client.get("/api/v1/characters/", headers=user["headers"]).status_code == 401
+    assert _refresh(client, user["refresh_token"]).status_code == 401
+
+
+def test_refresh_purges_expired_and_dead_session_tokens(client, register):
+    user = register()
+    logged_out = client.post("/api/v1/auth/login", json={"email": "alice@example.com", "password": "password123"})
+    logged_out = logged_out.json()
+    client.post("/api/v1/auth/logout", json={"refresh_token": logged_out["refresh_token"]})
+    dead_session = _row(logged_out["refresh_token"]).session_id
+    live_session = _row(user["refresh_token"]).session_id
+    expired = client.post("/api/v1/auth/login", json={"email": "alice@example.com", "password": "password123"})
+    expired_session = _row(expired.json()["refresh_token"]).session_id
+    db = SessionLocal()
+    try:
+        db.query(RefreshToken).filter(RefreshToken.session_id == expired_session).update(
+            {"expires_at": datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+    rotated = _refresh(client, user["refresh_token"]).json()
+
+    assert _session_rows(dead_session) == 0
+    assert _session_rows(expired_session) == 0
+    # 当前会话轮换掉的旧令牌保留，重放时仍能发现
+    assert _session_rows(live_session) == 2
+    assert _refresh(client, user["refresh_token"]).status_code == 401
+    assert _refresh(client, rotated["refresh_token"]).status_code == 401
@@ -0,0 +1,55 @@
+"""场景DAG执行器：失败重试与取消；未配置渲染器时不执行任务"""
+import asyncio
+
+import pytest
+
+from app.services.task_scheduler import TaskScheduler
+from app.services.video_pipeline import (
+    FakeSceneRenderer, GenerationContext, SceneRenderError, ScenePipeline, TaskCancelledError, TaskWorkerPool,
+    _create_renderer,
+)
+
+
+def _context() -> GenerationContext:
+    return GenerationContext(task_id="t1", user_id="u1", character_id="c1", script="s", duration=3)
+
+
+def _scenes(pipeline: ScenePipeline):
+    script = {"duration": 3, "scenes": [{"start": i, "end": i + 1} for i in range(3)]}
+    return pipeline.build_scenes(script, 3)
+
+
+def test_failed_scene_is_retried_until_exhausted():
+    pipeline = ScenePipeline(FakeSceneRenderer(seconds_per_scene_second=0.0, failure_rate=1.0, seed=1),
+                             scene_workers=2, max_retries=2)
+    scenes = _scenes(pipeline)
+    with pytest.raises(SceneRenderError):
+        asyncio.run(pipeline.run(_context(), scenes))
+    assert max(scene.attempts for scene in scenes) == 3
+
+
+def test_cancelled_task_does_not_retry_scenes():
+    pipeline = ScenePipeline(FakeSceneRenderer(seconds_per_scene_second=0.0), scene_workers=2, max_retries=2)
+    scenes = _scenes(pipeline)
+
+    async def on_progress(value: float):
+        raise TaskCancelledError("t1")
+
+    with pytest.raises(TaskCancelledError):
+        asyncio.run(pipeline.run(_context(), scenes, on_progress))
+    assert all(scene.attempts <= 1 for scene in scenes)
+    assert all(scene.status != "failed" for scene in scenes)
+
+
+def test_no_renderer_leaves_tasks_pending():
+    # 缺省不使用假渲染器，worker不启动，任务留在队列中而不是被标记为完成
+    assert _create_renderer() is None
+    scheduler = TaskScheduler({"standard": 1.0}, {"standard": 1.0}, 30.0, 600.0)
+    pool = TaskWorkerPool(scheduler, ScenePipeline(None, scene_workers=1), workers=2)
+
+    async def start():
+        pool.start()
+        await pool.stop()
+
+    asyncio.run(start())
+    assert pool._tasks == []
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+
+import httpx
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+from app.core.sqlite_profile import configure_engine
+
+
+def _engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'profile.db'}",
+        connect_args={"check_same_thread": False, "timeout": 5},
+        poolclass=QueuePool,
+    )
+    configure_engine(engine)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+    return engine
+
+
+def test_commit_releases_write_lock_before_checkin(tmp_path):
+    # 事件循环线程上的请求提交后、会话关闭前，同一线程的其他写入不应等待
+    engine = _engine(tmp_path)
+    first = engine.connect()
+    first.execute(text("INSERT INTO items (name) VALUES ('a')"))
+    first.commit()
+
+    start = time.perf_counter()
+    with engine.connect() as second:
+        second.execute(text("INSERT INTO items (name) VALUES ('b')"))
+        second.commit()
+    assert time.perf_counter() - start < 1
+    first.close()
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM items")).scalar() == 2
+
+
+def test_writer_waits_for_open_write_transaction(tmp_path):
+    engine = _engine(tmp_path)
+    holding = threading.Event()
+
+    def hold_write_transaction():
+        with engine.connect() as connection:
+            connection.execute(text("INSERT INTO items (name) VALUES ('held')"))
+            holding.set()
+            time.sleep(0.3)
+            connection.commit()
+
+    thread = threading.Thread(target=hold_write_transaction)
+    thread.start()
+    holding.wait()
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        # 先读后写：BEGIN IMMEDIATE 在 busy_timeout 内等待写锁，而不是报 database is locked
+        count = connection.execute(text("SELECT COUNT(*) FROM items")).scalar()
+        connection.execute(text("INSERT INTO items (name) VALUES (:name)"), {"name": f"after-{count}"})
+        connection.commit()
+    waited = time.perf_counter() - start
+    thread.join()
+
+    assert waited >= 0.2
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM items")).scalar() == 2
+
+
+def test_request_commit_waits_for_write_lock_off_the_event_loop(database):
+    from app.core.database import engine
+    from app.main import create_application
+
+    app = create_application()
+    holding = threading.Event()
+    release = threading.Event()
+
+    def hold_write_lock():
+        with engine.connect() as connection:
+            # 任意写语句都会以 BEGIN IMMEDIATE 开始事务并持有写锁，直到回滚
+            connection.execute(text("DELETE FROM characters WHERE 0"))
+            holding.set()
+            release.wait()
+            connection.rollback()
+
+    async def go():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            tokens = (await client.post("/api/v1/auth/register", json={
+                "email": "lock@example.com", "username": "lock", "password": "password123"})).json()
+            headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+            thread = threading.Thread(target=hold_write_lock)
+            thread.start()
+            holding.wait()
+            asyncio.get_running_loop().call_later(0.5, release.set)
+            request = asyncio.create_task(client.post("/api/v1/characters/", json={"name": "角色"}, headers=headers))
+            # 请求在线程中等待写锁，期间事件循环照常调度
+            ticks = 0
+            while not request.done():
+                await asyncio.sleep(0.01)
+                ticks += 1
+            thread.join()
+            return (await request).status_code, ticks
+
+    status, ticks = asyncio.run(go())
+    assert status == 200
+    assert ticks >= 20
@@ -0,0 +1,15 @@
+"""生成参数规范化与指纹"""
+from app.schemas.video import VideoTaskCreate
+from app.services.task_dedup import generation_fingerprint
+
+
+def test_fingerprint_ignores_whitespace_and_case():
+    a = VideoTaskCreate(character_id="c1", script="hello  world", style="Anime")
+    b = VideoTaskCreate(character_id="c1", script=" hello world ", style="anime ")
+    assert generation_fingerprint(a, ["i2", "i1"]) == generation_fingerprint(b, ["i1", "i2"])
+
+
+def test_preview_and_full_render_do_not_share_fingerprint():
+    full = VideoTaskCreate(character_id="c1", script="s")
+    preview = VideoTaskCreate(character_id="c1", script="s", preview=True)
+    assert generation_fingerprint(full, ["i1"]) != generation_fingerprint(preview, ["i1"])
@@ -0,0 +1,145 @@
+from collections import Counter
+import itertools
+
+from app.services.task_scheduler import ScheduledTask, TaskScheduler
+
+_ids = itertools.count()
+
+
+def _scheduler(tier_weights=None, user_quantum=30.0, aging_seconds=1e9) -> TaskScheduler:
+    return TaskScheduler(
+        tier_weights=tier_weights or {"standard": 3, "ultra": 1},
+        tier_costs={"standard": 1.0, "ultra": 1.0},
+        user_quantum=user_quantum,
+        aging_seconds=aging_seconds,
+        clock=lambda: 0.0,
+    )
+
+
+def _task(user_id="u1", quality="standard", duration=30, enqueued_at=0.0) -> ScheduledTask:
+    return ScheduledTask(f"t{next(_ids)}", user_id, quality, duration, enqueued_at=enqueued_at)
+
+
+def _drain(scheduler: TaskScheduler, count: int, now: float = 0.0) -> list:
+    return [scheduler.next_task(now=now) for _ in range(count)]
+
+
+def test_tiers_share_workers_by_weight():
+    scheduler = _scheduler({"standard": 3, "ultra": 1})
+    for _ in range(40):
+        scheduler.submit(_task(quality="standard"))
+        scheduler.submit(_task(quality="ultra"))
+
+    order = [task.quality for task in _drain(scheduler, 40)]
+
+    assert Counter(order) == {"standard": 30, "ultra": 10}
+    # 平滑加权轮询：每 4 个任务中恰好有 1 个 ultra，不会连续执行一长串 standard
+    for start in range(0, 40, 4):
+        assert order[start:start + 4].count("ultra") == 1
+
+
+def test_users_share_a_tier_equally():
+    scheduler = _scheduler()
+    for _ in range(20):
+        scheduler.submit(_task(user_id="heavy"))
+    for _ in range(5):
+        scheduler.submit(_task(user_id="light"))
+
+    first = [task.user_id for task in _drain(scheduler, 10)]
+
+    assert Counter(first) == {"heavy": 5, "light": 5}
+
+
+def test_unused_deficit_carries_over_to_next_round():
+    scheduler = _scheduler(user_quantum=10.0)
+    big = [_task(user_id="big", duration=15) for _ in range(3)]
+    small = [_task(user_id="small", duration=10) for _ in range(3)]
+    for task in big + small:
+        scheduler.submit(task)
+    tier = scheduler.tiers["standard"]
+
+    # big 的第一轮额度 10 不够支付成本 15，保留到下一轮，累计 20 后出队并剩余 5
+    assert scheduler.next_task(now=0.0) is small[0]
+    assert tier.deficits["big"] == 10.0
+    assert scheduler.next_task(now=0.0) is big[0]
+    assert tier.deficits["big"] == 5.0
+    assert _drain(scheduler, 4) == [small[1], big[1], small[2], big[2]]
+    assert len(scheduler) == 0
+
+
+def test_starved_tier_is_served_after_aging():
+    scheduler = _scheduler({"standard": 100, "ultra": 1}, aging_seconds=5.0)
+    ultra = _task(quality="ultra", enqueued_at=0.0)
+    scheduler.submit(ultra)
+    for _ in range(10):
+        scheduler.submit(_task(quality="standard", enqueued_at=0.0))
+
+    # 按权重 ultra 要等约 100 个任务，老化前一直让给 standard
+    for now in range(1, 5):
+        assert scheduler.next_task(now=float(now)).quality == "standard"
+    assert scheduler.next_task(now=5.0) is ultra
+    assert scheduler.next_task(now=6.0).quality == "standard"
+
+
+def test_cancel_removes_task_from_queue():
+    scheduler = _scheduler(user_quantum=10.0)
+    first, second, third = _task(duration=10), _task(duration=20), _task(user_id="u2", duration=30)
+    for task in (first, second, third):
+        scheduler.submit(task)
+    assert scheduler.queued_cost == 60.0
+
+    assert scheduler.cancel(second.task_id)
+    assert second.task_id not in scheduler
+    assert len(scheduler) == 2
+    assert scheduler.queued_cost == 40.0
+    assert not scheduler.cancel(second.task_id)
+
+    # 取消 u2 唯一的任务后该用户退出轮询
+    assert scheduler.cancel(third.task_id)
+    assert "u2" not in scheduler.tiers["standard"].active_users
+    assert _drain(scheduler, 2) == [first, None]
+    assert scheduler.queued_cost == 0.0
+
+
+def test_restore_resets_interrupted_tasks(database):
+    from datetime import datetime, timedelta
+
+    from app.core.database import SessionLocal
+    from app.models.character import Character
+    from app.models.user import User
+    from app.models.video import VideoTask
+
+    db = SessionLocal()
+    try:
+        user = User(email="u@example.com", username="u", hashed_password="x")
+        db.add(user)
+        db.flush()
+        character = Character(name="角色", user_id=user.id)
+        db.add(character)
+        db.flush()
+        long_ago = datetime.utcnow() - timedelta(minutes=10)
+        tasks = {
+            name: VideoTask(user_id=user.id, character_id=character.id, script=name, status=status,
+                            progress=50, updated_at=updated_at)
+            for name, status, updated_at in [
+                ("crashed", "processing", long_ago),
+                ("running", "processing", datetime.utcnow()),
+                ("pending", "pending", long_ago),
+                ("done", "completed", long_ago),
+            ]
+        }
+        db.add_all(tasks.values())
+        db.commit()
+        ids = {name: task.id for name, task in tasks.items()}
+
+        scheduler = _scheduler()
+        scheduler.restore(db, stale_seconds=120)
+
+        # 崩溃时中断的任务重新排队；最近仍在写回进度的任务可能由其他进程执行，保持原状
+        assert {ids["crashed"], ids["pending"]} == {task_id for task_id in ids.values() if task_id in scheduler}
+        db.expire_all()
+        assert db.get(VideoTask, ids["crashed"]).status == "pending"
+        assert db.get(VideoTask, ids["crashed"]).progress == 0
+        assert db.get(VideoTask, ids["running"]).status == "processing"
+    finally:
+        db.close()
@@ -0,0 +1,183 @@
+"""traceparent 传播与尾部采样"""
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import tracing
+from app.core.config import settings
+from app.core.tracing import Tracer, inject_context, parse_traceparent
+from app.services.task_scheduler import task_scheduler
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+# trace ID 的低64位决定按比例采样的结论：前者在比例大于0时即保留，后者只在比例为1时保留
+LOW_TRACE_ID = "0af7651916cd43dd" + "0000000000000001"
+HIGH_TRACE_ID = "0af7651916cd43dd" + "ffffffffffffffff"
+
+
+def _traceparent(trace_id: str = TRACE_ID, span_id: str = PARENT_ID) -> str:
+    return f"00-{trace_id}-{span_id}-01"
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(_traceparent()) == (TRACE_ID, PARENT_ID)
+    # 大小写与首尾空白不影响解析
+    assert parse_traceparent(f"  {_traceparent().upper()} ") == (TRACE_ID, PARENT_ID)
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00") == (TRACE_ID, PARENT_ID)
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "garbage",
+    f"01-{TRACE_ID}-{PARENT_ID}-01",
+    f"00-{TRACE_ID[:-1]}-{PARENT_ID}-01",
+    f"00-{TRACE_ID}-{PARENT_ID}x-01",
+    f"00-{'0' * 32}-{PARENT_ID}-01",
+    f"00-{TRACE_ID}-{'0' * 16}-01",
+], ids=["none", "empty", "garbage", "version", "short_trace_id", "bad_span_id", "zero_trace_id", "zero_span_id"])
+def test_invalid_traceparent_is_ignored(header):
+    assert parse_traceparent(header) is None
+
+
+class RecordingExporter:
+    def __init__(self):
+        self.requests = []
+
+    def export(self, request: dict):
+        self.requests.append(request)
+
+    def shutdown(self):
+        pass
+
+    def trace_ids(self) -> list:
+        return [span["traceId"] for request in self.requests
+                for resource in request["resourceSpans"] for scope in resource["scopeSpans"]
+                for span in scope["spans"]]
+
+
+def _tracer(sample_ratio: float = 0.0, **kwargs) -> Tracer:
+    return Tracer("test", exporter=RecordingExporter(), sample_ratio=sample_ratio,
+                  slow_thresholds_ms={"server": 100.0}, export_interval=0.01, **kwargs)
+
+
+def _flush(tracer: Tracer) -> list:
+    tracer.start()
+    tracer.shutdown()
+    return tracer.exporter.trace_ids()
+
+
+def test_remote_parent_continues_trace_and_propagates():
+    tracer = _tracer()
+    carrier = inject_context({"task_id": "t1"})
+    assert carrier == {"task_id": "t1"}
+
+    with tracer.span("request", "server", parent=_traceparent()) as root:
+        with tracer.span("db", "client") as child:
+            inject_context(carrier)
+
+    assert (root.trace_id, root.parent_id) == (TRACE_ID, PARENT_ID)
+    assert (child.trace_id, child.parent_id) == (TRACE_ID, root.span_id)
+    # 载荷携带当前 span 作为父 span，接收方据此接续同一 trace
+    assert carrier["traceparent"] == child.traceparent
+    assert parse_traceparent(carrier["traceparent"]) == (TRACE_ID, child.span_id)
+    # 格式不合法的 traceparent 开始新的 trace
+    with tracer.span("request", "server", parent="garbage") as fresh:
+        pass
+    assert fresh.trace_id != TRACE_ID and fresh.parent_id is None
+
+
+def test_errors_are_always_kept():
+    tracer = _tracer()
+    with pytest.raises(ValueError):
+        with tracer.span("request", "server", parent=_traceparent(HIGH_TRACE_ID)):
+            with tracer.span("db", "client"):
+                raise ValueError("boom")
+
+    assert tracer.kept["error"] == 1
+    assert _flush(tracer) == [HIGH_TRACE_ID, HIGH_TRACE_ID]
+
+
+def test_slow_segments_are_kept_by_root_kind():
+    tracer = _tracer()
+    now = time.time_ns()
+    slow = tracer.start_span("request", "server", parent=_traceparent(HIGH_TRACE_ID), start_ns=now - 150_000_000)
+    tracer.end(slow, now)
+    fast = tracer.start_span("request", "server", start_ns=now - 50_000_000)
+    tracer.end(fast, now)
+    # 没有阈值的 span 类型不按耗时保留
+    internal = tracer.start_span("job", "internal", start_ns=now - 10 ** 12)
+    tracer.end(internal, now)
+
+    assert tracer.kept["slow"] == 1
+    assert tracer.dropped_by_sampling == 2
+    assert _flush(tracer) == [HIGH_TRACE_ID]
+
+
+def test_later_segments_of_kept_trace_are_sticky():
+    tracer = _tracer(sticky_traces=1)
+    with pytest.raises(RuntimeError):
+        with tracer.span("request", "server", parent=_traceparent(HIGH_TRACE_ID)):
+            raise RuntimeError("boom")
+
+    # 请求之后的任务执行是同一 trace 的另一个片段，即使本身不满足保留条件也保留
+    with tracer.span("video_task.execute", "consumer", parent=_traceparent(HIGH_TRACE_ID)):
+        pass
+    assert tracer.kept["sticky"] == 1
+
+    # 只记住最近 sticky_traces 个 trace
+    with pytest.raises(RuntimeError):
+        with tracer.span("request", "server"):
+            raise RuntimeError("boom")
+    with tracer.span("video_task.execute", "consumer", parent=_traceparent(HIGH_TRACE_ID)):
+        pass
+    assert tracer.kept["sticky"] == 1
+    assert tracer.dropped_by_sampling == 1
+
+
+@pytest.mark.parametrize("ratio, kept", [(0.0, []), (0.5, [LOW_TRACE_ID]), (1.0, [LOW_TRACE_ID, HIGH_TRACE_ID])])
+def test_ratio_sampling_is_decided_by_trace_id(ratio, kept):
+    tracer = _tracer(sample_ratio=ratio)
+    for trace_id in (LOW_TRACE_ID, HIGH_TRACE_ID):
+        # 同一 trace 的多个片段结论一致
+        for _ in range(2):
+            with tracer.span("request", "server", parent=_traceparent(trace_id)):
+                pass
+
+    # 第二个片段按已保留的 trace 计入 sticky
+    assert (tracer.kept["sampled"], tracer.kept["sticky"]) == (len(kept), len(kept))
+    assert tracer.dropped_by_sampling == 4 - 2 * len(kept)
+    assert _flush(tracer) == [trace_id for trace_id in kept for _ in range(2)]
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = _tracer(enabled=False)
+    with tracer.span("request", "server", parent=_traceparent()) as span:
+        assert inject_context({}) == {}
+    assert span.traceparent is None
+    assert tracer.segments == 0
+
+
+def test_request_traceparent_reaches_task_payload(database, monkeypatch):
+    from app.main import create_application
+
+    monkeypatch.setattr(settings, "tracing_enabled", True)
+    monkeypatch.setattr(tracing.tracer, "enabled", True)
+    monkeypatch.setattr(tracing.tracer, "exporter", None)
+    with TestClient(create_application(), base_url="http://localhost") as client:
+        tokens = client.post("/api/v1/auth/register", json={
+            "email": "trace@example.com", "username": "trace", "password": "password123"}).json()
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        character_id = client.post("/api/v1/characters/", json={"name": "角色"}, headers=headers).json()["id"]
+
+        response = client.post("/api/v1/videos/generate", json={
+            "character_id": character_id, "script": "脚本", "duration": 10,
+        }, headers={**headers, "traceparent": _traceparent()})
+
+    assert response.status_code == 200, response.text
+    assert response.headers["X-Trace-Id"] == TRACE_ID
+    payload = task_scheduler.tasks[response.json()["id"]].payload
+    # worker 执行任务时以载荷中的 traceparent 为父 span，与请求属于同一 trace
+    trace_id, parent_id = parse_traceparent(payload["traceparent"])
+    assert trace_id == TRACE_ID and parent_id != PARENT_ID
@@ -0,0 +1,145 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app.core.database import SessionLocal
+from app.models.character import CharacterImage
+from app.services.upload_sessions import upload_session_store
+
+
+def _png(seed: int) -> bytes:
+    image = Image.effect_noise((64, 64), 40 + seed * 30).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def alice(client, register):
+    user = register("alice")
+    response = client.post("/api/v1/characters/", json={"name": "角色"}, headers=user["headers"])
+    return {**user, "character_id": response.json()["id"]}
+
+
+def _upload_session(client, user: dict, files: list) -> str:
+    response = client.post(f"/api/v1/upload/character/{user['character_id']}/sessions", headers=user["headers"], json={
+        "files": [{"filename": f"{i}.png", "size": len(data), "content_type": "image/png"}
+                  for i, data in enumerate(files)],
+        "reject_duplicates": False,
+    })
+    assert response.status_code == 200, response.text
+    session = response.json()
+    chunk_size = session["chunk_size"]
+    for spec in session["files"]:
+        data = files[spec["index"]]
+        for chunk in spec["missing_chunks"]:
+            offset = chunk * chunk_size
+            response = client.put(f"/api/v1/upload/sessions/{session['session_id']}/files/{spec['index']}",
+                                  params={"offset": offset}, content=data[offset:offset + chunk_size],
+                                  headers=user["headers"])
+            assert response.status_code == 200, response.text
+    return session["session_id"]
+
+
+def _image_count(character_id: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(CharacterImage).filter(CharacterImage.character_id == character_id).count()
+    finally:
+        db.close()
+
+
+def test_sessions_belong_to_their_creator(client, register, alice):
+    session_id = _upload_session(client, alice, [_png(0)])
+    bob = register("bob")
+
+    assert client.get(f"/api/v1/upload/sessions/{session_id}").status_code == 401
+    assert client.get(f"/api/v1/upload/sessions/{session_id}", headers=bob["headers"]).status_code == 404
+    assert client.put(f"/api/v1/upload/sessions/{session_id}/files/0", params={"offset": 0}, content=b"x",
+                      headers=bob["headers"]).status_code == 404
+    assert client.post(f"/api/v1/upload/sessions/{session_id}/finalize", headers=bob["headers"]).status_code == 404
+    assert client.delete(f"/api/v1/upload/sessions/{session_id}", headers=bob["headers"]).status_code == 404
+    # 不能在别人的角色下创建会话
+    response = client.post(f"/api/v1/upload/character/{alice['character_id']}/sessions", headers=bob["headers"],
+                           json={"files": [{"filename": "0.png", "size": 10}]})
+    assert response.status_code == 404
+    assert client.get(f"/api/v1/upload/sessions/{session_id}", headers=alice["headers"]).status_code == 200
+
+
+def test_finalize_stores_each_file_in_one_pass(client, alice, monkeypatch):
+    files = [_png(0), _png(1)]
+    session_id = _upload_session(client, alice, files)
+    reads = []
+    iter_file = upload_session_store.iter_file
+
+    def counting_iter_file(session, file_index, *args, **kwargs):
+        reads.append(file_index)
+        return iter_file(session, file_index, *args, **kwargs)
+
+    monkeypatch.setattr(upload_session_store, "iter_file", counting_iter_file)
+    response = client.post(f"/api/v1/upload/sessions/{session_id}/finalize", headers=alice["headers"])
+
+    assert response.status_code == 200, response.text
+    assert response.json()["total_uploaded"] == 2
+    assert sorted(reads) == [0, 1]
+    for image, data in zip(response.json()["uploaded_images"], files):
+        with open(image["url"], "rb") as f:
+            assert f.read() == data
+
+
+def test_finalize_is_serialized(client, alice):
+    session_id = _upload_session(client, alice, [_png(0)])
+    lock = upload_session_store.lock_finalize(session_id)
+    try:
+        response = client.post(f"/api/v1/upload/sessions/{session_id}/finalize", headers=alice["headers"])
+        assert response.status_code == 409
+    finally:
+        lock.close()
+    assert _image_count(alice["character_id"]) == 0
+
+    response = client.post(f"/api/v1/upload/sessions/{session_id}/finalize", headers=alice["headers"])
+    assert response.status_code == 200
+    assert _image_count(alice["character_id"]) == 1
+
+
+def test_finalize_retry_skips_stored_files(client, alice):
+    session_id = _upload_session(client, alice, [_png(0), _png(1)])
+    # 上一次 finalize 在第一个文件入库后中断
+    stored = {"id": "image-0", "filename": "0.png", "url": "stored/0.png", "file_size": 1, "mime_type": "image/png",
+              "quality_score": 0.5, "recommendations": []}
+    upload_session_store.record_result(session_id, 0, {"image": stored})
+
+    response = client.post(f"/api/v1/upload/sessions/{session_id}/finalize", headers=alice["headers"])
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["total_uploaded"] == 2
+    assert body["uploaded_images"][0]["id"] == "image-0"
+    assert _image_count(alice["character_id"]) == 1
+    assert not os.path.exists(os.path.join(upload_session_store.root, session_id))
+
+
+def test_similar_elsewhere_counts_only_own_characters(client, register, alice, monkeypatch):
+    from app.api.v1 import upload
+    from app.services.image_hash import ImageHashIndex
+
+    monkeypatch.setattr(upload, "image_hash_index", ImageHashIndex())
+    bob = register("bob")
+    bob_character = client.post("/api/v1/characters/", json={"name": "角色"}, headers=bob["headers"]).json()["id"]
+    other_character = client.post("/api/v1/characters/", json={"name": "另一个角色"},
+                                  headers=alice["headers"]).json()["id"]
+    image = [("files", ("ref.png", _png(0), "image/png"))]
+
+    def upload_image(character_id: str, user: dict) -> dict:
+        response = client.post(f"/api/v1/upload/character/{character_id}/images", files=image, headers=user["headers"])
+        assert response.status_code == 200, response.text
+        return response.json()["uploaded_images"][0]
+
+    assert upload_image(alice["character_id"], alice)["similar_elsewhere"] == 0
+    # 其他用户角色中的相同图片不计入，也不能上传到别人的角色
+    assert upload_image(bob_character, bob)["similar_elsewhere"] == 0
+    assert client.post(f"/api/v1/upload/character/{bob_character}/images", files=image,
+                       headers=alice["headers"]).status_code == 404
+    assert upload_image(other_character, alice)["similar_elsewhere"] == 1
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+import zlib
+
+import msgpack
+import pytest
+
+from app.core.security import decode_token
+from app.services.ws_protocol import FLAG_RAW, FLAG_ZLIB, JsonCodec, MsgpackCodec, ProtocolError
+
+
+def test_msgpack_round_trip():
+    codec = MsgpackCodec(compress_threshold=64)
+    timestamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    message = {"type": "task_progress_update", "task_id": "t1", "progress": 42, "timestamp": timestamp,
+               "custom": [1, "二"]}
+
+    frame = codec.encode(message)
+
+    assert frame[0] == FLAG_RAW
+    assert codec.decode(frame) == {**message, "timestamp": int(timestamp.timestamp() * 1000)}
+    # 超过阈值的消息整体压缩，未知消息类型原样传输
+    large = {"type": "custom_event", "result": {"scenes": ["场景"] * 100}}
+    frame = codec.encode(large)
+    assert frame[0] == FLAG_ZLIB
+    assert codec.decode(frame) == large
+
+
+def test_json_round_trip():
+    codec = JsonCodec()
+    message = {"type": "ping", "message": "你好"}
+    assert codec.decode(codec.encode(message)) == message
+    # 二进制编码的连接也接受JSON文本帧
+    assert MsgpackCodec().decode(codec.encode(message)) == message
+
+
+@pytest.mark.parametrize("frame", [
+    b"",
+    bytes((7,)) + msgpack.packb({"t": 7}),
+    bytes((FLAG_ZLIB,)) + b"not zlib",
+    bytes((FLAG_ZLIB,)) + zlib.compress(b"\0" * (2 << 20)),
+    bytes((FLAG_RAW,)) + b"\xc1",
+    bytes((FLAG_RAW,)) + msgpack.packb({"t": 7}) + b"\x01",
+    bytes((FLAG_RAW,)) + msgpack.packb([1, 2]),
+    bytes((FLAG_RAW,)),
+    "not json",
+    "[1, 2]",
+], ids=["empty", "unknown_flag", "bad_zlib", "zlib_bomb", "bad_msgpack", "trailing_data", "not_a_map",
+        "flag_only", "bad_json", "json_array"])
+def test_malformed_frames_raise_protocol_error(frame):
+    with pytest.raises(ProtocolError):
+        MsgpackCodec().decode(frame)
+
+
+def test_endpoint_answers_malformed_frame_and_keeps_connection(client, register):
+    user = register()
+    user_id = decode_token(user["access_token"])["sub"]
+    codec = MsgpackCodec()
+
+    url = f"ws://localhost/api/v1/ws/{user_id}?protocol=msgpack&token={user['access_token']}"
+    with client.websocket_connect(url) as ws:
+        ws.send_bytes(b"")
+        reply = codec.decode(ws.receive_bytes())
+        assert reply == {"type": "error", "message": "空帧"}
+
+        ws.send_bytes(bytes((FLAG_ZLIB,)) + b"not zlib")
+        assert codec.decode(ws.receive_bytes())["type"] == "error"
+
+        ws.send_bytes(codec.encode({"type": "ping"}))
+        assert codec.decode(ws.receive_bytes()) == {"type": "pong"}
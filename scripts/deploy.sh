@@ -113,7 +113,7 @@ wait_for_services() {
 run_migrations() {
     log_info "运行数据库迁移..."
     
-    docker exec ai-video-lab-backend-1 alembic upgrade head
+    docker exec ai-video-lab-backend-1 python -m app.core.migrate
     
     log_success "数据库迁移完成"
 }